@@ -230,3 +230,18 @@ class LogLevel(IntEnum):
 
 
 
+
+
+class Precision(IntEnum):
+    """
+    The precision of computing 4D-STEM datasets, selected per task.
+
+    Float64 and Float32 compute in the floating type. Native keeps the dtype 
+    of the dataset: integer datasets mapped by integer filters (like binary 
+    masks) are summed exactly in int64, and float32 datasets stay float32.
+    """
+    Float64 = 1
+    Float32 = 2
+    Native = 3
+
+    default = 1
@@ -39,15 +39,19 @@ ROOT_PATH = os.path.dirname(__file__)
 if not ROOT_PATH in sys.path:
     sys.path.append(ROOT_PATH)
 
-import matplotlib.style as mplstyle
-mplstyle.use('fast')
+# import matplotlib.style as mplstyle
+# mplstyle.use('fast')
 
+from bin.ImportProfiler import ImportProfiler
 from bin.Widgets.SplashScreenStart import SplashScreenStart
 
 from bin.app import App 
 
 def run():
-
+    # Modules are imported as late as possible, so that the loading screen 
+    # shows up quickly. The time of importing is recorded in the log.
+    import_profiler = ImportProfiler()
+    import_profiler.start()
 
     ''' start app '''
     app = App(sys.argv)
@@ -57,16 +61,29 @@ def run():
     loading_screen.show()
     app.processEvents()
 
+    import matplotlib.style as mplstyle
+    mplstyle.use('fast')
+
     ''' start backend managers '''
+    loading_screen.showMessage('Starting managers...')
+    app.processEvents()
     app.startBackEnds()
     logger = app.logger
     app.theme_handler.initTheme() 
 
     ''' start main window '''
+    loading_screen.showMessage('Loading the main window...')
+    app.processEvents()
     from bin.Widgets.MainWindow import MainWindow
     main_window = MainWindow()
     app.main_window = main_window
     main_window.show()
+
+    import_profiler.stop()
+    logger.info('4D-Explorer started in {0:.2f} s. {1}'.format(
+        import_profiler.elapsed, import_profiler.summary()
+    ))
+    logger.debug(import_profiler.report())
     loading_screen.finish(main_window)
     
     quit = app.exec()
@@ -19,7 +19,7 @@ from PySide6.QtWidgets import QWidget, QStackedWidget
 from PySide6.QtGui import QActionGroup, QAction
 
 from bin.UIManager import ThemeHandler
-from bin.Widgets.PageSettings import PageSettings
+# from bin.Widgets.PageSettings import PageSettings
 
 class ControlActionGroup(QActionGroup):
     """
@@ -33,7 +33,7 @@ class ControlActionGroup(QActionGroup):
             ActionPages(self),
             ActionTask(self),
             ActionComputer(self),
-            # ActionEMServer(self),
+            ActionEMServer(self),
         ]
         for action in self._control_actions:
             self.addAction(action)
@@ -192,6 +192,8 @@ class ActionSettings(ActionControlBase):
         """
         Will open a page for settings.
         """
+        # PageSettings is imported when it is opened for a faster startup
+        from bin.Widgets.PageSettings import PageSettings
         page = PageSettings()
         self.tabview_manager.openTab(page)
         
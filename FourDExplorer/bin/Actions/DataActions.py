@@ -15,6 +15,7 @@ date:           Jun 15, 2022
 """
 
 from logging import Logger 
+from typing import TYPE_CHECKING
 
 from PySide6.QtCore import QObject, QModelIndex
 from PySide6.QtWidgets import QMessageBox, QInputDialog, QTreeView, QWidget
@@ -26,10 +27,18 @@ from bin.HDFManager import HDFDataNode, HDFHandler
 from bin.UIManager import ThemeHandler
 from bin.Widgets.DialogChangeDataType import DialogChangeDataType
 from bin.Widgets.DialogChooseItem import DialogHDFChoose
-from bin.Widgets.PageViewFourDSTEM import PageViewFourDSTEM
-from bin.Widgets.PageViewImage import PageViewImage
-from bin.Widgets.PageViewLine import PageViewLine
-from bin.Widgets.PageViewVectorField import PageViewVectorField
+# The pages are imported when they are opened, since importing all of them 
+# takes long at the startup.
+# from bin.Widgets.PageViewFourDSTEM import PageViewFourDSTEM
+# from bin.Widgets.PageViewImage import PageViewImage
+# from bin.Widgets.PageViewLine import PageViewLine
+# from bin.Widgets.PageViewVectorField import PageViewVectorField
+
+if TYPE_CHECKING:
+    from bin.Widgets.PageViewFourDSTEM import PageViewFourDSTEM
+    from bin.Widgets.PageViewImage import PageViewImage
+    from bin.Widgets.PageViewLine import PageViewLine
+    from bin.Widgets.PageViewVectorField import PageViewVectorField
 
 
 class ActionDataManipulateBase(ActionEditBase):
@@ -123,6 +132,10 @@ class ActionOpenData(ActionDataManipulateBase):
         arguments:
             hdf_type: (HDFType)
         """
+        from bin.Widgets.PageViewImage import PageViewImage
+        from bin.Widgets.PageViewFourDSTEM import PageViewFourDSTEM
+        from bin.Widgets.PageViewVectorField import PageViewVectorField
+        from bin.Widgets.PageViewLine import PageViewLine
         if hdf_type == HDFType.Image:
             page = PageViewImage()
             page.setImage(self.item_path)
@@ -177,13 +190,14 @@ class ActionOpenLine(ActionOpenData):
         self.setText('Open Line')
         self.initIconResources('line')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageViewLine:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageViewLine':
         """
         Use the line viewing method to open the line.
 
         arguments:
             hdf_type: (HDFType) (does not work)
         """
+        from bin.Widgets.PageViewLine import PageViewLine
         page = PageViewLine()
         if self.item_path not in ('', '/'):
             page.addLine(self.item_path)
@@ -201,13 +215,14 @@ class ActionOpenImage(ActionOpenData):
         self.setText('Open Image')
         self.initIconResources('picture')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageViewImage:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageViewImage':
         """
         Use the image viewing method to open the data.
 
         arguments:
             hdf_type: (HDFType) (does not work)
         """
+        from bin.Widgets.PageViewImage import PageViewImage
         page = PageViewImage()
         if self.item_path not in ('', '/'):
             page.setImage(self.item_path)
@@ -225,13 +240,14 @@ class ActionOpenVectorField(ActionOpenData):
         self.setText('Open Vector Field')
         self.initIconResources('particle_tracking')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageViewVectorField:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageViewVectorField':
         """
         Use the vector field method to open the data.
 
         arguments:
             hdf_type: (HDFType) (does not work)
         """
+        from bin.Widgets.PageViewVectorField import PageViewVectorField
         page = PageViewVectorField()
         if self.item_path not in ('', '/'):
             page.setVectorField(self.item_path)
@@ -249,13 +265,14 @@ class ActionOpenFourDSTEM(ActionOpenData):
         self.setText('Open 4D-STEM')
         self.initIconResources('cube')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageViewFourDSTEM:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageViewFourDSTEM':
         """
         Use the 4D-STEM method to open the data.
 
         arguments:
             hdf_type: (HDFType) (does not work)
         """
+        from bin.Widgets.PageViewFourDSTEM import PageViewFourDSTEM
         page = PageViewFourDSTEM()
         if self.item_path not in ('', '/'):
             page.setFourDSTEM(self.item_path)
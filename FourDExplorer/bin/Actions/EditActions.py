@@ -19,36 +19,50 @@ from logging import Logger
 import os 
 import datetime
 import time 
+from typing import TYPE_CHECKING
 
 from PySide6.QtCore import QObject, QModelIndex
 from PySide6.QtWidgets import QMessageBox, QInputDialog, QTreeView
 from PySide6.QtGui import QAction
-from Constants import ItemDataRoles, HDFType, APP_VERSION
+from Constants import ItemDataRoles, HDFType, APP_VERSION, TaskState
 
 from bin.HDFManager import HDFHandler
 from bin.UIManager import ThemeHandler
 from bin.Widgets.DialogChangeDataType import DialogChangeDataType
 from bin.Widgets.DialogCreateItem import DialogHDFCreate
-from bin.Widgets.DialogImportFourDSTEM import DialogImportFourDSTEM
+# from bin.Widgets.DialogImportFourDSTEM import DialogImportFourDSTEM
 from bin.Widgets.DialogMoveItem import DialogHDFMove
 from bin.Widgets.DialogCopyItem import DialogHDFCopy
 # from bin.Widgets.DialogAttrViewer import DialogAttrViewer
-from bin.Widgets.DialogMetaViewer import DialogMetaViewer
-from bin.Widgets.DialogImportImage import DialogImportImage
+# from bin.Widgets.DialogMetaViewer import DialogMetaViewer
+# from bin.Widgets.DialogImportImage import DialogImportImage
 from bin.Widgets.DialogChooseItem import DialogHDFChoose
-from bin.Widgets.WidgetImportEMPAD import WidgetImportEMPAD
-from bin.Widgets.WidgetImportMerlin import WidgetImportMerlin 
-from bin.Widgets.WidgetImportRaw import WidgetImportRaw 
-from bin.Widgets.WidgetImportNumpy import WidgetImportNumpy 
-from bin.Widgets.WidgetImportDM4 import WidgetImportDM4
-from bin.Widgets.WidgetImportHDF5 import WidgetImport4DSTEMFromHDF5
-from lib.ImporterEMPAD import ImporterEMPAD, ImporterEMPAD_NJU
-from lib.ImporterRaw import ImporterRawFourDSTEM
-from lib.ImporterMIB import ImporterMIB
-from lib.ImporterNumpy import ImporterNumpy
-from lib.ImporterDM4 import ImporterDM4
-from lib.ImporterHDF5 import ImporterHDF5
-from lib.TaskLoadData import TaskLoadTiff
+# from bin.Widgets.WidgetImportEMPAD import WidgetImportEMPAD
+# from bin.Widgets.WidgetImportMerlin import WidgetImportMerlin 
+# from bin.Widgets.WidgetImportRaw import WidgetImportRaw 
+# from bin.Widgets.WidgetImportNumpy import WidgetImportNumpy 
+# from bin.Widgets.WidgetImportDM4 import WidgetImportDM4
+# from bin.Widgets.WidgetImportHDF5 import WidgetImport4DSTEMFromHDF5
+# from bin.Widgets.PageViewImage import PageViewImage
+# from lib.ImporterEMPAD import ImporterEMPAD, ImporterEMPAD_NJU
+# from lib.ImporterRaw import ImporterRawFourDSTEM
+# from lib.ImporterMIB import ImporterMIB
+# from lib.ImporterNumpy import ImporterNumpy
+# from lib.ImporterDM4 import ImporterDM4
+# from lib.ImporterHDF5 import ImporterHDF5
+# from lib.TaskLoadData import TaskLoadTiff
+# from lib.TaskLoadData import TaskBaseLoadData
+# The import dialogs, importers and pages are imported when they are used, 
+# since importing all of them takes long at the startup.
+
+if TYPE_CHECKING:
+    from bin.Widgets.WidgetImportEMPAD import WidgetImportEMPAD
+    from bin.Widgets.WidgetImportMerlin import WidgetImportMerlin
+    from bin.Widgets.WidgetImportRaw import WidgetImportRaw
+    from bin.Widgets.WidgetImportNumpy import WidgetImportNumpy
+    from bin.Widgets.WidgetImportDM4 import WidgetImportDM4
+    from bin.Widgets.WidgetImportHDF5 import WidgetImport4DSTEMFromHDF5
+    from lib.TaskLoadData import TaskBaseLoadData
 
 class ActionEditBase(QAction):
     """
@@ -457,6 +471,7 @@ class ActionAttributes(ActionEditBase):
         # function returning, which keeps the lifetime of the dialog.
         global qApp 
         # dialog_attr = DialogAttrViewer(qApp.main_window)
+        from bin.Widgets.DialogMetaViewer import DialogMetaViewer
         dialog_attr = DialogMetaViewer(qApp.main_window)
         dialog_attr.setItemPath(self.item_path)
         dialog_attr.show()
@@ -473,6 +488,11 @@ class ActionImportFourDSTEM(ActionEditBase):
         self.setText('Import 4D-STEM dataset')
         self.triggered.connect(lambda: self.importFourDSTEM(self))
 
+    @property
+    def tabview_manager(self):
+        global qApp 
+        return qApp.tabview_manager
+
     @failLogging
     def importFourDSTEM(self):
         """
@@ -480,6 +500,13 @@ class ActionImportFourDSTEM(ActionEditBase):
         """
         if self._treeview is not None:
             self.setItemPathFromIndex(self._treeview.currentIndex())
+        from bin.Widgets.DialogImportFourDSTEM import DialogImportFourDSTEM
+        from lib.ImporterEMPAD import ImporterEMPAD, ImporterEMPAD_NJU
+        from lib.ImporterRaw import ImporterRawFourDSTEM
+        from lib.ImporterMIB import ImporterMIB
+        from lib.ImporterNumpy import ImporterNumpy
+        from lib.ImporterDM4 import ImporterDM4
+        from lib.ImporterHDF5 import ImporterHDF5
         dialog_import = DialogImportFourDSTEM()
         if self.item_path:
             dialog_import.setParentPath(self.item_path)
@@ -490,12 +517,15 @@ class ActionImportFourDSTEM(ActionEditBase):
         parent_path = dialog_import.getParentPath()
         mode = dialog_import.getImportMode()
         page = dialog_import.getPage(mode)
+        is_preview = dialog_import.getIsPreview()
+        importer = None 
 
         if mode == 0:
             importer = ImporterEMPAD(new_name, parent_path)
             page: WidgetImportEMPAD
             xml_path = page.getHeaderPath()
             importer.parseHead(xml_path)
+            importer.preview = is_preview 
             importer.loadData()
         
         elif mode == 1:
@@ -503,6 +533,7 @@ class ActionImportFourDSTEM(ActionEditBase):
             page: WidgetImportEMPAD
             xml_path = page.getHeaderPath()
             importer.parseHead(xml_path)
+            importer.preview = is_preview 
             importer.loadData()
 
         elif mode == 2:
@@ -512,6 +543,7 @@ class ActionImportFourDSTEM(ActionEditBase):
             importer.parseMibHead(mib_path)
             importer.scan_i = page.scan_i
             importer.scan_j = page.scan_j 
+            importer.preview = is_preview 
             importer.loadData()
         
         elif mode == 3:
@@ -520,6 +552,7 @@ class ActionImportFourDSTEM(ActionEditBase):
             page: WidgetImportDM4
             file_path = page.getFilePath()
             importer.parseDM4(file_path)
+            importer.preview = is_preview 
             importer.loadData()
 
         elif mode == 4:
@@ -539,6 +572,7 @@ class ActionImportFourDSTEM(ActionEditBase):
                 rotate_90 = page.getRotate90(),
                 is_flipped = page.getIsFlip(),
             )
+            importer.preview = is_preview 
             importer.loadData()
 
         elif mode == 5:
@@ -549,6 +583,7 @@ class ActionImportFourDSTEM(ActionEditBase):
                 file_path = page.getFilePath(),
                 npz_data_name = page.getNpzKey(), 
             )
+            importer.preview = is_preview 
             importer.loadData()
             
         elif mode == 6:
@@ -559,6 +594,7 @@ class ActionImportFourDSTEM(ActionEditBase):
             file_path = page.getHDF5FilePath()
             dataset_path = page.getSelectedItemPath()
             importer.setFileAndDatasetPath(file_path, dataset_path)
+            importer.preview = is_preview 
             importer.loadData()
              
         elif mode == 7:
@@ -568,6 +604,32 @@ class ActionImportFourDSTEM(ActionEditBase):
         elif mode == 8:
             # .mat file sequences 
             pass 
+
+        if is_preview and importer is not None:
+            self._openPreview(importer.task)
+
+    def _openPreview(self, task: 'TaskBaseLoadData'):
+        """
+        Open the preview image of the loading task, and refresh it while the
+        data are being loaded.
+
+        If the task has not been submitted, the page is opened as a preparing
+        function, i.e. just after the preview image is created.
+
+        arguments:
+            task: (TaskBaseLoadData)
+        """
+        def _openPage():
+            from bin.Widgets.PageViewImage import PageViewImage
+            page = PageViewImage()
+            page.setImage(task.preview_path)
+            task.partial_updated.connect(page.updateImage)
+            self.tabview_manager.openTab(page)
+
+        if task.state in (TaskState.Initialized, TaskState.Waiting):
+            task.setPrepare(_openPage)
+        elif task.state == TaskState.Submitted:
+            _openPage()
             
         
         
@@ -595,6 +657,8 @@ class ActionImportImage(ActionEditBase):
         """
         if self._treeview is not None:
             self.setItemPathFromIndex(self._treeview.currentIndex())
+        from bin.Widgets.DialogImportImage import DialogImportImage
+        from lib.TaskLoadData import TaskLoadTiff
         dialog_import = DialogImportImage()
         if self.item_path:
             dialog_import.setParentPath(self.item_path)
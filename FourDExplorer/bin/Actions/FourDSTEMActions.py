@@ -14,6 +14,8 @@ date:           Jun 19, 2022
 *-------------------------- FourDSTEMActions.py ------------------------------*
 """
 
+from typing import TYPE_CHECKING
+
 from PySide6.QtCore import QObject 
 from PySide6.QtWidgets import QWidget 
 
@@ -23,15 +25,25 @@ from bin.Actions.DataActions import ActionOpenFourDSTEM
 from bin.Actions.DataActions import ActionOpenData
 from bin.HDFManager import HDFType
 from bin.Widgets.DialogChooseItem import DialogHDFChoose
-from bin.Widgets.PageAlignFourDSTEM import PageAlignFourDSTEM
-from bin.Widgets.PageBkgrdFourDSTEM import PageBkgrdFourDSTEM
-from bin.Widgets.PageCenterOfMass import PageCenterOfMass
-from bin.Widgets.PageRotateFourDSTEM import PageRotateFourDSTEM
-from bin.Widgets.PageViewFourDSTEM import PageViewFourDSTEM
-from bin.Widgets.PageVirtualImage import PageVirtualImage
-from bin.Widgets.DialogEditParaFourDSTEM import DialogEditParaFourDSTEM
-
-from bin.Widgets.PagePlotCTF import PagePlotCTF
+# The pages are imported when they are opened, since importing all of them 
+# takes long at the startup.
+# from bin.Widgets.PageAlignFourDSTEM import PageAlignFourDSTEM
+# from bin.Widgets.PageBkgrdFourDSTEM import PageBkgrdFourDSTEM
+# from bin.Widgets.PageCenterOfMass import PageCenterOfMass
+# from bin.Widgets.PageRotateFourDSTEM import PageRotateFourDSTEM
+# from bin.Widgets.PageViewFourDSTEM import PageViewFourDSTEM
+# from bin.Widgets.PageVirtualImage import PageVirtualImage
+# from bin.Widgets.DialogEditParaFourDSTEM import DialogEditParaFourDSTEM
+
+# from bin.Widgets.PagePlotCTF import PagePlotCTF
+
+if TYPE_CHECKING:
+    from bin.Widgets.PageAlignFourDSTEM import PageAlignFourDSTEM
+    from bin.Widgets.PageBkgrdFourDSTEM import PageBkgrdFourDSTEM
+    from bin.Widgets.PageCenterOfMass import PageCenterOfMass
+    from bin.Widgets.PagePlotCTF import PagePlotCTF
+    from bin.Widgets.PageRotateFourDSTEM import PageRotateFourDSTEM
+    from bin.Widgets.PageVirtualImage import PageVirtualImage
 
 class ActionVirtualImage(ActionOpenData):
     """
@@ -43,13 +55,14 @@ class ActionVirtualImage(ActionOpenData):
         super().__init__(parent)
         self.setText('Virtual Image')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageVirtualImage:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageVirtualImage':
         """
         Use the virtual image method to open the Dataset.
 
         arguments:
             hdf_type: (HDFType) (does not work)
         """
+        from bin.Widgets.PageVirtualImage import PageVirtualImage
         page = PageVirtualImage()
         page.setFourDSTEM(self.item_path)
         return page  
@@ -65,13 +78,14 @@ class ActionCenterOfMass(ActionOpenData):
         super().__init__(parent)
         self.setText('Center of Mass')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageCenterOfMass:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageCenterOfMass':
         """
         Use the center of mass method to open the Dataset.
 
         arguments:
             hdf_type: (HDFType) (does not work)
         """
+        from bin.Widgets.PageCenterOfMass import PageCenterOfMass
         page = PageCenterOfMass()
         page.setFourDSTEM(self.item_path)
         return page 
@@ -87,13 +101,14 @@ class ActionAlign(ActionOpenData):
         super().__init__(parent)
         self.setText('Diffraction Alignment')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageAlignFourDSTEM:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageAlignFourDSTEM':
         """
         Use the diffraction alignment method to open the Dataset.
 
         arguments:
             hdf_type: (HDFType) 
         """
+        from bin.Widgets.PageAlignFourDSTEM import PageAlignFourDSTEM
         page = PageAlignFourDSTEM()
         page.setFourDSTEM(self.item_path)
         return page 
@@ -109,13 +124,14 @@ class ActionBackground(ActionOpenData):
         super().__init__(parent)
         self.setText('Background Subtraction')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageBkgrdFourDSTEM:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageBkgrdFourDSTEM':
         """
         Use the background subtraction method to open the Dataset.
 
         arguments:
             hdf_type: (HDFType)
         """
+        from bin.Widgets.PageBkgrdFourDSTEM import PageBkgrdFourDSTEM
         page = PageBkgrdFourDSTEM()
         page.setFourDSTEM(self.item_path)
         return page 
@@ -131,13 +147,14 @@ class ActionRotate(ActionOpenData):
         super().__init__(parent)
         self.setText('Diffraction Rotation')
 
-    def openAs(self, hdf_type: HDFType = None) -> PageRotateFourDSTEM:
+    def openAs(self, hdf_type: HDFType = None) -> 'PageRotateFourDSTEM':
         """
         Use the diffraction rotation method to open the Dataset.
 
         arguments:
             hdf_type: (HDFType)
         """
+        from bin.Widgets.PageRotateFourDSTEM import PageRotateFourDSTEM
         page = PageRotateFourDSTEM()
         page.setFourDSTEM(self.item_path)
         return page 
@@ -168,6 +185,7 @@ class ActionPlotCTF(ActionOpenData):
         arguments:
             hdf_type: (HDFType)
         """
+        from bin.Widgets.PagePlotCTF import PagePlotCTF
         page = PagePlotCTF()
         page.setFourDSTEM(self.item_path)
         return page 
@@ -205,6 +223,7 @@ class ActionEditParam(ActionEditBase):
         # Here we must bind the dialog to the main window, in case it is 
         # garbage collected.
         global qApp 
+        from bin.Widgets.DialogEditParaFourDSTEM import DialogEditParaFourDSTEM
         dialog_para = DialogEditParaFourDSTEM(qApp.main_window)
         dialog_para.setFourDSTEM(self.item_path)
         dialog_para.show()
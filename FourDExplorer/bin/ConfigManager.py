@@ -45,6 +45,12 @@ class ConfigManager(QObject):
                 'clevel': 'DEBUG',
                 'wlevel': 'INFO'
             }
+            self._config['Memory'] = {
+                'fraction': '0.5',
+                'minfree': '1024',
+                'maxblock': '2048',
+                'hdfcache': '256'
+            }
             with open(CONFIG_PATH, 'w', encoding='UTF-8') as f:
                 self._config.write(f)
         else:
@@ -63,6 +69,14 @@ class ConfigManager(QObject):
                     'clevel': 'DEBUG',
                     'wlevel': 'INFO'
                 }
+            if not self._config.has_section('Memory'):
+                self._config.add_section('Memory')
+                self._config['Memory'] = {
+                    'fraction': '0.5',
+                    'minfree': '1024',
+                    'maxblock': '2048',
+                    'hdfcache': '256'
+                }
             with open(CONFIG_PATH, 'w', encoding='UTF-8') as f:
                 self._config.write(f)
         
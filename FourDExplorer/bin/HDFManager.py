@@ -61,6 +61,7 @@ from datetime import datetime
 import re
 import threading
 from collections.abc import Mapping
+from typing import Callable
 from typing import Iterator
 from logging import Logger
 import itertools
@@ -78,6 +79,10 @@ from PySide6.QtCore import QAbstractTableModel
 
 from Constants import APP_VERSION, ItemDataRoles, HDFType
 from bin.TaskManager import Task, TaskManager
+from bin.MemoryBudget import getMemoryBudget
+from bin.SearchIndex import HDFSearchIndex
+from lib.HDFCopy import copyDataset
+from lib.HDFCopy import getCreateOptions
 
 
 """
@@ -215,6 +220,8 @@ class HDFHandler(QObject):
         self._file_path = ''
         self._lock = threading.Lock()   # read/write lock
         self._root_node = HDFRootNode()
+        self._node_index = {'/': self._root_node}   # path -> node
+        self._search_index = None 
         self._createModel()
         self._keep_file_opened = []
 
@@ -356,7 +363,12 @@ class HDFHandler(QObject):
         try:
             if not self.isFileOpened():
                 # Read/write, file must exist
-                self.file = h5py.File(self.file_path, mode='r+')
+                # self.file = h5py.File(self.file_path, mode='r+')
+                self.file = h5py.File(
+                    self.file_path, 
+                    mode = 'r+', 
+                    rdcc_nbytes = getMemoryBudget().hdf_cache,
+                )
                 self.buildHDFTree()
                 self.file_opened.emit()
                 
@@ -427,6 +439,7 @@ class HDFHandler(QObject):
             self.file_closed.emit()
             self.logger.info('Close file: {0}'.format(self.file_path))
         self.file = None
+        self._search_index = None
           
 
     def isFileOpened(self) -> bool:
@@ -484,19 +497,98 @@ class HDFHandler(QObject):
         """
         Build an HDFTree according to the current HDF5 file.
 
-        Will add child nodes recursively for the root_node and its childs.
+        The tree is built lazily: the children of a group node are listed from
+        the file only when they are first queried, e.g. when the group is 
+        expanded in the view. So opening a file with many items is fast.
         """
         if self.isFileOpened():
-            self._root_node = self.addChildDeepFirst(HDFRootNode())
+            self._root_node = HDFRootNode(loader = self._loadChildren)
         else:
             self._root_node = HDFRootNode()
+        self._node_index = {'/': self._root_node}
+        self._search_index = None   # built at the first search
         self._createModel()
+
+    @property
+    def search_index(self) -> HDFSearchIndex:
+        """
+        The search index of item names and attributes in the current file.
+
+        It is built at the first access after the file is opened, and then 
+        updated by the methods of HDFHandler.
+
+        returns:
+            (HDFSearchIndex) or None if no file is opened.
+        """
+        if not self.isFileOpened():
+            return None
+        if self._search_index is None:
+            self._search_index = HDFSearchIndex(self._file)
+        return self._search_index
+
+    def attributesChanged(self, item_path: str):
+        """
+        Notify that the attributes of the item have been edited, so that the
+        search index is updated.
+
+        Attributes written directly by h5py (e.g. obj.attrs[key] = value) are 
+        not seen by the index, so call this after writing them. The item is 
+        indexed again before the next search, so several writes cost only one
+        update.
+
+        arguments:
+            item_path: (str) absolute path of the HDF5 item.
+        """
+        if self._search_index is not None:
+            self._search_index.markDirty(item_path)
+
+    def _indexNewItem(self, item_path: str, recursive: bool = False):
+        """
+        Add a new item into the search index if it has been built.
+
+        The attributes are indexed again before the next search, as they are 
+        usually written just after the item is created.
+        """
+        if self._search_index is not None:
+            self._search_index.addItem(item_path, recursive = recursive)
+            self._search_index.markDirty(item_path)
+
+    def _loadChildren(self, parent: 'HDFGroupNode'):
+        """
+        List the children of a group node from the HDF5 file.
+
+        This is the loader of the group nodes, which is called when their 
+        children are queried for the first time. The children groups are 
+        also lazy. 
+
+        Only Group and Dataset object in the HDF5 file will be added.
+
+        arguments:
+            parent: (HDFGroupNode)
+        """
+        if not self.isFileOpened():
+            return 
+        parent_path = parent.path
+        prefix = '' if parent_path == '/' else parent_path
+        group = self._file[parent_path]
+        for key in group:
+            # only one lookup of the link for every child
+            item_class = group.get(key, getclass = True)
+            if item_class is h5py.Group:
+                child = HDFGroupNode(key, loader = self._loadChildren)
+            elif item_class is h5py.Dataset:
+                child = HDFDataNode(key)
+            else:
+                continue
+            parent.addChild(child)
+            self._node_index[prefix + '/' + key] = child
             
     def addChildDeepFirst(self, parent: 'HDFGroupNode'):
         """
-        Add child nodes recursively for the root_node and its childs.
+        Add child nodes for the group node according to the HDF5 file.
 
-        Only Group and Dataset object in the HDF5 file will be added.
+        The children are not listed immediately, but when they are queried for
+        the first time. Existing children of the node are discarded.
 
         TODO: Other types like String, Referece and External Links.
 
@@ -511,14 +603,34 @@ class HDFHandler(QObject):
             raise TypeError('parent must be an HDFGroupNode, not '
                 '{0}'.format(type(parent).__name__))
         
-        for key in self._file[parent.path]:
-            if isinstance(self._file[parent.path][key], h5py.Group):
-                parent.addChild(HDFGroupNode(key))
-                self.addChildDeepFirst(parent[key])
-            elif isinstance(self._file[parent.path][key], h5py.Dataset):
-                parent.addChild(HDFDataNode(key))
+        parent.setLoader(self._loadChildren)
         return parent
 
+        # for key in self._file[parent.path]:
+        #     if isinstance(self._file[parent.path][key], h5py.Group):
+        #         parent.addChild(HDFGroupNode(key))
+        #         self.addChildDeepFirst(parent[key])
+        #     elif isinstance(self._file[parent.path][key], h5py.Dataset):
+        #         parent.addChild(HDFDataNode(key))
+        # return parent
+
+    def _forgetNodes(self, item_path: str):
+        """
+        Remove the item and its subitems from the path index.
+
+        Must be called when the path of items changes, i.e. they are deleted, 
+        moved or renamed. They will be indexed again when queried.
+
+        arguments:
+            item_path: (str) absolute path of the HDF5 item.
+        """
+        prefix = item_path + '/'
+        for path in [
+            path for path in self._node_index 
+            if path == item_path or path.startswith(prefix)
+        ]:
+            del self._node_index[path]
+
     def getNode(self, hdf_path: str) -> 'HDFTreeNode':
         """
         Get Node with the absolute path of the HDF5 items.
@@ -542,17 +654,26 @@ class HDFHandler(QObject):
             raise KeyError('hdf_path cannot end with slash /')
         elif hdf_path == '/':
             return self.root_node
-        else:
-            keys_array = hdf_path.split('/')[1:]
-            node = self.root_node
-            for key in keys_array:
-                if key in node:
-                    node = node[key]
-                else:
-                    raise KeyError(('There is no key '
-                        '{0} in {1}'.format(key, node.name)))
+
+        node = self._node_index.get(hdf_path)
+        if (
+            node is not None 
+            and node.path == hdf_path 
+            and node.isSubNode(self.root_node)
+        ):
             return node
 
+        keys_array = hdf_path.split('/')[1:]
+        node = self.root_node
+        for key in keys_array:
+            if key in node:
+                node = node[key]
+            else:
+                raise KeyError(('There is no key '
+                    '{0} in {1}'.format(key, node.name)))
+        self._node_index[hdf_path] = node
+        return node
+
     def getRank(self, hdf_path: str = '') -> int:
         """
         Get the rank of the node among its mates.
@@ -572,7 +693,8 @@ class HDFHandler(QObject):
             # print(hdf_path)
             this = self.getNode(hdf_path)
             key = hdf_path.split('/').pop()
-            rank = list(this.parent.keys()).index(key)
+            # rank = list(this.parent.keys()).index(key)
+            rank = this.parent.rowOf(key)
             return rank
 
     def addNewGroup(self, parent_path: str, name: str):
@@ -604,6 +726,7 @@ class HDFHandler(QObject):
         self.model.beginInsertRows(parent_model_index, row, row)
         parent_node.addChild(HDFGroupNode(name))
         self.model.endInsertRows()
+        self._indexNewItem(parent_node[name].path)
 
         self.logger.debug('Create group {0} in {1}'.format(name, parent_path))
         
@@ -615,6 +738,9 @@ class HDFHandler(QObject):
         dtype: str = 'float32',
         compression: str = None,
         # compression: str = 'gzip', # compression has some performance problem
+        maxshape: tuple = None,
+        chunks: tuple|bool = None,
+        **kwargs,
     ):
         """
         Create a dataset in the parent_path.
@@ -625,6 +751,16 @@ class HDFHandler(QObject):
             parent_path: (str) absolute path of the HDF5 group
 
             name: (str) name of the new dataset
+
+            maxshape: (tuple) the dataset can be resized up to this shape. Use
+                None in an axis to make it unlimited. Resizable datasets are 
+                always chunked. Default is None (not resizable).
+
+            chunks: (tuple or bool) the chunk shape. Default is None, which 
+                means contiguous storage unless chunking is required.
+
+            **kwargs: other storage options of h5py create_dataset, like 
+                compression_opts, shuffle and fillvalue.
         """
         if not isinstance(parent_path, str):
             raise TypeError(('parent_path must be str, not '
@@ -650,6 +786,9 @@ class HDFHandler(QObject):
                 shape = shape, 
                 dtype = dtype, 
                 compression = compression,
+                maxshape = maxshape,
+                chunks = chunks,
+                **kwargs,
             )
 
         parent_model_index = self.model.indexFromPath(parent_path)
@@ -657,6 +796,7 @@ class HDFHandler(QObject):
         self.model.beginInsertRows(parent_model_index, row, row)
         parent_node.addChild(HDFDataNode(name, parent_node))
         self.model.endInsertRows()
+        self._indexNewItem(parent_node[name].path)
         
         self.logger.debug('Create data {0} in {1}'.format(name, parent_path))
 
@@ -687,6 +827,9 @@ class HDFHandler(QObject):
         self.model.beginRemoveRows(parent_model_index, row, row)
         parent_node.deleteChild(this_node)
         self.model.endRemoveRows()
+        self._forgetNodes(item_path)
+        if self._search_index is not None:
+            self._search_index.removeItem(item_path)
         
         self.logger.debug('Delete {0}'.format(item_path))
 
@@ -766,6 +909,9 @@ class HDFHandler(QObject):
         this_parent_node.deleteChild(this_node)
         dest_parent_node.addChild(this_node)
         self.model.endMoveRows()
+        self._forgetNodes(item_path)
+        if self._search_index is not None:
+            self._search_index.moveItem(item_path, dest_path)
 
         self.logger.debug('Move {0} to {1}'.format(
             item_path, dest_parent_path))
@@ -824,6 +970,9 @@ class HDFHandler(QObject):
         )
         parent_node.addChild(item_node)
         self.model.endInsertRows()
+        self._forgetNodes(item_path)
+        if self._search_index is not None:
+            self._search_index.moveItem(item_path, new_path)
         
         self.logger.debug('Rename {0} to {1}'.format(item_path, new_name))
 
@@ -931,6 +1080,9 @@ class HDFHandler(QObject):
         """
         A generator that yields nodes matching the key word.
 
+        The names are looked up in the search index, and only the matched 
+        nodes (with their ancestors) are loaded into the tree.
+
         arguments:
             kw: (str) the key word to be matched
 
@@ -940,14 +1092,23 @@ class HDFHandler(QObject):
         if not isinstance(kw, str):
             raise TypeError(('kw must be a str, not '
                 '{0}'.format(type(kw).__name__)))
-        def _matchSubNode(node:'HDFTreeNode'):
-            for key in node:
-                if kw in key:
-                    yield node[key]
-                if isinstance(node[key], HDFGroupNode):
-                    for subnode in _matchSubNode(node[key]):
-                        yield subnode
-        return _matchSubNode(self.root_node)
+        # def _matchSubNode(node:'HDFTreeNode'):
+        #     for key in node:
+        #         if kw in key:
+        #             yield node[key]
+        #         if isinstance(node[key], HDFGroupNode):
+        #             for subnode in _matchSubNode(node[key]):
+        #                 yield subnode
+        # return _matchSubNode(self.root_node)
+        def _matchNames():
+            if not self.isFileOpened():
+                return 
+            for path in self.search_index.matchNames(kw):
+                try:
+                    yield self.getNode(path)
+                except KeyError:
+                    continue
+        return _matchNames()
 
 
 
@@ -1197,7 +1358,12 @@ class HDFGroupNode(HDFTreeNode):
         hdf_type: (HDFType) must be HDFType.Group
     """
 
-    def __init__(self, name: str = '', parent: 'HDFGroupNode' = None):
+    def __init__(
+        self, 
+        name: str = '', 
+        parent: 'HDFGroupNode' = None, 
+        loader: Callable = None,
+    ):
         """
         arguments:
             name: [optional](str) only root's name can and must be a null stri-
@@ -1205,10 +1371,74 @@ class HDFGroupNode(HDFTreeNode):
             
         parent: [optional](HDFTreeNode or NoneType) only root's parent can and
         must be NoneType.
+
+        loader: [optional](Callable) If given, the children are not added 
+            until they are queried for the first time. Then loader(self) is 
+            called once to add them.
         """
+        self._loader = loader 
+        self._rows = None       # (list of keys, dict of key -> row)
         super().__init__(name, parent)
         self._hdf_type = HDFType.Group 
 
+    @property
+    def _mapping(self) -> dict:
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            loader(self)
+        return self._children
+
+    @_mapping.setter
+    def _mapping(self, mapping: dict):
+        self._children = mapping
+        self._rows = None
+
+    def isLoaded(self) -> bool:
+        """
+        Whether the children have been added.
+        """
+        return self._loader is None
+
+    def setLoader(self, loader: Callable):
+        """
+        Discard the children, and add them by loader when they are queried.
+
+        arguments:
+            loader: (Callable) called as loader(self).
+        """
+        self._mapping = {}
+        self._loader = loader
+
+    def _getRows(self) -> tuple:
+        if self._rows is None:
+            keys = list(self._mapping)
+            self._rows = (keys, {key: row for row, key in enumerate(keys)})
+        return self._rows
+
+    def keyAt(self, row: int) -> str:
+        """
+        Get the key of the child in the row.
+
+        arguments:
+            row: (int)
+
+        returns:
+            (str)
+        """
+        return self._getRows()[0][row]
+
+    def rowOf(self, key: str) -> int:
+        """
+        Get the row of the child among its mates.
+
+        arguments:
+            key: (str) the name of the child.
+
+        returns:
+            (int)
+        """
+        return self._getRows()[1][key]
+
 
     def __setitem__(self, key: str, child: HDFTreeNode):
         """
@@ -1241,6 +1471,7 @@ class HDFGroupNode(HDFTreeNode):
             del self._mapping[key]
 
         self._mapping[child.name] = child
+        self._rows = None
 
         if child.parent:            # delete child from its original parent
             del child.parent[child.name]
@@ -1249,6 +1480,7 @@ class HDFGroupNode(HDFTreeNode):
 
     def __delitem__(self, key: str):
         del self._mapping[key]
+        self._rows = None
 
     def __contains__(self, key: str) -> bool:
         return key in self._mapping
@@ -1274,6 +1506,7 @@ class HDFGroupNode(HDFTreeNode):
                 '{0}'.format(child.name)))
         else:
             self._mapping[child.name] = child
+            self._rows = None
             child.parent = self
 
     def deleteChild(self, child: HDFTreeNode) -> HDFTreeNode:
@@ -1438,8 +1671,8 @@ class HDFRootNode(HDFGroupNode):
 
         hdf_type: (HDFType) must be HDFType.Root
     """
-    def __init__(self):
-        super().__init__(name = '', parent = None)
+    def __init__(self, loader: Callable = None):
+        super().__init__(name = '', parent = None, loader = loader)
         self._hdf_type = HDFType.Root
     
     @property 
@@ -1639,9 +1872,9 @@ class HDFTreeModel(QAbstractItemModel):
             return self.createIndex(0, column, self.hdf_handler.root_node)
         else:
             parent_node = parent.internalPointer()
-            key_list = list(parent_node.keys())
+            # key_list = list(parent_node.keys())
             if row < len(parent_node):
-                node = parent_node[key_list[row]]
+                node = parent_node[parent_node.keyAt(row)]
                 return self.createIndex(row, column, node)
             else:
                 return QModelIndex()
@@ -1678,6 +1911,27 @@ class HDFTreeModel(QAbstractItemModel):
             parent_node = parent.internalPointer()
             return len(parent_node)
 
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        """
+        Whether there are rows under the parent.
+
+        For groups whose children have not been listed, the number of members
+        is asked from the HDF5 file, so that they are not loaded until being
+        expanded.
+
+        arguments:
+            parent: (QModelIndex)
+        """
+        if not parent.isValid():
+            return True
+        node = parent.internalPointer()
+        if not isinstance(node, HDFGroupNode):
+            return False
+        elif node.isLoaded() or not self.hdf_handler.isFileOpened():
+            return len(node) > 0
+        else:
+            return len(self.hdf_handler.file[node.path]) > 0
+
     def columnCount(self, parent: QModelIndex) -> int:
         """
         Get the number of columns under the parent.
@@ -2081,6 +2335,7 @@ class TaskCopy(Task):
         new_node = dest_parent_node[new_name]
         if isinstance(new_node, HDFGroupNode):
             new_node = self.hdf_handler.addChildDeepFirst(new_node)
+        self.hdf_handler._indexNewItem(new_node.path, recursive = True)
         new_index = self.model.indexFromPath(new_node.path)
         self.model.dataChanged.emit(new_index, new_index)
 
@@ -2129,12 +2384,7 @@ class TaskCopy(Task):
                 shape=src_dset.shape,
                 dtype=src_dset.dtype,
                 maxshape=src_dset.maxshape,
-                chunks=src_dset.chunks,
-                compression=src_dset.compression,
-                compression_opts=src_dset.compression_opts,
-                shuffle=src_dset.shuffle,
-                fletcher32=src_dset.fletcher32,
-                scaleoffset=src_dset.scaleoffset
+                **getCreateOptions(src_dset),
             )
             # Copy attributes
             for key, value in src_dset.attrs.items():
@@ -2148,49 +2398,55 @@ class TaskCopy(Task):
         self, 
         src_dset: h5py.Dataset, 
         dest_dset: h5py.Dataset, 
-        max_chunk_bytes: int = 4*1024*1024,
+        max_chunk_bytes: int = None,
         progress_signal: Signal = None,
     ):
         """
         Copy data from src_dset to dest_dset in slices to avoid loading the entire dataset into memory.
 
-        This method ensures efficient memory usage by copying data in chunks that do not exceed the specified maximum chunk size.
-        
-        The chunk sizes are computed proportionally across all dimensions to balance the number of elements in each chunk.
+        The raw chunks are copied directly if the two datasets have the same 
+        chunks and filters, otherwise the data are copied in hyperslabs 
+        aligned to the storage chunks. See lib.HDFCopy.copyDataset.
 
         arguments:
             src_dset: (h5py.Dataset) The source dataset to be copied.
             
             dest_dset: (h5py.Dataset) The destination dataset where the data will be copied.
             
-            max_chunk_bytes: (int) The maximum size of each chunk in bytes. 
-                Default is 4 MB.
-        """
-
-        shape = src_dset.shape
-        dtype = src_dset.dtype
-        itemsize = dtype.itemsize
-        total_size = np.prod(shape, dtype = np.int64) * itemsize
-        max_chunk_elems = max_chunk_bytes // itemsize
-        
-        if progress_signal is None:
-            progress_signal = Signal(int)
+            max_chunk_bytes: (int) The maximum size of each slice in bytes. 
+                Default is given by the memory budget (see bin.MemoryBudget).
+        """
+        copyDataset(
+            src_dset, 
+            dest_dset, 
+            progress_signal = progress_signal, 
+            memory_budget = max_chunk_bytes,
+        )
 
-        if total_size <= max_chunk_bytes:
-            # Small dataset; copy all at once
-            dest_dset[...] = src_dset[...]
-        else:
-            # Compute chunk sizes along each axis
-            chunk_sizes = self.computeChunkSizes(shape, max_chunk_elems)
-            # Calculate total number of chunks
-            progress = 0
-            total_chunks = np.prod([(dim + size - 1) // size for dim, size in zip(shape, chunk_sizes)], dtype = np.int64)
-            # Generate slices
-            for slices in self.getSlices(shape, chunk_sizes):
-                data = src_dset[slices]
-                dest_dset[slices] = data
-                progress += 1
-                progress_signal.emit(min(100, int(progress * 100 / total_chunks)))
+        # shape = src_dset.shape
+        # dtype = src_dset.dtype
+        # itemsize = dtype.itemsize
+        # total_size = np.prod(shape, dtype = np.int64) * itemsize
+        # max_chunk_elems = max_chunk_bytes // itemsize
+        # 
+        # if progress_signal is None:
+        #     progress_signal = Signal(int)
+        # 
+        # if total_size <= max_chunk_bytes:
+        #     # Small dataset; copy all at once
+        #     dest_dset[...] = src_dset[...]
+        # else:
+        #     # Compute chunk sizes along each axis
+        #     chunk_sizes = self.computeChunkSizes(shape, max_chunk_elems)
+        #     # Calculate total number of chunks
+        #     progress = 0
+        #     total_chunks = np.prod([(dim + size - 1) // size for dim, size in zip(shape, chunk_sizes)], dtype = np.int64)
+        #     # Generate slices
+        #     for slices in self.getSlices(shape, chunk_sizes):
+        #         data = src_dset[slices]
+        #         dest_dset[slices] = data
+        #         progress += 1
+        #         progress_signal.emit(min(100, int(progress * 100 / total_chunks)))
 
     def computeChunkSizes(self, shape: tuple, max_chunk_elems: int) -> list:
         """
@@ -2483,6 +2739,7 @@ class HDFAttrModel(QAbstractTableModel):
         self.attrs.create(key, value)
         self.meta[key] = value
         self.endInsertRows()
+        self.hdf_handler.attributesChanged(self.item_path)
         self.logger.debug('Create Attribute {0} in {1}'.format(
             key, self.item_path))
 
@@ -2504,6 +2761,7 @@ class HDFAttrModel(QAbstractTableModel):
         del self.attrs[key]
         del self.meta[key]
         self.endRemoveRows()
+        self.hdf_handler.attributesChanged(self.item_path)
         self.logger.debug('Delete Attribute {0} in {1}'.format(
             key, self.item_path
         ))
@@ -2525,6 +2783,7 @@ class HDFAttrModel(QAbstractTableModel):
         key = self.keyFromIndex(index)
         self.attrs.modify(key, value)
         self.meta[key] = value
+        self.hdf_handler.attributesChanged(self.item_path)
         self.dataChanged().emit(QModelIndex(), index)
         self.logger.debug('Change the value of attribute {0} in {1}'.format(
             key, self.item_path
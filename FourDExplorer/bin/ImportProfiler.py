@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+"""
+*---------------------------- ImportProfiler.py -------------------------------*
+记录程序启动时导入各个模块所花费的时间。
+
+与 python -X importtime 类似，ImportProfiler 在启动期间替换内置的 __import__ 函数，
+记录每个新导入模块的累计时间 (包括其导入的子模块) 与自身时间。启动完成后，在日志中输出
+最慢的若干个模块，以便发现拖慢启动的依赖。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Record the time spent on importing modules when the software starts.
+
+Like python -X importtime, ImportProfiler replaces the builtin __import__
+during the startup, and records the cumulative time (including the modules it
+imports) and the self time of every newly imported module. After the startup,
+the slowest modules are written into the log, so that the dependencies that
+slow down the startup can be found.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*---------------------------- ImportProfiler.py -------------------------------*
+"""
+
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+
+
+class ImportRecord:
+    """
+    一个模块的导入时间记录。
+
+    The import time of a module.
+
+    attributes:
+        name: (str) the full name of the module.
+
+        depth: (int) how deep the import is nested. Modules imported by the
+            profiled code directly have depth 0.
+
+        cumulative: (float) seconds including the imported submodules.
+
+        self_time: (float) seconds excluding the imported submodules.
+    """
+    __slots__ = ('name', 'depth', 'cumulative', 'self_time')
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.cumulative = 0.0
+        self.self_time = 0.0
+
+
+class ImportProfiler:
+    """
+    记录模块导入时间的工具。
+
+    Profiler of module imports.
+
+    Only the imports in the thread that starts the profiler are recorded.
+    Modules that are already imported are skipped, so the cost of a deferred
+    import is not counted twice.
+
+    Usage:
+        profiler = ImportProfiler()
+        profiler.start()
+        from bin.Widgets.MainWindow import MainWindow
+        profiler.stop()
+        logger.info(profiler.summary())
+    """
+    def __init__(self):
+        self._records = []
+        self._stack = []
+        self._original_import = None
+        self._running = False
+        self._hook = self._import      # the same bound method is compared
+        self._thread_id = None
+        self._start_time = None
+        self._elapsed = 0.0
+
+    @property
+    def records(self) -> list:
+        """
+        The records of imported modules, in the order of importing.
+        """
+        return self._records
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    @property
+    def import_time(self) -> float:
+        """
+        Seconds spent on importing modules, i.e. the sum of the cumulative
+        time of the outermost imports.
+        """
+        return sum(
+            record.cumulative for record in self._records if record.depth == 0
+        )
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Seconds from start() to stop(), or to now if it is running.
+        """
+        if self.is_running:
+            return self._elapsed + time.perf_counter() - self._start_time
+        return self._elapsed
+
+    def start(self):
+        """
+        Start to record the imports.
+        """
+        if self.is_running:
+            return
+        if builtins.__import__ is not self._hook:
+            self._original_import = builtins.__import__
+        self._running = True
+        self._thread_id = threading.get_ident()
+        self._start_time = time.perf_counter()
+        builtins.__import__ = self._hook
+
+    def stop(self):
+        """
+        Stop recording, and restore the builtin __import__.
+        """
+        if not self.is_running:
+            return
+        if builtins.__import__ is self._hook:
+            builtins.__import__ = self._original_import
+        self._elapsed += time.perf_counter() - self._start_time
+        self._running = False
+
+    def _resolveName(self, name: str, globals: dict, level: int) -> str:
+        if level == 0:
+            return name
+        package = (globals or {}).get('__package__') or ''
+        try:
+            return importlib.util.resolve_name('.' * level + name, package)
+        except (ImportError, ValueError):
+            return name
+
+    def _import(self, name, globals = None, locals = None, fromlist = (),
+        level = 0):
+        original_import = self._original_import
+        if not self._running:
+            return original_import(name, globals, locals, fromlist, level)
+        if threading.get_ident() != self._thread_id:
+            return original_import(name, globals, locals, fromlist, level)
+        full_name = self._resolveName(name, globals, level)
+        if full_name in sys.modules:
+            # 'from package import submodule' may import new submodules
+            module = sys.modules[full_name]
+            new_submodules = [
+                sub for sub in (fromlist or ())
+                if sub != '*' and not hasattr(module, sub)
+                and full_name + '.' + sub not in sys.modules
+            ]
+            if not new_submodules:
+                return original_import(name, globals, locals, fromlist, level)
+            full_name = ', '.join(
+                full_name + '.' + sub for sub in new_submodules
+            )
+
+        record = ImportRecord(full_name, len(self._stack))
+        self._records.append(record)
+        self._stack.append(0.0)          # cumulative time of the children
+        start = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            record.cumulative = time.perf_counter() - start
+            record.self_time = record.cumulative - self._stack.pop()
+            if self._stack:
+                self._stack[-1] += record.cumulative
+
+    def slowest(self, number: int = 10, key: str = 'cumulative') -> list:
+        """
+        Get the slowest imports.
+
+        arguments:
+            number: (int) how many records to be returned.
+
+            key: (str) 'cumulative' or 'self_time'.
+
+        returns:
+            (list) of ImportRecord, the slowest first.
+        """
+        return sorted(
+            self._records,
+            key = lambda record: getattr(record, key),
+            reverse = True,
+        )[:number]
+
+    def report(self, number: int = 30) -> str:
+        """
+        Report the slowest imports in the format of python -X importtime.
+
+        arguments:
+            number: (int) how many modules to be reported.
+
+        returns:
+            (str)
+        """
+        lines = [
+            'Import time of {0} modules: {1:.0f} ms'.format(
+                len(self._records), self.import_time * 1000
+            ),
+            '   self [ms] | cumulative [ms] | module',
+        ]
+        for record in self.slowest(number):
+            lines.append('{0:12.1f} | {1:15.1f} | {2}{3}'.format(
+                record.self_time * 1000,
+                record.cumulative * 1000,
+                '  ' * record.depth,
+                record.name,
+            ))
+        return '\n'.join(lines)
+
+    def summary(self, number: int = 3) -> str:
+        """
+        A one-line summary of the import time, with the slowest modules by
+        self time.
+
+        arguments:
+            number: (int) how many modules to be named.
+
+        returns:
+            (str)
+        """
+        slowest = ', '.join(
+            '{0} ({1:.0f} ms)'.format(record.name, record.self_time * 1000)
+            for record in self.slowest(number, key = 'self_time')
+        )
+        return 'Imported {0} modules in {1:.0f} ms. Slowest: {2}'.format(
+            len(self._records), self.import_time * 1000, slowest or 'none',
+        )
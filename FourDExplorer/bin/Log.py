@@ -35,11 +35,14 @@ except BaseException as e:      # Or any other exception
 '''
 
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 import time
 
 from configparser import ConfigParser
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, Signal, QTimer
 from Constants import ROOT_PATH, CONFIG_PATH, LogLevel
 
 class LogUtil(QObject):
@@ -61,6 +64,12 @@ class LogUtil(QObject):
     Among them, widget_handler will not print traceback if an exception 
     occured.
 
+    The handlers are not attached to the logger directly. Instead, the logger
+    only puts records into a queue by a QueueHandler, which is cheap to be
+    called in worker threads. A QueueListener thread formats the records and
+    passes them to the handlers. The logger drops the records below all the
+    handlers' levels at once, so debug logs in loops cost little.
+
     attributes:
         logger: (logging.Logger) use logger's functions to print logs.
 
@@ -102,6 +111,7 @@ class LogUtil(QObject):
         self._initFileHandler()
         self._initConsoleHandler()
         self._initWidgetHandler()
+        self._initQueue()
 
     @property
     def log_dir_path(self) -> str:
@@ -170,6 +180,7 @@ class LogUtil(QObject):
         """
         self._setLevel('cLevel', _cLevel)
         self._console_handler.setLevel(_cLevel)
+        self._updateLoggerLevel()
 
     @property
     def fLevel(self) -> LogLevel:
@@ -187,6 +198,7 @@ class LogUtil(QObject):
         """
         self._setLevel('fLevel', _fLevel)
         self._file_handler.setLevel(_fLevel)
+        self._updateLoggerLevel()
 
     @property
     def wLevel(self) -> LogLevel:
@@ -204,6 +216,7 @@ class LogUtil(QObject):
         """
         self._setLevel('wLevel', _wLevel)
         self._widget_handler.setLevel(_wLevel)
+        self._updateLoggerLevel()
 
     def _getLevel(self, handler_level_name: str) -> LogLevel:
         """
@@ -314,7 +327,7 @@ class LogUtil(QObject):
         
         self._file_handler.setLevel(self.fLevel)
         self._file_handler.setFormatter(self._formatter)
-        self._logger.addHandler(self._file_handler)
+        # self._logger.addHandler(self._file_handler)
 
     def _initConsoleHandler(self):
         """
@@ -335,7 +348,7 @@ class LogUtil(QObject):
         self._console_handler = logging.StreamHandler()
         self._console_handler.setLevel(self.cLevel)
         self._console_handler.setFormatter(self._formatter)
-        self._logger.addHandler(self._console_handler)
+        # self._logger.addHandler(self._console_handler)
 
     def _initWidgetHandler(self):
         """
@@ -353,7 +366,55 @@ class LogUtil(QObject):
         self._widget_handler = logging.StreamHandler(self._widget_stream)
         self._widget_handler.setLevel(self.wLevel)
         self._widget_handler.setFormatter(self._widget_formatter)
-        self._logger.addHandler(self._widget_handler)
+        # self._logger.addHandler(self._widget_handler)
+
+    def _initQueue(self):
+        """
+        Initialize the queue between the logger and the handlers.
+
+        The logger puts records into the queue by the queue handler, and the 
+        listener thread takes them out to the file, console and widget 
+        handlers.
+        """
+        self._queue = queue.SimpleQueue()
+        self._queue_handler = LogQueueHandler(self._queue)
+        self._logger.addHandler(self._queue_handler)
+        self._listener = logging.handlers.QueueListener(
+            self._queue,
+            self._file_handler,
+            self._console_handler,
+            self._widget_handler,
+            respect_handler_level = True,
+        )
+        self._listener.start()
+        self._updateLoggerLevel()
+
+    def _updateLoggerLevel(self):
+        """
+        Set the level of the logger to the lowest level of the handlers.
+
+        Records below it are dropped before being put into the queue.
+        """
+        self._logger.setLevel(min(
+            self._file_handler.level,
+            self._console_handler.level,
+            self._widget_handler.level,
+        ))
+
+    def shutDown(self):
+        """
+        Write the records left in the queue, and stop the listener thread.
+
+        Should be called when the program exits. After that, the logs are 
+        written into the file and the console directly.
+        """
+        if not self._queue_handler in self._logger.handlers:
+            return
+        self._logger.removeHandler(self._queue_handler)
+        self._listener.stop()
+        self._widget_stream.deliver()
+        self._logger.addHandler(self._file_handler)
+        self._logger.addHandler(self._console_handler)
 
     def _useDefaultPath(self):
         """
@@ -384,31 +445,83 @@ class LogUtil(QObject):
 
 
 
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """
+    将日志记录放入队列中的 handler。
+
+    The handler that puts log records into the queue.
+
+    Unlike logging.handlers.QueueHandler, the records are not formatted here
+    but in the listener thread, so logging costs little in worker threads.
+    The queue is in the same process, so the records need not be pickled.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 class LogStream(QObject):
     """
     一个Logging流。用于主界面上显示Log。
 
+    日志由监听线程写入缓冲区，再由主线程的定时器成批地发送给 Log 窗口。
+
     A stream of logging. Used to print logs in the MainWindow.
 
+    The logs are written into a buffer by the listener thread. A timer in the 
+    GUI thread delivers them to the log widget in batches. If logs come faster
+    than max_lines per delivery, the oldest ones are omitted in the widget 
+    (but not in the file).
+
     signals:
-        print_signal: emits whenever the logger need to log a message to the 
-            widget handler.
+        print_signal: emits a batch of logs that the widget should print.
     """
     print_signal = Signal(str)
+
+    interval = 100          # ms between two deliveries
+    max_lines = 200         # logs kept in the buffer for a delivery
+
     def __init__(self, parent: QObject = None):
         """
         arguments:
             parent: (QObject)
         """
         super().__init__(parent)
-        
+        self._buffer = []
+        self._omitted = 0
+        self._lock = threading.Lock()
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.interval)
+        self._timer.timeout.connect(self.deliver)
+        self._timer.start()
     
     def write(self, strings: str):
         """
+        Write logs into the buffer. May be called in any thread.
+
         arguments:
             strings: (str)
         """
-        self.print_signal.emit(strings)
+        with self._lock:
+            self._buffer.append(strings)
+            if len(self._buffer) > self.max_lines:
+                del self._buffer[0]
+                self._omitted += 1
+
+    def deliver(self):
+        """
+        Emit the logs in the buffer as a batch. Called in the GUI thread.
+        """
+        with self._lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            omitted, self._omitted = self._omitted, 0
+        if omitted:
+            batch.insert(0, '... {0} logs omitted, see the log file.\n'.format(
+                omitted
+            ))
+        # self.print_signal.emit(strings)
+        self.print_signal.emit(''.join(batch))
 
 
 class WidgetFormatter(logging.Formatter):
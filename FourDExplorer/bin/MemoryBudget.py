@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+"""
+*----------------------------- MemoryBudget.py -------------------------------*
+决定各个数据处理引擎每次可以在内存中读写多大的数据块。
+
+导入、复制、映射等引擎都是按块处理 4D-STEM 数据集的。块越大，读写的次数越少，吞吐量
+越高；但块太大则会占满内存，引起交换 (swap)。MemoryBudget 根据系统的空闲内存 (由
+psutil 获得)、配置文件中允许软件使用的内存比例、HDF5 分块缓存的大小，以及正在进行的
+其他块分配，计算出每个请求可以使用的字节数。引擎再根据数据集的 dtype 与形状，把它换算
+为块中的衍射图样数或扫描行数。
+
+这样在 16 GB 内存的笔记本电脑上不会引起交换，在 512 GB 内存的服务器上也不会只使用
+很小的块。
+
+配置文件中的 [Memory] 小节：
+    fraction: 软件所有数据块最多占总内存的比例
+    minfree: 始终留给系统与界面的空闲内存，单位 MB
+    maxblock: 一个数据块的上限，单位 MB
+    hdfcache: HDF5 数据集分块缓存的大小，单位 MB
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Decide how large a block each engine may read or write in memory at a time.
+
+The importing, copying and mapping engines process 4D-STEM datasets in blocks.
+Larger blocks need fewer reads and writes and give higher throughput, but
+blocks that are too large fill up the memory and cause swapping. MemoryBudget
+calculates the bytes that a request may use, according to the free memory of
+the system (from psutil), the fraction of memory that the software may use in
+the configuration file, the size of the HDF5 chunk cache, and the other blocks
+being allocated at the same time. The engines then convert it into the number
+of diffraction patterns or scanning rows of a block, according to the dtype and
+shape of the dataset.
+
+So there is no swapping on 16 GB laptops, and 512 GB servers are not limited
+to small blocks.
+
+The [Memory] section in the configuration file:
+    fraction: the fraction of the total memory that all blocks may take
+    minfree: the free memory always left for the system and GUI, unit: MB
+    maxblock: the upper limit of one block, unit: MB
+    hdfcache: the size of the chunk cache of HDF5 datasets, unit: MB
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*----------------------------- MemoryBudget.py -------------------------------*
+"""
+
+from configparser import ConfigParser
+import threading
+
+import psutil
+
+from Constants import CONFIG_PATH
+
+
+class BlockAllocation:
+    """
+    一次块分配。在退出 with 语句时释放。
+
+    A block allocation, released when the with statement exits.
+
+    Usage:
+        with getMemoryBudget().request(pattern_bytes, scan_i * scan_j) as alloc:
+            for start in range(0, total, alloc.units):
+                ...
+
+    attributes:
+        units: (int) the number of units in a block.
+
+        nbytes: (int) bytes of a block, i.e. units * unit_bytes.
+
+        total_bytes: (int) bytes taken by all copies of the block.
+    """
+    def __init__(
+        self,
+        budget: 'MemoryBudget',
+        units: int,
+        unit_bytes: int,
+        copies: int,
+    ):
+        self._budget = budget
+        self.units = units
+        self.nbytes = units * unit_bytes
+        self.total_bytes = self.nbytes * copies
+
+    def release(self):
+        """
+        Release the allocation. Nothing happens if it has been released.
+        """
+        if self._budget is not None:
+            self._budget._release(self)
+            self._budget = None
+
+    def __enter__(self) -> 'BlockAllocation':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class MemoryBudget:
+    """
+    数据块的内存预算。
+
+    The memory budget of data blocks.
+
+    The bytes given to a request is the free budget shared with the blocks
+    that are being allocated, i.e.
+
+        free = min(total * fraction - hdf_cache - allocated,
+                   available - min_free)
+        block = clamp(free / (number of allocations + 1), min_block,
+                      max_block) / copies
+
+    where available is the memory that the system can give without swapping.
+
+    Use getMemoryBudget() to get the one of the application.
+    """
+
+    min_block = 2**20       # bytes, a block is never smaller than this
+
+    def __init__(
+        self,
+        fraction: float = 0.5,
+        min_free: int = 2**30,
+        max_block: int = 2 * 2**30,
+        hdf_cache: int = 256 * 2**20,
+    ):
+        """
+        arguments:
+            fraction: (float) the fraction of the total memory that all blocks
+                may take.
+
+            min_free: (int) bytes of free memory always left for the system.
+
+            max_block: (int) bytes of one block at most.
+
+            hdf_cache: (int) bytes of the chunk cache of HDF5 datasets.
+        """
+        self.fraction = fraction
+        self.min_free = min_free
+        self.max_block = max_block
+        self.hdf_cache = hdf_cache
+        self._allocations = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fromConfig(cls, config_path: str = CONFIG_PATH) -> 'MemoryBudget':
+        """
+        Create the budget from the [Memory] section of the configuration file.
+        Missing or invalid options are set to the default values.
+
+        arguments:
+            config_path: (str)
+
+        returns:
+            (MemoryBudget)
+        """
+        config = ConfigParser()
+        config.read(config_path, encoding = 'utf-8')
+        section = config['Memory'] if config.has_section('Memory') else {}
+        budget = cls()
+        options = (
+            ('fraction', 'fraction', float, 1),
+            ('minfree', 'min_free', float, 2**20),
+            ('maxblock', 'max_block', float, 2**20),
+            ('hdfcache', 'hdf_cache', float, 2**20),
+        )
+        for key, attr, convert, scale in options:
+            try:
+                value = convert(section[key]) * scale
+            except (KeyError, ValueError):
+                continue
+            if value >= 0:
+                setattr(budget, attr, value if scale == 1 else int(value))
+        budget.fraction = min(budget.fraction, 1.0)
+        return budget
+
+    def getSystemMemory(self) -> tuple:
+        """
+        Get the memory of the system.
+
+        returns:
+            (tuple) (total bytes, available bytes)
+        """
+        memory = psutil.virtual_memory()
+        return memory.total, memory.available
+
+    @property
+    def allocated(self) -> int:
+        """
+        Bytes of the blocks that are being allocated.
+        """
+        return sum(alloc.total_bytes for alloc in self._allocations)
+
+    @property
+    def allocation_count(self) -> int:
+        return len(self._allocations)
+
+    def getFreeBytes(self) -> int:
+        """
+        Bytes that can still be given to new blocks.
+
+        returns:
+            (int)
+        """
+        total, available = self.getSystemMemory()
+        limit = int(total * self.fraction) - self.hdf_cache - self.allocated
+        return max(min(limit, available - self.min_free), 0)
+
+    def request(
+        self,
+        unit_bytes: int,
+        total_units: int = None,
+        copies: int = 1,
+        align: int = 1,
+    ) -> BlockAllocation:
+        """
+        Request a block of whole units.
+
+        The unit is the smallest piece that the engine processes, like a
+        diffraction pattern, or a scanning row of patterns. Its bytes depend
+        on the dtype and shape of the dataset. A block has at least one unit,
+        even if the unit is larger than the budget.
+
+        arguments:
+            unit_bytes: (int) bytes of a unit.
+
+            total_units: (int) the number of units in the dataset. A block is
+                never larger than the dataset.
+
+            copies: (int) how many copies of the block the engine holds at the
+                same time, like the data read and the data converted to
+                float64.
+
+            align: (int) the number of units in a block is rounded down to a
+                multiple of it, e.g. the chunk shape of the dataset.
+
+        returns:
+            (BlockAllocation) to be released after the work.
+        """
+        unit_bytes = max(int(unit_bytes), 1)
+        copies = max(int(copies), 1)
+        with self._lock:
+            share = self.getFreeBytes() // (len(self._allocations) + 1)
+            nbytes = min(max(share, self.min_block), self.max_block) // copies
+            units = max(nbytes // unit_bytes, 1)
+            if total_units is not None:
+                units = min(units, max(int(total_units), 1))
+            if align > 1 and units > align:
+                units = units // align * align
+            allocation = BlockAllocation(self, units, unit_bytes, copies)
+            self._allocations.append(allocation)
+        return allocation
+
+    def reserve(self, nbytes: int) -> BlockAllocation:
+        """
+        Allocate a block of the given bytes, e.g. when the caller of an engine
+        has given the block size. It is counted for the other requests.
+
+        arguments:
+            nbytes: (int)
+
+        returns:
+            (BlockAllocation) of one unit, to be released after the work.
+        """
+        allocation = BlockAllocation(self, 1, max(int(nbytes), 0), 1)
+        with self._lock:
+            self._allocations.append(allocation)
+        return allocation
+
+    def _release(self, allocation: BlockAllocation):
+        with self._lock:
+            self._allocations.remove(allocation)
+
+
+_default_budget = None
+
+
+def getMemoryBudget() -> MemoryBudget:
+    """
+    Get the memory budget of the application.
+
+    If the application is not running (like in tests and scripts), a budget
+    read from the configuration file is used.
+
+    returns:
+        (MemoryBudget)
+    """
+    global qApp
+    try:
+        return qApp.memory_budget
+    except (NameError, AttributeError):
+        pass
+    global _default_budget
+    if _default_budget is None:
+        _default_budget = MemoryBudget.fromConfig()
+    return _default_budget
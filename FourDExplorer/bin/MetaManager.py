@@ -404,7 +404,44 @@ class MetaManager(QObject):
                 elif len(subnode) > 0:
                     for subsubnode in _matchSubNode(subnode):
                         yield subsubnode 
-        return _matchSubNode(self.meta_tree.root)
+
+        search_index = self.hdf_handler.search_index
+        if search_index is None:
+            # no file is opened, so walk the tree as it is
+            return _matchSubNode(self.meta_tree.root)
+
+        def _matchKeys():
+            matched = set()
+            # keys are looked up in the search index of the HDF5 file. The 
+            # attributes of this item may have been written directly by h5py,
+            # so they are indexed again first.
+            search_index.markDirty(self.item_path)
+            for _path, key in search_index.matchAttributes(
+                kw, item_path = self.item_path
+            ):
+                if not self.meta_tree.isValidPath(key):
+                    continue 
+                # the shallowest node whose name includes kw, as the tree
+                # walk does not go into the matched nodes
+                path = ''
+                for part in key.lstrip('/').split('/'):
+                    path = path + '/' + part
+                    if kw in part:
+                        break 
+                else:
+                    continue
+                if path not in matched:
+                    matched.add(path)
+                    yield self.getNode(path)
+            for key in self.listKeys():
+                if key in self._schema and key not in matched:
+                    if kw in self.getSchemaTitle(key):
+                        matched.add(key)
+                        try:
+                            yield self.getNode(key)
+                        except KeyError:
+                            continue
+        return _matchKeys()
                 
     def matchNumberGeneratorNotPathlike(self, kw: str):
         """
@@ -427,7 +464,11 @@ class MetaManager(QObject):
     def refreshModel(self):
         """
         Refresh the models.
+
+        This is called after the metadata are edited, so the search index is 
+        also updated.
         """
+        self.hdf_handler.attributesChanged(self.item_path)
         self.setItemPath(self.item_path)
         self.model_refreshed.emit()
 
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+
+"""
+*------------------------------ SearchIndex.py -------------------------------*
+HDF5 文件中对象名称与属性的内存搜索索引。
+
+在打开文件后第一次搜索时，遍历整个文件一次建立索引；此后在新建、删除、移动、重命名对象
+以及编辑属性时增量地更新。索引支持前缀查询与子串查询。子串查询先通过三元组 (trigram)
+的散列桶筛选候选字符串，再逐个确认；每个三元组只占几个字节，因此即使文件中有数万个属性，
+索引也很小，搜索也能即时完成。属性值只索引开头的一段，更长的值在查询时逐个检查。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+In-memory search index of item names and attributes in the HDF5 file.
+
+The index is built by one visit of the whole file at the first search after the
+file is opened. Then it is updated incrementally when items are created,
+deleted, moved, renamed, or their attributes are edited. It supports prefix
+and substring queries. For substring queries, candidates are found by the
+hashed buckets of their trigrams before being checked one by one. A trigram
+costs only a few bytes, so the index of a file with tens of thousands of
+attributes is still small, and searching it is still instant. Only the heads
+of the attribute values are indexed, and longer values are checked one by one
+at the queries.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*------------------------------ SearchIndex.py -------------------------------*
+"""
+
+from array import array
+import bisect
+from typing import Hashable
+
+import h5py
+import numpy as np
+
+
+class TextIndex:
+    """
+    字符串索引，支持前缀查询与子串查询。
+
+    Index of strings that supports prefix and substring queries.
+
+    Every string may be referred by several references, like the paths of the
+    items with this name.
+
+    For substring queries, the trigrams of the strings are hashed into a fixed
+    number of buckets, each of which is a compact array of the ids of the 
+    strings. The candidates of a keyword are in all buckets of its trigrams,
+    and are checked one by one. So the memory is a few bytes per trigram. 
+    Keywords shorter than 3 characters have no trigrams, and are checked 
+    against every string.
+    """
+
+    bucket_bits = 16
+
+    def __init__(self):
+        self._refs = {}         # text -> set of references
+        self._ids = {}          # text -> id
+        self._texts = []        # id -> text, None if removed
+        self._free_ids = []
+        self._buckets = {}      # hashed trigram -> array of ids
+        self._sorted = []       # sorted texts, for prefix queries
+        self._is_sorted = True
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def _bucketsOf(self, text: str) -> set:
+        mask = (1 << self.bucket_bits) - 1
+        return {hash(text[ii:ii+3]) & mask for ii in range(len(text) - 2)}
+
+    def add(self, text: str, ref: Hashable):
+        """
+        Add a string with its reference.
+
+        arguments:
+            text: (str)
+
+            ref: (Hashable) the reference of the string.
+        """
+        refs = self._refs.get(text)
+        if refs is not None:
+            refs.add(ref)
+            return
+        self._refs[text] = {ref}
+        if self._free_ids:
+            text_id = self._free_ids.pop()
+            self._texts[text_id] = text
+        else:
+            text_id = len(self._texts)
+            self._texts.append(text)
+        self._ids[text] = text_id
+        for bucket in self._bucketsOf(text):
+            ids = self._buckets.get(bucket)
+            if ids is None:
+                self._buckets[bucket] = array('I', (text_id,))
+            else:
+                ids.append(text_id)
+        self._sorted.append(text)
+        self._is_sorted = False
+
+    def remove(self, text: str, ref: Hashable):
+        """
+        Remove the reference of a string. Nothing happens if it is not there.
+
+        arguments:
+            text: (str)
+
+            ref: (Hashable)
+        """
+        refs = self._refs.get(text)
+        if refs is None:
+            return
+        refs.discard(ref)
+        if refs:
+            return
+        del self._refs[text]
+        text_id = self._ids.pop(text)
+        self._texts[text_id] = None
+        self._free_ids.append(text_id)
+        for bucket in self._bucketsOf(text):
+            ids = self._buckets[bucket]
+            ids.remove(text_id)
+            if not ids:
+                del self._buckets[bucket]
+        if self._is_sorted:
+            del self._sorted[bisect.bisect_left(self._sorted, text)]
+        else:
+            self._sorted.remove(text)
+
+    def matchPrefix(self, kw: str) -> set:
+        """
+        Get the references of the strings that start with kw.
+
+        arguments:
+            kw: (str)
+
+        returns:
+            (set)
+        """
+        if not self._is_sorted:
+            self._sorted.sort()
+            self._is_sorted = True
+        result = set()
+        start = bisect.bisect_left(self._sorted, kw)
+        for text in self._sorted[start:]:
+            if not text.startswith(kw):
+                break
+            result.update(self._refs[text])
+        return result
+
+    def matchSubstring(self, kw: str) -> set:
+        """
+        Get the references of the strings that include kw.
+
+        arguments:
+            kw: (str)
+
+        returns:
+            (set)
+        """
+        if len(kw) < 3:
+            candidates = self._refs.keys()
+        else:
+            buckets = []
+            for bucket in self._bucketsOf(kw):
+                ids = self._buckets.get(bucket)
+                if ids is None:
+                    return set()
+                buckets.append(ids)
+            buckets.sort(key = len)
+            candidate_ids = set(buckets[0]).intersection(*buckets[1:])
+            candidates = [self._texts[text_id] for text_id in candidate_ids]
+        result = set()
+        for text in candidates:
+            if kw in text:
+                result.update(self._refs[text])
+        return result
+
+
+class HDFSearchIndex:
+    """
+    HDF5 文件中对象名称、属性键与属性值的索引。
+
+    Index of item names, attribute keys and attribute values in an HDF5 file.
+
+    Items are referred by their absolute paths, while attributes are referred
+    by tuples (path, key). Items that have just been created are marked dirty,
+    and their attributes are indexed again before the next query, because
+    tasks usually write attributes just after creating the datasets.
+    """
+
+    max_value_length = 64       # longer values are indexed by their head,
+                                # and checked one by one at the queries
+
+    def __init__(self, file: h5py.File):
+        """
+        arguments:
+            file: (h5py.File) the opened HDF5 file.
+        """
+        self._file = file
+        self._names = TextIndex()
+        self._attr_keys = TextIndex()
+        self._attr_values = TextIndex()
+        self._attrs = {}        # path -> {key: value text}
+        self._long_values = {}  # (path, key) -> value text longer than max
+        self._dirty = set()
+        self.addItem('/', recursive = True)
+
+    def _valueText(self, value) -> str:
+        """
+        Convert an attribute value into the string to be searched.
+
+        Large arrays are not indexed.
+        """
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', errors = 'replace')
+        elif isinstance(value, np.ndarray) and value.size > 16:
+            return None
+        return str(value)
+
+    def _indexAttributes(self, path: str):
+        attrs = {}
+        try:
+            for key, value in self._file[path].attrs.items():
+                attrs[key] = self._valueText(value)
+        except (KeyError, OSError, TypeError):
+            # attributes of unsupported types are skipped
+            pass
+        for key, text in attrs.items():
+            self._attr_keys.add(key, (path, key))
+            if text is not None:
+                self._attr_values.add(
+                    text[:self.max_value_length], (path, key)
+                )
+                if len(text) > self.max_value_length:
+                    self._long_values[(path, key)] = text
+        self._attrs[path] = attrs
+
+    def _forgetAttributes(self, path: str):
+        for key, text in self._attrs.pop(path, {}).items():
+            self._attr_keys.remove(key, (path, key))
+            if text is not None:
+                self._attr_values.remove(
+                    text[:self.max_value_length], (path, key)
+                )
+                self._long_values.pop((path, key), None)
+
+    def _refresh(self):
+        for path in self._dirty:
+            if path in self._attrs:
+                self.updateAttributes(path)
+        self._dirty.clear()
+
+    def addItem(self, path: str, recursive: bool = False):
+        """
+        Index an item that is in the file.
+
+        arguments:
+            path: (str) absolute path of the item.
+
+            recursive: (bool) whether to index the subitems of a group.
+        """
+        if path != '/':
+            self._names.add(path.rsplit('/', 1)[1], path)
+        self._indexAttributes(path)
+        item = self._file[path]
+        if recursive and isinstance(item, h5py.Group):
+            prefix = '' if path == '/' else path
+            def _visitor(name, obj):
+                if isinstance(obj, (h5py.Group, h5py.Dataset)):
+                    self.addItem(prefix + '/' + name)
+            item.visititems(_visitor)
+
+    def markDirty(self, path: str):
+        """
+        Index the attributes of the item again before the next query.
+
+        arguments:
+            path: (str)
+        """
+        self._dirty.add(path)
+
+    def removeItem(self, path: str):
+        """
+        Remove the item and its subitems from the index.
+
+        arguments:
+            path: (str) absolute path of the item.
+        """
+        prefix = path + '/'
+        for item_path in [
+            p for p in self._attrs if p == path or p.startswith(prefix)
+        ]:
+            self._names.remove(item_path.rsplit('/', 1)[1], item_path)
+            self._forgetAttributes(item_path)
+            self._dirty.discard(item_path)
+
+    def moveItem(self, path: str, new_path: str):
+        """
+        Update the index after the item is moved or renamed.
+
+        arguments:
+            path: (str) the old path.
+
+            new_path: (str) the new path, where the item is now.
+        """
+        self.removeItem(path)
+        self.addItem(new_path, recursive = True)
+
+    def updateAttributes(self, path: str):
+        """
+        Index the attributes of the item again after they are edited.
+
+        arguments:
+            path: (str)
+        """
+        self._forgetAttributes(path)
+        self._indexAttributes(path)
+
+    def matchNames(self, kw: str, prefix: bool = False) -> list:
+        """
+        Find the items whose names match kw.
+
+        arguments:
+            kw: (str)
+
+            prefix: (bool) if True, names must start with kw. Otherwise they
+                only need to include kw.
+
+        returns:
+            (list) sorted paths of the matched items.
+        """
+        if prefix:
+            return sorted(self._names.matchPrefix(kw))
+        else:
+            return sorted(self._names.matchSubstring(kw))
+
+    def matchAttributes(
+        self,
+        kw: str,
+        item_path: str = None,
+        prefix: bool = False,
+        values: bool = False,
+    ) -> list:
+        """
+        Find the attributes whose keys (or values) match kw.
+
+        arguments:
+            kw: (str)
+
+            item_path: (str) if given, only the attributes of this item are
+                returned.
+
+            prefix: (bool) if True, keys must start with kw. Otherwise they
+                only need to include kw.
+
+            values: (bool) whether to match the values as well.
+
+        returns:
+            (list) sorted tuples (path, key) of the matched attributes.
+        """
+        self._refresh()
+        indexes = [self._attr_keys]
+        if values:
+            indexes.append(self._attr_values)
+        result = set()
+        for index in indexes:
+            if prefix:
+                result.update(index.matchPrefix(kw))
+            else:
+                result.update(index.matchSubstring(kw))
+        if values:
+            # kw may be beyond the indexed heads of the long values
+            for ref, text in self._long_values.items():
+                if text.startswith(kw) if prefix else kw in text:
+                    result.add(ref)
+        if item_path is not None:
+            result = {ref for ref in result if ref[0] == item_path}
+        return sorted(result)
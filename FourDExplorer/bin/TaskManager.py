@@ -53,6 +53,7 @@ date:               Jan 9, 2022
 
 from concurrent import futures
 from typing import Iterator, Callable
+import json
 import traceback
 
 from PySide6.QtCore import (
@@ -65,9 +66,11 @@ from PySide6.QtCore import (
 
 from PySide6.QtWidgets import QMessageBox
 
-from Constants import TaskState
+from Constants import TaskState, APP_VERSION
 from logging import Logger
 
+from bin.TaskMetrics import TaskMetrics
+
 
 def _packing(func: Callable, *arg, **kw) -> Callable:
     """
@@ -287,8 +290,9 @@ class TaskManager(QObject):
         Do follow work, and handle its exceptions.
         """
         try:
-            self.logger.info('Task {0} completed.'.format(
-                self.current_task.name
+            self.logger.info('Task {0} completed. {1}'.format(
+                self.current_task.name,
+                self.current_task.metrics.summary(),
             ))
             self.current_task.follow()
         except BaseException as e:
@@ -336,10 +340,12 @@ class TaskManager(QObject):
         task.task_completed.connect(self._startNextTask)
         task.task_progress.connect(self._sendProgress)
 
+        task.metrics.start()
         try:
             task.prepare()
         except BaseException as e:
             # Abandon submitting if errors happen
+            task.metrics.stop()
             task.state = TaskState.Excepted
             self.logger.error('{0}'.format(e), exc_info = True)
             self.task_exception.emit(
@@ -356,9 +362,10 @@ class TaskManager(QObject):
         else:
             self.current_task = task
             for subtask in task:
-                subtask.future = self._executor.submit(
-                    subtask.getFunction()
-                )
+                # subtask.future = self._executor.submit(
+                #     subtask.getFunction()
+                # )
+                subtask.future = self._executor.submit(subtask.run)
                 subtask.future.add_done_callback(subtask.complete)
                 self.logger.debug(
                     'subtask {0} submitted to the executor and has added '
@@ -403,6 +410,26 @@ class TaskManager(QObject):
         """
         self.task_queue.clearHistory()
 
+    def exportMetrics(self, path: str):
+        """
+        Export the performance metrics of the history tasks as a JSON file.
+
+        Tasks that have not been run are skipped.
+
+        arguments:
+            path: (str) the path of the JSON file.
+        """
+        tasks = [
+            task.getMetrics() for task in self.task_queue.history_list
+            if task.metrics.wall_time is not None
+        ]
+        with open(path, 'w', encoding = 'utf-8') as f:
+            json.dump(
+                {'app_version': APP_VERSION, 'tasks': tasks}, 
+                f, 
+                indent = 4,
+            )
+
 class TaskQueue(QObject):
     """
     任务的等待队列。
@@ -627,6 +654,12 @@ class Task(QObject):
         state: (TaskState) the state of the task
 
         comment: (str) comment of this task
+
+        metrics: (TaskMetrics) performance metrics of this task, measured from
+            its submission to the completion of all subtasks.
+
+        patterns: (int or None) number of diffraction patterns processed by
+            this task, to calculate the throughput.
     """
 
     task_completed = Signal()   # emits when this task is completed.
@@ -642,6 +675,7 @@ class Task(QObject):
         self._progress = 0
         self._state = TaskState.Initialized
         self._has_progress = False
+        self._metrics = TaskMetrics()
 
     @property
     def name(self) -> str:
@@ -681,6 +715,44 @@ class Task(QObject):
                 '{0}'.format(type(_tstate).__name__))
         self._state = _tstate
 
+    @property
+    def metrics(self) -> TaskMetrics:
+        return self._metrics
+
+    @property
+    def patterns(self) -> int:
+        return self._metrics.patterns
+
+    @patterns.setter
+    def patterns(self, _patterns: int):
+        """
+        arguments:
+            _patterns: (int) number of diffraction patterns to be processed.
+        """
+        if not isinstance(_patterns, int):
+            raise TypeError('patterns must be an int, not '
+                '{0}'.format(type(_patterns).__name__))
+        self._metrics.patterns = _patterns
+
+    def getMetrics(self) -> dict:
+        """
+        Get the performance metrics of this task and its subtasks.
+
+        returns:
+            (dict) that can be dumped to JSON.
+        """
+        metrics = {
+            'name': self.name,
+            'state': self.state.name,
+        }
+        metrics.update(self.metrics.toDict())
+        metrics['subtasks'] = []
+        for subtask in self:
+            subtask_metrics = {'name': subtask.name}
+            subtask_metrics.update(subtask.metrics.toDict())
+            metrics['subtasks'].append(subtask_metrics)
+        return metrics
+
     def __iter__(self):
         return iter(self._subtasks)
 
@@ -950,6 +1022,7 @@ class Task(QObject):
             for subtask in self:
                 if not subtask.completed:
                     return False
+            self.metrics.stop()
             self.state = TaskState.Completed
             self.task_completed.emit()
             return True
@@ -958,6 +1031,7 @@ class Task(QObject):
             for subtask in self:
                 if not subtask.completed:
                     return False
+            self.metrics.stop()
             self.task_completed.emit()
             return True
         else:
@@ -1033,6 +1107,9 @@ class Subtask(QObject):
             saved in this variable.
 
         rec_exc: (None or str) traceback information if there is an exception
+
+        metrics: (TaskMetrics) performance metrics of the function. The CPU 
+            time is the time of the worker thread.
     """
     subtask_completed = Signal()    # emits when the subtask is completed
     subtask_excepted = Signal()     # emits when there is an exception raised
@@ -1046,6 +1123,7 @@ class Subtask(QObject):
         self._result = None
         self._exception = None  # exception, if an exception occured
         self._rec_exc = None    # trace back exc when an exception occured
+        self._metrics = TaskMetrics(per_thread = True, sample_memory = False)
     
     def __str__(self):
         return '<Subtask> name: {0}'.format(self.name)
@@ -1116,9 +1194,26 @@ class Subtask(QObject):
         """
         return self._rec_exc
 
+    @property
+    def metrics(self) -> TaskMetrics:
+        return self._metrics
+
     def getFunction(self) -> Callable:
         return self._func
 
+    def run(self):
+        """
+        Call the function and measure it. This is submitted to the executor.
+
+        returns:
+            the result of the function.
+        """
+        self._metrics.start()
+        try:
+            return self._func()
+        finally:
+            self._metrics.stop()
+
     def complete(self, future: futures.Future):
         """
         Will emits a completed signal, and save the result.
@@ -1384,7 +1479,9 @@ class SubtaskListModel(QAbstractListModel):
 
         elif role == Qt.ToolTipRole:
             if subtask.completed:
-                return '<Subtask>: {0} (completed)'.format(name)
+                return '<Subtask>: {0} (completed) {1}'.format(
+                    name, subtask.metrics.summary()
+                )
             else:
                 return '<Subtask>: {0}'.format(name)
 
@@ -1453,10 +1550,16 @@ class HistoryTaskModel(QAbstractListModel):
             return None
         task = self.history_list[index.row()]
         if role == Qt.DisplayRole:
-            return task.name
+            # return task.name
+            if task.metrics.wall_time is None:
+                return task.name
+            return '{0} ({1:.2f} s)'.format(task.name, task.metrics.wall_time)
         elif role == Qt.ToolTipRole:
-            return '<Task>: {0}, state: {1}'.format(
-                task.name, task.state
+            # return '<Task>: {0}, state: {1}'.format(
+            #     task.name, task.state
+            # )
+            return '<Task>: {0}, state: {1}\n{2}'.format(
+                task.name, task.state, task.metrics.summary()
             )
 
 
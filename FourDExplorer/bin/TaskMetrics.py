@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+
+"""
+*------------------------------ TaskMetrics.py -------------------------------*
+记录任务与子任务的性能指标。
+
+包括墙钟时间、CPU 时间、读写的字节数、常驻内存 (RSS) 的峰值，以及由此得到的吞吐量
+(每秒处理的衍射图样数、每秒读写的 MB 数)。这些指标显示在任务详情与历史任务中，也可以
+导出为 JSON 文件，用于追踪性能的退化。
+
+读写字节数来自本进程的 I/O 计数器。由于 TaskManager 一次只运行一个任务，这些读写几乎
+都是该任务通过 HDF 文件进行的。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Record the performance metrics of tasks and subtasks.
+
+They include the wall time, the CPU time, the bytes read and written, the peak
+resident set size (RSS), and the derived throughput (diffraction patterns per
+second and MB per second). The metrics are shown in the task details and the
+history tasks, and can be exported as JSON files to track regressions.
+
+The bytes read and written come from the I/O counters of this process. Since
+TaskManager runs only one task at a time, they are almost all done by the
+task through the HDF file.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*------------------------------ TaskMetrics.py -------------------------------*
+"""
+
+import threading
+import time
+
+import psutil
+
+
+def readIOCounters(process: psutil.Process) -> tuple:
+    """
+    Read the bytes that the process has read and written.
+
+    The bytes passing the read/write system calls (including the ones from
+    the page cache) are used if the platform provides them, otherwise the
+    bytes of I/O operations.
+
+    arguments:
+        process: (psutil.Process)
+
+    returns:
+        (tuple) (bytes read, bytes written), or (None, None) if the platform
+            does not support I/O counters.
+    """
+    try:
+        counters = process.io_counters()
+    except (AttributeError, NotImplementedError, psutil.Error):
+        return None, None
+    read = getattr(counters, 'read_chars', counters.read_bytes)
+    written = getattr(counters, 'write_chars', counters.write_bytes)
+    return read, written
+
+
+class MemorySampler(threading.Thread):
+    """
+    在后台周期性地采样进程常驻内存的线程。
+
+    A thread that samples the resident set size of the process periodically,
+    and keeps the peak.
+    """
+    interval = 0.05         # seconds between two samples
+
+    def __init__(self, process: psutil.Process):
+        super().__init__(name = 'MemorySampler', daemon = True)
+        self._process = process
+        self._stop_event = threading.Event()
+        self.peak_rss = 0
+        self.sample()
+
+    def sample(self):
+        try:
+            rss = self._process.memory_info().rss
+        except psutil.Error:
+            return
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        """
+        Stop sampling, and take the last sample.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.sample()
+
+
+class TaskMetrics:
+    """
+    一个任务或子任务的性能指标。
+
+    Performance metrics of a task or a subtask.
+
+    Call start() and stop() around the work. For a subtask, they are called
+    in the worker thread, and the CPU time is the time of that thread. For a
+    task, the CPU time is the time of the whole process.
+
+    attributes:
+        wall_time: (float or None) seconds.
+
+        cpu_time: (float or None) seconds.
+
+        bytes_read: (int or None)
+
+        bytes_written: (int or None)
+
+        peak_rss: (int or None) bytes of the peak resident set size.
+
+        patterns: (int or None) number of diffraction patterns processed.
+
+        patterns_per_second: (float or None)
+
+        megabytes_per_second: (float or None) MB read and written per second.
+    """
+    def __init__(self, per_thread: bool = False, sample_memory: bool = True):
+        """
+        arguments:
+            per_thread: (bool) whether to measure the CPU time of the thread
+                calling start() and stop(), instead of the process.
+
+            sample_memory: (bool) whether to sample the RSS in a background
+                thread. Otherwise the RSS is only sampled at stop().
+        """
+        self._per_thread = per_thread
+        self._sample_memory = sample_memory
+        self._process = None
+        self._sampler = None
+        self._start = None
+        self._start_cpu = None
+        self._start_io = (None, None)
+        self.wall_time = None
+        self.cpu_time = None
+        self.bytes_read = None
+        self.bytes_written = None
+        self.peak_rss = None
+        self.patterns = None
+
+    def _cpuTime(self) -> float:
+        if self._per_thread:
+            return time.thread_time()
+        return time.process_time()
+
+    @property
+    def is_running(self) -> bool:
+        return self._start is not None and self.wall_time is None
+
+    def start(self):
+        """
+        Start measuring.
+        """
+        self._process = psutil.Process()
+        if self._sample_memory:
+            self._sampler = MemorySampler(self._process)
+            self._sampler.start()
+        self._start_io = readIOCounters(self._process)
+        self._start_cpu = self._cpuTime()
+        self._start = time.perf_counter()
+
+    def stop(self):
+        """
+        Stop measuring. Nothing happens if it is not running.
+        """
+        if not self.is_running:
+            return
+        self.wall_time = time.perf_counter() - self._start
+        self.cpu_time = self._cpuTime() - self._start_cpu
+        read, written = readIOCounters(self._process)
+        if read is not None and self._start_io[0] is not None:
+            self.bytes_read = read - self._start_io[0]
+            self.bytes_written = written - self._start_io[1]
+        if self._sampler is not None:
+            self._sampler.stop()
+            self.peak_rss = self._sampler.peak_rss
+            self._sampler = None
+        else:
+            try:
+                self.peak_rss = self._process.memory_info().rss
+            except psutil.Error:
+                pass
+
+    @property
+    def patterns_per_second(self) -> float:
+        if not self.patterns or not self.wall_time:
+            return None
+        return self.patterns / self.wall_time
+
+    @property
+    def megabytes_per_second(self) -> float:
+        if self.bytes_read is None or not self.wall_time:
+            return None
+        return (self.bytes_read + self.bytes_written) / 2**20 / self.wall_time
+
+    def toDict(self) -> dict:
+        """
+        The metrics as a dict that can be dumped to JSON.
+
+        returns:
+            (dict)
+        """
+        return {
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'peak_rss': self.peak_rss,
+            'patterns': self.patterns,
+            'patterns_per_second': self.patterns_per_second,
+            'megabytes_per_second': self.megabytes_per_second,
+        }
+
+    def summary(self) -> str:
+        """
+        A one-line summary of the metrics, e.g.
+            '12.30 s (CPU 10.02 s), read 1024.0 MB, written 512.0 MB, peak RSS
+            800.0 MB, 1332.0 patterns/s, 124.9 MB/s'
+
+        returns:
+            (str) empty if the metrics have not been measured.
+        """
+        if self.wall_time is None:
+            return ''
+        items = ['{0:.2f} s (CPU {1:.2f} s)'.format(
+            self.wall_time, self.cpu_time
+        )]
+        if self.bytes_read is not None:
+            items.append('read {0:.1f} MB'.format(self.bytes_read / 2**20))
+            items.append('written {0:.1f} MB'.format(
+                self.bytes_written / 2**20
+            ))
+        if self.peak_rss is not None:
+            items.append('peak RSS {0:.1f} MB'.format(self.peak_rss / 2**20))
+        if self.patterns_per_second is not None:
+            items.append('{0:.1f} patterns/s'.format(self.patterns_per_second))
+        if self.megabytes_per_second is not None:
+            items.append('{0:.1f} MB/s'.format(self.megabytes_per_second))
+        return ', '.join(items)
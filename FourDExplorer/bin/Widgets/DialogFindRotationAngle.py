@@ -36,8 +36,11 @@ import h5py
 from bin.BlitManager import BlitManager
 from bin.HDFManager import HDFDataNode, HDFHandler
 from bin.Widgets.DialogChooseItem import DialogHDFChoose
-from lib.VectorFieldOperators import Divergence2D
-from lib.VectorFieldOperators import Curl2D
+# from lib.VectorFieldOperators import Divergence2D
+# from lib.VectorFieldOperators import Curl2D
+from lib.VectorFieldOperators import DivergenceCurlMoments
+from lib.VectorFieldOperators import MinimumCurlAngle
+from lib.VectorFieldOperators import RotatedDivergenceCurl
 from ui import uiDialogFindRotationAngle
 
 
@@ -61,6 +64,7 @@ class DialogFindRotationAngle(QDialog):
         self.ui.setupUi(self)
         
         self._vec_path = ''
+        self._moments = (0, 0, 0)
         self._curve_angle = np.linspace(0, 359, 360)
         self._curve_curl = np.zeros_like(self._curve_angle)
         self._curve_div = np.zeros_like(self._curve_angle)
@@ -240,33 +244,46 @@ class DialogFindRotationAngle(QDialog):
         """
         Calculate the square divergence and curl of the vector field, to 
         rotation angle curve.
+
+        The square sums of the rotated field are quadratic forms of three
+        moments of the field, which are read blockwise only once. See 
+        DivergenceCurlMoments.
         """
         
-        for ii, angle_deg in enumerate(self._curve_angle):
-            vec = self.vec_object[:]
-            vec_rotated = self._rotateVec(vec, angle_deg)
-            self._curve_div[ii] = np.sum(np.square(Divergence2D(
-                vec_rotated[0,:,:], 
-                vec_rotated[1,:,:]
-            )))
-
-            self._curve_curl[ii] = np.sum(np.square(Curl2D(
-                vec_rotated[0,:,:], 
-                vec_rotated[1,:,:]
-            )))
+        # for ii, angle_deg in enumerate(self._curve_angle):
+        #     vec = self.vec_object[:]
+        #     vec_rotated = self._rotateVec(vec, angle_deg)
+        #     self._curve_div[ii] = np.sum(np.square(Divergence2D(
+        #         vec_rotated[0,:,:], 
+        #         vec_rotated[1,:,:]
+        #     )))
+
+        #     self._curve_curl[ii] = np.sum(np.square(Curl2D(
+        #         vec_rotated[0,:,:], 
+        #         vec_rotated[1,:,:]
+        #     )))
+
+        self._moments = DivergenceCurlMoments(self.vec_object)
+        self._curve_div, self._curve_curl = RotatedDivergenceCurl(
+            self._moments, self._curve_angle
+        )
 
     def _findMinCurl(self):
         """
         Find the rotation angle which produces the minimum sum of the 
         point-wise square curl distribution of the vector field.
+
+        The angle is solved from the moments exactly, instead of being 
+        searched on the curve of 1 degree step.
         """
-        _angle = 0
-        _curl = self._curve_curl[0]
-        for angle, curl_sq in zip(self._curve_angle, self._curve_curl):
-            if curl_sq < _curl:
-                _angle = angle 
-                _curl = curl_sq 
-        return _angle 
+        # _angle = 0
+        # _curl = self._curve_curl[0]
+        # for angle, curl_sq in zip(self._curve_angle, self._curve_curl):
+        #     if curl_sq < _curl:
+        #         _angle = angle 
+        #         _curl = curl_sq 
+        # return _angle 
+        return MinimumCurlAngle(self._moments)
 
     def _initUi(self):
         """
@@ -277,22 +294,22 @@ class DialogFindRotationAngle(QDialog):
         self.ui.pushButton_ok.clicked.connect(self.accept)
         self.ui.pushButton_cancel.clicked.connect(self.reject)
 
-    def _rotateVec(self, vec: np.ndarray, angle_deg: float) -> np.ndarray:
-        """
-        Calculate the rotated vector field.
-
-        arguments:
-            vec: (np.ndarray) with shape (2, i, j)
-
-            angle: (float) unit: degree.
-        """
-        vec_i = vec[0, :, :]
-        vec_j = vec[1, :, :]
-        angle = angle_deg * np.pi / 180 
-        new_vec = np.zeros_like(vec)
-        new_vec[0, : ,:] = vec_i * np.cos(angle) - vec_j * np.sin(angle)
-        new_vec[1, :, :] = vec_i * np.sin(angle) + vec_j * np.cos(angle)
-        return new_vec 
+    # def _rotateVec(self, vec: np.ndarray, angle_deg: float) -> np.ndarray:
+    #     """
+    #     Calculate the rotated vector field.
+
+    #     arguments:
+    #         vec: (np.ndarray) with shape (2, i, j)
+
+    #         angle: (float) unit: degree.
+    #     """
+    #     vec_i = vec[0, :, :]
+    #     vec_j = vec[1, :, :]
+    #     angle = angle_deg * np.pi / 180 
+    #     new_vec = np.zeros_like(vec)
+    #     new_vec[0, : ,:] = vec_i * np.cos(angle) - vec_j * np.sin(angle)
+    #     new_vec[1, :, :] = vec_i * np.sin(angle) + vec_j * np.cos(angle)
+    #     return new_vec 
 
     def _updateCurve(self):
         """
@@ -13,7 +13,7 @@ date:           Mar 10, 2022
 *------------------------- DialogHistoryTasks.py -----------------------------*
 """
 
-from PySide6.QtWidgets import QDialog, QWidget, QMenu
+from PySide6.QtWidgets import QDialog, QWidget, QMenu, QFileDialog
 from PySide6.QtCore import Qt, QPoint, QModelIndex
 
 from bin.TaskManager import TaskManager, HistoryTaskModel, Task
@@ -42,6 +42,7 @@ class DialogHistoryTasks(QDialog):
         self.refresh()
         self.ui.pushButton_refresh.clicked.connect(self.refresh)
         self.ui.pushButton_clear_all.clicked.connect(self.clearAll)
+        self.ui.pushButton_export.clicked.connect(self.exportMetrics)
         self.ui.pushButton_OK.clicked.connect(self.accept)
         self.ui.pushButton_OK.setVisible(False)
 
@@ -71,6 +72,19 @@ class DialogHistoryTasks(QDialog):
         """
         self.task_manager.clearHistory()
         
+    def exportMetrics(self):
+        """
+        Export the performance metrics of the history tasks as a JSON file.
+        """
+        path, _ = QFileDialog.getSaveFileName(
+            self, 
+            'Export Task Metrics', 
+            'task_metrics.json', 
+            'JSON files (*.json)',
+        )
+        if path:
+            self.task_manager.exportMetrics(path)
+        
     def showContextMenu(self, pos: QPoint):
         """
         Show context menu of the list view.
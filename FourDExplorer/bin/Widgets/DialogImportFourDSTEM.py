@@ -27,7 +27,7 @@ date:           May 5, 2022
 
 from logging import Logger
 
-from PySide6.QtWidgets import QDialog, QWidget
+from PySide6.QtWidgets import QDialog, QWidget, QCheckBox
 from PySide6.QtGui import QRegularExpressionValidator
 
 from bin.HDFManager import reValidHDFName, HDFHandler, HDFGroupNode
@@ -64,6 +64,12 @@ class DialogImportFourDSTEM(QDialog):
         
         self._hideOptions()     # some importer is not completed yet TODO
 
+        self.checkBox_preview = QCheckBox(
+            'Show preview image while importing', 
+            self.ui.groupBox_2,
+        )
+        self.ui.verticalLayout_2.addWidget(self.checkBox_preview)
+
     @property
     def hdf_handler(self) -> HDFHandler:
         global qApp
@@ -162,6 +168,12 @@ class DialogImportFourDSTEM(QDialog):
         """
         return self.ui.comboBox_mode.currentIndex()
 
+    def getIsPreview(self) -> bool:
+        """
+        Whether a preview image should be shown while importing.
+        """
+        return self.checkBox_preview.isChecked()
+
     def getNewName(self) -> str:
         """
         returns the new name of the imported dataset.
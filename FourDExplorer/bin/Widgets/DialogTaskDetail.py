@@ -24,12 +24,14 @@ class DialogTaskDetail(QDialog):
     """
     显示当前任务详细信息的对话框。
 
-    包含一个 QListView 显示子任务，一个 QPlainTextEdit 用来显示注释。
+    包含一个 QListView 显示子任务，一个 QPlainTextEdit 用来显示注释，以及一个
+    QPlainTextEdit 用来显示任务与子任务的性能指标。
 
     Dialog to show the detail information of current task.
 
-    It includes a QListView to show subtasks, and a QPlainTextEdit to show the
-    comments of the task.
+    It includes a QListView to show subtasks, a QPlainTextEdit to show the
+    comments of the task, and a QPlainTextEdit to show the performance metrics
+    of the task and its subtasks.
     """
     def __init__(self, parent: QWidget = None):
         super().__init__(parent)
@@ -44,6 +46,7 @@ class DialogTaskDetail(QDialog):
         self.ui.pushButton_OK.clicked.connect(self.accept)
 
         self.ui.plainTextEdit_comment.setReadOnly(True)
+        self.ui.plainTextEdit_metrics.setReadOnly(True)
 
         self.setWindowTitle('Task Details')
         
@@ -71,6 +74,19 @@ class DialogTaskDetail(QDialog):
         self.ui.plainTextEdit_comment.setPlainText(self.task.comment)
         model = SubtaskListModel(self.task)
         self.ui.listView_subtask.setModel(model)
+        self.ui.plainTextEdit_metrics.setPlainText(self._getMetricsText())
+
+    def _getMetricsText(self) -> str:
+        """
+        The performance metrics of the task and its subtasks, one per line.
+        """
+        if self.task.metrics.wall_time is None:
+            return 'Not measured yet.'
+        lines = ['Task: {0}'.format(self.task.metrics.summary())]
+        for subtask in self.task:
+            summary = subtask.metrics.summary() or 'not measured yet'
+            lines.append('{0}: {1}'.format(subtask.name, summary))
+        return '\n'.join(lines)
         
         
 
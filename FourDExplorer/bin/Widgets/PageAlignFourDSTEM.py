@@ -42,8 +42,8 @@ from matplotlib.patches import Ellipse
 from matplotlib.patches import FancyArrowPatch
 from h5py import Dataset
 import numpy as np
-from skimage.transform import warp
-from skimage.transform import SimilarityTransform
+# from skimage.transform import warp
+# from skimage.transform import SimilarityTransform
 
 from Constants import APP_VERSION
 from bin.TaskManager import TaskManager
@@ -825,6 +825,9 @@ class PageAlignFourDSTEM(PageBaseFourDSTEM):
         center_xy = ((dp_i - 1)/2, (dp_j - 1)/2)
         
         if self.current_show_shifted_dp:
+            # skimage takes long to be imported, so it is imported here
+            from skimage.transform import warp
+            from skimage.transform import SimilarityTransform
             stm = SimilarityTransform(translation = shift_vec_xy)
             dp = self.data_object[scan_ii, scan_jj, :, :]
             shifted_dp = warp(dp, stm, mode = 'wrap', preserve_range = True)
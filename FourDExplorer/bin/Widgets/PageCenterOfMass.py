@@ -50,6 +50,7 @@ from PySide6.QtGui import QRegularExpressionValidator
 from bin.HDFManager import HDFGroupNode, HDFHandler, reValidHDFName
 from bin.Widgets.PageVirtualImage import PageVirtualImage
 from bin.Widgets.DialogChooseItem import DialogHDFChoose
+from bin.Widgets.PageViewImage import PageViewImage
 from lib.TaskReconstruction import TaskCenterOfMass
 from ui import uiDialogCreateCoM
 
@@ -129,9 +130,31 @@ class PageCenterOfMass(PageVirtualImage):
             is_com_inverted = is_com_inverted,
             is_mean_set_to_zero = is_mean_set_to_zero,
         )
-
+        self.task.setPrepare(self._openPartialImages, self.task)
         self.task_manager.addTask(self.task)
 
+    def _openPartialImages(self, task: TaskCenterOfMass):
+        """
+        Open the scalar results (CoMi, CoMj, dCoM and iCoM) once they are 
+        created, and refresh them while the task accumulates the CoM.
+
+        The CoM vector field is not opened here, since its view creates a 
+        background image.
+
+        This function works as a preparing function of the task.
+
+        arguments:
+            task: (TaskCenterOfMass)
+        """
+        for com_mode, data_path in task.getResultPaths().items():
+            if com_mode == 'CoM':
+                continue
+            page = PageViewImage()
+            page.setImage(data_path)
+            task.partial_updated.connect(page.updateImage)
+            task.task_completed.connect(page.updateImage)
+            self.tabview_manager.openTab(page)
+
     def _generateCoMMeta(self) -> dict:
         """
         Generate metadata for center of mass vector field.
@@ -58,6 +58,7 @@ from ui import uiPagePlotCTF
 
 from lib.Probe import OpticalSTEM
 from lib.Probe import CTFCalculator
+from lib.RadialProfile import RadialAverage
 
 class PagePlotCTF(QWidget):
     """
@@ -294,6 +295,7 @@ class PagePlotCTF(QWidget):
 
         config_object.attrs["defocus"] = self.ui.doubleSpinBox_defocus.value() * 1e-9
         config_object.attrs["Cs"] = self.ui.doubleSpinBox_Cs.value() * 1e-3
+        self.hdf_handler.attributesChanged(self.config_path)
 
     def _setOpticalSTEM(self):
         optics = OpticalSTEM(
@@ -697,11 +699,11 @@ class PagePlotCTF(QWidget):
         beta_out = self.ui.doubleSpinBox_abf_outer_radius.value()
         ctf_calculator = CTFCalculator(optics)
         
-        radial_locate, radial_distance = ctf_calculator.generateRadialPreimage(
-            matrix_shape = optics.detector_shape, 
-            target = None, 
-            pixel_size = optics.du,
-        )
+        # radial_locate, radial_distance = ctf_calculator.generateRadialPreimage(
+        #     matrix_shape = optics.detector_shape, 
+        #     target = None, 
+        #     pixel_size = optics.du,
+        # )
         if ctf_image_modes == 0:
             # BF, ABF 
             ctf_image = ctf_calculator.calcCTFofVirtualImageFirstOrder(beta_in, beta_out)
@@ -728,7 +730,10 @@ class PagePlotCTF(QWidget):
         
         # locate, distance = ctf_calculator.generateRadialPreimage(dp_N, None, optics.du)
         
-        _, ctf_curve_y = ctf_calculator.generateRotationalAverage(ctf_image, target=None, pixel_size = optics.du, preimage_locate=radial_locate, preimage_distance=radial_distance)
+        # _, ctf_curve_y = ctf_calculator.generateRotationalAverage(ctf_image, target=None, pixel_size = optics.du, preimage_locate=radial_locate, preimage_distance=radial_distance)
+        radial_distance, ctf_curve_y = RadialAverage(
+            ctf_image, pixel_size = optics.du,
+        )
         
         self.ctf_line_object.set_xdata(radial_distance*1e-9)
         self.ctf_line_object.set_ydata(ctf_curve_y)
@@ -282,6 +282,7 @@ class PageViewFourDSTEM(PageBaseFourDSTEM):
         self._preview_path = preview_path
         self.ui.lineEdit_preview_path.setText(self.preview_path)
         self.data_object.attrs['preview_path'] = preview_path
+        self.hdf_handler.attributesChanged(self.data_path)
 
         self._createPreviewImage()
         self._createPreviewCursor()
@@ -495,6 +496,7 @@ class PageViewFourDSTEM(PageBaseFourDSTEM):
             preview_path = data_node.parent.path + '/' + preview_name
 
         self.data_object.attrs['preview_path'] = preview_path
+        self.hdf_handler.attributesChanged(self.data_path)
         scan_i, scan_j, dp_i, dp_j = self.data_object.shape
 
         _index = self.hdf_handler.model.indexFromPath(self.data_path)
@@ -220,6 +220,25 @@ class PageViewImage(QWidget):
         self.ui.widget_image.action_scale_bar.dialog_scale_bar.readScaleBarMeta()
         self.ui.widget_image.action_scale_bar.dialog_scale_bar.updateScaleBar()
 
+    def updateImage(self):
+        """
+        Read the data again and refresh the shown image, keeping the axes
+        limits and colormap.
+
+        Used when the dataset is being written by a task, e.g. the live
+        acquisition, so the image can be updated while it grows.
+        """
+        if self._image_object is None or not self.data_path:
+            return
+        data = self.data_object[()]
+        self._image_max = np.max(data)
+        self._image_min = np.min(data)
+        self._image_object.set_data(data)
+        self._image_object.set_clim(self._image_min, self._image_max)
+        self.ui.widget_hist_view.drawHist(data)
+        self.colorbar_object.update_normal(self.image_object)
+        self.image_blit_manager.update()
+
     def _createAxes(self):
         """
         Create the axes that contains the image and the colorbar respectively.
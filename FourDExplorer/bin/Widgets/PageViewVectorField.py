@@ -301,6 +301,7 @@ class PageViewVectorField(QWidget):
         else:
             self.data_object.attrs['quiver_color'] = 'black'
             quiver_color = 'black'
+        self.hdf_handler.attributesChanged(self.data_path)
 
         X, Y = coord_j, coord_i 
         U, V = vec_j, vec_i 
@@ -381,6 +382,7 @@ class PageViewVectorField(QWidget):
         self._background_path = background_path
         self.ui.lineEdit_background_path.setText(self.background_path)
         self.data_object.attrs['background_path'] = background_path
+        self.hdf_handler.attributesChanged(self.data_path)
 
         self._createBackgroundImage()
         self._createColorbar()
@@ -477,6 +479,7 @@ class PageViewVectorField(QWidget):
         self.data_object.attrs['quiver_scale'] = dialog.getScale()
         self.data_object.attrs['quiver_width'] = dialog.getWidth()
         self.data_object.attrs['quiver_color'] = dialog.getColor()
+        self.hdf_handler.attributesChanged(self.data_path)
         
         self.setVectorField(self.data_path)
 
@@ -579,6 +582,7 @@ class PageViewVectorField(QWidget):
             bkgrd_path = data_node.parent.path + '/' + bkgrd_name
 
         self.data_object.attrs['background_path'] = bkgrd_path
+        self.hdf_handler.attributesChanged(self.data_path)
 
         return bkgrd_path
         
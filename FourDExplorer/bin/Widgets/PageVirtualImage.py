@@ -79,6 +79,8 @@ from bin.DateTimeManager import DateTimeManager
 from bin.Widgets.DialogChooseItem import DialogHDFChoose
 from bin.Widgets.PageBaseFourDSTEM import PageBaseFourDSTEM
 from bin.Widgets.DialogSaveItem import DialogSaveImage
+from bin.Widgets.PageViewImage import PageViewImage
+from lib.MaskRasterizer import rasterizeMask, rasterizeSegments
 from lib.TaskReconstruction import TaskVirtualImage
 from ui import uiPageVirtualImage
 from ui import uiDialogTestPlot
@@ -108,6 +110,7 @@ class PageVirtualImage(PageBaseFourDSTEM):
         
         self._max_segment_num = 10      # The maximum number of segmented ring.
         self._mask_widgets = []         # Must be the same order as the mode.
+        self.mask_supersample = 1       # Sub-pixels of the mask edges.
 
         self._patch_circle = None
         self._patch_ring = None
@@ -138,6 +141,11 @@ class PageVirtualImage(PageBaseFourDSTEM):
         global qApp
         return qApp.task_manager
 
+    @property
+    def tabview_manager(self):
+        global qApp
+        return qApp.tabview_manager
+
     def _initUi(self):
         """
         Initialize Uis.
@@ -404,18 +412,32 @@ class PageVirtualImage(PageBaseFourDSTEM):
         ion patterns' size of the 4D-STEM dataset. Elements within the region 
         will be 1, while otherwise will be 0.
 
+        If mask_supersample is larger than 1, the elements on the edges are 
+        the fractions of the pixels covered by the region.
+
         returns:
             (np.ndarray) 
         """
         scan_i, scan_j, dp_i, dp_j = self.data_object.shape
-        index = np.arange(dp_i * dp_j)
-        x = np.floor_divide(index, dp_j).reshape((dp_i*dp_j, 1))
-        y = np.mod(index, dp_j).reshape((dp_i * dp_j, 1))
-        coords = np.concatenate((y, x), axis = 1)
+        # index = np.arange(dp_i * dp_j)
+        # x = np.floor_divide(index, dp_j).reshape((dp_i*dp_j, 1))
+        # y = np.mod(index, dp_j).reshape((dp_i * dp_j, 1))
+        # coords = np.concatenate((y, x), axis = 1)
+        # widget = self._mask_widgets[self.mask_index]
+        # _is_contained = widget.isContained(coords)
+        # mask = _is_contained.reshape((dp_i, dp_j))
+        # return mask
         widget = self._mask_widgets[self.mask_index]
-        _is_contained = widget.isContained(coords)
-        mask = _is_contained.reshape((dp_i, dp_j))
-        return mask
+        geometry = widget.getMaskGeometry()
+        if geometry is None:
+            # the widget has no geometry, so test the pixels by its patch
+            index = np.arange(dp_i * dp_j)
+            x = np.floor_divide(index, dp_j).reshape((dp_i*dp_j, 1))
+            y = np.mod(index, dp_j).reshape((dp_i * dp_j, 1))
+            coords = np.concatenate((y, x), axis = 1)
+            return widget.isContained(coords).reshape((dp_i, dp_j))
+        mask = rasterizeMask(geometry, (dp_i, dp_j), self.mask_supersample)
+        return mask.copy()
         # mask = np.zeros((dp_i, dp_j), dtype = self.data_object.dtype)
         # widget = self._mask_widgets[self.mask_index]
         # for ii in range(dp_i):
@@ -423,6 +445,26 @@ class PageVirtualImage(PageBaseFourDSTEM):
         #         mask[ii, jj] = widget.isContained((ii, jj))
         # return mask
 
+    def calcSegmentMasks(self) -> np.ndarray:
+        """
+        Calculate the integration regions of all segments of the mask, e.g.
+        the segmented ring, at once.
+
+        returns:
+            (np.ndarray) in the shape (segments, dp_i, dp_j)
+        """
+        scan_i, scan_j, dp_i, dp_j = self.data_object.shape
+        widget = self._mask_widgets[self.mask_index]
+        geometry = widget.getMaskGeometry()
+        if geometry is None:
+            return self.calcMask()[None, :, :]
+        masks = rasterizeSegments(
+            geometry, 
+            (dp_i, dp_j), 
+            self.mask_supersample,
+        )
+        return masks.copy()
+
     def startCalculation(self):
         """
         Start to calculate virtual image of 4D-STEM.
@@ -447,8 +489,25 @@ class PageVirtualImage(PageBaseFourDSTEM):
             mask,
             **meta,
         )
+        self.task.setPrepare(self._openPartialImage, self.task)
         self.task_manager.addTask(self.task)
 
+    def _openPartialImage(self, task: TaskVirtualImage):
+        """
+        Open the virtual image once it is created, and refresh it while the
+        task fills it incrementally.
+
+        This function works as a preparing function of the task.
+
+        arguments:
+            task: (TaskVirtualImage)
+        """
+        page = PageViewImage()
+        page.setImage(task.image_path)
+        task.partial_updated.connect(page.updateImage)
+        task.task_completed.connect(page.updateImage)
+        self.tabview_manager.openTab(page)
+
     def _generateImageMeta(self) -> dict:
         """
         Generate the meta data saved in the reconstructed image.
@@ -36,7 +36,7 @@ from PySide6.QtWidgets import QDialogButtonBox
 from matplotlib.axes import Axes
 from matplotlib.image import AxesImage
 from matplotlib.patches import Ellipse
-import onnxruntime as ort
+# import onnxruntime as ort
 from h5py import Dataset
 
 from Constants import APP_VERSION
@@ -47,7 +47,7 @@ import numpy as np
 from matplotlib.image import AxesImage
 from matplotlib.axes import Axes 
 from h5py import Dataset
-from scipy.optimize import curve_fit
+# from scipy.optimize import curve_fit
 
 from Constants import APP_VERSION
 from bin.BlitManager import BlitManager
@@ -58,6 +58,8 @@ from bin.DateTimeManager import DateTimeManager
 from bin.Widgets.DialogSaveItem import DialogSaveVectorField
 # from bin.Widgets.DialogCreateItem import DialogHDFCreate
 from bin.Widgets.DialogChooseItem import DialogHDFChoose
+from lib.DiffractionAlignment import generateShiftMapWithLinearModel
+from lib.DiffractionAlignment import generateShiftMapWithQuadraticModel
 from ui import uiWidgetAlignmentManual
 
 
@@ -366,6 +368,7 @@ class WidgetAlignmentManual(QWidget):
             )
             for key, value in shift_map_meta.items():
                 shift_map_dataset.attrs[key] = value
+            self.hdf_handler.attributesChanged(full_path)
             
             self.logger.info(f"Shift map created at {full_path}")
             
@@ -445,26 +448,31 @@ class WidgetAlignmentManual(QWidget):
         anchor_locations, anchor_shifts = self._getAnchorLists()
         scan_i, scan_j, dp_i, dp_j = self.data_object.shape
 
-        # Generate the shift map
-        shift_map = np.zeros((2, scan_i, scan_j))
-        
-        def linear_model(x, a, b, c):
-            return a * x[0] + b * x[1] + c
+        # # Generate the shift map
+        # shift_map = np.zeros((2, scan_i, scan_j))
 
-        def fit_linear_model(locations, shifts):
-            popt, _ = curve_fit(linear_model, locations.T, shifts)
-            return popt
+        # def linear_model(x, a, b, c):
+        #     return a * x[0] + b * x[1] + c
 
-        i_params = fit_linear_model(anchor_locations, anchor_shifts[:, 0])
-        j_params = fit_linear_model(anchor_locations, anchor_shifts[:, 1])
+        # def fit_linear_model(locations, shifts):
+        #     popt, _ = curve_fit(linear_model, locations.T, shifts)
+        #     return popt
 
-        # Generate the shift map using the fitted models
-        i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
-        locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
-        shift_map[0] = linear_model(locations.T, *i_params).reshape(scan_i, scan_j)
-        shift_map[1] = linear_model(locations.T, *j_params).reshape(scan_i, scan_j)
+        # i_params = fit_linear_model(anchor_locations, anchor_shifts[:, 0])
+        # j_params = fit_linear_model(anchor_locations, anchor_shifts[:, 1])
 
-        return shift_map
+        # # Generate the shift map using the fitted models
+        # i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
+        # locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
+        # shift_map[0] = linear_model(locations.T, *i_params).reshape(scan_i, scan_j)
+        # shift_map[1] = linear_model(locations.T, *j_params).reshape(scan_i, scan_j)
+
+        # return shift_map
+
+        # both components are fitted in one solve, see lib.PolynomialFit
+        return generateShiftMapWithLinearModel(
+            anchor_locations, anchor_shifts, scan_i, scan_j
+        )
 
 
     def _useQuadraticPolynomial(self):
@@ -475,26 +483,31 @@ class WidgetAlignmentManual(QWidget):
         anchor_locations, anchor_shifts = self._getAnchorLists()
         scan_i, scan_j, dp_i, dp_j = self.data_object.shape
 
-        # Generate the shift map
-        shift_map = np.zeros((2, scan_i, scan_j))
-        
-        def quadratic_model(x, a, b, c, d, e, f):
-            return a * x[0]**2 + b * x[1]**2 + c * x[0] * x[1] + d * x[0] + e * x[1] + f
+        # # Generate the shift map
+        # shift_map = np.zeros((2, scan_i, scan_j))
 
-        def fit_quadratic_model(locations, shifts):
-            popt, _ = curve_fit(quadratic_model, locations.T, shifts)
-            return popt
+        # def quadratic_model(x, a, b, c, d, e, f):
+        #     return a * x[0]**2 + b * x[1]**2 + c * x[0] * x[1] + d * x[0] + e * x[1] + f
 
-        i_params = fit_quadratic_model(anchor_locations, anchor_shifts[:, 0])
-        j_params = fit_quadratic_model(anchor_locations, anchor_shifts[:, 1])
+        # def fit_quadratic_model(locations, shifts):
+        #     popt, _ = curve_fit(quadratic_model, locations.T, shifts)
+        #     return popt
 
-        # Generate the shift map using the fitted models
-        i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
-        locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
-        shift_map[0] = quadratic_model(locations.T, *i_params).reshape(scan_i, scan_j)
-        shift_map[1] = quadratic_model(locations.T, *j_params).reshape(scan_i, scan_j)
+        # i_params = fit_quadratic_model(anchor_locations, anchor_shifts[:, 0])
+        # j_params = fit_quadratic_model(anchor_locations, anchor_shifts[:, 1])
 
-        return shift_map
+        # # Generate the shift map using the fitted models
+        # i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
+        # locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
+        # shift_map[0] = quadratic_model(locations.T, *i_params).reshape(scan_i, scan_j)
+        # shift_map[1] = quadratic_model(locations.T, *j_params).reshape(scan_i, scan_j)
+
+        # return shift_map
+
+        # both components are fitted in one solve, see lib.PolynomialFit
+        return generateShiftMapWithQuadraticModel(
+            anchor_locations, anchor_shifts, scan_i, scan_j
+        )
         
             
     def _saveShiftAnchorsInAttrs(self, vec_object: Dataset):
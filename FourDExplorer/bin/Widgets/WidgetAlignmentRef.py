@@ -24,6 +24,7 @@ date:           Sep 2, 2024
 """
 
 from logging import Logger
+import os
 
 from PySide6.QtWidgets import QWidget
 from PySide6.QtWidgets import QMessageBox
@@ -41,8 +42,10 @@ from bin.HDFManager import HDFDataNode
 from bin.DateTimeManager import DateTimeManager
 from bin.Widgets.DialogChooseItem import DialogHDFChoose
 from bin.Widgets.DialogSaveItem import DialogSaveVectorField
-from lib.VectorFieldOperators import CenterOfMass
-from lib.TaskReconstruction import TaskCenterOfMass
+# from lib.VectorFieldOperators import CenterOfMass
+from lib.DiffractionAlignment import PatternCenterOfMass
+# from lib.TaskReconstruction import TaskCenterOfMass
+from lib.TaskReconstruction import TaskMeasureDiskShift
 
 from ui import uiWidgetAlignmentRef
 
@@ -68,7 +71,10 @@ class WidgetAlignmentRef(QWidget):
     def current_ref_com(self) -> tuple[float, float]:
         if not self.reference_path: 
             return (0, 0)
-        return CenterOfMass(self.reference_dataset[self.scan_ii, self.scan_jj, :, :])
+        # return CenterOfMass(self.reference_dataset[self.scan_ii, self.scan_jj, :, :])
+        return PatternCenterOfMass(
+            self.reference_dataset[self.scan_ii, self.scan_jj, :, :]
+        )
     
     @property
     def reference_path(self) -> str:
@@ -237,24 +243,33 @@ class WidgetAlignmentRef(QWidget):
         parent_path = dialog_save.getParentPath()
         com_name = dialog_save.getNewName()
 
-        # Initialize the TaskCenterOfMass with only CoM calculation
-        calc_dict = {'CoM': True}
-        names = {'CoM': com_name}
-        metas = {'CoM': self._generateCoMMeta()}
-
-        is_com_inverted = False
-        is_mean_set_to_zero = False 
-        mask = None
-
-        self.task = TaskCenterOfMass(
-            item_path=self._reference_path,
-            image_parent_path=parent_path,
-            calc_dict=calc_dict,
-            names_dict=names,
-            metas_dict=metas,
-            mask=mask,
-            is_com_inverted=is_com_inverted,
-            is_mean_set_to_zero=is_mean_set_to_zero,
+        # # Initialize the TaskCenterOfMass with only CoM calculation
+        # calc_dict = {'CoM': True}
+        # names = {'CoM': com_name}
+        # metas = {'CoM': self._generateCoMMeta()}
+
+        # is_com_inverted = False
+        # is_mean_set_to_zero = False 
+        # mask = None
+
+        # self.task = TaskCenterOfMass(
+        #     item_path=self._reference_path,
+        #     image_parent_path=parent_path,
+        #     calc_dict=calc_dict,
+        #     names_dict=names,
+        #     metas_dict=metas,
+        #     mask=mask,
+        #     is_com_inverted=is_com_inverted,
+        #     is_mean_set_to_zero=is_mean_set_to_zero,
+        # )
+
+        # The batched measurement gives the same Center of Mass vector field
+        self.task = TaskMeasureDiskShift(
+            item_path = self._reference_path,
+            image_parent_path = parent_path,
+            image_name = com_name,
+            workers = min(os.cpu_count() or 1, 4),
+            **self._generateCoMMeta(),
         )
 
         self.task_manager.addTask(self.task)
@@ -4,6 +4,9 @@
 *---------------------------- WidgetEMServer.py ------------------------------*
 管理与电镜服务器及相机进行通信的页面。
 
+目前支持从 Merlin (Medipix3) 的 TCP 数据端口实时接收 4D-STEM 数据。接收的同时，数据
+会逐行写入 HDF5 文件，并实时显示虚拟明场像与虚拟环形暗场像。
+
 提升部件：
     - 提升类名 WidgetEMServer
     - 头文件 bin.Widgets.WidgetEMServer
@@ -13,6 +16,11 @@
 
 The GUI Widget to manage connections to TEM Server and camera.
 
+Now it supports receiving 4D-STEM dataset from the TCP data port of Merlin
+(Medipix3) in real time. While receiving, the data are written row by row into
+the HDF5 file, and the virtual bright field image and virtual annular dark
+field image are shown live.
+
 Promoted Widget:
     - name of widget class: WidgetEMServer
     - header file: bin.Widgets.WidgetEMServer
@@ -22,10 +30,258 @@ date:           Jun 13, 2022
 *---------------------------- WidgetEMServer.py ------------------------------*
 """
 
+from logging import Logger
+
 from PySide6.QtWidgets import QWidget
+from PySide6.QtWidgets import QFormLayout
+from PySide6.QtWidgets import QHBoxLayout
+from PySide6.QtWidgets import QVBoxLayout
+from PySide6.QtWidgets import QLabel
+from PySide6.QtWidgets import QLineEdit
+from PySide6.QtWidgets import QSpinBox
+from PySide6.QtWidgets import QDoubleSpinBox
+from PySide6.QtWidgets import QComboBox
+from PySide6.QtWidgets import QPushButton
+from PySide6.QtWidgets import QMessageBox
+
+from bin.HDFManager import HDFHandler
+from bin.TaskManager import TaskManager
+from bin.Widgets.DialogChooseItem import DialogHDFChoose
+from bin.Widgets.PageViewImage import PageViewImage
+from lib.TaskLiveAcquisition import TaskLiveAcquisition
+
 
 class WidgetEMServer(QWidget):
-    # TODO
+    """
+    管理与电镜服务器及相机进行通信的部件。
+
+    Widget to manage connections to TEM server and camera.
+
+    The Start button submits a TaskLiveAcquisition to the task manager. When
+    the task reports completed rows, the live image pages are refreshed.
+    """
     def __init__(self, parent: QWidget = None):
         super().__init__(parent)
+        self._task = None
+        self._live_pages = []
+        self._initUi()
+
+    @property
+    def logger(self) -> Logger:
+        global qApp
+        return qApp.logger
+
+    @property
+    def hdf_handler(self) -> HDFHandler:
+        global qApp
+        return qApp.hdf_handler
+
+    @property
+    def task_manager(self) -> TaskManager:
+        global qApp
+        return qApp.task_manager
+
+    @property
+    def tabview_manager(self):
+        global qApp
+        return qApp.tabview_manager
+
+    def _initUi(self):
+        """
+        Initialize UI.
+        """
+        self.lineEdit_host = QLineEdit('127.0.0.1', self)
+        self.spinBox_port = QSpinBox(self)
+        self.spinBox_port.setRange(1, 65535)
+        self.spinBox_port.setValue(6342)
+
+        self.spinBox_scan_i = self._createSizeSpinBox(256)
+        self.spinBox_scan_j = self._createSizeSpinBox(256)
+        self.spinBox_dp_i = self._createSizeSpinBox(256)
+        self.spinBox_dp_j = self._createSizeSpinBox(256)
+
+        self.comboBox_dtype = QComboBox(self)
+        self.comboBox_dtype.addItems(['uint8', 'uint16', 'uint32'])
+        self.comboBox_dtype.setCurrentIndex(1)
+
+        self.doubleSpinBox_bf_radius = self._createRadiusSpinBox(16)
+        self.doubleSpinBox_adf_inner = self._createRadiusSpinBox(32)
+        self.doubleSpinBox_adf_outer = self._createRadiusSpinBox(128)
+
+        self.lineEdit_parent_path = QLineEdit('/', self)
+        self.lineEdit_parent_path.setReadOnly(True)
+        self.pushButton_browse = QPushButton('Browse', self)
+        self.pushButton_browse.clicked.connect(self.browseParent)
+        layout_parent = QHBoxLayout()
+        layout_parent.addWidget(self.lineEdit_parent_path)
+        layout_parent.addWidget(self.pushButton_browse)
+
+        self.lineEdit_name = QLineEdit('live.4dstem', self)
+
+        self.pushButton_start = QPushButton('Start', self)
+        self.pushButton_stop = QPushButton('Stop', self)
+        self.pushButton_stop.setEnabled(False)
+        self.pushButton_start.clicked.connect(self.startAcquisition)
+        self.pushButton_stop.clicked.connect(self.stopAcquisition)
+        layout_buttons = QHBoxLayout()
+        layout_buttons.addWidget(self.pushButton_start)
+        layout_buttons.addWidget(self.pushButton_stop)
+
+        self.label_status = QLabel('Idle', self)
+
+        layout_form = QFormLayout()
+        layout_form.addRow('Merlin Host', self.lineEdit_host)
+        layout_form.addRow('Data Port', self.spinBox_port)
+        layout_form.addRow('Scan i', self.spinBox_scan_i)
+        layout_form.addRow('Scan j', self.spinBox_scan_j)
+        layout_form.addRow('Pattern i', self.spinBox_dp_i)
+        layout_form.addRow('Pattern j', self.spinBox_dp_j)
+        layout_form.addRow('Pixel Depth', self.comboBox_dtype)
+        layout_form.addRow('vBF Radius', self.doubleSpinBox_bf_radius)
+        layout_form.addRow('vADF Inner Radius', self.doubleSpinBox_adf_inner)
+        layout_form.addRow('vADF Outer Radius', self.doubleSpinBox_adf_outer)
+        layout_form.addRow('Parent Group', layout_parent)
+        layout_form.addRow('Dataset Name', self.lineEdit_name)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(layout_form)
+        layout.addLayout(layout_buttons)
+        layout.addWidget(self.label_status)
+        layout.addStretch()
+
+    def _createSizeSpinBox(self, value: int) -> QSpinBox:
+        spin_box = QSpinBox(self)
+        spin_box.setRange(1, 2**16)
+        spin_box.setValue(value)
+        return spin_box
+
+    def _createRadiusSpinBox(self, value: float) -> QDoubleSpinBox:
+        spin_box = QDoubleSpinBox(self)
+        spin_box.setRange(0, 2**16)
+        spin_box.setDecimals(1)
+        spin_box.setValue(value)
+        return spin_box
+
+    def browseParent(self) -> bool:
+        """
+        Open a dialog to browse a group to be parent.
+
+        returns:
+            (bool) whether a new path is set.
+        """
+        dialog_browse = DialogHDFChoose(self, only_group = True)
+        dialog_code = dialog_browse.exec()
+        if dialog_code == dialog_browse.Accepted:
+            current_path = dialog_browse.getCurrentPath()
+            if current_path:
+                self.lineEdit_parent_path.setText(current_path)
+            return True
+        else:
+            return False
+
+    def getItemName(self) -> str:
+        """
+        Get the name of the new dataset, with extension '.4dstem'.
+        """
+        name = self.lineEdit_name.text()
+        if not name.endswith('.4dstem'):
+            name = name + '.4dstem'
+        return name
+
+    def startAcquisition(self):
+        """
+        Submit a live acquisition task to the task manager.
+        """
+        if self.hdf_handler.file is None:
+            QMessageBox.warning(self, 'No HDF5 File',
+                'Please open or create an HDF5 file first.')
+            return
+        if self._task is not None:
+            return
+
+        try:
+            self._task = TaskLiveAcquisition(
+                host = self.lineEdit_host.text(),
+                port = self.spinBox_port.value(),
+                shape = (
+                    self.spinBox_scan_i.value(),
+                    self.spinBox_scan_j.value(),
+                    self.spinBox_dp_i.value(),
+                    self.spinBox_dp_j.value(),
+                ),
+                dtype = self.comboBox_dtype.currentText(),
+                item_parent_path = self.lineEdit_parent_path.text(),
+                item_name = self.getItemName(),
+                bright_field_radius = self.doubleSpinBox_bf_radius.value(),
+                adf_inner_radius = self.doubleSpinBox_adf_inner.value(),
+                adf_outer_radius = self.doubleSpinBox_adf_outer.value(),
+            )
+        except Exception as e:
+            self.logger.error('Cannot create live acquisition: '
+                '{0}'.format(e), exc_info = True)
+            self._task = None
+            return
+
+        self._task.live_updated.connect(self._updateLivePages)
+        self._task.task_completed.connect(self._finishAcquisition)
+        self._task.setPrepare(self._openLivePages)
+        self.task_manager.addTask(self._task)
+
+        self.pushButton_start.setEnabled(False)
+        self.pushButton_stop.setEnabled(True)
+        self.label_status.setText('Waiting for frames...')
+
+    def stopAcquisition(self):
+        """
+        Stop the current live acquisition. The received rows are kept.
+        """
+        if self._task is not None:
+            self._task.stopAcquisition()
+            self.label_status.setText('Stopping...')
+
+    def _openLivePages(self):
+        """
+        Open pages of the live images once they are created.
+
+        This function works as a preparing function of the task, called after
+        the datasets are created.
+        """
+        live_paths = self._task.live_paths
+        self._live_pages = []
+        for key in ('vBF', 'vADF'):
+            page = PageViewImage()
+            try:
+                page.setImage(live_paths[key])
+            except Exception as e:
+                self.logger.error('Cannot open live image {0}: '
+                    '{1}'.format(live_paths[key], e), exc_info = True)
+                continue
+            self.tabview_manager.openTab(page)
+            self._live_pages.append(page)
+
+    def _updateLivePages(self, rows_done: int):
+        """
+        Refresh the live image pages.
+
+        arguments:
+            rows_done: (int) the number of completed scan rows.
+        """
+        self.label_status.setText('Received {0} / {1} rows'.format(
+            rows_done, self.spinBox_scan_i.value()))
+        for page in self._live_pages:
+            try:
+                page.updateImage()
+            except Exception as e:
+                self.logger.error('Cannot refresh live image: '
+                    '{0}'.format(e), exc_info = True)
 
+    def _finishAcquisition(self):
+        """
+        Reset the buttons after the task finishes.
+        """
+        if self._task is not None:
+            self.label_status.setText('Finished, {0} rows written.'.format(
+                self._task.rows_done))
+        self._task = None
+        self.pushButton_start.setEnabled(True)
+        self.pushButton_stop.setEnabled(False)
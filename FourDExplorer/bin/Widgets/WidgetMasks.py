@@ -53,6 +53,16 @@ import numpy as np
 
 from bin.BlitManager import BlitManager
 from bin.Widgets.DialogAdjustPatchEffects import DialogAdjustPatchEffects
+from lib.MaskRasterizer import (
+    MaskGeometry,
+    CircleMask,
+    RingMask,
+    WedgeMask,
+    RectangleMask,
+    EllipseMask,
+    RegularPolygonMask,
+    SegmentMask,
+)
 from ui import uiWidgetMaskCircle
 from ui import uiWidgetMaskRing
 from ui import uiWidgetMaskWedge
@@ -155,6 +165,23 @@ class WidgetMaskBase(QWidget):
         return tmp_patch.contains_points(loc)
         
         
+    def getMaskGeometry(self) -> MaskGeometry:
+        """
+        Returns the geometry of the mask, which can be rasterized by 
+        lib.MaskRasterizer. Reimplement it in the subclasses.
+
+        returns:
+            (MaskGeometry) or None, if it is not reimplemented.
+        """
+        self.logger.warning('getMaskGeometry() should be reimplemented')
+        return None
+
+    def _getMaskCenter(self) -> Tuple[float, float]:
+        """
+        Returns the (i, j) center of the mask, with its shift.
+        """
+        return (self.center[0] + self.shift_i, self.center[1] + self.shift_j)
+
     def setCenter(self, loc: Tuple):
         """
         Set the center of the original patch locates.
@@ -322,6 +349,15 @@ class WidgetMaskCircle(WidgetMaskBase):
         """
         return self._updateLocation()
 
+    def getMaskGeometry(self) -> MaskGeometry:
+        """
+        Returns the geometry of the mask, see lib.MaskRasterizer.
+
+        returns:
+            (MaskGeometry)
+        """
+        return CircleMask(self._getMaskCenter(), self.radius)
+
     def generateMeta(self) -> dict:
         """
         Generate the patch's metadata as a dict.
@@ -510,6 +546,19 @@ class WidgetMaskRing(WidgetMaskBase):
         # return (r_sq > self.inner_radius**2) and (
         #             r_sq < self.outer_radius**2)
         
+    def getMaskGeometry(self) -> MaskGeometry:
+        """
+        Returns the geometry of the mask, see lib.MaskRasterizer.
+
+        returns:
+            (MaskGeometry)
+        """
+        return RingMask(
+            self._getMaskCenter(),
+            min(self.inner_radius, self.outer_radius),
+            self.outer_radius,
+        )
+
     def generateMeta(self) -> dict:
         """
         Generate the patch's metadata as a dict.
@@ -715,6 +764,22 @@ class WidgetMaskWedge(WidgetMaskBase):
         dialog.initialize(self.patch, self.blit_manager)
         dialog.exec()
         
+    def getMaskGeometry(self) -> MaskGeometry:
+        """
+        Returns the geometry of the mask, see lib.MaskRasterizer.
+
+        returns:
+            (MaskGeometry)
+        """
+        _open_angle = min(360, max(0, self.open_angle))
+        return WedgeMask(
+            self._getMaskCenter(),
+            min(self.inner_radius, self.outer_radius),
+            self.outer_radius,
+            self.rotation_angle,
+            self.rotation_angle + _open_angle,
+        )
+
     def generateMeta(self) -> dict:
         """
         Generate the patch's metadata as a dict.
@@ -916,6 +981,20 @@ class WidgetMaskRectangle(WidgetMaskBase):
         dialog.initialize(self.patch, self.blit_manager)
         dialog.exec()
 
+    def getMaskGeometry(self) -> MaskGeometry:
+        """
+        Returns the geometry of the mask, see lib.MaskRasterizer.
+
+        returns:
+            (MaskGeometry)
+        """
+        return RectangleMask(
+            self._getMaskCenter(),
+            self.width,
+            self.height,
+            self.rotation_angle,
+        )
+
     def generateMeta(self) -> dict:
         """
         Generate the patch's metadata as a dict.
@@ -1089,6 +1168,20 @@ class WidgetMaskEllipse(WidgetMaskBase):
         """
         return self._updateLocation()
 
+    def getMaskGeometry(self) -> MaskGeometry:
+        """
+        Returns the geometry of the mask, see lib.MaskRasterizer.
+
+        returns:
+            (MaskGeometry)
+        """
+        return EllipseMask(
+            self._getMaskCenter(),
+            self.width,
+            self.height,
+            self.rotation_angle,
+        )
+
     def generateMeta(self) -> dict:
         """
         Generate the patch's metadata as a dict.
@@ -1312,6 +1405,20 @@ class WidgetMaskPolygon(WidgetMaskBase):
                                         # speeds by about 10 times.
         return tmp_patch.contains_points(loc)
 
+    def getMaskGeometry(self) -> MaskGeometry:
+        """
+        Returns the geometry of the mask, see lib.MaskRasterizer.
+
+        returns:
+            (MaskGeometry)
+        """
+        return RegularPolygonMask(
+            self._getMaskCenter(),
+            self.radius,
+            self.num_vertices,
+            self.rotation_angle,
+        )
+
     def generateMeta(self) -> dict:
         """
         Generate the patch's metadata as a dict.
@@ -1590,6 +1697,22 @@ class WidgetMaskSegment(WidgetMaskBase):
         return _is_contained
 
         
+    def getMaskGeometry(self) -> MaskGeometry:
+        """
+        Returns the geometry of the mask, see lib.MaskRasterizer.
+
+        returns:
+            (MaskGeometry)
+        """
+        return SegmentMask(
+            self._getMaskCenter(),
+            min(self.inner_radius, self.outer_radius),
+            self.outer_radius,
+            self.num_segments,
+            self.open_angle,
+            self.rotation_angle,
+        )
+
     def generateMeta(self) -> dict:
         """
         Generate the patch's metadata as a dict.
@@ -63,6 +63,9 @@ class App(QApplication):
 
         log_util: (LogUtil) read only property. Use log_util to manage loggers.
 
+        memory_budget: (MemoryBudget) read only property. Use memory_budget to
+            decide how large a block of data can be processed at a time.
+
         main_window: (MainWindow) read only property. Get the instance of the 
             MainWindow object.
 
@@ -93,9 +96,11 @@ class App(QApplication):
         from bin.Log import LogUtil
         from bin.UnitManager import UnitManager
         from bin.DateTimeManager import DateTimeManager
+        from bin.MemoryBudget import MemoryBudget
 
         # from bin.MetaManager import MetaManager
         self._config_manager = ConfigManager(self)
+        self._memory_budget = MemoryBudget.fromConfig()
         self._hdf_handler = HDFHandler(self)
         self._theme_handler = ThemeHandler(self)
         self._task_manager = TaskManager(self)
@@ -110,6 +115,10 @@ class App(QApplication):
     def hdf_handler(self):
         return self._hdf_handler
 
+    @property
+    def memory_budget(self):
+        return self._memory_budget
+
     @property
     def theme_handler(self):
         return self._theme_handler
@@ -159,6 +168,7 @@ class App(QApplication):
         """
         self.hdf_handler.closeFile()
         self.task_manager.shutDown()
+        self.log_util.shutDown()
 
     def requireMetaManager(self, item_path: str):
         """
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+
+"""
+*------------------------------- CTFSweep.py ---------------------------------*
+批量计算一系列成像条件下的衬度传递函数 (CTF)。
+
+选择成像条件时，往往需要比较一系列离焦量、球差系数、收集角下的 CTF。CTFCalculator
+每次只计算一组参数；而 CTFSweep 把各组参数排列为第一个维度，在整个参数堆栈上计算像差
+函数，并沿最后两个维度做批量 FFT，一次得到一块参数的 CTF。结果 (CTF 图像以及其旋转
+平均) 可以写入 np.ndarray 或者 HDF5 数据集。dp_N 很大时，可以用线程池并行计算各块。
+
+公式与 CTFCalculator 中相同，见
+    E.G.T. Bosch, I. Lazić. Ultramicroscopy 156 (2015) 59-72
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Calculate the contrast transfer functions (CTF) of a series of imaging
+conditions in batches.
+
+Choosing imaging conditions means comparing the CTFs of a series of defocus,
+Cs and collection angles. CTFCalculator calculates one configuration per call,
+while CTFSweep stacks the configurations along a leading axis, evaluates the
+aberration function over the stack, and calculates the CTFs of a block of
+configurations with batched FFTs over the last two axes. The results (CTF
+images and their rotational averages) can be written into np.ndarray or HDF5
+datasets. For large dp_N, the blocks can be calculated in a thread pool.
+
+The formulas are the same as those in CTFCalculator, see
+    E.G.T. Bosch, I. Lazić. Ultramicroscopy 156 (2015) 59-72
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*------------------------------- CTFSweep.py ---------------------------------*
+"""
+
+from collections import deque
+from concurrent import futures
+from typing import Iterator
+
+from PySide6.QtCore import Signal
+import h5py
+import numpy as np
+from scipy.special import j0 as bessel_j0
+
+from bin.MemoryBudget import getMemoryBudget
+from lib.Probe import AberrationDict, OpticalSTEM
+from lib.RadialProfile import getRadialBins
+
+
+CTF_MODES = (
+    'VirtualImageFirstOrder',
+    'VirtualImageSecondOrder',
+    'ICoM',
+    'DCoM',
+    'AxialBF',
+)
+
+# names of the swept parameters besides the keys of AberrationDict
+_PARAMETER_ALIASES = {
+    'defocus': 'C1',
+    'Cs': 'C3',
+}
+_DETECTOR_PARAMETERS = ('beta_min', 'beta_max')
+# aberrations without angles, whose real values are used as they are
+_ROUND_ABERRATIONS = ('C1', 'C3', 'C5')
+
+
+class CTFSweep:
+    """
+    一系列成像条件下的 CTF。
+
+    Sweep of the CTF over a series of imaging conditions.
+
+    The swept parameters are given as a dict of sequences of the same length
+    P. The keys can be the keys of AberrationDict ('C1', 'A1', ..., 'A5'),
+    'defocus' (C1), 'Cs' (C3), 'beta_min' and 'beta_max'. Real values of
+    C1, C3 and C5 and complex values are used as they are, while real values
+    of the other aberrations are the modules, keeping the angles in the
+    optical_stem. Other parameters are taken from the optical_stem.
+
+    Usage:
+        sweep = CTFSweep(
+            optical_stem,
+            'VirtualImageFirstOrder',
+            {'defocus': np.linspace(-50e-9, 50e-9, 21)},
+            beta_min = 10e-3,
+            beta_max = 20e-3,
+        )
+        ctf_images, distance, profiles = sweep.calculate(workers = 4)
+    """
+    def __init__(
+        self,
+        optical_stem: OpticalSTEM,
+        mode: str,
+        parameters: dict,
+        beta_min: float = 0,
+        beta_max: float = None,
+        rho: float = 1e-10,
+    ):
+        """
+        arguments:
+            optical_stem: (OpticalSTEM) the fixed optical parameters.
+
+            mode: (str) one of CTF_MODES.
+
+            parameters: (dict) the swept parameters, {name: sequence}.
+
+            beta_min: (float) the inner collection angle of the virtual
+                detector, unless it is swept. unit: rad
+
+            beta_max: (float) the outer collection angle of the virtual
+                detector, unless it is swept. If None, alpha is used.
+                unit: rad
+
+            rho: (float) the parameter of the sample in the second order CTF,
+                see CTFCalculator.calcCTFofVirtualImageSecondOrder.
+        """
+        if not isinstance(optical_stem, OpticalSTEM):
+            raise TypeError('optical_stem must be an OpticalSTEM object')
+        if mode not in CTF_MODES:
+            raise ValueError('mode must be one of {0}, not {1}'.format(
+                CTF_MODES, mode
+            ))
+        if not parameters:
+            raise ValueError('parameters must not be empty')
+        self._optical_stem = optical_stem
+        self._mode = mode
+        self._rho = rho
+
+        lengths = {len(values) for values in parameters.values()}
+        if len(lengths) != 1:
+            raise ValueError('all of the swept parameters must have the same '
+                'length, not {0}'.format(lengths))
+        self._length = lengths.pop()
+
+        aberration_dict = optical_stem._aberration_dict
+        aberration_keys = list(aberration_dict)
+        self._coefficients = np.tile(
+            np.array([aberration_dict[key] for key in aberration_keys],
+                dtype = 'complex128'),
+            (self._length, 1),
+        )
+        if beta_max is None:
+            beta_max = optical_stem.alpha
+        self._beta_min = np.full(self._length, beta_min, dtype = 'float64')
+        self._beta_max = np.full(self._length, beta_max, dtype = 'float64')
+
+        for name, values in parameters.items():
+            if name in _DETECTOR_PARAMETERS:
+                getattr(self, '_' + name)[:] = values
+                continue
+            key = _PARAMETER_ALIASES.get(name, name)
+            if key not in aberration_keys:
+                raise KeyError('{0} is not a parameter that can be swept'
+                    .format(name))
+            values = np.asarray(values)
+            if not np.iscomplexobj(values) and key not in _ROUND_ABERRATIONS:
+                values = values * np.exp(
+                    1j * aberration_dict.getComplexAngle(key)
+                )
+            self._coefficients[:, aberration_keys.index(key)] = values
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @property
+    def optical_stem(self) -> OpticalSTEM:
+        return self._optical_stem
+
+    @property
+    def image_shape(self) -> tuple:
+        """
+        The shape of the CTF images, (P, dp_N, dp_N).
+        """
+        dp_N = self._optical_stem.dp_N
+        return (self._length, dp_N, dp_N)
+
+    @property
+    def profile_shape(self) -> tuple:
+        """
+        The shape of the rotational averages, (P, nbins).
+        """
+        dp_N = self._optical_stem.dp_N
+        return (self._length, getRadialBins((dp_N, dp_N)).nbins)
+
+    def getRadialDistance(self) -> np.ndarray:
+        """
+        The spatial frequencies of the rotational averages, unit: m^-1
+        """
+        dp_N = self._optical_stem.dp_N
+        return getRadialBins((dp_N, dp_N)).distance * self._optical_stem.du
+
+    def _calcProbes(self, start: int, stop: int) -> np.ndarray:
+        """
+        The normalized probes of the configurations [start, stop).
+
+        returns:
+            (np.ndarray) in the shape (stop - start, dp_N, dp_N)
+        """
+        optics = self._optical_stem
+        chi = AberrationDict.evaluateAberrationFunction(
+            self._coefficients[start:stop],
+            optics.generateAberrationBasis(),
+            optics.wave_length,
+        )
+        beams = optics.generateConvergentAperture() * np.exp(-1j * chi)
+        probes = OpticalSTEM.fft2(beams, optics.du)
+        norm = np.sqrt(np.sum(
+            np.abs(probes)**2, axis = (-2, -1), keepdims = True
+        ) * optics.dx**2)
+        return probes / norm
+
+    def _calcDetectors(self, start: int, stop: int) -> np.ndarray:
+        """
+        The virtual annular detectors of the configurations [start, stop).
+
+        returns:
+            (np.ndarray) in the shape (stop - start, dp_N, dp_N)
+        """
+        optics = self._optical_stem
+        ui, uj = optics.generateDiffractionMeshgrid()
+        radius = np.sqrt(ui**2 + uj**2)
+        beta_min = self._beta_min[start:stop, None, None] / optics.wave_length
+        beta_max = self._beta_max[start:stop, None, None] / optics.wave_length
+        return ((radius <= beta_max) & (radius >= beta_min)).astype('float64')
+
+    def calcCTF(self, start: int, stop: int) -> np.ndarray:
+        """
+        Calculate the CTF images of the configurations [start, stop).
+
+        arguments:
+            start: (int)
+
+            stop: (int)
+
+        returns:
+            (np.ndarray) in the shape (stop - start, dp_N, dp_N)
+        """
+        stop = min(stop, self._length)
+        optics = self._optical_stem
+        dx, du = optics.dx, optics.du
+        fft2, ifft2 = OpticalSTEM.fft2, OpticalSTEM.ifft2
+        probes = self._calcProbes(start, stop)
+
+        if self._mode in ('VirtualImageFirstOrder', 'VirtualImageSecondOrder'):
+            masks = self._calcDetectors(start, stop)
+            B_tmp = probes * fft2(masks * ifft2(np.conj(probes), dx), du)
+        if self._mode == 'VirtualImageFirstOrder':
+            return np.real(-2 * np.conj(fft2(np.imag(B_tmp), dx)))
+        if self._mode == 'AxialBF':
+            norm = np.sum(np.conj(probes), axis = (-2, -1), keepdims = True)
+            ctfab = -2 * np.conj(fft2(np.imag(probes * norm * dx**2), dx))
+            return np.real(ctfab) * np.pi * (
+                optics.alpha / optics.wave_length
+            )**2
+
+        intensity_spectrum = np.conj(fft2(np.abs(probes)**2, dx))
+        if self._mode == 'ICoM':
+            return np.real((1/(2*np.pi)) * intensity_spectrum)
+        if self._mode == 'DCoM':
+            ui, uj = optics.generateDiffractionMeshgrid()
+            return np.real(2 * np.pi * (ui**2 + uj**2) * intensity_spectrum)
+
+        # VirtualImageSecondOrder
+        ctfc = -2 * np.conj(fft2(np.real(B_tmp), dx))
+        k = 2 * np.pi / optics.wave_length * self._rho
+        G_D = (bessel_j0(k * self._beta_min[start:stop])
+            - bessel_j0(k * self._beta_max[start:stop]))
+        ctfkk = 2 * G_D[:, None, None] * intensity_spectrum
+        return np.real(ctfc + ctfkk)
+
+    def iterBlocks(self, workers: int = 1) -> Iterator[tuple]:
+        """
+        Calculate the CTF images block by block. The block size is decided by
+        the memory budget.
+
+        arguments:
+            workers: (int) the number of threads. The FFTs of numpy release
+                the GIL, so threads help when dp_N is large.
+
+        yields:
+            (tuple) (start, block), where block is in the shape
+                (n, dp_N, dp_N). The blocks are yielded in order.
+        """
+        dp_N = self._optical_stem.dp_N
+        workers = max(int(workers), 1)
+        # complex probes, the FFT temporaries and the detectors
+        unit_bytes = dp_N * dp_N * 16 * 4
+        with getMemoryBudget().request(
+            unit_bytes, self._length, copies = workers,
+        ) as allocation:
+            starts = range(0, self._length, allocation.units)
+            if workers == 1:
+                for start in starts:
+                    yield start, self.calcCTF(start, start + allocation.units)
+                return
+            # at most workers blocks are pending, as the budget allows
+            with futures.ThreadPoolExecutor(workers) as executor:
+                pending = deque()
+                for start in starts:
+                    pending.append((start, executor.submit(
+                        self.calcCTF, start, start + allocation.units,
+                    )))
+                    if len(pending) >= workers:
+                        start, future = pending.popleft()
+                        yield start, future.result()
+                while pending:
+                    start, future = pending.popleft()
+                    yield start, future.result()
+
+    def calculate(self, workers: int = 1) -> tuple[np.ndarray]:
+        """
+        Calculate the CTF images and their rotational averages in memory.
+
+        arguments:
+            workers: (int) the number of threads.
+
+        returns:
+            (tuple) (ctf_images, distance, profiles), in the shape
+                (P, dp_N, dp_N), (nbins,) and (P, nbins). The unit of
+                distance is m^-1.
+        """
+        ctf_images = np.empty(self.image_shape)
+        profiles = np.empty(self.profile_shape)
+        CalculateCTFSweep(self, ctf_images, profiles, workers = workers)
+        return ctf_images, self.getRadialDistance(), profiles
+
+
+def CalculateCTFSweep(
+    sweep: CTFSweep,
+    result: np.ndarray|h5py.Dataset = None,
+    profile_result: np.ndarray|h5py.Dataset = None,
+    progress_signal: Signal = None,
+    workers: int = 1,
+):
+    """
+    Calculate a CTF sweep and write the results block by block.
+
+    arguments:
+        sweep: (CTFSweep)
+
+        result: (np.ndarray or h5py.Dataset) the CTF images, in the shape
+            sweep.image_shape. If None, the images are not kept.
+
+        profile_result: (np.ndarray or h5py.Dataset) the rotational averages,
+            in the shape sweep.profile_shape. If None, the averages are not
+            calculated.
+
+        progress_signal: (Signal) emits the progress in percentage.
+
+        workers: (int) the number of threads.
+    """
+    if result is not None and tuple(result.shape) != sweep.image_shape:
+        raise ValueError('the shape of result must be {0}, not {1}'.format(
+            sweep.image_shape, result.shape
+        ))
+    if profile_result is not None and (
+        tuple(profile_result.shape) != sweep.profile_shape
+    ):
+        raise ValueError('the shape of profile_result must be {0}, not {1}'
+            .format(sweep.profile_shape, profile_result.shape))
+
+    dp_N = sweep.optical_stem.dp_N
+    bins = getRadialBins((dp_N, dp_N))
+    for start, block in sweep.iterBlocks(workers):
+        stop = start + block.shape[0]
+        if result is not None:
+            result[start:stop] = block
+        if profile_result is not None:
+            profile_result[start:stop] = bins.average(block)
+        if progress_signal is not None:
+            progress_signal.emit(int(stop / len(sweep) * 100))
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+"""
+*------------------------------ ComputeCache.py ------------------------------*
+按参数缓存计算得到的只读数组。
+
+OpticalSTEM 的中间结果 (meshgrid、光阑、像差函数与 probe) 以及虚拟探测器的 mask 都
+只由少数几个参数决定，而且在交互时会被反复计算。这里的缓存以这些参数组成的 tuple 为键，
+所有线程共享。缓存的数组是只读的；超出 max_bytes 时，最久未使用的结果被丢弃。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Cache of computed read-only arrays, keyed by their parameters.
+
+The intermediate arrays of OpticalSTEM (meshgrids, apertures, aberration
+functions and probes) and the masks of virtual detectors are decided by a few
+parameters, and are calculated again and again while interacting. The cache
+here is keyed by tuples of those parameters, and is shared by all threads.
+The cached arrays are read-only. When max_bytes is exceeded, the least
+recently used results are dropped.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*------------------------------ ComputeCache.py ------------------------------*
+"""
+
+from collections import OrderedDict
+import threading
+from typing import Callable
+
+
+class ComputeCache:
+    """
+    按参数缓存计算结果的 LRU 缓存。
+
+    每个结果的键只应包含它所依赖的参数。例如，只改变离焦量时，meshgrid 与光阑的键不变，
+    可以直接复用。
+
+    LRU cache of computed results, keyed by exactly the parameters that each
+    of them depends on.
+
+    attributes:
+        max_bytes: (int) the maximum bytes of the cached arrays.
+
+        hits: (int) the number of results found in the cache.
+
+        misses: (int) the number of results calculated.
+    """
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        """
+        arguments:
+            max_bytes: (int) the maximum bytes of the cached arrays.
+        """
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _sizeOf(value) -> int:
+        if isinstance(value, tuple):
+            return sum(item.nbytes for item in value)
+        return value.nbytes
+
+    @staticmethod
+    def _setReadOnly(value):
+        for array in (value if isinstance(value, tuple) else (value,)):
+            array.flags.writeable = False
+
+    def get(self, key: tuple, func: Callable):
+        """
+        获取键对应的结果。如果没有缓存，则调用 func() 计算并缓存。
+
+        arguments:
+            key: (tuple) 结果的名字以及它所依赖的参数。
+
+            func: (Callable) 计算结果的函数，返回 np.ndarray 或者它们的 tuple。
+
+        returns:
+            (np.ndarray or tuple) 只读的结果。
+        """
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+        value = func()
+        self._setReadOnly(value)
+        nbytes = self._sizeOf(value)
+        with self._lock:
+            self.misses += 1
+            if key not in self._items:
+                self._items[key] = value
+                self._nbytes += nbytes
+            while self._nbytes > self.max_bytes and len(self._items) > 1:
+                _, dropped = self._items.popitem(last = False)
+                self._nbytes -= self._sizeOf(dropped)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._nbytes = 0
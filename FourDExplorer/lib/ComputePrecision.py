@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+*--------------------------- ComputePrecision.py -----------------------------*
+计算精度策略 (见 Constants.Precision)：决定各个计算核使用的 dtype。
+
+映射 (虚拟成像、质心等) 的计算类型由精度、数据集的 dtype 以及滤波器是否都是整数决定；
+修改 4D-STEM 数据集的函数则按结果数据集的 dtype 计算，写入整数数据集时先四舍五入并
+截断到该类型的范围内，而不是直接截尾或溢出。
+
+不需要双精度时使用 float32 或原生类型，可以把内存读写与中间结果的大小减半。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+The precision policy of computing (see Constants.Precision): decide the dtype
+that every compute kernel uses.
+
+For mappings (virtual images, center of mass, etc.), the dtype depends on the
+precision, the dtype of the dataset and whether all filters are integers. The
+functions modifying 4D-STEM datasets compute in the dtype of the result
+dataset. When the result is an integer dataset, values are rounded and clipped
+to its range, instead of being truncated or overflowing.
+
+When double precision is not needed, float32 or the native dtype halves the
+memory traffic and the size of intermediate results.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*--------------------------- ComputePrecision.py -----------------------------*
+"""
+
+from typing import Iterable
+
+import h5py
+import numpy as np
+
+from Constants import Precision
+
+
+def isIntegral(array: np.ndarray|h5py.Dataset) -> bool:
+    """
+    Whether all of the values in the array are integers.
+
+    arguments:
+        array: (np.ndarray or h5py.Dataset)
+
+    returns:
+        (bool)
+    """
+    array = np.asarray(array)
+    if array.dtype.kind in 'biu':
+        return True
+    if array.dtype.kind != 'f':
+        return False
+    return bool(np.all(np.isfinite(array)) and np.all(array == np.rint(array)))
+
+
+def getMappingDType(
+    precision: Precision,
+    data_dtype: np.dtype,
+    filters: Iterable[np.ndarray|h5py.Dataset] = None,
+) -> np.dtype:
+    """
+    Get the dtype to map a dataset by filters, which is also the dtype of the
+    mapped images.
+
+    For Precision.Native, integer datasets with integer filters are summed in
+    int64. Otherwise float32 is used for float32 datasets and integer datasets
+    of at most 16 bits (whose values are exact in float32), and float64 for
+    the others.
+
+    arguments:
+        precision: (Precision)
+
+        data_dtype: (np.dtype) the dtype of the 4D-STEM dataset.
+
+        filters: (Iterable[np.ndarray, h5py.Dataset]) the filters of mapping.
+
+    returns:
+        (np.dtype)
+    """
+    precision = Precision(precision)
+    if precision == Precision.Float64:
+        return np.dtype('float64')
+    if precision == Precision.Float32:
+        return np.dtype('float32')
+    data_dtype = np.dtype(data_dtype)
+    if data_dtype.kind in 'biu':
+        if filters is not None and all(isIntegral(f) for f in filters):
+            return np.dtype('int64')
+        if data_dtype.itemsize <= 2:
+            return np.dtype('float32')
+        return np.dtype('float64')
+    if data_dtype.kind == 'f' and data_dtype.itemsize <= 4:
+        return np.dtype('float32')
+    return np.dtype('float64')
+
+
+def getRatioDType(dtype: np.dtype) -> np.dtype:
+    """
+    Get the floating dtype to divide the mapped images, e.g. the center of
+    mass from the first moments and the integral.
+
+    arguments:
+        dtype: (np.dtype) the dtype of the mapped images.
+
+    returns:
+        (np.dtype) float32 if the images are float32, otherwise float64.
+    """
+    if np.dtype(dtype) == np.dtype('float32'):
+        return np.dtype('float32')
+    return np.dtype('float64')
+
+
+def getResultDType(precision: Precision, data_dtype: np.dtype) -> np.dtype:
+    """
+    Get the dtype of a modified 4D-STEM dataset.
+
+    arguments:
+        precision: (Precision)
+
+        data_dtype: (np.dtype) the dtype of the source 4D-STEM dataset.
+
+    returns:
+        (np.dtype) float64, float32, or data_dtype for Precision.Native.
+    """
+    precision = Precision(precision)
+    if precision == Precision.Float64:
+        return np.dtype('float64')
+    if precision == Precision.Float32:
+        return np.dtype('float32')
+    return np.dtype(data_dtype)
+
+
+def getTransformDType(result_dtype: np.dtype) -> np.dtype:
+    """
+    Get the dtype to compute a transform (rotation, filtering, etc.) whose
+    result is written into a dataset of result_dtype.
+
+    arguments:
+        result_dtype: (np.dtype)
+
+    returns:
+        (np.dtype) result_dtype itself if it is float32 or float64. float32
+            for integers of at most 16 bits, otherwise float64.
+    """
+    result_dtype = np.dtype(result_dtype)
+    if result_dtype.kind == 'f':
+        return np.dtype('float64') if result_dtype.itemsize > 4 else \
+            np.dtype('float32')
+    if result_dtype.kind in 'biu' and result_dtype.itemsize <= 2:
+        return np.dtype('float32')
+    return np.dtype('float64')
+
+
+def castResult(data: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """
+    Cast the computed data into the dtype of the result.
+
+    Values written into integer types are rounded, and clipped to the range
+    of the type.
+
+    arguments:
+        data: (np.ndarray)
+
+        dtype: (np.dtype) the dtype of the result.
+
+    returns:
+        (np.ndarray)
+    """
+    dtype = np.dtype(dtype)
+    data = np.asarray(data)
+    if dtype.kind in 'iu' and data.dtype.kind not in 'biu':
+        info = np.iinfo(dtype)
+        data = np.clip(np.rint(data), info.min, info.max)
+    elif dtype.kind in 'iu' and data.dtype != dtype:
+        info = np.iinfo(dtype)
+        data = np.clip(data, info.min, info.max)
+    return data.astype(dtype, copy = False)
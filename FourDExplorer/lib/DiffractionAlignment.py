@@ -18,8 +18,19 @@ date:           Sep 18, 2024
 *------------------------- DiffractionAlignment.py ---------------------------*
 """
 
+from collections import deque
+from concurrent import futures
+from functools import lru_cache
+
+from PySide6.QtCore import Signal
+import h5py
 import numpy as np
-from scipy.optimize import curve_fit
+# from scipy.optimize import curve_fit
+
+from bin.MemoryBudget import getMemoryBudget
+from lib.FourDSTEMMapping import CreateCenterOfMassFilters
+from lib.PolynomialFit import evaluatePolynomial
+from lib.PolynomialFit import fitPolynomial
 
 def linearModel(locations: np.ndarray, a, b, c) -> np.ndarray:
     """
@@ -47,14 +58,17 @@ def fitLinearModel(locations: np.ndarray, shifts: np.ndarray) -> tuple:
     returns:
         (tuple) The optimized parameters for the linear model.
     """
-    popt, _ = curve_fit(linearModel, locations.T, shifts)
-    return popt
+    # popt, _ = curve_fit(linearModel, locations.T, shifts)
+    # return popt
+    return fitPolynomial(locations, shifts, 'Linear')
 
 def generateShiftMapWithLinearModel(
     anchor_locations: np.ndarray, 
     anchor_shifts: np.ndarray, 
     scan_i: int, 
-    scan_j: int
+    scan_j: int,
+    robust: str = None,
+    **kw,
 ):
     """
     Generate the shift map using the fitted linear models.
@@ -68,21 +82,29 @@ def generateShiftMapWithLinearModel(
         
         scan_j: (int) The number of scan positions in the j direction.
 
+        robust: (str) None, 'Huber' or 'RANSAC', see PolynomialFit.
+
+        **kw: other arguments of PolynomialFit.fitPolynomial
+
     returns:
         (np.ndarray) The shift map with shape (2, scan_i, scan_j).
     """
-    shift_map = np.zeros((2, scan_i, scan_j))
+    # shift_map = np.zeros((2, scan_i, scan_j))
 
-    i_params = fitLinearModel(anchor_locations, anchor_shifts[:, 0])
-    j_params = fitLinearModel(anchor_locations, anchor_shifts[:, 1])
+    # i_params = fitLinearModel(anchor_locations, anchor_shifts[:, 0])
+    # j_params = fitLinearModel(anchor_locations, anchor_shifts[:, 1])
 
-    # Generate the shift map using the fitted models
-    i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
-    locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
-    shift_map[0] = linearModel(locations.T, *i_params).reshape(scan_i, scan_j)
-    shift_map[1] = linearModel(locations.T, *j_params).reshape(scan_i, scan_j)
+    # # Generate the shift map using the fitted models
+    # i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
+    # locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
+    # shift_map[0] = linearModel(locations.T, *i_params).reshape(scan_i, scan_j)
+    # shift_map[1] = linearModel(locations.T, *j_params).reshape(scan_i, scan_j)
 
-    return shift_map
+    # both components are fitted in one solve
+    params = fitPolynomial(
+        anchor_locations, anchor_shifts, 'Linear', robust, **kw
+    )
+    return evaluatePolynomial(params, scan_i, scan_j, 'Linear')
 
 
 def quadraticModel(locations: np.ndarray, a, b, c, d, e, f) -> np.ndarray:
@@ -112,8 +134,9 @@ def fitQuadraticModel(locations: np.ndarray, shifts: np.ndarray) -> tuple:
     returns:
         tuple: The optimized parameters for the quadratic model.
     """
-    popt, _ = curve_fit(quadraticModel, locations.T, shifts)
-    return popt
+    # popt, _ = curve_fit(quadraticModel, locations.T, shifts)
+    # return popt
+    return fitPolynomial(locations, shifts, 'Quadratic')
 
 
 def generateShiftMapWithQuadraticModel(
@@ -121,6 +144,8 @@ def generateShiftMapWithQuadraticModel(
     anchor_shifts: np.ndarray, 
     scan_i: int, 
     scan_j: int,
+    robust: str = None,
+    **kw,
 ):
     """
     Generate the shift map using the fitted quadratic models.
@@ -134,18 +159,259 @@ def generateShiftMapWithQuadraticModel(
         
         scan_j: (int) The number of scan positions in the j direction.
 
+        robust: (str) None, 'Huber' or 'RANSAC', see PolynomialFit.
+
+        **kw: other arguments of PolynomialFit.fitPolynomial
+
     returns:
         (np.ndarray) The shift map with shape (2, scan_i, scan_j).
     """
-    shift_map = np.zeros((2, scan_i, scan_j))
+    # shift_map = np.zeros((2, scan_i, scan_j))
+
+    # i_params = fitQuadraticModel(anchor_locations, anchor_shifts[:, 0])
+    # j_params = fitQuadraticModel(anchor_locations, anchor_shifts[:, 1])
+
+    # # Generate the shift map using the fitted models
+    # i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
+    # locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
+    # shift_map[0] = quadraticModel(locations.T, *i_params).reshape(scan_i, scan_j)
+    # shift_map[1] = quadraticModel(locations.T, *j_params).reshape(scan_i, scan_j)
+
+    # both components are fitted in one solve
+    params = fitPolynomial(
+        anchor_locations, anchor_shifts, 'Quadratic', robust, **kw
+    )
+    return evaluatePolynomial(params, scan_i, scan_j, 'Quadratic')
+
+
+def _createCenterOfMassWeights(
+    dp_i: int, 
+    dp_j: int, 
+    mask: np.ndarray = None,
+) -> np.ndarray:
+    filters = CreateCenterOfMassFilters(dp_i, dp_j, mask)
+    return np.stack([f.ravel() for f in filters], axis = 1)
+
+
+@lru_cache(maxsize = 8)
+def _getCachedCenterOfMassWeights(dp_i: int, dp_j: int) -> np.ndarray:
+    weights = _createCenterOfMassWeights(dp_i, dp_j)
+    weights.flags.writeable = False
+    return weights
+
+
+def getCenterOfMassWeights(
+    dp_i: int, 
+    dp_j: int, 
+    mask: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Get the coordinate weights to calculate the Center of Mass of flattened
+    diffraction patterns by one matrix product, i.e.
+        (Σ i·m, Σ j·m, Σ m) = patterns.reshape(n, -1) @ weights
+    The origin is the center of the diffraction patterns, the same as 
+    CreateCenterOfMassFilters. The weights without a mask are cached.
 
-    i_params = fitQuadraticModel(anchor_locations, anchor_shifts[:, 0])
-    j_params = fitQuadraticModel(anchor_locations, anchor_shifts[:, 1])
+    arguments:
+        dp_i: (int)
+
+        dp_j: (int)
+
+        mask: (np.ndarray) the region that contributes. If None, all of the
+            pattern contributes.
 
-    # Generate the shift map using the fitted models
-    i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
-    locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
-    shift_map[0] = quadraticModel(locations.T, *i_params).reshape(scan_i, scan_j)
-    shift_map[1] = quadraticModel(locations.T, *j_params).reshape(scan_i, scan_j)
+    returns:
+        (np.ndarray) in the shape (dp_i * dp_j, 3)
+    """
+    if mask is None:
+        return _getCachedCenterOfMassWeights(dp_i, dp_j)
+    return _createCenterOfMassWeights(dp_i, dp_j, mask)
 
-    return shift_map
\ No newline at end of file
+
+def _measureCenterOfMass(
+    patterns: np.ndarray, 
+    weights: np.ndarray, 
+    threshold: float = 0,
+) -> np.ndarray:
+    """
+    Calculate the Center of Mass of a stack of patterns.
+
+    arguments:
+        patterns: (np.ndarray) in the shape (..., dp_i, dp_j)
+
+        weights: (np.ndarray) from getCenterOfMassWeights
+
+        threshold: (float) the values below threshold times the maximum of 
+            each pattern are ignored.
+
+    returns:
+        (np.ndarray) in the shape (..., 3), i.e. (CoM_i, CoM_j, mass). The 
+            Center of Mass of a pattern without mass is (0, 0).
+    """
+    shape = patterns.shape[:-2]
+    flattened = np.asarray(patterns, dtype = 'float64').reshape(
+        -1, weights.shape[0]
+    )
+    if threshold > 0:
+        peak = flattened.max(axis = 1, keepdims = True)
+        flattened = np.where(flattened >= threshold * peak, flattened, 0)
+    sums = flattened @ weights
+    mass = sums[:, 2:3]
+    com = np.divide(
+        sums[:, :2], mass, out = np.zeros_like(sums[:, :2]), where = mass != 0
+    )
+    return np.concatenate([com, mass], axis = 1).reshape(shape + (3,))
+
+
+def PatternCenterOfMass(
+    pattern: np.ndarray, 
+    mask: np.ndarray = None, 
+    threshold: float = 0,
+) -> tuple[float]:
+    """
+    Returns the Center of Mass of a diffraction pattern relative to its 
+    center, using the cached coordinate weights.
+
+    arguments:
+        pattern: (np.ndarray) in the shape (dp_i, dp_j)
+
+        mask: (np.ndarray) the region that contributes.
+
+        threshold: (float) the values below threshold times the maximum are
+            ignored.
+
+    returns:
+        (tuple) (CoM_i, CoM_j). Like CenterOfMass, a pattern without mass 
+            returns its center ((dp_i - 1)/2, (dp_j - 1)/2).
+    """
+    dp_i, dp_j = pattern.shape
+    weights = getCenterOfMassWeights(dp_i, dp_j, mask)
+    com_i, com_j, mass = _measureCenterOfMass(pattern, weights, threshold)
+    if mass == 0:
+        return ((dp_i - 1)/2, (dp_j - 1)/2)
+    return (float(com_i), float(com_j))
+
+
+def MeasureDiskShifts(
+    data_object: np.ndarray|h5py.Dataset,
+    mask: np.ndarray = None,
+    threshold: float = 0,
+    progress_signal: Signal = None,
+    workers: int = 1,
+) -> tuple[np.ndarray]:
+    """
+    Measure the shifts of the diffraction disks of every scanning point by 
+    the masked and thresholded Center of Mass.
+
+    The dataset is read in slabs of scanning rows, whose size is decided by 
+    the memory budget. The Center of Mass of a slab is one matrix product 
+    against the precomputed coordinate weights. The slabs are read in order 
+    while the products are calculated in a thread pool.
+
+    arguments:
+        data_object: (np.ndarray or h5py.Dataset) the 4D-STEM dataset, e.g. 
+            the reference dataset without sample.
+
+        mask: (np.ndarray) the region of the patterns that contributes, e.g.
+            a circle around the bright field disk.
+
+        threshold: (float) the values below threshold times the maximum of 
+            each pattern are ignored, in [0, 1).
+
+        progress_signal: (Signal) emits the progress in percentage.
+
+        workers: (int) the number of threads.
+
+    returns:
+        (tuple) the shifts relative to the center of the patterns, in the 
+            shape (2, scan_i, scan_j), and the mass in the shape 
+            (scan_i, scan_j). The shifts of the points without mass are 0.
+    """
+    scan_i, scan_j, dp_i, dp_j = data_object.shape
+    if not 0 <= threshold < 1:
+        raise ValueError('threshold must be in [0, 1), not {0}'.format(
+            threshold
+        ))
+    weights = getCenterOfMassWeights(dp_i, dp_j, mask)
+    shifts = np.zeros((2, scan_i, scan_j))
+    mass = np.zeros((scan_i, scan_j))
+    workers = max(int(workers), 1)
+
+    def _store(start: int, result: np.ndarray):
+        stop = start + result.shape[0]
+        shifts[0, start:stop] = result[..., 0]
+        shifts[1, start:stop] = result[..., 1]
+        mass[start:stop] = result[..., 2]
+        if progress_signal is not None:
+            progress_signal.emit(int(stop / scan_i * 100))
+
+    # the slab read and its float64 copy
+    row_bytes = scan_j * dp_i * dp_j * 8
+    with getMemoryBudget().request(
+        row_bytes, scan_i, copies = 2 * workers,
+    ) as allocation:
+        starts = range(0, scan_i, allocation.units)
+        if workers == 1:
+            for start in starts:
+                block = data_object[start:start + allocation.units]
+                _store(start, _measureCenterOfMass(block, weights, threshold))
+            return shifts, mass
+        # at most workers slabs are pending, as the budget allows
+        with futures.ThreadPoolExecutor(workers) as executor:
+            pending = deque()
+            for start in starts:
+                block = data_object[start:start + allocation.units]
+                pending.append((start, executor.submit(
+                    _measureCenterOfMass, block, weights, threshold,
+                )))
+                if len(pending) >= workers:
+                    start, future = pending.popleft()
+                    _store(start, future.result())
+            while pending:
+                start, future = pending.popleft()
+                _store(start, future.result())
+    return shifts, mass
+
+
+def FitShiftMap(
+    shifts: np.ndarray,
+    model: str = None,
+    valid: np.ndarray = None,
+    robust: str = None,
+) -> np.ndarray:
+    """
+    Fit the measured shifts of all scanning points with a model.
+
+    arguments:
+        shifts: (np.ndarray) in the shape (2, scan_i, scan_j)
+
+        model: (str) None, 'Linear' or 'Quadratic'. If None, the shifts are 
+            returned as they are.
+
+        valid: (np.ndarray) bool in the shape (scan_i, scan_j), the points 
+            used in the fitting, e.g. those with mass. If None, all points 
+            are used.
+
+        robust: (str) None, 'Huber' or 'RANSAC', to discard the outliers 
+            in the fitting, see PolynomialFit.
+
+    returns:
+        (np.ndarray) the shift map in the shape (2, scan_i, scan_j)
+    """
+    if model is None:
+        return shifts
+    _, scan_i, scan_j = shifts.shape
+    if valid is None:
+        valid = np.ones((scan_i, scan_j), dtype = bool)
+    anchor_locations = np.argwhere(valid)
+    anchor_shifts = shifts[:, valid].T
+    if model == 'Linear':
+        return generateShiftMapWithLinearModel(
+            anchor_locations, anchor_shifts, scan_i, scan_j, robust
+        )
+    elif model == 'Quadratic':
+        return generateShiftMapWithQuadraticModel(
+            anchor_locations, anchor_shifts, scan_i, scan_j, robust
+        )
+    raise ValueError('model must be None, \'Linear\' or \'Quadratic\', '
+        'not {0}'.format(model))
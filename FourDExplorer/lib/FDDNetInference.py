@@ -17,13 +17,29 @@ date:           Sep 21, 2024
 *--------------------------- FDDNetInference.py ------------------------------*
 """
 
+from __future__ import annotations
+
 import importlib.resources
 from threading import Lock 
+from typing import TYPE_CHECKING
 
 from PySide6.QtCore import Signal 
-import onnxruntime as ort 
+# import onnxruntime as ort 
 import numpy as np
-from skimage.transform import resize 
+# from skimage.transform import resize 
+
+if TYPE_CHECKING:
+    import onnxruntime as ort
+
+# onnxruntime and skimage are imported when the models are used, since they
+# take long to be imported and are not needed at the startup.
+
+def resize(image: np.ndarray, output_shape: tuple, **kwargs) -> np.ndarray:
+    """
+    Resize the image by skimage.transform.resize, imported at the first use.
+    """
+    from skimage.transform import resize as _resize
+    return _resize(image, output_shape, **kwargs)
 
 
 def loadFDDNetModel() -> ort.InferenceSession:
@@ -35,6 +51,7 @@ def loadFDDNetModel() -> ort.InferenceSession:
     returns:
         (ort.InferenceSession) The ONNX runtime session for the FDDNet model.
     """
+    import onnxruntime as ort
     with importlib.resources.path('models', 'FDDNet.onnx') as model_path:
         session_fddnet_options = ort.SessionOptions()
         session_fddnet_options.log_severity_level = 4 
@@ -51,6 +68,7 @@ def loadFDDNetAngleModel() -> ort.InferenceSession:
     returns:
         (ort.InferenceSession) The ONNX runtime session for the FDDNetAngle model.
     """
+    import onnxruntime as ort
     with importlib.resources.path('models', 'FDDNetAngle.onnx') as model_path:
         session_fddnet_options = ort.SessionOptions()
         session_fddnet_options.log_severity_level = 4 
@@ -14,13 +14,230 @@ date:           Apr 29, 2022
 *-------------------------- FourDSTEMMapping.py ------------------------------*
 """
 
-from typing import Iterable
+from typing import Callable, Iterable
 from threading import Lock
+import time
 
 from PySide6.QtCore import Signal
 import h5py
 import numpy as np
 
+from Constants import Precision
+from bin.MemoryBudget import getMemoryBudget
+from lib.ComputePrecision import getMappingDType
+from lib.ComputePrecision import getRatioDType
+
+
+# _MAP_BLOCK_BYTES = 64 * 2**20     # bytes of float64 patterns read at a time
+
+
+class IncrementalMapper(object):
+    """
+    逐块累加的 4D-STEM 映射器。
+
+    Accumulates the mapping of 4D-STEM dataset block by block, so that the
+    mapped images can be shown while the data are still being read, imported
+    or acquired.
+
+    Every filter maps a diffraction pattern into a number, i.e. the sum of the
+    pattern multiplied by the filter. Because the mapping is linear, a block
+    containing only some of the scanning positions, or only some rows of the
+    diffraction patterns, can be accumulated independently. The blocks are
+    mapped and accumulated in the given dtype (float64 by default, see
+    lib.ComputePrecision.getMappingDType), whatever the dtype of the 4D-STEM
+    dataset is. For integer dtypes, the sums are exact.
+
+    The accumulated images are written into the results periodically (not
+    more often than update_interval), and partial_signal is emitted with the
+    percentage of data that has been accumulated. Call finish() after the last
+    block to make sure the results are complete.
+
+    attributes:
+        images: (np.ndarray) the accumulators, shape (n_filters, scan_i,
+            scan_j).
+
+        progress: (int) the percentage of data that have been accumulated.
+    """
+    def __init__(
+        self,
+        filters: Iterable[np.ndarray|h5py.Dataset],
+        scan_shape: tuple[int],
+        results: Iterable[np.ndarray|h5py.Dataset] = None,
+        partial_signal: Signal = None,
+        update_interval: float = 1.0,
+        dtype: np.dtype = 'float64',
+    ):
+        """
+        arguments:
+            filters: (Iterable[np.ndarray, h5py.Dataset]) the distributions of
+                mapping. All of them must have the same shape (dp_i, dp_j).
+
+            scan_shape: (tuple) (scan_i, scan_j)
+
+            results: (Iterable[np.ndarray, h5py.Dataset]) where the partial
+                images are written. Their shapes must be (scan_i, scan_j). If
+                None, the images are only kept in the accumulators.
+
+            partial_signal: (Signal) emits the percentage of accumulated data
+                after the results are updated. If None, nothing is emitted.
+
+            update_interval: (float) the minimum seconds between two updates
+                of the results.
+
+            dtype: (np.dtype) the dtype of mapping and accumulators, e.g.
+                'float64', 'float32' or 'int64'.
+        """
+        self._dtype = np.dtype(dtype)
+        # self._filters = np.stack(
+        #     [np.asarray(filter, dtype = 'float64') for filter in filters],
+        #     axis = 0,
+        # )
+        self._filters = np.stack(
+            [np.asarray(filter).astype(self._dtype) for filter in filters],
+            axis = 0,
+        )
+        if self._filters.ndim != 3:
+            raise IndexError('filters must be a list of 2D matrices')
+        self._scan_i, self._scan_j = scan_shape
+        _, dp_i, dp_j = self._filters.shape
+
+        if results is None:
+            results = []
+        self._results = list(results)
+        for result in self._results:
+            if not isinstance(result, (np.ndarray, h5py.Dataset)):
+                raise TypeError('result must a list of np.ndarray, not'
+                    '{0}'.format(type(result).__name__))
+            if tuple(result.shape[:2]) != (self._scan_i, self._scan_j):
+                raise IndexError('the shape of the result matrices must be '
+                    'the same as the scanning coordinates')
+        if self._results and len(self._results) != len(self._filters):
+            raise ValueError('the number of results must be the same as '
+                'the number of filters')
+
+        self._images = np.zeros(
+            (len(self._filters), self._scan_i, self._scan_j),
+            dtype = self._dtype,
+        )
+        self._partial_signal = partial_signal
+        self._update_interval = update_interval
+        self._total_elements = self._scan_i * self._scan_j * dp_i * dp_j
+        self._accumulated_elements = 0
+        self._dirty_rows = None         # [first, last) rows not flushed
+        self._last_update = time.monotonic()
+        self._lock = Lock()
+
+    @property
+    def images(self) -> np.ndarray:
+        return self._images
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def progress(self) -> int:
+        return int(self._accumulated_elements / self._total_elements * 100)
+
+    def accumulate(
+        self,
+        block: np.ndarray|h5py.Dataset,
+        scan_i_start: int = 0,
+        scan_j_start: int = 0,
+        dp_i_start: int = 0,
+        dp_j_start: int = 0,
+    ):
+        """
+        Accumulate a block of the 4D-STEM dataset.
+
+        This method is thread-safe, so several workers can accumulate their
+        blocks concurrently.
+
+        arguments:
+            block: (np.ndarray) 4D block, shape (block_scan_i, block_scan_j,
+                block_dp_i, block_dp_j).
+
+            scan_i_start: (int) the scanning row where the block starts.
+
+            scan_j_start: (int) the scanning column where the block starts.
+
+            dp_i_start: (int) the pattern row where the block starts.
+
+            dp_j_start: (int) the pattern column where the block starts.
+        """
+        block = np.asarray(block)
+        if block.ndim != 4:
+            raise IndexError('block must be a 4-dimensional matrix')
+        b_scan_i, b_scan_j, b_dp_i, b_dp_j = block.shape
+        filters = self._filters[
+            :,
+            dp_i_start:dp_i_start + b_dp_i,
+            dp_j_start:dp_j_start + b_dp_j,
+        ]
+        if self._dtype.kind == 'f':
+            # (b_scan_i, b_scan_j, n_filters), summed by BLAS in one call
+            mapped = np.tensordot(
+                block.astype(self._dtype, copy = False),
+                filters,
+                axes = ([2, 3], [1, 2]),
+            )
+        else:
+            # integers are summed exactly, without converting the whole block
+            mapped = np.einsum(
+                'abij,fij->abf', 
+                block, 
+                filters, 
+                dtype = self._dtype, 
+                casting = 'unsafe',
+            )
+        scan_i_end = scan_i_start + b_scan_i
+        with self._lock:
+            self._images[
+                :,
+                scan_i_start:scan_i_end,
+                scan_j_start:scan_j_start + b_scan_j,
+            ] += np.moveaxis(mapped, -1, 0)
+            self._accumulated_elements += block.size
+            if self._dirty_rows is None:
+                self._dirty_rows = (scan_i_start, scan_i_end)
+            else:
+                self._dirty_rows = (
+                    min(self._dirty_rows[0], scan_i_start),
+                    max(self._dirty_rows[1], scan_i_end),
+                )
+            is_due = (
+                time.monotonic() - self._last_update >= self._update_interval
+            )
+        if is_due:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the changed rows of the accumulators into the results, and emit
+        partial_signal.
+        """
+        with self._lock:
+            dirty_rows = self._dirty_rows
+            self._dirty_rows = None
+            self._last_update = time.monotonic()
+            if dirty_rows is not None:
+                first, last = dirty_rows
+                for result, image in zip(self._results, self._images):
+                    result[first:last, :] = image[first:last, :]
+            progress = self.progress
+        if dirty_rows is not None and self._partial_signal is not None:
+            self._partial_signal.emit(progress)
+
+    def finish(self) -> np.ndarray:
+        """
+        Write all of the remaining changes into the results.
+
+        returns:
+            (np.ndarray) the accumulated images, shape (n_filters, scan_i,
+                scan_j).
+        """
+        self.flush()
+        return self._images
 
 
 def MapFourDSTEM(
@@ -28,6 +245,9 @@ def MapFourDSTEM(
     filters: Iterable[np.ndarray|h5py.Dataset],
     results: Iterable[np.ndarray|h5py.Dataset],
     progress_signal: Signal = None,
+    partial_signal: Signal = None,
+    update_interval: float = 1.0,
+    precision: Precision = Precision.Float64,
 ) -> list[np.ndarray]:
     """
     Map 4D-STEM dataset into a 2D image, according to the distribution dist.
@@ -44,8 +264,16 @@ def MapFourDSTEM(
     Considering the fact that in some cases the dtype of the 4D-STEM dataset is
     like 'uint8' or something else. When doing calculation, result numbers may
     exceed the maximum of the dtype (stack overflow) especially for integers. 
-    So here the dtype of the result is set to 'float64'. And whatever the dtype
-    of the 4D-STEM is, it will be casted to 'float64'.
+    So the patterns are mapped in the dtype decided by the precision (see 
+    lib.ComputePrecision.getMappingDType): 'float64', 'float32', or 'int64' 
+    for integer datasets mapped by integer filters in Precision.Native.
+
+    The dataset is read in blocks of scanning positions, and the results are
+    filled incrementally by IncrementalMapper. So if partial_signal is given,
+    the partially filled results can be shown before the mapping completes.
+    The size of blocks is given by the memory budget (see bin.MemoryBudget),
+    where a pattern is held both in the dtype of the dataset and in the dtype
+    of mapping.
 
     arguments:
         item_path: (str) the 4D-STEM data's path in HDF5 file.
@@ -59,6 +287,16 @@ def MapFourDSTEM(
             calculation result will be saved. In these result matrices there 
             may exist other thread reading or writing concurrently.
 
+        progress_signal: (Signal) emits the progress in percentage.
+
+        partial_signal: (Signal) emits the progress in percentage, after the
+            partial results are written.
+
+        update_interval: (float) the minimum seconds between two updates of
+            the partial results.
+
+        precision: (Precision) the precision of mapping.
+
     returns:
         (list[np.ndarray]) a list of mapped image whose shape is the same as 
             the first two dimensions (scanning coordinates) of the 4D-STEM 
@@ -74,6 +312,7 @@ def MapFourDSTEM(
 
     scan_i, scan_j, dp_i, dp_j = dataset.shape
     
+    filters = list(filters)
     for filter in filters:
         if not isinstance(filter, (np.ndarray, h5py.Dataset)):
             raise TypeError('filter must be a list of np.ndarray, not'
@@ -82,22 +321,42 @@ def MapFourDSTEM(
             raise IndexError('the shape of the filter must be the same as '
                 'the diffraction patterns shape of the 4D-STEM dataset.')
 
-    for result in results:
-        if not isinstance(result, (np.ndarray, h5py.Dataset)):
-            raise TypeError('result must a list of np.ndarray, not'
-                '{0}'.format(type(result).__name__))
-        if (result.shape[0] != scan_i or result.shape[1] != scan_j):
-            raise IndexError('the shape of the result matrices must be the'
-                'same as the scanning coordinates of the 4D-STEM dataset')
-
-    result_lock = Lock()
-    for ii in range(scan_i):
-        for jj in range(scan_j):
-            dp = np.asarray(dataset[ii, jj, :, :], dtype = 'float64')
-            for result, filter in zip(results, filters):
-                with result_lock:
-                    result[ii, jj] = np.sum(dp*filter)
-        progress_signal.emit(int((ii+1)/scan_i*100))
+    dtype = getMappingDType(precision, dataset.dtype, filters)
+    mapper = IncrementalMapper(
+        filters, 
+        (scan_i, scan_j), 
+        results, 
+        partial_signal, 
+        update_interval,
+        dtype,
+    )
+
+    # result_lock = Lock()
+    # for ii in range(scan_i):
+    #     for jj in range(scan_j):
+    #         dp = np.asarray(dataset[ii, jj, :, :], dtype = 'float64')
+    #         for result, filter in zip(results, filters):
+    #             with result_lock:
+    #                 result[ii, jj] = np.sum(dp*filter)
+    #     progress_signal.emit(int((ii+1)/scan_i*100))
+
+    # block_patterns = max(_MAP_BLOCK_BYTES // (dp_i * dp_j * 8), 1)
+    pattern_bytes = dp_i * dp_j * (dataset.dtype.itemsize + dtype.itemsize)
+    with getMemoryBudget().request(pattern_bytes, scan_i * scan_j) as allocation:
+        block_patterns = allocation.units
+        block_rows = max(block_patterns // scan_j, 1)
+        block_cols = min(block_patterns, scan_j)
+        for i_start in range(0, scan_i, block_rows):
+            i_end = min(i_start + block_rows, scan_i)
+            for j_start in range(0, scan_j, block_cols):
+                j_end = min(j_start + block_cols, scan_j)
+                mapper.accumulate(
+                    dataset[i_start:i_end, j_start:j_end, :, :],
+                    i_start,
+                    j_start,
+                )
+            progress_signal.emit(int(i_end/scan_i*100))
+    mapper.finish()
 
     return results
 
@@ -107,6 +366,8 @@ def CalculateVirtualImage(
     mask: np.ndarray|h5py.Dataset,
     result_path: str,
     progress_signal: Signal = None,
+    partial_signal: Signal = None,
+    precision: Precision = Precision.Float64,
 ) -> np.ndarray:
     """
     Calculate the Virtual Image of the 4D-STEM dataset.
@@ -120,6 +381,13 @@ def CalculateVirtualImage(
 
         result: (str) the HDF object path to store the result.
 
+        partial_signal: (Signal) emits when the partially filled result is 
+            written.
+
+        precision: (Precision) the precision of mapping. With 
+            Precision.Native, integer datasets with a binary mask are summed
+            exactly in int64.
+
     returns:
         (np.ndarray) the reconstructed virtual image whose shape is the same as
             the first two dimensions (scanning coordinates) of the 4D-STEM 
@@ -128,14 +396,107 @@ def CalculateVirtualImage(
     global qApp
     hdf_handler = qApp.hdf_handler
     result_object = hdf_handler.file[result_path]
-    return MapFourDSTEM(item_path, [mask], [result_object], progress_signal)
+    return MapFourDSTEM(
+        item_path, 
+        [mask], 
+        [result_object], 
+        progress_signal, 
+        partial_signal,
+        precision = precision,
+    )
+
+
+
+def CreateCenterOfMassFilters(
+    dp_i: int,
+    dp_j: int,
+    mask: np.ndarray|h5py.Dataset|None = None,
+    dtype: np.dtype = 'float64',
+) -> list[np.ndarray]:
+    """
+    Create the filters to calculate the Center of Mass (CoM). The origin of 
+    the diffraction plane is set to the center of the diffraction patterns.
+
+    To calculate center of mass, we should calculate
+            Σrm(r)/Σm(r)
+    where m is the mass distribution, r is location vector. So the filters are
+    the i-coordinate, the j-coordinate and the mask itself.
+
+    arguments:
+        dp_i: (int) the height of diffraction patterns.
+
+        dp_j: (int) the width of diffraction patterns.
+
+        mask: (np.ndarray or h5py.Dataset) the region of diffraction patterns
+            that contributes to the center of mass. If None, all of the 
+            pattern contributes.
+
+        dtype: (np.dtype) the dtype of the filters.
+
+    returns:
+        (list[np.ndarray]) [loc_i * mask, loc_j * mask, mask]
+    """
+    center_i = (dp_i - 1)/2
+    center_j = (dp_j - 1)/2
+    array_i = np.linspace(- center_i, dp_i - center_i - 1, dp_i)
+    array_j = np.linspace(- center_j, dp_j - center_j - 1, dp_j)
+    loc_i, loc_j = np.meshgrid(array_i, array_j, indexing = 'ij')
+
+    if mask is None:
+        mask = np.ones((dp_i, dp_j))
+    mask = np.asarray(mask)
+    # return [loc_i*mask, loc_j*mask, mask]
+    return [
+        np.asarray(f, dtype = dtype) for f in (loc_i*mask, loc_j*mask, mask)
+    ]
+
+
+def _momentsToCenterOfMass(
+    first_momentum_i: np.ndarray,
+    first_momentum_j: np.ndarray,
+    region_integral: np.ndarray,
+    ratio_dtype: np.dtype,
+) -> tuple[np.ndarray]:
+    """
+    Divide the first moments by the region integral.
+    """
+    region_integral = region_integral.astype(ratio_dtype) + 1e-12
+    com_i = first_momentum_i.astype(ratio_dtype)/region_integral
+    com_j = first_momentum_j.astype(ratio_dtype)/region_integral
+    return (com_i, com_j)
 
 
+class _PartialCenterOfMass(object):
+    """
+    Calculates the partial Center of Mass from the partially accumulated 
+    moments.
+
+    It works as the partial_signal of MapFourDSTEM, so emit is called in the 
+    worker thread every time the moments are updated.
+    """
+    def __init__(
+        self, 
+        moments: list[np.ndarray], 
+        ratio_dtype: np.dtype,
+        partial_func: Callable,
+    ):
+        self._moments = moments
+        self._ratio_dtype = ratio_dtype
+        self._partial_func = partial_func
+
+    def emit(self, progress: int):
+        com_i, com_j = _momentsToCenterOfMass(
+            *self._moments, self._ratio_dtype
+        )
+        self._partial_func(progress, com_i, com_j)
+
 
 def CalculateCenterOfMass(
     item_path: str,
     mask: np.ndarray|h5py.Dataset|None,
     progress_signal: Signal = None,
+    precision: Precision = Precision.Float64,
+    partial_func: Callable = None,
 ) -> tuple[np.ndarray]:
     """
     Calculate the Center of Mass (CoM) distribution of the 4D-STEM dataset.
@@ -154,6 +515,14 @@ def CalculateCenterOfMass(
         result_com_j: (np.ndarray or h5py.Dataset) the array to store the 
             result of j-direction center of mass distribution.
 
+        precision: (Precision) the precision of mapping. The center of mass 
+            is float32 if the mapping is float32, otherwise float64.
+
+        partial_func: (Callable) called as partial_func(progress, com_i, 
+            com_j) with the partial center of mass, every time the partially
+            accumulated moments are updated. It is called in the worker 
+            thread. If None, only the complete result is returned.
+
     returns:
         (tuple[np.ndarray]) this function will return two matrices CoM_i and 
             CoM_j. Both matrices' shapes are the same as the first two 
@@ -166,29 +535,38 @@ def CalculateCenterOfMass(
         raise IndexError('dataset must be a 4-dimensional matrix')
     
     scan_i, scan_j, dp_i, dp_j = dataset.shape
-    center_i = (dp_i - 1)/2
-    center_j = (dp_j - 1)/2
-    array_i = np.linspace(- center_i, dp_i - center_i - 1, dp_i)
-    array_j = np.linspace(- center_j, dp_j - center_j - 1, dp_j)
-    loc_i, loc_j = np.meshgrid(array_i, array_j, indexing = 'ij')
-
-    if mask is None:
-        mask = np.ones((dp_i, dp_j))
-
-    # To calculate center of mass, we should calculate
-    #       Σrm(r)/Σm(r)
-    # Where m is the mass distribution, r is location vector.
-    filters = [loc_i*mask, loc_j*mask, mask]
-    first_momentum_i = np.zeros((scan_i, scan_j))
-    first_momentum_j = np.zeros((scan_i, scan_j))
-    region_integral = np.zeros((scan_i, scan_j))
+    filters = CreateCenterOfMassFilters(dp_i, dp_j, mask)
+    dtype = getMappingDType(precision, dataset.dtype, filters)
+    # first_momentum_i = np.zeros((scan_i, scan_j))
+    # first_momentum_j = np.zeros((scan_i, scan_j))
+    # region_integral = np.zeros((scan_i, scan_j))
+    first_momentum_i = np.zeros((scan_i, scan_j), dtype = dtype)
+    first_momentum_j = np.zeros((scan_i, scan_j), dtype = dtype)
+    region_integral = np.zeros((scan_i, scan_j), dtype = dtype)
     results = [first_momentum_i, first_momentum_j, region_integral]
-
-    MapFourDSTEM(item_path, filters, results, progress_signal)
-
-    com_i = first_momentum_i/(region_integral + 1e-12)
-    com_j = first_momentum_j/(region_integral + 1e-12)
-
-    return (com_i, com_j)
+    ratio_dtype = getRatioDType(dtype)
+
+    if partial_func is None:
+        partial_signal = None
+    else:
+        partial_signal = _PartialCenterOfMass(
+            results, ratio_dtype, partial_func,
+        )
+    MapFourDSTEM(
+        item_path, 
+        filters, 
+        results, 
+        progress_signal, 
+        partial_signal,
+        precision = precision,
+    )
+
+    # region_integral = region_integral.astype(ratio_dtype) + 1e-12
+    # com_i = first_momentum_i.astype(ratio_dtype)/region_integral
+    # com_j = first_momentum_j.astype(ratio_dtype)/region_integral
+    # return (com_i, com_j)
+    return _momentsToCenterOfMass(
+        first_momentum_i, first_momentum_j, region_integral, ratio_dtype,
+    )
 
 
@@ -21,8 +21,11 @@ from PySide6.QtCore import Signal
 import numpy as np 
 import h5py
 from scipy.ndimage import rotate
-from skimage.transform import SimilarityTransform
-from skimage.transform import warp
+
+from lib.ComputePrecision import castResult
+from lib.ComputePrecision import getTransformDType
+# from skimage.transform import SimilarityTransform
+# from skimage.transform import warp
 
 
 def RollingDiffractionPattern(
@@ -64,11 +67,16 @@ def RollingDiffractionPattern(
     for ii in range(scan_i):
         for jj in range(scan_j):
             with result_lock:
-                result_object[ii, jj, :, :] = np.roll(
+                # result_object[ii, jj, :, :] = np.roll(
+                #     data_object[ii, jj, :, :],
+                #     translation_vector,
+                #     axis = (0, 1)
+                # )
+                result_object[ii, jj, :, :] = castResult(np.roll(
                     data_object[ii, jj, :, :],
                     translation_vector,
                     axis = (0, 1)
-                )
+                ), result_object.dtype)
         progress_signal.emit(int((ii+1)/scan_i*100))
 
     return result_object 
@@ -100,17 +108,26 @@ def TranslatingDiffractionPattern(
     if shift_mapping.shape[1:2] != data_object.shape[:1]:
         raise ValueError(f'shape of shift_mapping {shift_mapping.shape} does not match the scanning shape of 4D-STEM dataset {data_object.shape}')
     
+    # skimage takes long to be imported, so it is imported here
+    from skimage.transform import SimilarityTransform
+    from skimage.transform import warp
+    
     scan_i, scan_j, dp_i, dp_j = data_object.shape 
+    dtype = getTransformDType(result_object.dtype)
     
     result_lock = Lock()
     for ii in range(scan_i):
         for jj in range(scan_j):
             with result_lock:
-                dp = data_object[ii, jj, :, :]
+                # dp = data_object[ii, jj, :, :]
+                dp = np.asarray(data_object[ii, jj, :, :], dtype = dtype)
                 shift_x, shift_y = shift_mapping[1, ii, jj], shift_mapping[0, ii, jj]
                 transform = SimilarityTransform(translation=(shift_x, shift_y))
                 dp_translated = warp(dp, transform, mode = 'reflect', preserve_range=True)
-                result_object[ii, jj, :, :] = dp_translated
+                # result_object[ii, jj, :, :] = dp_translated
+                result_object[ii, jj, :, :] = castResult(
+                    dp_translated, result_object.dtype
+                )
     
         progress_signal.emit(int((ii+1)/scan_i*100))
         
@@ -153,16 +170,21 @@ def FilteringDiffractionPattern(
             'source data object\'s shape.')
 
     scan_i, scan_j, dp_i, dp_j = data_object.shape 
+    dtype = getTransformDType(result_object.dtype)
     result_lock = Lock()
     for ii in range(scan_i):
         for jj in range(scan_j):
             with result_lock:
-                dp = data_object[ii, jj, :, :]
+                # dp = data_object[ii, jj, :, :]
+                dp = np.asarray(data_object[ii, jj, :, :], dtype = dtype)
                 if window_max is not None:
                     dp[dp > window_max] = window_max
                 if window_min is not None:
                     dp[dp < window_min] = 0
-                result_object[ii, jj, :, :] = dp 
+                # result_object[ii, jj, :, :] = dp 
+                result_object[ii, jj, :, :] = castResult(
+                    dp, result_object.dtype
+                )
         progress_signal.emit(int((ii+1)/scan_i*100))
 
     return result_object 
@@ -200,13 +222,21 @@ def RotatingDiffractionPattern(
             'source data object\'s shape.')
 
     scan_i, scan_j, dp_i, dp_j = data_object.shape 
+    dtype = getTransformDType(result_object.dtype)
     result_lock = Lock()
     for ii in range(scan_i):
         for jj in range(scan_j):
             with result_lock:
-                dp = data_object[ii, jj, :, :]
-                dp_rotate = rotate(dp, rotation_angle, reshape = False)
-                result_object[ii, jj, :, :] = dp_rotate 
+                # dp = data_object[ii, jj, :, :]
+                # dp_rotate = rotate(dp, rotation_angle, reshape = False)
+                # result_object[ii, jj, :, :] = dp_rotate 
+                dp = np.asarray(data_object[ii, jj, :, :], dtype = dtype)
+                dp_rotate = rotate(
+                    dp, rotation_angle, reshape = False, output = dtype,
+                )
+                result_object[ii, jj, :, :] = castResult(
+                    dp_rotate, result_object.dtype
+                )
         progress_signal.emit(int((ii+1)/scan_i*100))
 
     return result_object
@@ -246,13 +276,20 @@ def SubtractBackground(
         raise ValueError('result object\'s shape must be the same as the '
             'source data object\'s shape.')
     scan_i, scan_j, dp_i, dp_j = data_object.shape 
+    dtype = getTransformDType(result_object.dtype)
+    background = np.asarray(background_object[:, :], dtype = dtype)
     
     result_lock = Lock()
     for ii in range(scan_i):
         for jj in range(scan_j):
             with result_lock:
-                dp = data_object[ii, jj, :, :] - background_object[:, :]
+                # dp = data_object[ii, jj, :, :] - background_object[:, :]
+                dp = np.asarray(data_object[ii, jj, :, :], dtype = dtype)
+                dp -= background
                 dp[dp < 0] = 0
-                result_object[ii, jj, :, :] = dp
+                # result_object[ii, jj, :, :] = dp
+                result_object[ii, jj, :, :] = castResult(
+                    dp, result_object.dtype
+                )
         progress_signal.emit(int((ii+1)/scan_i*100))
     return result_object 
\ No newline at end of file
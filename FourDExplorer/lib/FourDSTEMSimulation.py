@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+"""
+*-------------------------- FourDSTEMSimulation.py ---------------------------*
+模拟 4D-STEM 数据集的前向模型。
+
+在给定的透射函数 (物体) 上，用 OpticalSTEM 的 probe 逐点扫描，由
+|F[probe · t]|² 得到会聚束衍射图样，一次计算一块扫描点：
+    - probe 的位置由 ScanGeometry 广播得到，整数部分用于从物体上截取窗口，小数部分
+      通过在衍射空间乘以相位斜坡来平移 probe (亚像素扫描)；
+    - 一块扫描点的出射波沿最后两个维度做批量 fft2；
+    - 每块的大小由内存预算决定，结果逐块写入 np.ndarray 或 HDF5 数据集。
+
+由于物体已知，模拟的数据可以用来检验重构算法与 CTF 的预测。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+The forward model to simulate 4D-STEM datasets.
+
+The probe of OpticalSTEM scans over a given transmission function (object),
+and the convergent beam diffraction patterns are |F[probe · t]|². A block of
+scanning points is calculated at a time:
+    - The probe positions are broadcast by ScanGeometry. Their integer parts
+      take windows of the object, and their fractional parts shift the probe
+      by phase ramps in the diffraction space (sub-pixel scanning).
+    - The exit waves of a block are transformed by a batched fft2 over the
+      last two axes.
+    - The block size is decided by the memory budget, and the results are
+      written into np.ndarray or HDF5 datasets block by block.
+
+Since the object is known, the simulated data can be used to validate the
+reconstructions and the CTF predictions.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*-------------------------- FourDSTEMSimulation.py ---------------------------*
+"""
+
+from PySide6.QtCore import Signal
+import h5py
+import numpy as np
+
+from bin.MemoryBudget import getMemoryBudget
+from lib.ComputePrecision import castResult
+from lib.Probe import OpticalSTEM
+from lib.ScanGeometry import extractWindows
+from lib.ScanGeometry import getObjectShape
+from lib.ScanGeometry import shiftPositionsToObject
+
+
+class FourDSTEMSimulator:
+    """
+    4D-STEM 数据集的前向模拟器。
+
+    Forward simulator of 4D-STEM datasets.
+
+    The probe window is dp_N x dp_N real space pixels, and the diffraction
+    patterns are cropped at the center to the detector shape of the
+    optical_stem. With the probe normalized as in OpticalSTEM, the patterns
+    sum to one (for a pure phase object with no cropping), so they are
+    multiplied by the dose to get the electron counts.
+
+    Usage:
+        optics = OpticalSTEM(...)
+        positions = optics.generateProbePositions(0)
+        simulator = FourDSTEMSimulator(optics, np.exp(1j * phase), positions)
+        SimulateFourDSTEM(simulator, file['/4D-STEM'], progress_signal)
+    """
+    def __init__(
+        self,
+        optical_stem: OpticalSTEM,
+        transmission: np.ndarray,
+        positions: np.ndarray = None,
+        padding: int = 0,
+        dose: float = None,
+        seed: int = None,
+    ):
+        """
+        arguments:
+            optical_stem: (OpticalSTEM)
+
+            transmission: (np.ndarray) the complex transmission function of
+                the object, or the phase (real) of a pure phase object.
+
+            positions: (np.ndarray) the probe positions in real space pixels,
+                in the shape (scan_i, scan_j, 2). They are moved into the
+                frame of the object with the padding. If None, the positions
+                of optical_stem.generateProbePositions(0) are used.
+
+            padding: (int) the distance between the windows and the edges of
+                the object, unit: pixel
+
+            dose: (float) the number of electrons of every pattern. If None,
+                the patterns are the probabilities.
+
+            seed: (int) if not None, Poisson noise of the dose is added with
+                the random seed.
+        """
+        if not isinstance(optical_stem, OpticalSTEM):
+            raise TypeError('optical_stem must be an OpticalSTEM object')
+        transmission = np.asarray(transmission)
+        if transmission.ndim != 2:
+            raise ValueError('transmission must be a 2D array')
+        if not np.iscomplexobj(transmission):
+            transmission = np.exp(1j * transmission)
+        if positions is None:
+            positions = optical_stem.generateProbePositions(0)
+        positions = np.asarray(positions, dtype = 'float64')
+        if positions.ndim != 3 or positions.shape[-1] != 2:
+            raise ValueError('positions must be in the shape '
+                '(scan_i, scan_j, 2), not {0}'.format(positions.shape))
+        if seed is not None and dose is None:
+            raise ValueError('dose must be given to add Poisson noise')
+
+        self._optical_stem = optical_stem
+        self._transmission = transmission
+        self._positions = shiftPositionsToObject(positions, padding)
+        self._dose = dose
+        self._seed = seed
+
+        dp_N = optical_stem.dp_N
+        required = getObjectShape(self._positions, (dp_N, dp_N), padding)
+        if (required[0] > transmission.shape[0]
+            or required[1] > transmission.shape[1]):
+            raise ValueError('the object must be at least {0} for the scan, '
+                'not {1}'.format(required, transmission.shape))
+
+        ki = np.fft.fftfreq(dp_N)
+        self._ramp_i = -2j * np.pi * ki[:, None]
+        self._ramp_j = -2j * np.pi * ki[None, :]
+        self._probe_spectrum = np.fft.fft2(optical_stem.getProbe())
+
+    @property
+    def optical_stem(self) -> OpticalSTEM:
+        return self._optical_stem
+
+    @property
+    def positions(self) -> np.ndarray:
+        """
+        The probe positions in the frame of the object, unit: pixel
+        """
+        return self._positions
+
+    @property
+    def shape(self) -> tuple:
+        """
+        The shape of the simulated dataset, (scan_i, scan_j, dp_i, dp_j).
+        """
+        scan_i, scan_j = self._positions.shape[:2]
+        dp_i, dp_j = self._optical_stem.detector_shape
+        return (scan_i, scan_j, dp_i, dp_j)
+
+    @staticmethod
+    def getObjectShape(
+        optical_stem: OpticalSTEM,
+        positions: np.ndarray = None,
+        padding: int = 0,
+    ) -> tuple:
+        """
+        Get the shape of the object needed by the scan.
+
+        arguments:
+            optical_stem: (OpticalSTEM)
+
+            positions: (np.ndarray) if None, the positions of
+                optical_stem.generateProbePositions(0) are used.
+
+            padding: (int)
+
+        returns:
+            (tuple) (object_i, object_j)
+        """
+        if positions is None:
+            positions = optical_stem.generateProbePositions(0)
+        positions = shiftPositionsToObject(positions, padding)
+        dp_N = optical_stem.dp_N
+        return getObjectShape(positions, (dp_N, dp_N), padding)
+
+    def _shiftProbes(self, fractions: np.ndarray) -> np.ndarray:
+        """
+        Shift the probe by the sub-pixel fractions.
+
+        arguments:
+            fractions: (np.ndarray) in the shape (B, 2)
+
+        returns:
+            (np.ndarray) in the shape (B, dp_N, dp_N)
+        """
+        if not np.any(fractions):
+            probe = self._optical_stem.getProbe()
+            return np.broadcast_to(probe, (fractions.shape[0],) + probe.shape)
+        ramps = np.exp(
+            fractions[:, 0, None, None] * self._ramp_i
+            + fractions[:, 1, None, None] * self._ramp_j
+        )
+        return np.fft.ifft2(self._probe_spectrum * ramps)
+
+    def simulatePatterns(self, positions: np.ndarray) -> np.ndarray:
+        """
+        Simulate the diffraction patterns at a batch of positions.
+
+        arguments:
+            positions: (np.ndarray) in the frame of the object, in the shape
+                (B, 2).
+
+        returns:
+            (np.ndarray) in the shape (B, dp_i, dp_j)
+        """
+        optics = self._optical_stem
+        dp_N = optics.dp_N
+        dp_i, dp_j = optics.detector_shape
+        corners = np.floor(positions)
+        probes = self._shiftProbes(positions - corners)
+        windows = extractWindows(self._transmission, corners, (dp_N, dp_N))
+        waves = OpticalSTEM.fft2(probes * windows, optics.dx)
+        top = (dp_N - dp_i) // 2
+        left = (dp_N - dp_j) // 2
+        patterns = np.abs(waves[:, top:top+dp_i, left:left+dp_j])**2
+        patterns *= optics.du**2
+        if self._dose is not None:
+            patterns *= self._dose
+        return patterns
+
+    def simulateRows(self, ii: int, rows: int = 1) -> np.ndarray:
+        """
+        Simulate the diffraction patterns of some scanning rows.
+
+        arguments:
+            ii: (int) the first scanning row.
+
+            rows: (int) the number of scanning rows.
+
+        returns:
+            (np.ndarray) in the shape (rows, scan_j, dp_i, dp_j)
+        """
+        scan_i, scan_j, dp_i, dp_j = self.shape
+        rows = min(rows, scan_i - ii)
+        patterns = self.simulatePatterns(
+            self._positions[ii:ii+rows].reshape(-1, 2)
+        )
+        patterns = patterns.reshape(rows, scan_j, dp_i, dp_j)
+        if self._seed is not None:
+            # one generator per row, so the noise does not depend on blocks
+            for row in range(rows):
+                rng = np.random.default_rng((self._seed, ii + row))
+                patterns[row] = rng.poisson(patterns[row])
+        return patterns
+
+
+def SimulateFourDSTEM(
+    simulator: FourDSTEMSimulator,
+    result: np.ndarray|h5py.Dataset,
+    progress_signal: Signal = None,
+):
+    """
+    Simulate a 4D-STEM dataset and write it block by block.
+
+    The blocks are whole scanning rows, as many as the memory budget allows.
+    Integer results are rounded and clipped.
+
+    arguments:
+        simulator: (FourDSTEMSimulator)
+
+        result: (np.ndarray or h5py.Dataset) in the shape simulator.shape
+
+        progress_signal: (Signal) emits the progress in percentage.
+    """
+    if tuple(result.shape) != simulator.shape:
+        raise ValueError('the shape of result must be {0}, not {1}'.format(
+            simulator.shape, result.shape
+        ))
+    scan_i, scan_j, dp_i, dp_j = simulator.shape
+    dp_N = simulator.optical_stem.dp_N
+    # complex probes, windows and exit waves of a row
+    row_bytes = scan_j * dp_N * dp_N * 16 * 4
+    with getMemoryBudget().request(row_bytes, scan_i) as allocation:
+        for ii in range(0, scan_i, allocation.units):
+            block = simulator.simulateRows(ii, allocation.units)
+            result[ii:ii+block.shape[0]] = castResult(block, result.dtype)
+            if progress_signal is not None:
+                progress_signal.emit(int((ii + block.shape[0]) / scan_i * 100))
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+"""
+*------------------------------- HDFCopy.py ----------------------------------*
+按存储分块复制 HDF5 数据集。
+
+若源数据集与目标数据集的分块形状与过滤器 (压缩等) 完全一致，则直接复制已压缩的原始
+分块，不需要解压与重新压缩；否则按与分块对齐的超切片 (hyperslab) 逐块复制，每块都在
+内存预算之内。
+
+从外部 .h5/.emd 文件导入数据，以及在文件内复制数据集，都使用这里的函数。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Copy HDF5 datasets according to their storage chunks.
+
+If the source and the destination have the same chunk shape and the same
+filters (compression, etc.), the raw chunks are copied directly without
+decompression and recompression. Otherwise the data are copied in hyperslabs
+aligned to the chunks, each within the memory budget (see bin.MemoryBudget).
+
+Both importing from external .h5/.emd files and copying datasets in the file
+use the functions here.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*------------------------------- HDFCopy.py ----------------------------------*
+"""
+
+import math
+
+from PySide6.QtCore import Signal
+import h5py
+import numpy as np
+
+from bin.MemoryBudget import getMemoryBudget
+from lib.FourDSTEMMapping import IncrementalMapper
+
+
+# COPY_MEMORY_BUDGET = 64 * 2**20     # bytes of a hyperslab in memory
+
+
+def getFilters(dataset: h5py.Dataset) -> list:
+    """
+    Get the filter pipeline of a dataset.
+
+    arguments:
+        dataset: (h5py.Dataset)
+
+    returns:
+        (list) of tuples (filter code, flags, client values).
+    """
+    dcpl = dataset.id.get_create_plist()
+    filters = []
+    for ii in range(dcpl.get_nfilters()):
+        code, flags, values, _name = dcpl.get_filter(ii)
+        filters.append((code, flags, tuple(values)))
+    return filters
+
+
+def canCopyChunksDirectly(
+    src_dataset: h5py.Dataset,
+    dest_dataset: h5py.Dataset,
+) -> bool:
+    """
+    Whether the raw chunks of the source can be written to the destination.
+
+    It requires the same shape, dtype, chunk shape, fill value and filter
+    pipeline.
+
+    arguments:
+        src_dataset: (h5py.Dataset)
+
+        dest_dataset: (h5py.Dataset)
+
+    returns:
+        (bool)
+    """
+    if src_dataset.chunks is None or dest_dataset.chunks is None:
+        return False
+    if src_dataset.chunks != dest_dataset.chunks:
+        return False
+    if src_dataset.shape != dest_dataset.shape:
+        return False
+    if src_dataset.dtype != dest_dataset.dtype:
+        return False
+    if src_dataset.is_virtual or dest_dataset.is_virtual:
+        return False
+    if src_dataset.fillvalue != dest_dataset.fillvalue:
+        return False
+    return getFilters(src_dataset) == getFilters(dest_dataset)
+
+
+def planHyperslab(
+    shape: tuple,
+    unit: tuple,
+    itemsize: int,
+    memory_budget: int,
+) -> tuple:
+    """
+    Plan the shape of hyperslabs that are aligned to the unit.
+
+    Starting from the unit, the hyperslab grows along the last axis first to
+    the full length, then the axes before, as long as it fits the budget. So
+    the hyperslabs are as contiguous as possible. A hyperslab is never smaller
+    than the unit.
+
+    arguments:
+        shape: (tuple) the shape of the dataset.
+
+        unit: (tuple) the shape to be aligned to, usually the chunk shape.
+
+        itemsize: (int) bytes of a scalar.
+
+        memory_budget: (int) bytes of a hyperslab.
+
+    returns:
+        (tuple) the shape of hyperslabs.
+    """
+    block = [min(u, n) for u, n in zip(unit, shape)]
+    budget_items = max(memory_budget // itemsize, 1)
+    for axis in range(len(shape) - 1, -1, -1):
+        others = math.prod(block) // block[axis]
+        fit = budget_items // max(others, 1)
+        if fit >= shape[axis]:
+            block[axis] = shape[axis]
+        else:
+            block[axis] = max(fit // block[axis], 1) * block[axis]
+            break
+    return tuple(block)
+
+
+def iterHyperslabs(shape: tuple, block: tuple):
+    """
+    Iterate over hyperslabs of the block shape in C order.
+
+    arguments:
+        shape: (tuple) the shape of the dataset.
+
+        block: (tuple) the shape of hyperslabs.
+
+    yields:
+        (tuple) of slices.
+    """
+    starts = [range(0, n, b) for n, b in zip(shape, block)]
+    for corner in np.ndindex(*[len(r) for r in starts]):
+        yield tuple(
+            slice(r[c], min(r[c] + b, n))
+            for r, c, b, n in zip(starts, corner, block, shape)
+        )
+
+
+def _getCopyUnit(
+    src_dataset: h5py.Dataset,
+    dest_dataset: h5py.Dataset,
+) -> tuple:
+    """
+    Get the unit that hyperslabs are aligned to.
+
+    If both datasets are chunked, it is the least common multiple of the two
+    chunk shapes, so that neither a source chunk is decompressed twice nor a
+    destination chunk is written partially.
+    """
+    ndim = len(src_dataset.shape)
+    units = [
+        dset.chunks for dset in (src_dataset, dest_dataset)
+        if dset.chunks is not None
+    ]
+    if not units:
+        return (1,) * ndim
+    unit = [1] * ndim
+    for chunks in units:
+        unit = [math.lcm(u, c) for u, c in zip(unit, chunks)]
+    return tuple(min(u, n) for u, n in zip(unit, src_dataset.shape))
+
+
+def copyChunksDirectly(
+    src_dataset: h5py.Dataset,
+    dest_dataset: h5py.Dataset,
+    progress_signal: Signal = None,
+):
+    """
+    Copy the raw chunks from the source to the destination.
+
+    Only the allocated chunks are copied. The unallocated chunks in the
+    destination are read as the (same) fill value.
+
+    arguments:
+        src_dataset: (h5py.Dataset)
+
+        dest_dataset: (h5py.Dataset)
+
+        progress_signal: (Signal) The progress signal of the task.
+    """
+    if progress_signal is None:
+        progress_signal = Signal(int)
+
+    num_chunks = src_dataset.id.get_num_chunks()
+    progress = 0
+    for index in range(num_chunks):
+        info = src_dataset.id.get_chunk_info(index)
+        filter_mask, chunk = src_dataset.id.read_direct_chunk(info.chunk_offset)
+        dest_dataset.id.write_direct_chunk(
+            info.chunk_offset, chunk, filter_mask
+        )
+        new_progress = int((index + 1) / num_chunks * 100)
+        if new_progress > progress:
+            progress = new_progress
+            progress_signal.emit(progress)
+
+
+def copyHyperslabs(
+    src_dataset: h5py.Dataset,
+    dest_dataset: h5py.Dataset,
+    progress_signal: Signal = None,
+    memory_budget: int = None,
+    mapper: IncrementalMapper = None,
+):
+    """
+    Copy the data from the source to the destination in chunk-aligned
+    hyperslabs.
+
+    arguments:
+        src_dataset: (h5py.Dataset)
+
+        dest_dataset: (h5py.Dataset) must have the same shape as the source.
+
+        progress_signal: (Signal) The progress signal of the task.
+
+        memory_budget: (int) bytes of a hyperslab. Default is given by the
+            memory budget (see bin.MemoryBudget).
+
+        mapper: (IncrementalMapper) If given, every hyperslab of the 4D-STEM
+            dataset is also accumulated into it.
+    """
+    if progress_signal is None:
+        progress_signal = Signal(int)
+
+    shape = src_dataset.shape
+    unit = _getCopyUnit(src_dataset, dest_dataset)
+    itemsize = src_dataset.dtype.itemsize
+    budget = getMemoryBudget()
+    if memory_budget is None:
+        # the mapper holds another copy of the hyperslab in float64
+        copies = 1 if mapper is None else 1 + math.ceil(8 / itemsize)
+        allocation = budget.request(
+            math.prod(unit) * itemsize, copies = copies,
+        )
+        memory_budget = allocation.nbytes
+    else:
+        allocation = budget.reserve(memory_budget)
+
+    with allocation:
+        block = planHyperslab(shape, unit, itemsize, memory_budget)
+        total = max(math.prod(shape), 1)
+        done = 0
+        progress = 0
+        for slices in iterHyperslabs(shape, block):
+            data = src_dataset[slices]
+            dest_dataset[slices] = data
+            if mapper is not None:
+                mapper.accumulate(data, *[s.start for s in slices])
+            done += data.size
+            new_progress = int(done / total * 100)
+            if new_progress > progress:
+                progress = new_progress
+                progress_signal.emit(progress)
+
+
+def copyDataset(
+    src_dataset: h5py.Dataset,
+    dest_dataset: h5py.Dataset,
+    progress_signal: Signal = None,
+    memory_budget: int = None,
+    mapper: IncrementalMapper = None,
+):
+    """
+    Copy the data of a dataset into another one of the same shape.
+
+    The raw chunks are copied directly if possible (see canCopyChunksDirectly),
+    unless a mapper is given, which needs the decompressed data. Otherwise
+    the data are copied in chunk-aligned hyperslabs.
+
+    arguments:
+        src_dataset: (h5py.Dataset) The source dataset, may be in another file.
+
+        dest_dataset: (h5py.Dataset) The destination dataset.
+
+        progress_signal: (Signal) The progress signal of the task.
+
+        memory_budget: (int) bytes of a hyperslab. Default is given by the
+            memory budget (see bin.MemoryBudget).
+
+        mapper: (IncrementalMapper) If given, the 4D-STEM data are also
+            accumulated into it.
+
+    raises:
+        ValueError: If the shapes are different.
+    """
+    if progress_signal is None:
+        progress_signal = Signal(int)
+    if src_dataset.shape != dest_dataset.shape:
+        raise ValueError('Cannot copy dataset of shape {0} into {1}'.format(
+            src_dataset.shape, dest_dataset.shape))
+
+    if src_dataset.shape == () or src_dataset.size == 0:
+        if src_dataset.shape == ():
+            dest_dataset[()] = src_dataset[()]
+        progress_signal.emit(100)
+    elif mapper is None and canCopyChunksDirectly(src_dataset, dest_dataset):
+        copyChunksDirectly(src_dataset, dest_dataset, progress_signal)
+    else:
+        copyHyperslabs(
+            src_dataset,
+            dest_dataset,
+            progress_signal,
+            memory_budget,
+            mapper,
+        )
+
+
+def getCreateOptions(dataset: h5py.Dataset) -> dict:
+    """
+    Get the keyword arguments to create a dataset with the same storage
+    layout and filters as the given one.
+
+    With these options, the raw chunks can be copied directly.
+
+    arguments:
+        dataset: (h5py.Dataset)
+
+    returns:
+        (dict) keyword arguments of h5py.Group.create_dataset.
+    """
+    if dataset.shape == ():
+        return {}
+    options = {'chunks': dataset.chunks}
+    if dataset.chunks is not None:
+        options.update({
+            'compression': dataset.compression,
+            'compression_opts': dataset.compression_opts,
+            'shuffle': dataset.shuffle,
+            'fletcher32': dataset.fletcher32,
+            'scaleoffset': dataset.scaleoffset,
+        })
+    if dataset.dtype.kind in 'biufc':
+        options['fillvalue'] = dataset.fillvalue
+    return options
@@ -21,6 +21,7 @@ import datetime
 
 from PySide6.QtCore import QObject 
 from dateutil import parser as dt_parser
+import numpy as np
 
 from bin.TaskManager import TaskManager 
 from bin.MetaManager import MetaManager
@@ -35,7 +36,14 @@ class TagObject:
         self.length = None
 
 class TagDirectory(TagObject):
-    def __init__(self, parent, name, length, closed, sorted, num_tags):
+    """
+    A tag directory of the .dm4 file.
+
+    The tags in the directory can be loaded lazily. If loader is given, the 
+    directory only records where its tags begin, and the tags are parsed when 
+    they are accessed for the first time.
+    """
+    def __init__(self, parent, name, length, closed, sorted, num_tags, loader = None):
         self.parent_directory = parent
         self.name = name
         self.length = length
@@ -43,15 +51,27 @@ class TagDirectory(TagObject):
         self.closed = closed
         self.sorted = sorted
         self.num_tags = num_tags
-        self.tags = []
+        self._tags = []
+        self._loader = loader   # callable that appends the tags to this directory
 
     def __str__(self):
         return f"Tag Directory: {self.name}, Number of tags: {self.num_tags}, Closed: {self.closed}, Sorted: {self.sorted}"
 
+    @property
+    def tags(self) -> list:
+        if self._loader is not None:
+            loader = self._loader
+            self._loader = None 
+            loader(self)
+        return self._tags
+
+    def is_loaded(self) -> bool:
+        return self._loader is None 
+
     def append_tag(self, tag):
         if isinstance(tag, TagObject):
-            if len(self.tags) < self.num_tags:
-                self.tags.append(tag)
+            if len(self._tags) < self.num_tags:
+                self._tags.append(tag)
             else:
                 raise ValueError("Number of tags exceeded")
         else:
@@ -166,6 +186,15 @@ class Tag(TagObject):
             return len(self.get_data())
         
 class TagArrayData():
+    """
+    Reference to an array in the .dm4 file. 
+
+    Only the offset and the length are recorded when parsing, and the array is 
+    read with a single np.fromfile when requested.
+
+    For arrays of groups, dtype is a list of struct formats of the fields, and
+    read() returns a list of lists, one for each group.
+    """
     def __init__(self, filepath, offset, dtype, dsize, byte_order, number_of_entries):
         self.path = filepath
         self.offset = offset
@@ -174,14 +203,37 @@ class TagArrayData():
         self.byte_order = byte_order
         self.number_of_entries = number_of_entries
 
-    def read(self):
+    @property
+    def numpy_dtype(self) -> np.dtype:
+        if isinstance(self.dtype, str):
+            return np.dtype(self.byte_order + self.dtype)
+        return np.dtype([
+            ('f{0}'.format(ii), self.byte_order + fmt) 
+            for ii, fmt in enumerate(self.dtype)
+        ])
+
+    @property
+    def nbytes(self) -> int:
+        return self.dsize * self.number_of_entries
+
+    def read(self) -> np.ndarray|list:
         with open(self.path, 'rb') as f:
             f.seek(self.offset)
-            data_entries = []
-            for i in range(self.number_of_entries):
-                data = struct.unpack(self.byte_order + self.dtype, f.read(self.dsize))[0]
-                data_entries.append(data)
-            return data_entries
+            data = np.fromfile(f, dtype = self.numpy_dtype, count = self.number_of_entries)
+        if len(data) != self.number_of_entries:
+            raise EOFError(f"Array at offset {self.offset} is truncated.")
+        if isinstance(self.dtype, str):
+            return data 
+        return [list(entry) for entry in data.tolist()]
+
+    # def read(self):
+    #     with open(self.path, 'rb') as f:
+    #         f.seek(self.offset)
+    #         data_entries = []
+    #         for i in range(self.number_of_entries):
+    #             data = struct.unpack(self.byte_order + self.dtype, f.read(self.dsize))[0]
+    #             data_entries.append(data)
+    #         return data_entries
 
     @property    
     def type(self):
@@ -222,6 +274,7 @@ class ParseDM4(QObject):
         self.io = None  # io object
         self.byte_order = '>'  # Default to big-endian ('>' for big-endian, '<' for little-endian)
         self.byte_size = None # Size of the root tag directory 
+        self._file_size = os.path.getsize(file_path) if os.path.isfile(file_path) else 0
 
     @property
     def logger(self) -> Logger:
@@ -253,16 +306,27 @@ class ParseDM4(QObject):
 
         self.logger.debug(f"Header read successfully, DM version: {dm_version}, Root length: {root_len}, Byte order: {self.byte_order}.")
 
-    def read_tag_directory(self, parent_dir_name = None, tag_dir_name=None, tag_dir_len=None):
+    def read_tag_directory(self, parent_dir_name = None, tag_dir_name=None, tag_dir_len=None, lazy = False):
+        """
+        Read a tag directory. 
+        
+        If lazy is True, only the head of the directory is read, and the file 
+        position is moved to the end of the directory using tag_dir_len. The 
+        tags will be parsed when they are accessed.
+        """
         f = self.io
+        dir_start = f.tell()
         # Read the sorted flag (1 byte), closed flag (1 byte), number of tags (8 bytes)
-        sorted_flag = struct.unpack(self.byte_order + 'B', f.read(1))[0]
+        sorted_flag, closed_flag, num_tags = struct.unpack('>BBQ', f.read(10))
         # 1 = sorted, 0 = unsorted
         sorted_flag = True if sorted_flag == 1 else False
-        closed_flag = struct.unpack(self.byte_order + 'B', f.read(1))[0]
         # 1 = open, 0 = closed
         closed_flag = True if closed_flag == 1 else False
-        num_tags = struct.unpack('>Q', f.read(8))[0]
+
+        tags_offset = f.tell()
+        if lazy and num_tags > 0 and self._skip_to(dir_start + tag_dir_len):
+            loader = lambda tagdir: self._load_tags(tagdir, tags_offset)
+            return TagDirectory(parent_dir_name, tag_dir_name, tag_dir_len, closed_flag, sorted_flag, num_tags, loader)
 
         tagdir = TagDirectory(parent_dir_name, tag_dir_name, tag_dir_len, closed_flag, sorted_flag, num_tags)
         
@@ -273,6 +337,43 @@ class ParseDM4(QObject):
 
         return tagdir
 
+    def _skip_to(self, position: int) -> bool:
+        """
+        Move to the end of a directory to skip its tags.
+
+        The length of the directory recorded in the file is trusted only if 
+        the next byte is a valid tag indicator (or the end of the file). 
+        Otherwise the file position is not changed.
+
+        returns:
+            (bool) whether the directory is skipped.
+        """
+        f = self.io
+        current = f.tell()
+        if position < current or position > self._file_size:
+            return False
+        f.seek(position)
+        indicator = f.read(1)
+        if indicator and indicator[0] not in (0, 20, 21):
+            f.seek(current)
+            return False
+        f.seek(position)
+        return True
+
+    def _load_tags(self, tagdir: TagDirectory, tags_offset: int):
+        """
+        Parse the tags of a lazily indexed directory.
+        """
+        with open(self.file_path, 'rb') as f:
+            io, self.io = self.io, f 
+            try:
+                f.seek(tags_offset)
+                for i in range(tagdir.num_tags):
+                    tag = self.parse_tag(tagdir.name)
+                    tagdir.append_tag(tag)
+            finally:
+                self.io = io 
+
     def parse_tag(self, parent_dir_name = None):
         f = self.io
         # A tag starts with 1 byte (tag indicator), 2 bytes (tag name length), and tag name
@@ -294,7 +395,7 @@ class ParseDM4(QObject):
        
         if tag_type == 20:  # Tag Directory
             tag_len = struct.unpack('>Q', f.read(8))[0]
-            tag_object = self.read_tag_directory(parent_dir_name=parent_dir_name, tag_dir_name=tag_name, tag_dir_len=tag_len)
+            tag_object = self.read_tag_directory(parent_dir_name=parent_dir_name, tag_dir_name=tag_name, tag_dir_len=tag_len, lazy=True)
         elif tag_type == 21:  # Tag
             tag_object = self.read_tag(parent_dir_name=parent_dir_name, tag_name = tag_name)
         elif tag_type == 00:  # End of file (8 nulls)
@@ -314,9 +415,7 @@ class ParseDM4(QObject):
 
         # Read the information about the tag
         tag_info_len = struct.unpack('>Q', f.read(8))[0]
-        tag_info = [0] * tag_info_len
-        for i in range(tag_info_len):
-            tag_info[i] = struct.unpack('>q', f.read(8))[0]
+        tag_info = np.frombuffer(f.read(8 * tag_info_len), dtype = '>i8').tolist()
 
         # Read the tag data
         if tag_info_len == 1: # Single data entry
@@ -333,14 +432,10 @@ class ParseDM4(QObject):
                 # Read the number of data entries
                 num_entries = tag_info[2]
 
-                # Read the data entries
-                data_entries = []
-                for i in range(num_entries):
-                    data_type = tagDataType[tag_info[i*2+4]]['format']
-                    data_size = tagDataType[tag_info[i*2+4]]['size']
-                    data = struct.unpack(self.byte_order + data_type, f.read(data_size))[0]
-                    data_entries.append(data)
-                tag_data = data_entries
+                # Read the data entries with one unpack
+                data_types = [tagDataType[tag_info[i*2+4]]['format'] for i in range(num_entries)]
+                group_format = self.byte_order + ''.join(data_types)
+                tag_data = list(struct.unpack(group_format, f.read(struct.calcsize(group_format))))
             elif tag_info[0] == 20: # Array tag
                 if tag_info_len == 3: # Single array
                     data_type = tagDataType[tag_info[1]]['format']
@@ -348,23 +443,19 @@ class ParseDM4(QObject):
                     num_entries = tag_info[2]
 
                     offset = f.tell()
-                    f.read(data_size * num_entries)
+                    f.seek(data_size * num_entries, os.SEEK_CUR)
                     tag_data = TagArrayData(self.file_path, offset, data_type, data_size, self.byte_order, num_entries)
                 else: # Arrays of groups
                     if tag_info[1] != 15:
                         raise TypeError("Expected group of data")
                     num_groups = tag_info[3]
                     array_size = tag_info[-1]
-                    data_entries = []
-                    for i in range(array_size):
-                        struct_entries = []
-                        for j in range(num_groups):
-                            data_type = tagDataType[tag_info[5+j*2]]['format']
-                            data_size = tagDataType[tag_info[5+j*2]]['size']
-                            data = struct.unpack(self.byte_order + data_type, f.read(data_size))[0]
-                            struct_entries.append(data)
-                        data_entries.append(struct_entries)
-                    tag_data = data_entries
+                    data_types = [tagDataType[tag_info[5+j*2]]['format'] for j in range(num_groups)]
+                    group_size = sum(tagDataType[tag_info[5+j*2]]['size'] for j in range(num_groups))
+
+                    offset = f.tell()
+                    f.seek(group_size * array_size, os.SEEK_CUR)
+                    tag_data = TagArrayData(self.file_path, offset, data_types, group_size, self.byte_order, array_size)
             else:
                 raise TypeError("Unknown tag data type", tag_info)
         
@@ -373,9 +464,13 @@ class ParseDM4(QObject):
     def parse(self):
         self.logger.debug("Starting parsing DM4 file...")
         self.open_file()
-        self.read_header()
-        self.logger.debug("Reading root directory of DM4 file...")
-        dm4obj = self.read_tag_directory(parent_dir_name= "", tag_dir_name='/', tag_dir_len=self.byte_size)
+        try:
+            self.read_header()
+            self.logger.debug("Reading root directory of DM4 file...")
+            dm4obj = self.read_tag_directory(parent_dir_name= "", tag_dir_name='/', tag_dir_len=self.byte_size)
+        finally:
+            self.io.close()
+            self.io = None 
         self.logger.debug("Parsing DM4 file completed.")
 
         return dm4obj
@@ -389,6 +484,7 @@ class ImporterDM4(QObject):
 
         self.item_name = item_name
         self.item_parent_path = item_parent_path
+        self.preview = False    # Show preview image while loading
 
         self._scan_i = 1
         self._scan_j = 1 
@@ -551,5 +647,7 @@ class ImporterDM4(QObject):
             parent = self,
             **self.meta,
         )
+        if self.preview:
+            self.task.enablePreview()
         self.task_manager.addTask(self.task)
 
@@ -72,6 +72,7 @@ class ImporterEMPAD(QObject):
         
         self.item_name = item_name 
         self.item_parent_path = item_parent_path
+        self.preview = False    # Show preview image while loading
 
         # pre-defined parameters of EMPAD v1.0.0
         self.scalar_type = 'float'
@@ -362,6 +363,8 @@ class ImporterEMPAD(QObject):
             parent = self, 
             **self.meta,
         )
+        if self.preview:
+            self.task.enablePreview()
         self.task_manager.addTask(self.task)
         
 
@@ -51,6 +51,7 @@ class ImporterHDF5(QObject):
         self.item_parent_path = item_parent_path 
         self.file_path = ''
         self.dataset_path = ''
+        self.preview = False
         
         self.meta = {
             '/General/fourd_explorer_version': '.'.join([str(i) for i in APP_VERSION]),
@@ -120,6 +121,8 @@ class ImporterHDF5(QObject):
             item_name = self.item_name,
             **self.meta,
         )
+        if self.preview:
+            self.task.enablePreview()
         self.task_manager.addTask(self.task)
 
         
@@ -62,6 +62,7 @@ class ImporterMIB(QObject):
         
         self.item_name = item_name 
         self.item_parent_path = item_parent_path
+        self.preview = False    # Show preview image while loading
 
         self._scan_i = 1
         self._scan_j = 1 
@@ -307,4 +308,6 @@ class ImporterMIB(QObject):
             parent = self,
             **self.meta,
         )
+        if self.preview:
+            self.task.enablePreview()
         self.task_manager.addTask(self.task)
@@ -52,6 +52,7 @@ class ImporterNumpy(QObject):
         
         self.item_name = item_name 
         self.item_parent_path = item_parent_path 
+        self.preview = False    # Show preview image while loading
         
         self._scan_i = 1
         self._scan_j = 1 
@@ -60,6 +61,7 @@ class ImporterNumpy(QObject):
         
         self._file_type = 'npy'
         self._file_path = ''
+        self._npz_data_name = None
         self._dtype = 'float'
         
         self._is_flipped = False 
@@ -215,6 +217,9 @@ class ImporterNumpy(QObject):
             self.item_parent_path, 
             self.item_name, 
             self.meta,
-            dtype
+            dtype,
+            npz_data_name = self._npz_data_name,
         ) 
+        if self.preview:
+            self.task.enablePreview()
         self.task_manager.addTask(self.task)
@@ -58,6 +58,7 @@ class ImporterRawFourDSTEM(QObject):
         
         self._item_name = item_name 
         self._item_parent_path = item_parent_path
+        self.preview = False    # Show preview image while loading
 
         self.meta = {}  
 
@@ -133,5 +134,7 @@ class ImporterRawFourDSTEM(QObject):
             parent = self, 
             **self.meta,
         )
+        if self.preview:
+            self.task.enablePreview()
         self.task_manager.addTask(self.task)
 
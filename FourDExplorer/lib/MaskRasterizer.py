@@ -0,0 +1,489 @@
+# -*- coding: utf-8 -*-
+
+"""
+*----------------------------- MaskRasterizer.py -----------------------------*
+把虚拟探测器的几何形状光栅化为衍射图样上的 mask。
+
+以前的 mask 是通过复制 matplotlib 的 patch，再对每个像素调用 Path.contains_points
+得到的，每次使用都要重新计算，而且只有 0 和 1。这里：
+    - 圆形、环形、扇形、矩形、椭圆、正多边形与分段环形都有解析的包含判据，对整个像素
+      网格一次广播计算；
+    - 可以对每个像素做 supersample x supersample 的超采样，得到像素被覆盖的比例作为
+      权重，使 mask 的边缘抗锯齿；
+    - 分段探测器的所有分段一次生成，叠成一个 (分段数, dp_i, dp_j) 的数组；
+    - mask 以几何参数为键缓存，拖动 mask 或者实时预览时，不变的 mask 可以直接复用。
+
+坐标为衍射图样的 (i, j) 像素坐标，像素的中心在整数坐标上。角度的约定与 matplotlib 的
+patch 相同，即在 (x, y) = (j, i) 坐标中从 x 轴逆时针计算，单位为度。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Rasterize the geometries of virtual detectors into masks of the diffraction
+patterns.
+
+The masks used to be calculated by copying the matplotlib patches and calling
+Path.contains_points for every pixel, from scratch at every use, with only 0
+and 1. Here:
+    - Circles, rings, wedges, rectangles, ellipses, regular polygons and
+      segmented rings have closed-form containment tests, broadcast over the
+      whole pixel grid at once.
+    - Every pixel can be supersampled by supersample x supersample points,
+      whose fraction inside is the weight, so the edges are anti-aliased.
+    - All segments of a segmented detector are rasterized at once, stacked
+      into an array of (segments, dp_i, dp_j).
+    - The masks are cached by their geometries, so the unchanged masks are
+      reused while dragging or previewing.
+
+The coordinates are the (i, j) pixel coordinates of the diffraction patterns,
+where the centers of the pixels are at integers. The angles follow the
+matplotlib patches, i.e. counterclockwise from the x-axis in (x, y) = (j, i),
+unit: degree.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*----------------------------- MaskRasterizer.py -----------------------------*
+"""
+
+from functools import lru_cache
+import logging
+from typing import Callable
+
+import numpy as np
+
+from lib.ComputeCache import ComputeCache
+
+
+mask_cache = ComputeCache(max_bytes = 64 * 2**20)
+
+
+class MaskGeometry:
+    """
+    虚拟探测器几何形状的基类。
+
+    Base class of the geometries of virtual detectors. A geometry has a key
+    of all its parameters for caching, and a vectorized containment test.
+    """
+    def __init__(self, center: tuple[float]):
+        """
+        arguments:
+            center: (tuple) (i, j) the center of the shape.
+        """
+        self.center = (float(center[0]), float(center[1]))
+
+    @property
+    def logger(self) -> logging.Logger:
+        # the logger of the application, see bin.Log
+        return logging.getLogger('4D-Explorer')
+
+    def getKey(self) -> tuple:
+        """
+        Returns the name and the parameters of the geometry. Reimplement it in
+        the subclasses.
+
+        returns:
+            (tuple) or None, if the geometry cannot be cached.
+        """
+        self.logger.warning('getKey() should be reimplemented')
+        return None
+
+    def contains(self, ii: np.ndarray, jj: np.ndarray) -> np.ndarray:
+        """
+        Test whether the points are in the shape.
+
+        arguments:
+            ii: (np.ndarray) the i-coordinates.
+
+            jj: (np.ndarray) the j-coordinates, broadcastable with ii.
+
+        returns:
+            (np.ndarray) bool in the broadcast shape.
+        """
+        self.logger.warning('contains() should be reimplemented')
+        return np.zeros(np.broadcast(ii, jj).shape, dtype = bool)
+
+    def getSegments(self) -> list['MaskGeometry']:
+        """
+        Returns the segments of the geometry. Most geometries have only one.
+        """
+        return [self]
+
+    def _getPolar(
+        self,
+        ii: np.ndarray,
+        jj: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # the radius, and the angle from x = j to y = i in degree
+        d_i = ii - self.center[0]
+        d_j = jj - self.center[1]
+        return np.hypot(d_i, d_j), np.degrees(np.arctan2(d_i, d_j))
+
+    def _getLocal(
+        self,
+        ii: np.ndarray,
+        jj: np.ndarray,
+        angle: float,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        # the coordinates along the width and the height of a rotated shape
+        d_i = ii - self.center[0]
+        d_j = jj - self.center[1]
+        cos, sin = np.cos(np.radians(angle)), np.sin(np.radians(angle))
+        return d_j * cos + d_i * sin, d_i * cos - d_j * sin
+
+
+class CircleMask(MaskGeometry):
+    """
+    圆形。
+
+    Circle.
+    """
+    def __init__(self, center: tuple[float], radius: float):
+        super().__init__(center)
+        self.radius = float(radius)
+
+    def getKey(self) -> tuple:
+        return ('Circle', self.center, self.radius)
+
+    def contains(self, ii: np.ndarray, jj: np.ndarray) -> np.ndarray:
+        d_i = ii - self.center[0]
+        d_j = jj - self.center[1]
+        return d_i**2 + d_j**2 <= self.radius**2
+
+
+class RingMask(MaskGeometry):
+    """
+    环形。
+
+    Ring (annulus).
+    """
+    def __init__(
+        self,
+        center: tuple[float],
+        inner_radius: float,
+        outer_radius: float,
+    ):
+        super().__init__(center)
+        self.inner_radius = float(inner_radius)
+        self.outer_radius = float(outer_radius)
+
+    def getKey(self) -> tuple:
+        return ('Ring', self.center, self.inner_radius, self.outer_radius)
+
+    def contains(self, ii: np.ndarray, jj: np.ndarray) -> np.ndarray:
+        r_sq = (ii - self.center[0])**2 + (jj - self.center[1])**2
+        return (r_sq >= self.inner_radius**2) & (r_sq <= self.outer_radius**2)
+
+
+class WedgeMask(MaskGeometry):
+    """
+    扇形。
+
+    Wedge, the part of a ring between theta_1 and theta_2.
+    """
+    def __init__(
+        self,
+        center: tuple[float],
+        inner_radius: float,
+        outer_radius: float,
+        theta_1: float,
+        theta_2: float,
+    ):
+        super().__init__(center)
+        self.inner_radius = float(inner_radius)
+        self.outer_radius = float(outer_radius)
+        self.theta_1 = float(theta_1)
+        self.theta_2 = float(theta_2)
+
+    def getKey(self) -> tuple:
+        return (
+            'Wedge', self.center, self.inner_radius, self.outer_radius,
+            self.theta_1, self.theta_2,
+        )
+
+    def contains(self, ii: np.ndarray, jj: np.ndarray) -> np.ndarray:
+        radius, theta = self._getPolar(ii, jj)
+        in_ring = (radius >= self.inner_radius) & (radius <= self.outer_radius)
+        open_angle = self.theta_2 - self.theta_1
+        if open_angle >= 360:
+            return in_ring
+        in_angle = np.mod(theta - self.theta_1, 360) <= open_angle
+        return in_ring & in_angle
+
+
+class RectangleMask(MaskGeometry):
+    """
+    矩形。
+
+    Rectangle, rotated around its center.
+    """
+    def __init__(
+        self,
+        center: tuple[float],
+        width: float,
+        height: float,
+        angle: float = 0,
+    ):
+        """
+        arguments:
+            center: (tuple) (i, j)
+
+            width: (float) the size along j before rotation.
+
+            height: (float) the size along i before rotation.
+
+            angle: (float) the rotation, unit: degree
+        """
+        super().__init__(center)
+        self.width = float(width)
+        self.height = float(height)
+        self.angle = float(angle)
+
+    def getKey(self) -> tuple:
+        return ('Rectangle', self.center, self.width, self.height, self.angle)
+
+    def contains(self, ii: np.ndarray, jj: np.ndarray) -> np.ndarray:
+        along_w, along_h = self._getLocal(ii, jj, self.angle)
+        return (
+            (np.abs(along_w) <= self.width / 2)
+            & (np.abs(along_h) <= self.height / 2)
+        )
+
+
+class EllipseMask(MaskGeometry):
+    """
+    椭圆。
+
+    Ellipse, rotated around its center.
+    """
+    def __init__(
+        self,
+        center: tuple[float],
+        width: float,
+        height: float,
+        angle: float = 0,
+    ):
+        """
+        arguments:
+            center: (tuple) (i, j)
+
+            width: (float) the diameter along j before rotation.
+
+            height: (float) the diameter along i before rotation.
+
+            angle: (float) the rotation, unit: degree
+        """
+        super().__init__(center)
+        self.width = float(width)
+        self.height = float(height)
+        self.angle = float(angle)
+
+    def getKey(self) -> tuple:
+        return ('Ellipse', self.center, self.width, self.height, self.angle)
+
+    def contains(self, ii: np.ndarray, jj: np.ndarray) -> np.ndarray:
+        if self.width <= 0 or self.height <= 0:
+            return np.zeros(np.broadcast(ii, jj).shape, dtype = bool)
+        along_w, along_h = self._getLocal(ii, jj, self.angle)
+        return (
+            (along_w / (self.width / 2))**2
+            + (along_h / (self.height / 2))**2
+        ) <= 1
+
+
+class RegularPolygonMask(MaskGeometry):
+    """
+    正多边形。
+
+    Regular polygon. As matplotlib.patches.RegularPolygon, the first vertex
+    is at 90 degree plus the orientation.
+    """
+    def __init__(
+        self,
+        center: tuple[float],
+        radius: float,
+        num_vertices: int,
+        orientation: float = 0,
+    ):
+        """
+        arguments:
+            center: (tuple) (i, j)
+
+            radius: (float) the distance from the center to the vertices.
+
+            num_vertices: (int) at least 3.
+
+            orientation: (float) the rotation, unit: degree
+        """
+        super().__init__(center)
+        if int(num_vertices) < 3:
+            raise ValueError('num_vertices must be at least 3, not '
+                '{0}'.format(num_vertices))
+        self.radius = float(radius)
+        self.num_vertices = int(num_vertices)
+        self.orientation = float(orientation)
+
+    def getKey(self) -> tuple:
+        return (
+            'RegularPolygon', self.center, self.radius, self.num_vertices,
+            self.orientation,
+        )
+
+    def contains(self, ii: np.ndarray, jj: np.ndarray) -> np.ndarray:
+        # inside if the projection on the nearest edge normal is within the
+        # apothem
+        radius, theta = self._getPolar(ii, jj)
+        sector = 360 / self.num_vertices
+        first_vertex = 90 + self.orientation
+        offset = np.mod(theta - first_vertex, sector) - sector / 2
+        apothem = self.radius * np.cos(np.pi / self.num_vertices)
+        return radius * np.cos(np.radians(offset)) <= apothem
+
+
+class SegmentMask(MaskGeometry):
+    """
+    分段环形，即分段探测器。
+
+    Segmented ring, i.e. a segmented detector. The segments are wedges with
+    the same open angle, evenly distributed from the rotation angle.
+    """
+    def __init__(
+        self,
+        center: tuple[float],
+        inner_radius: float,
+        outer_radius: float,
+        num_segments: int,
+        open_angle: float,
+        rotation_angle: float = 0,
+    ):
+        super().__init__(center)
+        self.inner_radius = float(inner_radius)
+        self.outer_radius = float(outer_radius)
+        self.num_segments = int(num_segments)
+        self.open_angle = min(360.0, max(0.0, float(open_angle)))
+        self.rotation_angle = float(rotation_angle)
+
+    def getKey(self) -> tuple:
+        return (
+            'Segment', self.center, self.inner_radius, self.outer_radius,
+            self.num_segments, self.open_angle, self.rotation_angle,
+        )
+
+    def getSegments(self) -> list[WedgeMask]:
+        segments = []
+        for ii in range(self.num_segments):
+            theta_1 = self.rotation_angle + 360 / self.num_segments * ii
+            segments.append(WedgeMask(
+                self.center,
+                self.inner_radius,
+                self.outer_radius,
+                theta_1,
+                theta_1 + self.open_angle,
+            ))
+        return segments
+
+    def contains(self, ii: np.ndarray, jj: np.ndarray) -> np.ndarray:
+        contained = np.zeros(np.broadcast(ii, jj).shape, dtype = bool)
+        for segment in self.getSegments():
+            contained |= segment.contains(ii, jj)
+        return contained
+
+
+@lru_cache(maxsize = 8)
+def _getSampleGrid(
+    shape: tuple[int],
+    supersample: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    # the sample points of every pixel, at the centers of its sub-pixels
+    offsets = (np.arange(supersample) + 0.5) / supersample - 0.5
+    ii = (np.arange(shape[0])[:, None] + offsets[None, :]).reshape(-1, 1)
+    jj = (np.arange(shape[1])[:, None] + offsets[None, :]).reshape(1, -1)
+    ii.flags.writeable = False
+    jj.flags.writeable = False
+    return ii, jj
+
+
+def _rasterize(
+    geometry: MaskGeometry,
+    shape: tuple[int],
+    supersample: int,
+) -> np.ndarray:
+    ii, jj = _getSampleGrid(shape, supersample)
+    contained = geometry.contains(ii, jj)
+    if supersample == 1:
+        return contained.astype('float64')
+    return contained.reshape(
+        shape[0], supersample, shape[1], supersample
+    ).mean(axis = (1, 3))
+
+
+def _getCachedMask(key: tuple, func: Callable) -> np.ndarray:
+    # geometries without keys are rasterized every time
+    if key[1] is None:
+        mask = func()
+        mask.flags.writeable = False
+        return mask
+    return mask_cache.get(key, func)
+
+
+def rasterizeMask(
+    geometry: MaskGeometry,
+    shape: tuple[int],
+    supersample: int = 1,
+) -> np.ndarray:
+    """
+    Rasterize the geometry into a mask. The masks are cached by the geometry,
+    the shape and the supersampling, and are read-only.
+
+    arguments:
+        geometry: (MaskGeometry)
+
+        shape: (tuple) (dp_i, dp_j)
+
+        supersample: (int) the number of sample points of every pixel along
+            each axis. If 1, the mask is 1 where the center of the pixel is
+            in the shape, otherwise 0. If larger, the mask is the fraction of
+            the pixel covered by the shape.
+
+    returns:
+        (np.ndarray) float64 in the shape (dp_i, dp_j), in [0, 1]
+    """
+    shape = (int(shape[0]), int(shape[1]))
+    supersample = int(supersample)
+    if supersample < 1:
+        raise ValueError('supersample must be a positive integer')
+    return _getCachedMask(
+        ('Mask', geometry.getKey(), shape, supersample),
+        lambda: _rasterize(geometry, shape, supersample),
+    )
+
+
+def rasterizeSegments(
+    geometry: MaskGeometry,
+    shape: tuple[int],
+    supersample: int = 1,
+) -> np.ndarray:
+    """
+    Rasterize all segments of the geometry (e.g. a segmented detector) into
+    a stack of masks, cached as rasterizeMask.
+
+    arguments:
+        geometry: (MaskGeometry)
+
+        shape: (tuple) (dp_i, dp_j)
+
+        supersample: (int) see rasterizeMask
+
+    returns:
+        (np.ndarray) float64 in the shape (segments, dp_i, dp_j)
+    """
+    shape = (int(shape[0]), int(shape[1]))
+    supersample = int(supersample)
+    if supersample < 1:
+        raise ValueError('supersample must be a positive integer')
+    return _getCachedMask(
+        ('Segments', geometry.getKey(), shape, supersample),
+        lambda: np.stack([
+            _rasterize(segment, shape, supersample)
+            for segment in geometry.getSegments()
+        ]),
+    )
@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+
+"""
+*---------------------------- MerlinStream.py --------------------------------*
+通过 TCP 接收 MerlinEM (Medipix3) 相机实时输出的帧。
+
+Merlin 的数据端口上传输的每条消息都具有如下格式：
+    MPX,<10 位十进制长度>,<消息>
+其中长度是紧随其后的逗号之后的消息字节数。消息分为两类：
+    - 以 'HDR,' 开头的采集头，是与 .hdr 文件相同的文本；
+    - 以 'MQ1,' 开头的帧，由帧头 (384 或 768 字节，与 .mib 文件中的帧头相同) 以及
+      紧随其后的图像数据组成。
+
+为了在没有电镜的情况下进行测试，这里还提供了一个回放 .mib 文件的本地服务器。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Receive frames from the MerlinEM (Medipix3) camera through TCP while the
+microscope is still scanning.
+
+Every message on the data port of Merlin has the format:
+    MPX,<10 digits length>,<message>
+where length is the number of bytes of the message after the trailing comma.
+There are two kinds of messages:
+    - the acquisition header starting with 'HDR,', which is the same text as
+      the .hdr file;
+    - the frame starting with 'MQ1,', which consists of the frame head (384 or
+      768 bytes, the same as the head in .mib files) and the image data.
+
+In order to test without a microscope, a local stand-in server replaying a
+.mib file is also provided here.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*---------------------------- MerlinStream.py --------------------------------*
+"""
+
+import os
+import socket
+import threading
+
+import numpy as np
+
+
+MPX_PREFIX_LENGTH = 15      # len(b'MPX,0000000000,')
+
+_mib_pixel_depth = {
+    'U01': 1,
+    'U08': 1,
+    'U16': 2,
+    'U32': 4,
+}
+
+
+def parseMerlinFrameHead(head: bytes, little_endian: bool = True) -> dict:
+    """
+    Parse the head of one frame, either from the .mib file or from the TCP
+    message.
+
+    The keys of the returned dict are:
+        sequence: (int) the sequence number of the frame, starting from 1
+        head_size: (int) 384 or 768 bytes
+        dp_i: (int)
+        dp_j: (int)
+        dtype: (np.dtype) the dtype of the image data
+
+    arguments:
+        head: (bytes) the head of the frame. Only the first 384 bytes are
+            needed.
+
+        little_endian: (bool) the byte order of the image data. Default is
+            True, the same as ImporterMIB.
+
+    returns:
+        (dict)
+
+    raises:
+        ValueError: the head is not a Merlin frame head.
+
+        NotImplementedError: the pixel depth is not supported.
+    """
+    head_str = head[:384].decode('ascii', errors = 'ignore')
+    fields = head_str.split(',')
+    if len(fields) < 7 or fields[0] != 'MQ1':
+        raise ValueError('Not a Merlin frame head: {0}'.format(head_str[:32]))
+    if fields[6] not in _mib_pixel_depth:
+        raise NotImplementedError(
+            'Unsupported data type: {0}'.format(fields[6])
+        )
+    scalar_size = _mib_pixel_depth[fields[6]]
+    if scalar_size == 1:
+        dtype = np.dtype('u1')
+    elif little_endian:
+        dtype = np.dtype('<u{0}'.format(scalar_size))
+    else:
+        dtype = np.dtype('>u{0}'.format(scalar_size))
+
+    return {
+        'sequence': int(fields[1]),
+        'head_size': int(fields[2]),
+        'dp_i': int(fields[4]),
+        'dp_j': int(fields[5]),
+        'dtype': dtype,
+    }
+
+
+def parseMerlinAcquisitionHeader(header: bytes|str) -> dict:
+    """
+    Parse the acquisition header, i.e. the content of the .hdr file.
+
+    arguments:
+        header: (bytes or str) the text of the acquisition header, with or
+            without the leading 'HDR,'.
+
+    returns:
+        (dict) keys and values are both str, e.g.
+            {'Frames per Trigger (Number)': '256', ...}
+    """
+    if isinstance(header, bytes):
+        header = header.decode('ascii', errors = 'ignore')
+    hdr_meta = {}
+    for line in header.splitlines():
+        line = line.strip('\x00')
+        if line.startswith('HDR') or line.startswith('END'):
+            continue
+        if ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        hdr_meta[key.strip()] = value.strip()
+    return hdr_meta
+
+
+class MerlinFrameStream(object):
+    """
+    从 Merlin 的 TCP 数据端口读取帧的客户端。
+
+    A client reading frames from the TCP data port of Merlin.
+
+    Usage:
+        with MerlinFrameStream('127.0.0.1', 6342) as stream:
+            header = stream.readAcquisitionHeader()
+            for sequence, frame in stream:
+                ...
+
+    The frame arrays yielded are newly allocated, so they can be put into a
+    queue and consumed by another thread.
+
+    attributes:
+        host: (str)
+
+        port: (int)
+
+        dp_i: (int) known after the first frame is received.
+
+        dp_j: (int) known after the first frame is received.
+
+        dtype: (np.dtype) known after the first frame is received.
+    """
+    def __init__(
+        self,
+        host: str,
+        port: int = 6342,
+        timeout: float = 10.0,
+        little_endian: bool = True,
+    ):
+        """
+        arguments:
+            host: (str) the address of the Merlin PC.
+
+            port: (int) the data port, default is 6342.
+
+            timeout: (float) seconds to wait before a socket operation fails.
+
+            little_endian: (bool) the byte order of the image data.
+        """
+        self.host = host
+        self.port = port
+        self._timeout = timeout
+        self._little_endian = little_endian
+        self._socket = None
+        self._prefix = bytearray(MPX_PREFIX_LENGTH)
+        self.dp_i = None
+        self.dp_j = None
+        self.dtype = None
+
+    def __enter__(self) -> 'MerlinFrameStream':
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            frame = self.readFrame()
+            if frame is None:
+                return
+            yield frame
+
+    def connect(self):
+        """
+        Connect to the data port.
+        """
+        self._socket = socket.create_connection(
+            (self.host, self.port),
+            timeout = self._timeout,
+        )
+
+    def close(self):
+        """
+        Close the connection. It is safe to call this method from another
+        thread to interrupt a blocking read.
+        """
+        if self._socket is not None:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            self._socket = None
+
+    def _readExactly(self, buffer: memoryview) -> bool:
+        """
+        Fill the buffer with bytes from the socket.
+
+        arguments:
+            buffer: (memoryview) writable buffer.
+
+        returns:
+            (bool) False if the connection is closed before any byte is read.
+
+        raises:
+            ConnectionError: the connection is closed in the middle of the
+                buffer.
+        """
+        sock = self._socket
+        if sock is None:
+            return False
+        total = len(buffer)
+        received = 0
+        while received < total:
+            count = sock.recv_into(buffer[received:], total - received)
+            if count == 0:
+                if received == 0:
+                    return False
+                raise ConnectionError(
+                    'Connection closed in the middle of a message.'
+                )
+            received += count
+        return True
+
+    def _readMessageLength(self) -> int|None:
+        """
+        Read the 'MPX,<length>,' prefix.
+
+        returns:
+            (int or None) the length of the following message. None if the
+                connection is closed.
+        """
+        if not self._readExactly(memoryview(self._prefix)):
+            return None
+        if self._prefix[:4] != b'MPX,' or self._prefix[14:15] != b',':
+            raise ValueError(
+                'Invalid Merlin message prefix: {0}'.format(bytes(self._prefix))
+            )
+        return int(self._prefix[4:14])
+
+    def readMessage(self) -> bytearray|None:
+        """
+        Read one whole message.
+
+        returns:
+            (bytearray or None) None if the connection is closed.
+        """
+        length = self._readMessageLength()
+        if length is None:
+            return None
+        message = bytearray(length)
+        if not self._readExactly(memoryview(message)):
+            raise ConnectionError('Connection closed before the message.')
+        return message
+
+    def readAcquisitionHeader(self) -> dict:
+        """
+        Read the acquisition header, which is sent once before frames.
+
+        returns:
+            (dict) see parseMerlinAcquisitionHeader.
+        """
+        message = self.readMessage()
+        if message is None:
+            raise ConnectionError('Connection closed before the header.')
+        if not message.startswith(b'HDR'):
+            raise ValueError('The first message is not an acquisition header.')
+        return parseMerlinAcquisitionHeader(bytes(message))
+
+    def readFrame(self) -> tuple[int, np.ndarray]|None:
+        """
+        Read one frame. Acquisition headers between frames are skipped.
+
+        The image data are received directly into the returned array, so
+        there is no extra copy.
+
+        returns:
+            (tuple or None) (sequence, frame), where frame is np.ndarray with
+                shape (dp_i, dp_j). None if the connection is closed.
+        """
+        while True:
+            length = self._readMessageLength()
+            if length is None:
+                return None
+            message_type = bytearray(4)
+            if not self._readExactly(memoryview(message_type)):
+                raise ConnectionError('Connection closed before the frame.')
+            if message_type == b'HDR,':
+                rest = bytearray(length - 4)
+                self._readExactly(memoryview(rest))
+                continue
+            head_start = message_type + bytearray(380)
+            self._readExactly(memoryview(head_start)[4:])
+            info = parseMerlinFrameHead(
+                bytes(head_start),
+                self._little_endian,
+            )
+            if info['head_size'] > 384:
+                rest_of_head = bytearray(info['head_size'] - 384)
+                self._readExactly(memoryview(rest_of_head))
+
+            self.dp_i, self.dp_j = info['dp_i'], info['dp_j']
+            self.dtype = info['dtype']
+            frame = np.empty((self.dp_i, self.dp_j), dtype = self.dtype)
+            if frame.nbytes != length - info['head_size']:
+                raise ValueError(
+                    'Frame {0}: data length {1} does not match the head'
+                    ''.format(info['sequence'], length - info['head_size'])
+                )
+            if not self._readExactly(memoryview(frame.view(np.uint8).ravel())):
+                raise ConnectionError('Connection closed before frame data.')
+            return info['sequence'], frame
+
+
+class MerlinReplayServer(object):
+    """
+    回放 .mib 文件的本地服务器，用于在没有电镜的情况下测试实时采集。
+
+    A local stand-in server replaying a .mib file, to test live acquisition
+    without the microscope.
+
+    The server accepts one client, sends the acquisition header (the companion
+    .hdr file if exists, otherwise a minimal one), and then every frame in the
+    .mib file as a Merlin TCP message. After the last frame the connection is
+    closed.
+
+    Usage:
+        server = MerlinReplayServer('data.mib', port = 0)
+        server.start()
+        ... connect to ('127.0.0.1', server.port)
+        server.stop()
+    """
+    def __init__(
+        self,
+        mib_path: str,
+        host: str = '127.0.0.1',
+        port: int = 6342,
+        frame_interval: float = 0,
+    ):
+        """
+        arguments:
+            mib_path: (str) the .mib file to be replayed.
+
+            host: (str) the address to listen.
+
+            port: (int) the port to listen. Use 0 to choose a free port
+                automatically, and get it by self.port.
+
+            frame_interval: (float) seconds to wait between two frames, to
+                mimic the dwell time.
+        """
+        self._mib_path = mib_path
+        self._frame_interval = frame_interval
+        self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server_socket.setsockopt(
+            socket.SOL_SOCKET, socket.SO_REUSEADDR, 1
+        )
+        self._server_socket.bind((host, port))
+        self._server_socket.listen(1)
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def port(self) -> int:
+        return self._server_socket.getsockname()[1]
+
+    def start(self):
+        """
+        Start serving in a daemon thread.
+        """
+        self._thread = threading.Thread(target = self._serve, daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop serving and close the listening socket.
+        """
+        self._stop_event.set()
+        self._server_socket.close()
+        if self._thread is not None:
+            self._thread.join(timeout = 5)
+
+    def _readHeader(self, frame_number: int) -> bytes:
+        """
+        Read the companion .hdr file, or create a minimal header.
+        """
+        hdr_path = os.path.splitext(self._mib_path)[0] + '.hdr'
+        if os.path.isfile(hdr_path):
+            with open(hdr_path, 'rb') as hdr_file:
+                return hdr_file.read()
+        return (
+            'HDR,\t\n'
+            'Frames in Acquisition (Number):\t{0}\n'
+            'End\t\n'.format(frame_number)
+        ).encode('ascii')
+
+    @staticmethod
+    def _packMessage(message: bytes) -> bytes:
+        return b'MPX,' + b'%010d' % len(message) + b',' + message
+
+    def _serve(self):
+        try:
+            connection, _address = self._server_socket.accept()
+        except OSError:
+            return
+        with connection, open(self._mib_path, 'rb') as mib_file:
+            info = parseMerlinFrameHead(mib_file.read(384))
+            frame_size = (
+                info['head_size'] +
+                info['dp_i'] * info['dp_j'] * info['dtype'].itemsize
+            )
+            file_size = os.path.getsize(self._mib_path)
+            frame_number = file_size // frame_size
+            mib_file.seek(0)
+            try:
+                connection.sendall(
+                    self._packMessage(self._readHeader(frame_number))
+                )
+                for _ in range(frame_number):
+                    if self._stop_event.is_set():
+                        break
+                    connection.sendall(
+                        self._packMessage(mib_file.read(frame_size))
+                    )
+                    if self._frame_interval > 0:
+                        self._stop_event.wait(self._frame_interval)
+            except OSError:
+                pass
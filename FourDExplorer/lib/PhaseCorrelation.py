@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+"""
+*--------------------------- PhaseCorrelation.py -----------------------------*
+用相位相关 (phase correlation) 配准衍射图样，测量衍射盘的亚像素平移。
+
+质心法会受到明场盘内部衍射衬度的影响，而 FDDNet 需要逐张图像做神经网络推理。这里把每张
+衍射图样 (或者它的边缘) 与模板 (例如平均衍射图样) 做互相关：
+    - 一块衍射图样沿最后两个维度做批量 FFT，模板的 FFT 只计算一次并缓存；
+    - 互功率谱 (可以部分白化) 做逆 FFT，其峰值给出整像素的平移；
+    - 在峰值附近用矩阵乘法形式的上采样 DFT 计算局部的互相关，得到亚像素精度。
+        M. Guizar-Sicairos, S. T. Thurman, J. R. Fienup.
+        Optics Letters 33 (2008) 156-158
+结果是与 TaskFourDSTEMAlignMapping 兼容的平移矢量分布。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Register diffraction patterns by phase correlation, to measure the sub-pixel
+shifts of the diffraction disks.
+
+The Center of Mass is biased by the diffraction contrast inside the bright
+field disk, while FDDNet needs a network inference per pattern. Here every
+pattern (or its edges) is cross-correlated with a template, like the mean
+pattern:
+    - A block of patterns is transformed by batched FFTs over the last two
+      axes. The FFT of the template is calculated once and cached.
+    - The cross power spectrum (optionally partially whitened) is
+      transformed back, whose peak is the shift in whole pixels.
+    - The cross correlation around the peak is calculated by an upsampled DFT
+      in the form of matrix products, for sub-pixel precision.
+        M. Guizar-Sicairos, S. T. Thurman, J. R. Fienup.
+        Optics Letters 33 (2008) 156-158
+The result is a shift mapping compatible with TaskFourDSTEMAlignMapping.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*--------------------------- PhaseCorrelation.py -----------------------------*
+"""
+
+from PySide6.QtCore import Signal
+import h5py
+import numpy as np
+from scipy import fft as sp_fft
+
+from bin.MemoryBudget import getMemoryBudget
+from lib.DiffractionAlignment import PatternCenterOfMass
+
+
+def EdgeFilter(patterns: np.ndarray) -> np.ndarray:
+    """
+    Returns the gradient magnitude of the patterns (central differences over
+    the last two axes), which keeps the edges of the diffraction disks and
+    drops the contrast inside them.
+
+    arguments:
+        patterns: (np.ndarray) in the shape (..., dp_i, dp_j)
+
+    returns:
+        (np.ndarray) in the same shape
+    """
+    grad_i = np.zeros_like(patterns, dtype = 'float64')
+    grad_j = np.zeros_like(patterns, dtype = 'float64')
+    grad_i[..., 1:-1, :] = (patterns[..., 2:, :] - patterns[..., :-2, :]) / 2
+    grad_j[..., :, 1:-1] = (patterns[..., :, 2:] - patterns[..., :, :-2]) / 2
+    return np.hypot(grad_i, grad_j)
+
+
+def UpsampledDFT(
+    spectra: np.ndarray,
+    region_size: int,
+    upsample_factor: int,
+    offsets: np.ndarray,
+) -> np.ndarray:
+    """
+    Calculate the inverse DFT of a batch of spectra on a small region of an
+    upsampled grid, by two matrix products instead of a padded FFT.
+
+    arguments:
+        spectra: (np.ndarray) in the shape (B, M, N)
+
+        region_size: (int) the size of the region, in upsampled pixels.
+
+        upsample_factor: (int)
+
+        offsets: (np.ndarray) the upsampled coordinates of the first pixel of
+            the region of every spectrum, in the shape (B, 2).
+
+    returns:
+        (np.ndarray) in the shape (B, region_size, region_size)
+    """
+    _, height, width = spectra.shape
+    region = np.arange(region_size)
+    kernel_j = np.exp(2j * np.pi * (
+        (region[None, :, None] + offsets[:, 1, None, None])
+        * np.fft.fftfreq(width, upsample_factor)[None, None, :]
+    ))
+    kernel_i = np.exp(2j * np.pi * (
+        (region[None, :, None] + offsets[:, 0, None, None])
+        * np.fft.fftfreq(height, upsample_factor)[None, None, :]
+    ))
+    # (B, M, N) x (B, R, N) -> (B, M, R), then (B, R, M) x (B, M, R)
+    partial = np.matmul(spectra, np.swapaxes(kernel_j, 1, 2))
+    return np.matmul(kernel_i, partial)
+
+
+class PhaseCorrelationRegistration:
+    """
+    用相位相关把衍射图样配准到模板。
+
+    Register diffraction patterns to a template by phase correlation.
+
+    The shift of a pattern is where the pattern equals the template moved by
+    it, i.e. a disk at template_disk + shift. With a reference shift (the
+    position of the disk in the template relative to the center of the
+    pattern), the shifts are relative to the center of the patterns, as in
+    DiffractionAlignment.MeasureDiskShifts.
+
+    Usage:
+        registration = PhaseCorrelationRegistration(mean_pattern)
+        shifts = registration.register(patterns)    # (B, 2)
+    """
+    def __init__(
+        self,
+        template: np.ndarray,
+        upsample_factor: int = 20,
+        edge_filter: bool = False,
+        whitening: float = 0,
+        reference_shift: tuple[float] = None,
+        workers: int = None,
+    ):
+        """
+        arguments:
+            template: (np.ndarray) in the shape (dp_i, dp_j), e.g. the mean
+                pattern.
+
+            upsample_factor: (int) the shifts are measured to 1/upsample_factor
+                pixel. If 1, only whole pixels.
+
+            edge_filter: (bool) whether to correlate the edges (gradient
+                magnitude) of the patterns instead of the patterns.
+
+            whitening: (float) the power of the magnitude of the cross power
+                spectrum that is divided out, in [0, 1]. 0 is the cross 
+                correlation, and 1 is the phase correlation, which is sharper
+                but biases the sub-pixel peak of smooth disks by a few 
+                hundredths of a pixel.
+
+            reference_shift: (tuple) the position of the disk in the template
+                relative to the center of the pattern, added to the shifts.
+                If None, the Center of Mass of the template is used.
+
+            workers: (int) the number of threads of the FFT, see scipy.fft
+        """
+        template = np.asarray(template, dtype = 'float64')
+        if template.ndim != 2:
+            raise ValueError('template must be a 2D array')
+        upsample_factor = int(upsample_factor)
+        if upsample_factor < 1:
+            raise ValueError('upsample_factor must be a positive integer')
+        if not 0 <= whitening <= 1:
+            raise ValueError('whitening must be in [0, 1], not '
+                '{0}'.format(whitening))
+        self._shape = template.shape
+        self._upsample_factor = upsample_factor
+        self._edge_filter = edge_filter
+        self._whitening = float(whitening)
+        self._workers = workers
+        if reference_shift is None:
+            reference_shift = PatternCenterOfMass(template)
+        self._reference_shift = np.asarray(reference_shift, dtype = 'float64')
+        if edge_filter:
+            template = EdgeFilter(template)
+        # the cached conjugate spectrum of the template
+        self._template_spectrum = np.conj(
+            sp_fft.fft2(template, workers = workers)
+        )
+
+    @property
+    def shape(self) -> tuple[int]:
+        return self._shape
+
+    @property
+    def upsample_factor(self) -> int:
+        return self._upsample_factor
+
+    def _crossPowerSpectrum(self, patterns: np.ndarray) -> np.ndarray:
+        patterns = np.asarray(patterns, dtype = 'float64')
+        if self._edge_filter:
+            patterns = EdgeFilter(patterns)
+        spectra = sp_fft.fft2(patterns, workers = self._workers)
+        spectra *= self._template_spectrum
+        if self._whitening > 0:
+            magnitude = np.maximum(np.abs(spectra), np.finfo('float64').eps)
+            spectra /= magnitude ** self._whitening
+        return spectra
+
+    def register(self, patterns: np.ndarray) -> np.ndarray:
+        """
+        Measure the shifts of a batch of patterns.
+
+        arguments:
+            patterns: (np.ndarray) in the shape (..., dp_i, dp_j)
+
+        returns:
+            (np.ndarray) in the shape (..., 2)
+        """
+        patterns = np.asarray(patterns)
+        if patterns.shape[-2:] != self._shape:
+            raise ValueError('the patterns must be in the shape {0}, not '
+                '{1}'.format(self._shape, patterns.shape[-2:]))
+        batch_shape = patterns.shape[:-2]
+        height, width = self._shape
+        spectra = self._crossPowerSpectrum(patterns.reshape(-1, height, width))
+        batch = spectra.shape[0]
+
+        correlation = sp_fft.ifft2(spectra, workers = self._workers)
+        peaks = np.argmax(
+            np.abs(correlation).reshape(batch, -1), axis = 1
+        )
+        shifts = np.stack(np.unravel_index(peaks, self._shape), axis = 1)
+        shifts = shifts.astype('float64')
+        midpoints = np.array([height // 2, width // 2])
+        size = np.array([height, width])
+        shifts = np.where(shifts > midpoints, shifts - size, shifts)
+
+        factor = self._upsample_factor
+        if factor > 1:
+            # search a region of 1.5 pixels around the peak
+            shifts = np.round(shifts * factor) / factor
+            region_size = int(np.ceil(factor * 1.5))
+            center = np.fix(region_size / 2)
+            offsets = shifts * factor - center
+            local = UpsampledDFT(spectra, region_size, factor, offsets)
+            peaks = np.argmax(np.abs(local).reshape(batch, -1), axis = 1)
+            maxima = np.stack(
+                np.unravel_index(peaks, local.shape[1:]), axis = 1
+            )
+            shifts = shifts + (maxima - center) / factor
+
+        shifts = shifts + self._reference_shift
+        return shifts.reshape(batch_shape + (2,))
+
+
+def MeanDiffractionPattern(
+    data_object: np.ndarray|h5py.Dataset,
+    progress_signal: Signal = None,
+) -> np.ndarray:
+    """
+    Calculate the mean diffraction pattern, reading the dataset in slabs of
+    scanning rows.
+
+    arguments:
+        data_object: (np.ndarray or h5py.Dataset) the 4D-STEM dataset
+
+        progress_signal: (Signal) emits the progress in percentage.
+
+    returns:
+        (np.ndarray) in the shape (dp_i, dp_j)
+    """
+    scan_i, scan_j, dp_i, dp_j = data_object.shape
+    total = np.zeros((dp_i, dp_j))
+    row_bytes = scan_j * dp_i * dp_j * 8
+    with getMemoryBudget().request(row_bytes, scan_i, copies = 2) as alloc:
+        for start in range(0, scan_i, alloc.units):
+            block = data_object[start:start + alloc.units]
+            total += np.sum(block, axis = (0, 1), dtype = 'float64')
+            if progress_signal is not None:
+                progress_signal.emit(
+                    int(min(start + alloc.units, scan_i) / scan_i * 100)
+                )
+    return total / (scan_i * scan_j)
+
+
+def RegisterDiffractionPatterns(
+    data_object: np.ndarray|h5py.Dataset,
+    registration: PhaseCorrelationRegistration,
+    progress_signal: Signal = None,
+) -> np.ndarray:
+    """
+    Measure the shifts of all of the diffraction patterns, reading the
+    dataset in slabs of scanning rows sized by the memory budget.
+
+    arguments:
+        data_object: (np.ndarray or h5py.Dataset) the 4D-STEM dataset
+
+        registration: (PhaseCorrelationRegistration)
+
+        progress_signal: (Signal) emits the progress in percentage.
+
+    returns:
+        (np.ndarray) the shift mapping in the shape (2, scan_i, scan_j)
+    """
+    scan_i, scan_j, dp_i, dp_j = data_object.shape
+    shift_map = np.zeros((2, scan_i, scan_j))
+    # the slab, the complex spectra and the correlations
+    row_bytes = scan_j * dp_i * dp_j * 8
+    with getMemoryBudget().request(row_bytes, scan_i, copies = 6) as alloc:
+        for start in range(0, scan_i, alloc.units):
+            block = data_object[start:start + alloc.units]
+            stop = start + block.shape[0]
+            shifts = registration.register(block)
+            shift_map[0, start:stop] = shifts[..., 0]
+            shift_map[1, start:stop] = shifts[..., 1]
+            if progress_signal is not None:
+                progress_signal.emit(int(stop / scan_i * 100))
+    return shift_map
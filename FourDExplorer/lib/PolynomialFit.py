@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+
+"""
+*----------------------------- PolynomialFit.py ------------------------------*
+用扫描位置的多项式拟合各种分布 (平移矢量、FDDNet 得到的椭圆参数等)。
+
+以前每一处拟合都用 scipy.optimize.curve_fit 与 Python 函数形式的模型，逐个分量迭代
+求解。多项式模型对参数是线性的，所以这里：
+    - 设计矩阵 (design matrix) 只构造一次，扫描网格上的设计矩阵会被缓存；
+    - 用 lstsq 一次求解，多个分量 (例如 ci, cj, a, b, angle) 作为多个右端项同时拟合；
+    - 多项式的阶数可以任意选择；
+    - 可以使用稳健拟合：Huber 权重的迭代重加权最小二乘，或者 RANSAC，以去掉 FDDNet
+      推理失败的点。一个点的所有分量共用同一个权重，因为推理失败时所有分量都不可信。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Fit mappings (shift vectors, ellipse parameters of FDDNet, etc.) with
+polynomials of the scanning location.
+
+Every fitting used to call scipy.optimize.curve_fit with a model as a Python
+function, solving the components one by one iteratively. The polynomials are
+linear in their parameters, so here:
+    - The design matrix is built once, and the one on the scanning grid is
+      cached.
+    - It is solved by lstsq at once, with several components (e.g. ci, cj,
+      a, b, angle) as multiple right-hand sides.
+    - The order of the polynomial is arbitrary.
+    - The fitting can be robust: iteratively reweighted least squares with
+      Huber weights, or RANSAC, to discard the points where FDDNet fails. All
+      components of a point share the weight, since none of them can be
+      trusted when the inference fails.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*----------------------------- PolynomialFit.py ------------------------------*
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+
+# The exponents (p, q) of i^p j^q in the order of the parameters of
+# DiffractionAlignment.linearModel and DiffractionAlignment.quadraticModel
+LINEAR_EXPONENTS = ((1, 0), (0, 1), (0, 0))
+QUADRATIC_EXPONENTS = ((2, 0), (0, 2), (1, 1), (1, 0), (0, 1), (0, 0))
+
+_named_exponents = {
+    'Linear': LINEAR_EXPONENTS,
+    'Quadratic': QUADRATIC_EXPONENTS,
+}
+
+
+def getPolynomialExponents(order: int|str) -> tuple[tuple[int]]:
+    """
+    Get the exponents of the terms of a 2D polynomial.
+
+    arguments:
+        order: (int or str) the order, or 'Linear' or 'Quadratic' for the
+            terms in the order of linearModel and quadraticModel.
+
+    returns:
+        (tuple) ((p, q), ...) for the terms i^p j^q, p + q <= order. The
+            higher orders come first.
+
+    raises:
+        ValueError: if the order is not known.
+    """
+    if isinstance(order, str):
+        if order not in _named_exponents:
+            raise ValueError('order must be an integer, \'Linear\' or '
+                '\'Quadratic\', not {0}'.format(order))
+        return _named_exponents[order]
+    order = int(order)
+    if order < 0:
+        raise ValueError('order must be non-negative, not {0}'.format(order))
+    return tuple(
+        (degree - qq, qq)
+        for degree in range(order, -1, -1)
+        for qq in range(degree + 1)
+    )
+
+
+def createDesignMatrix(
+    locations: np.ndarray,
+    exponents: tuple[tuple[int]],
+) -> np.ndarray:
+    """
+    Create the design matrix of a polynomial.
+
+    arguments:
+        locations: (np.ndarray) in the shape (n, 2), the (i, j) of the points.
+
+        exponents: (tuple) ((p, q), ...), see getPolynomialExponents
+
+    returns:
+        (np.ndarray) in the shape (n, terms)
+    """
+    locations = np.asarray(locations, dtype = 'float64')
+    max_power = max(max(p, q) for p, q in exponents)
+    # the powers are calculated once and reused by all of the terms
+    powers_i = locations[:, 0, None] ** np.arange(max_power + 1)
+    powers_j = locations[:, 1, None] ** np.arange(max_power + 1)
+    return np.stack(
+        [powers_i[:, p] * powers_j[:, q] for p, q in exponents], axis = 1
+    )
+
+
+@lru_cache(maxsize = 8)
+def getGridDesignMatrix(
+    scan_i: int,
+    scan_j: int,
+    exponents: tuple[tuple[int]],
+) -> np.ndarray:
+    """
+    Get the design matrix of all points of the scanning grid, in the order
+    of np.ndindex(scan_i, scan_j). It is cached and read-only.
+
+    returns:
+        (np.ndarray) in the shape (scan_i * scan_j, terms)
+    """
+    i_grid, j_grid = np.meshgrid(
+        np.arange(scan_i), np.arange(scan_j), indexing = 'ij'
+    )
+    locations = np.stack([i_grid.ravel(), j_grid.ravel()], axis = 1)
+    design = createDesignMatrix(locations, exponents)
+    design.flags.writeable = False
+    return design
+
+
+def _solveWeighted(
+    design: np.ndarray,
+    values: np.ndarray,
+    weights: np.ndarray = None,
+) -> np.ndarray:
+    """
+    Solve the (weighted) least squares with the columns of the design matrix
+    normalized, which keeps the higher orders well conditioned.
+    """
+    norms = np.linalg.norm(design, axis = 0)
+    norms[norms == 0] = 1
+    design = design / norms
+    if weights is not None:
+        root = np.sqrt(weights)[:, None]
+        design = design * root
+        values = values * root
+    coefficients, *_ = np.linalg.lstsq(design, values, rcond = None)
+    return coefficients / norms[:, None]
+
+
+def _robustScale(residuals: np.ndarray) -> np.ndarray:
+    # the normalized median absolute deviation of every component
+    median = np.median(residuals, axis = 0)
+    scale = 1.4826 * np.median(np.abs(residuals - median), axis = 0)
+    return np.maximum(scale, np.finfo('float64').eps)
+
+
+def _fitHuber(
+    design: np.ndarray,
+    values: np.ndarray,
+    tuning: float,
+    max_iterations: int,
+    tolerance: float,
+) -> np.ndarray:
+    coefficients = _solveWeighted(design, values)
+    for _ in range(max_iterations):
+        residuals = values - design @ coefficients
+        deviation = np.max(
+            np.abs(residuals) / _robustScale(residuals), axis = 1
+        )
+        weights = np.minimum(1, tuning / np.maximum(deviation, 1e-12))
+        updated = _solveWeighted(design, values, weights)
+        change = np.max(np.abs(updated - coefficients))
+        coefficients = updated
+        if change <= tolerance * max(np.max(np.abs(coefficients)), 1):
+            break
+    return coefficients
+
+
+def _fitRANSAC(
+    design: np.ndarray,
+    values: np.ndarray,
+    threshold: float,
+    trials: int,
+    seed: int,
+) -> np.ndarray:
+    points, terms = design.shape
+    if points <= terms:
+        return _solveWeighted(design, values)
+    scale = _robustScale(values - design @ _solveWeighted(design, values))
+    rng = np.random.default_rng(seed)
+    best_inliers, best_count = None, -1
+    # the minimal subsets are solved together, a chunk of trials at a time
+    chunk = max(1, min(trials, 2**22 // (points * values.shape[1])))
+    for start in range(0, trials, chunk):
+        count = min(chunk, trials - start)
+        subsets = np.stack([
+            rng.choice(points, terms, replace = False) for _ in range(count)
+        ])
+        candidates = np.linalg.pinv(design[subsets]) @ values[subsets]
+        residuals = design @ candidates - values
+        inliers = np.all(np.abs(residuals) <= threshold * scale, axis = 2)
+        counts = np.sum(inliers, axis = 1)
+        index = np.argmax(counts)
+        if counts[index] > best_count:
+            best_count = counts[index]
+            best_inliers = inliers[index]
+    if best_count < terms:
+        return _solveWeighted(design, values)
+    return _solveWeighted(design[best_inliers], values[best_inliers])
+
+
+def fitPolynomial(
+    locations: np.ndarray,
+    values: np.ndarray,
+    order: int|str = 1,
+    robust: str = None,
+    weights: np.ndarray = None,
+    tuning: float = 1.345,
+    max_iterations: int = 50,
+    tolerance: float = 1e-8,
+    threshold: float = 3,
+    trials: int = 200,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Fit polynomials of the locations to one or several components of values
+    in one solve.
+
+    arguments:
+        locations: (np.ndarray) in the shape (n, 2), the (i, j) of the points.
+
+        values: (np.ndarray) in the shape (n,) or (n, components)
+
+        order: (int or str) see getPolynomialExponents
+
+        robust: (str) None, 'Huber' or 'RANSAC'.
+
+        weights: (np.ndarray) the weights of the points in the shape (n,),
+            only used without robust fitting.
+
+        tuning: (float) the Huber tuning constant, in units of the robust
+            standard deviation of the residuals.
+
+        max_iterations: (int) the iterations of the Huber fitting.
+
+        tolerance: (float) the relative change of the coefficients to stop
+            the Huber fitting.
+
+        threshold: (float) the RANSAC inlier threshold, in units of the
+            robust standard deviation of the residuals.
+
+        trials: (int) the number of random subsets of RANSAC.
+
+        seed: (int) the random seed of RANSAC.
+
+    returns:
+        (np.ndarray) the coefficients in the shape (terms,) or
+            (terms, components), in the order of getPolynomialExponents.
+
+    raises:
+        ValueError: if robust is not known.
+    """
+    exponents = getPolynomialExponents(order)
+    values = np.asarray(values, dtype = 'float64')
+    squeeze = values.ndim == 1
+    if squeeze:
+        values = values[:, None]
+    design = createDesignMatrix(locations, exponents)
+    if robust is None:
+        coefficients = _solveWeighted(design, values, weights)
+    elif robust == 'Huber':
+        coefficients = _fitHuber(
+            design, values, tuning, max_iterations, tolerance
+        )
+    elif robust == 'RANSAC':
+        coefficients = _fitRANSAC(design, values, threshold, trials, seed)
+    else:
+        raise ValueError('robust must be None, \'Huber\' or \'RANSAC\', '
+            'not {0}'.format(robust))
+    if squeeze:
+        return coefficients[:, 0]
+    return coefficients
+
+
+def evaluatePolynomial(
+    coefficients: np.ndarray,
+    scan_i: int,
+    scan_j: int,
+    order: int|str = 1,
+) -> np.ndarray:
+    """
+    Evaluate the fitted polynomials on the scanning grid.
+
+    arguments:
+        coefficients: (np.ndarray) in the shape (terms,) or
+            (terms, components)
+
+        scan_i: (int)
+
+        scan_j: (int)
+
+        order: (int or str) the same as the fitting.
+
+    returns:
+        (np.ndarray) in the shape (scan_i, scan_j) or
+            (components, scan_i, scan_j)
+    """
+    design = getGridDesignMatrix(
+        scan_i, scan_j, getPolynomialExponents(order)
+    )
+    result = design @ coefficients
+    if result.ndim == 1:
+        return result.reshape(scan_i, scan_j)
+    return result.T.reshape(-1, scan_i, scan_j)
+
+
+def FitPolynomialMap(
+    mappings: np.ndarray,
+    order: int|str = 1,
+    valid: np.ndarray = None,
+    robust: str = None,
+    **kw,
+) -> np.ndarray:
+    """
+    Fit the mappings of the scanning grid with polynomials, all of the
+    components in one solve.
+
+    arguments:
+        mappings: (np.ndarray) in the shape (scan_i, scan_j) or
+            (components, scan_i, scan_j)
+
+        order: (int or str) see getPolynomialExponents
+
+        valid: (np.ndarray) bool in the shape (scan_i, scan_j), the points
+            used in the fitting. If None, the finite points are used.
+
+        robust: (str) None, 'Huber' or 'RANSAC'.
+
+        **kw: other arguments of fitPolynomial
+
+    returns:
+        (np.ndarray) the fitted mappings in the same shape.
+    """
+    mappings = np.asarray(mappings, dtype = 'float64')
+    single = mappings.ndim == 2
+    if single:
+        mappings = mappings[None]
+    _, scan_i, scan_j = mappings.shape
+    finite = np.all(np.isfinite(mappings), axis = 0)
+    if valid is None:
+        valid = finite
+    else:
+        valid = np.asarray(valid, dtype = bool) & finite
+    locations = np.argwhere(valid)
+    values = mappings[:, valid].T
+    coefficients = fitPolynomial(locations, values, order, robust, **kw)
+    result = evaluatePolynomial(coefficients, scan_i, scan_j, order)
+    if single:
+        return result[0]
+    return result
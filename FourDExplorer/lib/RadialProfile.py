@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+"""
+*----------------------------- RadialProfile.py ------------------------------*
+计算图像的旋转平均 (径向分布)。
+
+按照各个像素到中心的距离，把像素分入宽度为 bin_width 的环形区间，得到一张整数的区间
+标签图像。同一形状、中心与区间宽度的标签图像只计算一次并缓存，之后每张图像的旋转平均
+只需要一次带权重的 np.bincount。中心可以是小数 (亚像素)，也可以一次计算一批图像 (例如
+一块衍射图样) 的径向分布。
+
+CTF 曲线、衍射图样的径向分布等都使用这里的函数。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Calculate rotational averages (radial profiles) of images.
+
+The pixels are put into annular bins of width bin_width according to their
+distances to the center, which gives an integer image of bin labels. The label
+image of a shape, center and bin width is calculated only once and cached, so
+the rotational average of an image needs only one weighted np.bincount. The
+center may be fractional (sub-pixel), and the profiles of a batch of images
+(e.g. a block of diffraction patterns) can be calculated at once.
+
+The CTF curves and the radial profiles of diffraction patterns use the
+functions here.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*----------------------------- RadialProfile.py ------------------------------*
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+
+class RadialBins:
+    """
+    图像像素的径向区间。
+
+    Radial bins of the pixels of an image.
+
+    Bins that contain no pixels (possible when bin_width < 1) are dropped, so
+    every bin has at least one pixel.
+
+    Usage:
+        bins = getRadialBins((256, 256))
+        profile = bins.average(image)       # in the shape (bins.nbins,)
+        profiles = bins.average(patterns)   # (scan_i, scan_j, bins.nbins)
+
+    attributes:
+        shape: (tuple) (M, N), the shape of images.
+
+        center: (tuple) (ci, cj), may be fractional.
+
+        bin_width: (float) unit: pixel.
+
+        labels: (np.ndarray) the bin of every pixel, in the shape (M, N).
+
+        counts: (np.ndarray) the number of pixels in every bin.
+
+        distance: (np.ndarray) the distance of every bin to the center,
+            i.e. the rounded distance of its pixels, unit: pixel.
+    """
+    def __init__(
+        self,
+        shape: tuple[int],
+        center: tuple[float] = None,
+        bin_width: float = 1.0,
+    ):
+        """
+        arguments:
+            shape: (tuple) (M, N)
+
+            center: (tuple) (ci, cj). If None, (M//2, N//2) is used.
+
+            bin_width: (float) unit: pixel.
+        """
+        if len(shape) != 2:
+            raise ValueError('shape must be (M, N), not {0}'.format(shape))
+        if bin_width <= 0:
+            raise ValueError('bin_width must be positive, not {0}'.format(
+                bin_width
+            ))
+        self.shape = (int(shape[0]), int(shape[1]))
+        if center is None:
+            center = (self.shape[0]//2, self.shape[1]//2)
+        self.center = (float(center[0]), float(center[1]))
+        self.bin_width = float(bin_width)
+
+        i_range = np.arange(self.shape[0]) - self.center[0]
+        j_range = np.arange(self.shape[1]) - self.center[1]
+        radius = np.hypot(i_range[:, None], j_range[None, :])
+        rounded = np.floor(radius / self.bin_width + 0.5).astype(np.intp)
+        counts = np.bincount(rounded.ravel())
+
+        # drop the empty bins
+        occupied = counts > 0
+        remap = np.cumsum(occupied) - 1
+        self.labels = remap[rounded]
+        self.counts = counts[occupied]
+        self.distance = np.flatnonzero(occupied) * self.bin_width
+        self._flat_labels = self.labels.ravel()
+        for array in (self.labels, self.counts, self.distance):
+            array.flags.writeable = False
+
+    @property
+    def nbins(self) -> int:
+        return self.counts.size
+
+    def sum(self, images: np.ndarray) -> np.ndarray:
+        """
+        Sum the pixels in every bin.
+
+        arguments:
+            images: (np.ndarray) in the shape (..., M, N). Complex images
+                are supported.
+
+        returns:
+            (np.ndarray) in the shape (..., nbins)
+        """
+        images = np.asarray(images)
+        if images.shape[-2:] != self.shape:
+            raise ValueError('the shape of images must end with {0}, '
+                'not {1}'.format(self.shape, images.shape))
+        if np.iscomplexobj(images):
+            return self.sum(images.real) + 1j * self.sum(images.imag)
+
+        batch_shape = images.shape[:-2]
+        batch = int(np.prod(batch_shape))
+        weights = images.reshape(batch * self._flat_labels.size)
+        if batch == 1:
+            labels = self._flat_labels
+        else:
+            offsets = np.arange(batch, dtype = np.intp) * self.nbins
+            labels = (offsets[:, None] + self._flat_labels[None, :]).ravel()
+        sums = np.bincount(labels, weights, minlength = batch * self.nbins)
+        return sums.reshape(batch_shape + (self.nbins,))
+
+    def average(self, images: np.ndarray) -> np.ndarray:
+        """
+        Average the pixels in every bin, i.e. the rotational average.
+
+        arguments:
+            images: (np.ndarray) in the shape (..., M, N)
+
+        returns:
+            (np.ndarray) in the shape (..., nbins)
+        """
+        return self.sum(images) / self.counts
+
+    def getPreimage(self) -> list[np.ndarray]:
+        """
+        Get the coordinates of the pixels in every bin.
+
+        returns:
+            (list) of np.ndarray in the shape (n, 2), where n is the number
+                of pixels in the bin.
+        """
+        order = np.argsort(self._flat_labels, kind = 'stable')
+        coordinates = np.stack(np.unravel_index(order, self.shape), axis = 1)
+        return np.split(coordinates, np.cumsum(self.counts)[:-1])
+
+
+@lru_cache(maxsize = 32)
+def _getCachedRadialBins(
+    shape: tuple[int],
+    center: tuple[float],
+    bin_width: float,
+) -> RadialBins:
+    return RadialBins(shape, center, bin_width)
+
+
+def getRadialBins(
+    shape: tuple[int],
+    center: tuple[float] = None,
+    bin_width: float = 1.0,
+) -> RadialBins:
+    """
+    Get the radial bins of the shape, center and bin width. They are cached,
+    so that repeated calls cost nothing.
+
+    arguments:
+        shape: (tuple) (M, N)
+
+        center: (tuple) (ci, cj). If None, (M//2, N//2) is used.
+
+        bin_width: (float) unit: pixel.
+
+    returns:
+        (RadialBins) whose arrays are read-only.
+    """
+    shape = (int(shape[0]), int(shape[1]))
+    if center is None:
+        center = (shape[0]//2, shape[1]//2)
+    center = (float(center[0]), float(center[1]))
+    return _getCachedRadialBins(shape, center, float(bin_width))
+
+
+def RadialAverage(
+    images: np.ndarray,
+    center: tuple[float] = None,
+    bin_width: float = 1.0,
+    pixel_size: float = None,
+) -> tuple[np.ndarray]:
+    """
+    Calculate the rotational average (radial profile) of images.
+
+    arguments:
+        images: (np.ndarray) in the shape (..., M, N)
+
+        center: (tuple) (ci, cj) in pixels, may be fractional. If None,
+            (M//2, N//2) is used.
+
+        bin_width: (float) unit: pixel.
+
+        pixel_size: (float) if given, the distance is multiplied by it.
+
+    returns:
+        (tuple) (distance, profile), where distance is in the shape (nbins,)
+            and profile in the shape (..., nbins).
+    """
+    images = np.asarray(images)
+    bins = getRadialBins(images.shape[-2:], center, bin_width)
+    distance = bins.distance.copy()
+    if pixel_size is not None:
+        distance *= pixel_size
+    return distance, bins.average(images)
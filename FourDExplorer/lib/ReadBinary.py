@@ -14,10 +14,21 @@ date:           Apr 29, 2022
 *----------------------------- ReadBinary.py ---------------------------------*
 """
 
+import ast
+import queue
+import struct
+import threading
+import zipfile
+
 from PySide6.QtCore import Signal 
 import numpy as np
 import h5py 
 
+from bin.MemoryBudget import getMemoryBudget
+from lib.FourDSTEMMapping import IncrementalMapper
+from lib.HDFCopy import copyDataset
+
+
 def getDType(
     scalar_type: str, 
     scalar_size: int, 
@@ -102,6 +113,7 @@ def readFourDSTEMFromRaw(
     is_flipped: bool = False,       # Is chirality of 2D x 2D the same?
     rotate90: int = 0,              # Times every image should be rotated.
     progress_signal: Signal = None, # The progress signal of the task
+    mapper: IncrementalMapper = None,   # Accumulates the preview images
 ):
     """
     This function will read data from a binary raw file. The Dataset object
@@ -143,6 +155,10 @@ def readFourDSTEMFromRaw(
             clockwise. Default is 0. In some cases, the coordinate of the 
             source data is xy, but in 4D-Explorer we use ij, so we must rotate 
             90° when loading the 4D-STEM dataset.
+
+        mapper: (IncrementalMapper) if given, every loaded pattern is also 
+            accumulated into it, so that preview images can be shown while 
+            loading.
     """
     global qApp 
     hdf_handler = qApp.hdf_handler
@@ -167,25 +183,343 @@ def readFourDSTEMFromRaw(
                     offset = bool(ii + jj) * gap_between_images,
                 )).reshape((dp_i, dp_j))
                 if is_flipped:
-                    dataset[ii, jj, :, :] = np.rot90(data.T, rotate90)
+                    data = np.rot90(data.T, rotate90)
                 else:
-                    dataset[ii, jj, :, :] = np.rot90(data, rotate90)
+                    data = np.rot90(data, rotate90)
+                dataset[ii, jj, :, :] = data 
+                if mapper is not None:
+                    mapper.accumulate(data[None, None, :, :], ii, jj)
                     
             progress_signal.emit(int((ii+1)/scan_i*100))
     
     # print('is_flipped: ', is_flipped)
 
+# NUMPY_MEMORY_BUDGET = 256 * 2**20   # bytes of the buffered blocks in memory
+
+
+class NpzMemberStream:
+    """
+    按顺序读取 .npz 文件中压缩的数组。
+
+    Sequential reader of a compressed array member in a .npz file.
+
+    A deflated member cannot be memory-mapped, so it is decompressed as a 
+    stream. Blocks must be read in the C order of the array, which is the 
+    order planNumpyBlocks gives.
+    """
+    def __init__(self, file_path: str, member_name: str):
+        """
+        arguments:
+            file_path: (str) The absolute path of the .npz file.
+
+            member_name: (str) The name of the member in the zip archive, 
+                like 'data.npy'.
+        """
+        self._zip_file = zipfile.ZipFile(file_path, 'r')
+        self._member = self._zip_file.open(member_name, 'r')
+        self.shape, fortran_order, self.dtype = _readNpyHeader(self._member)
+        if fortran_order:
+            self.close()
+            raise ValueError('Fortran ordered arrays cannot be streamed')
+        self._position = 0      # in element
+
+    def read(self, start: int, count: int) -> np.ndarray:
+        """
+        Read count elements from the flat index start.
+
+        arguments:
+            start: (int) The flat index of the first element. It must be 
+                where the last reading stopped.
+
+            count: (int) The number of elements.
+
+        returns:
+            (np.ndarray) A 1D array of the elements.
+        """
+        if start != self._position:
+            raise ValueError('NpzMemberStream can only be read in order')
+        buffer = self._member.read(count * self.dtype.itemsize)
+        if len(buffer) != count * self.dtype.itemsize:
+            raise EOFError('Unexpected end of the .npz member')
+        self._position += count
+        return np.frombuffer(buffer, dtype = self.dtype)
+
+    def close(self):
+        self._member.close()
+        self._zip_file.close()
+
+
+def _readNpyHeader(file) -> tuple:
+    """
+    Read the header of a .npy file, leaving the file at the start of data.
+
+    returns:
+        (tuple) shape, fortran_order and dtype.
+    """
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(file)
+    elif version == (2, 0):
+        return np.lib.format.read_array_header_2_0(file)
+    else:
+        # version 3.0 only differs from 2.0 by the encoding of the header
+        header_length = struct.unpack('<I', file.read(4))[0]
+        header = file.read(header_length).decode('utf8')
+        descr = ast.literal_eval(header)
+        return (
+            descr['shape'], 
+            descr['fortran_order'], 
+            np.lib.format.descr_to_dtype(descr['descr']),
+        )
+
+
+def openNumpyArray(file_path: str, npz_data_name: str = None):
+    """
+    Open an array in a .npy or .npz file without loading it into memory.
+
+    The .npy file is memory-mapped. For .npz files, if the member is stored 
+    without compression, the offset of its data in the archive is located and
+    it is memory-mapped directly. Otherwise a NpzMemberStream is returned.
+
+    arguments:
+        file_path: (str) The absolute path of the .npy or .npz file.
+
+        npz_data_name: (str) The name of the array in the .npz file. If None, 
+            the first array is opened.
+
+    returns:
+        (np.memmap or NpzMemberStream)
+    """
+    if not zipfile.is_zipfile(file_path):
+        return np.load(file_path, mmap_mode = 'r')
+
+    with zipfile.ZipFile(file_path, 'r') as zip_file:
+        names = [name for name in zip_file.namelist() if name.endswith('.npy')]
+        if npz_data_name is None:
+            if not names:
+                raise KeyError('No array in {0}'.format(file_path))
+            member_name = names[0]
+        else:
+            member_name = npz_data_name + '.npy'
+        info = zip_file.getinfo(member_name)
+
+    if info.compress_type != zipfile.ZIP_STORED:
+        return NpzMemberStream(file_path, member_name)
+
+    with open(file_path, 'rb') as file:
+        # The local file header may have a different extra field from the 
+        # central directory, so the offset is read from the local header.
+        file.seek(info.header_offset)
+        local_header = file.read(30)
+        if local_header[:4] != b'PK\x03\x04':
+            raise ValueError('Invalid local header in {0}'.format(file_path))
+        name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+        file.seek(info.header_offset + 30 + name_length + extra_length)
+        shape, fortran_order, dtype = _readNpyHeader(file)
+        offset = file.tell()
+
+    return np.memmap(
+        file_path, 
+        dtype = dtype, 
+        mode = 'r', 
+        offset = offset, 
+        shape = shape, 
+        order = 'F' if fortran_order else 'C',
+    )
+
+
+def planNumpyBlocks(
+    shape: tuple, 
+    itemsize: int, 
+    memory_budget: int,
+) -> list:
+    """
+    Split a 4D-STEM dataset into blocks within the memory budget.
+
+    Blocks consist of whole scan rows if a scan row fits the budget, or else 
+    of patterns in one scan row. They are listed in C order.
+
+    arguments:
+        shape: (tuple) (scan_i, scan_j, dp_i, dp_j)
+
+        itemsize: (int) bytes of a scalar.
+
+        memory_budget: (int) bytes of one block.
+
+    returns:
+        (list) of tuples (i_start, i_stop, j_start, j_stop).
+    """
+    scan_i, scan_j, dp_i, dp_j = shape
+    pattern_bytes = dp_i * dp_j * itemsize
+    row_bytes = scan_j * pattern_bytes
+    blocks = []
+    if row_bytes <= memory_budget:
+        rows = max(memory_budget // max(row_bytes, 1), 1)
+        for i_start in range(0, scan_i, rows):
+            blocks.append((i_start, min(i_start + rows, scan_i), 0, scan_j))
+    else:
+        columns = max(memory_budget // pattern_bytes, 1)
+        for i_start in range(scan_i):
+            for j_start in range(0, scan_j, columns):
+                blocks.append(
+                    (i_start, i_start + 1, j_start, min(j_start + columns, scan_j))
+                )
+    return blocks
+
+
+def _readNumpyBlock(source, block: tuple) -> np.ndarray:
+    """
+    Read a block from the opened array into memory.
+    """
+    i_start, i_stop, j_start, j_stop = block
+    if isinstance(source, NpzMemberStream):
+        scan_j, dp_i, dp_j = source.shape[1:]
+        start = (i_start * scan_j + j_start) * dp_i * dp_j
+        count = (i_stop - i_start) * (j_stop - j_start) * dp_i * dp_j
+        return source.read(start, count).reshape(
+            (i_stop - i_start, j_stop - j_start, dp_i, dp_j)
+        )
+    else:
+        return np.array(source[i_start:i_stop, j_start:j_stop])
+
+
+def _produceNumpyBlocks(
+    source, 
+    blocks: list, 
+    block_queue: queue.Queue, 
+    stop_event: threading.Event,
+):
+    """
+    Read blocks in a thread and put them into the queue.
+
+    When finished, None is put. If an exception is raised, it is put instead.
+    The thread returns as soon as stop_event is set.
+    """
+    def _put(item) -> bool:
+        while not stop_event.is_set():
+            try:
+                block_queue.put(item, timeout = 0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for block in blocks:
+            if not _put((block, _readNumpyBlock(source, block))):
+                return
+        _put(None)
+    except Exception as e:
+        _put(e)
+
+
+def readFourDSTEMFromNumpy(
+    file_path: str,
+    item_path: str,
+    npz_data_name: str = None,
+    progress_signal: Signal = None,
+    mapper: IncrementalMapper = None,
+    memory_budget: int = None,
+) -> None:
+    """
+    Reads a 4D-STEM dataset from a .npy or .npz file into an HDF5 dataset.
+
+    The array is opened only once (see openNumpyArray) and copied in blocks 
+    within the memory budget. Reading and writing are overlapped: a thread 
+    reads the next block while the current one is written into the HDF5 file,
+    so that at most three blocks are in memory at the same time.
+
+    arguments:
+        file_path: (str) The absolute path of the .npy or .npz file.
+
+        item_path: (str) The path of the HDF5 dataset where the data will be 
+            written.
+
+        npz_data_name: (str) The name of the array in the .npz file.
+
+        progress_signal: (Signal) The progress signal of the task.
+
+        mapper: (IncrementalMapper) If given, every loaded block is also 
+            accumulated into it.
+
+        memory_budget: (int) Bytes of all the blocks in memory. Default is 
+            given by the memory budget (see bin.MemoryBudget).
+
+    raises:
+        IndexError: If the dataset is not a 4-dimensional matrix.
+    """
+    if progress_signal is None:
+        progress_signal = Signal(int)
+
+    global qApp
+    hdf_handler = qApp.hdf_handler
+    dataset = hdf_handler.file[item_path]
+
+    source = openNumpyArray(file_path, npz_data_name)
+    allocation = None
+    try:
+        if len(source.shape) != 4:
+            raise IndexError('dataset must be a 4-dimensional matrix')
+        scan_i, scan_j, dp_i, dp_j = source.shape
+        # one block is being read, one is queued and one is being written
+        budget = getMemoryBudget()
+        if memory_budget is None:
+            allocation = budget.request(
+                dp_i * dp_j * source.dtype.itemsize, 
+                scan_i * scan_j, 
+                copies = 3,
+            )
+            memory_budget = allocation.total_bytes
+        else:
+            allocation = budget.reserve(memory_budget)
+        blocks = planNumpyBlocks(
+            source.shape, source.dtype.itemsize, memory_budget // 3
+        )
+
+        block_queue = queue.Queue(maxsize = 1)
+        stop_event = threading.Event()
+        producer = threading.Thread(
+            target = _produceNumpyBlocks, 
+            args = (source, blocks, block_queue, stop_event),
+            daemon = True,
+        )
+        producer.start()
+        try:
+            patterns_done = 0
+            while True:
+                item = block_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                (i_start, i_stop, j_start, j_stop), data = item
+                dataset[i_start:i_stop, j_start:j_stop] = data
+                if mapper is not None:
+                    mapper.accumulate(data, i_start, j_start)
+                patterns_done += data.shape[0] * data.shape[1]
+                progress_signal.emit(int(patterns_done / (scan_i * scan_j) * 100))
+        finally:
+            stop_event.set()
+            producer.join()
+    finally:
+        if allocation is not None:
+            allocation.release()
+        if isinstance(source, NpzMemberStream):
+            source.close()
+
+
 def readFourDSTEMFromNpz(
     file_path: str,
     item_path: str,
     npz_data_name: str,
     progress_signal: Signal = None, # The progress signal of the task
+    mapper: IncrementalMapper = None,
 ) -> None:
     """
     Reads a 4D-STEM dataset from a .npz file and writes it into an HDF5 dataset.
     
-    This function reduces memory usage by reading and writing one scan row at a 
-    time for large datasets, and one scan column at a time for smaller datasets.
+    The member is opened only once by readFourDSTEMFromNumpy. If it is stored 
+    without compression, it is memory-mapped directly from the .npz file.
 
     arguments:
         file_path (str): The absolute path of the .npz file.
@@ -198,52 +532,70 @@ def readFourDSTEMFromNpz(
         progress_signal (Signal, optional): The progress signal of the task. 
             Defaults to None.
 
+        mapper (IncrementalMapper, optional): If given, every loaded block is 
+            also accumulated into it, so that preview images can be shown 
+            while loading. Defaults to None.
+
     raises:
         IndexError: If the dataset is not a 4-dimensional matrix.
     """
-    if progress_signal is None:
-        progress_signal = Signal(int)
-
-    global qApp
-    hdf_handler = qApp.hdf_handler
+    readFourDSTEMFromNumpy(
+        file_path, 
+        item_path, 
+        npz_data_name = npz_data_name, 
+        progress_signal = progress_signal, 
+        mapper = mapper,
+    )
+
+    # if progress_signal is None:
+    #     progress_signal = Signal(int)
+
+    # global qApp
+    # hdf_handler = qApp.hdf_handler
+
+    # # Load the .npz file and get the shape of the selected data
+    # npz_data = np.load(file_path, mmap_mode='r')
+    # selected_data = npz_data[npz_data_name]
+    # if len(selected_data.shape) != 4:
+    #     raise IndexError('dataset must be a 4-dimensional matrix')
+    # scan_i, scan_j, dp_i, dp_j = selected_data.shape
+    # del npz_data, selected_data  # Release memory
+
+    # dataset = hdf_handler.file[item_path]
+
+    # if scan_i > 5:  # If chunk is small, read all columns at once
+    #     for ii in range(scan_i):
+    #         npz_data = np.load(file_path, mmap_mode='r')
+    #         selected_data = npz_data[npz_data_name]
+    #         block = np.asarray(selected_data[ii:ii+1, :, :, :])
+    #         dataset[ii, :, :, :] = block[0]
+    #         if mapper is not None:
+    #             mapper.accumulate(block, ii)
+    #         del npz_data, selected_data  # Release memory
+    #         progress_signal.emit(int((ii+1)/scan_i*100))
+    # else:  # If chunk is large, read one column, one row at a time
+    #     for ii in range(scan_i):
+    #         for jj in range(scan_j):
+    #             npz_data = np.load(file_path, mmap_mode='r')
+    #             selected_data = npz_data[npz_data_name]
+    #             block = np.asarray(selected_data[ii:ii+1, jj:jj+1, :, :])
+    #             dataset[ii, jj, :, :] = block[0, 0]
+    #             if mapper is not None:
+    #                 mapper.accumulate(block, ii, jj)
+    #             del npz_data, selected_data  # Release memory
+    #         progress_signal.emit(int((ii+1)/scan_i*100))
 
-    # Load the .npz file and get the shape of the selected data
-    npz_data = np.load(file_path, mmap_mode='r')
-    selected_data = npz_data[npz_data_name]
-    if len(selected_data.shape) != 4:
-        raise IndexError('dataset must be a 4-dimensional matrix')
-    scan_i, scan_j, dp_i, dp_j = selected_data.shape
-    del npz_data, selected_data  # Release memory
 
-    dataset = hdf_handler.file[item_path]
-    
-    if scan_i > 5:  # If chunk is small, read all columns at once
-        for ii in range(scan_i):
-            npz_data = np.load(file_path, mmap_mode='r')
-            selected_data = npz_data[npz_data_name]
-            dataset[ii, :, :, :] = selected_data[ii, :, :, :]
-            del npz_data, selected_data  # Release memory
-            progress_signal.emit(int((ii+1)/scan_i*100))
-    else:  # If chunk is large, read one column, one row at a time
-        for ii in range(scan_i):
-            for jj in range(scan_j):
-                npz_data = np.load(file_path, mmap_mode='r')
-                selected_data = npz_data[npz_data_name]
-                dataset[ii, jj, :, :] = selected_data[ii, jj, :, :]
-                del npz_data, selected_data  # Release memory
-            progress_signal.emit(int((ii+1)/scan_i*100))
-                
-                
 def readFourDSTEMFromNpy(
     file_path: str,
     item_path: str,
     progress_signal: Signal = None, # The progress signal of the task
+    mapper: IncrementalMapper = None,
 ) -> None:
     """
     Reads a 4D-STEM dataset from a .npy file and writes it into an HDF5 dataset.
     
-    This function reduces memory usage by reading and writing one scan row at a 
-    time for large datasets, and one scan column at a time for smaller datasets.
+    The file is memory-mapped only once by readFourDSTEMFromNumpy.
 
     arguments:
         file_path (str): The absolute path of the .npy file.
@@ -254,36 +606,109 @@ def readFourDSTEMFromNpy(
         progress_signal (Signal, optional): The progress signal of the task. 
             Defaults to None.
 
+        mapper (IncrementalMapper, optional): If given, every loaded block is 
+            also accumulated into it, so that preview images can be shown 
+            while loading. Defaults to None.
+
     raises:
         IndexError: If the dataset is not a 4-dimensional matrix.
     """
-    if progress_signal is None:
-        progress_signal = Signal(int)
-    
-    global qApp 
-    hdf_handler = qApp.hdf_handler
-    
-    npy_data = np.load(file_path, mmap_mode='r')
-    if len(npy_data.shape) != 4:
-        raise IndexError('dataset must be a 4-dimensional matrix')
-    scan_i, scan_j, dp_i, dp_j = npy_data.shape 
-    del npy_data
-    dataset = hdf_handler.file[item_path]
-    
-    if scan_i > 5:      # if chunk is small, read all columns at once
-        for ii in range(scan_i):
-            npy_data = np.load(file_path, mmap_mode='r')
-            dataset[ii, :, :, :] = npy_data[ii, :, :, :]
-            del npy_data        # release memory
-            progress_signal.emit(int((ii+1)/scan_i*100))
-            
-    else:       # if chunk is large, read one column, one row at a time
-        for ii in range(scan_i):   
-            for jj in range(scan_j):
-                npy_data = np.load(file_path, mmap_mode='r')
-                dataset[ii, jj, :, :] = npy_data[ii, jj, :, :]
-                del npy_data    # release memory
-            progress_signal.emit(int((ii+1)/scan_i*100))
+    readFourDSTEMFromNumpy(
+        file_path, 
+        item_path, 
+        progress_signal = progress_signal, 
+        mapper = mapper,
+    )
+
+    # if progress_signal is None:
+    #     progress_signal = Signal(int)
+
+    # global qApp 
+    # hdf_handler = qApp.hdf_handler
+
+    # npy_data = np.load(file_path, mmap_mode='r')
+    # if len(npy_data.shape) != 4:
+    #     raise IndexError('dataset must be a 4-dimensional matrix')
+    # scan_i, scan_j, dp_i, dp_j = npy_data.shape 
+    # del npy_data
+    # dataset = hdf_handler.file[item_path]
+
+    # if scan_i > 5:      # if chunk is small, read all columns at once
+    #     for ii in range(scan_i):
+    #         npy_data = np.load(file_path, mmap_mode='r')
+    #         block = np.asarray(npy_data[ii:ii+1, :, :, :])
+    #         dataset[ii, :, :, :] = block[0]
+    #         if mapper is not None:
+    #             mapper.accumulate(block, ii)
+    #         del npy_data        # release memory
+    #         progress_signal.emit(int((ii+1)/scan_i*100))
+
+    # else:       # if chunk is large, read one column, one row at a time
+    #     for ii in range(scan_i):   
+    #         for jj in range(scan_j):
+    #             npy_data = np.load(file_path, mmap_mode='r')
+    #             block = np.asarray(npy_data[ii:ii+1, jj:jj+1, :, :])
+    #             dataset[ii, jj, :, :] = block[0, 0]
+    #             if mapper is not None:
+    #                 mapper.accumulate(block, ii, jj)
+    #             del npy_data    # release memory
+    #         progress_signal.emit(int((ii+1)/scan_i*100))
+
+
+# DM4_MEMORY_BUDGET = 256 * 2**20   # bytes of a transposed tile in memory
+
+
+def _alignDown(length: int, chunk: int) -> int:
+    """
+    Round length down to a multiple of chunk, but not less than chunk.
+    """
+    if length <= chunk:
+        return length
+    return length // chunk * chunk
+
+
+def planTransposeTiles(
+    scan_i: int,
+    scan_j: int,
+    dp_i: int,
+    dp_j: int,
+    itemsize: int,
+    memory_budget: int,
+    chunks: tuple[int]|None = None,
+) -> tuple[int, int]:
+    """
+    Plan the tiles of the out-of-core transpose from (dp_i, dp_j, scan_i, 
+    scan_j) to (scan_i, scan_j, dp_i, dp_j).
+
+    A tile contains a block of scan rows and a block of pattern rows, with all
+    of the scan columns and pattern columns. Whole patterns of whole scan rows
+    are preferred, because they are contiguous in the output dataset. Only if
+    one scan row of whole patterns exceeds the budget, the patterns are split 
+    along dp_i. If the output dataset is chunked, tiles are aligned to the 
+    chunks, so that every chunk is written only once.
+
+    arguments:
+        scan_i, scan_j, dp_i, dp_j: (int) the shape of the output.
+
+        itemsize: (int) bytes of one scalar.
+
+        memory_budget: (int) bytes that one tile may take. The tile is held
+            twice (read and transposed), which is counted here.
+
+        chunks: (tuple) the chunk shape of the output dataset, or None.
+
+    returns:
+        (tuple) (scan rows per tile, pattern rows per tile)
+    """
+    if chunks is None:
+        chunks = (1, scan_j, 1, dp_j)
+    row_bytes = 2 * scan_j * dp_i * dp_j * itemsize
+    if row_bytes <= memory_budget:
+        block_scan_i = min(max(memory_budget // row_bytes, 1), scan_i)
+        return _alignDown(block_scan_i, chunks[0]), dp_i
+    dp_row_bytes = 2 * scan_j * dp_j * itemsize
+    block_dp_i = min(max(memory_budget // dp_row_bytes, 1), dp_i)
+    return 1, _alignDown(block_dp_i, chunks[2])
 
 
 def readFourDSTEMFromDM4(
@@ -298,10 +723,19 @@ def readFourDSTEMFromDM4(
         offset_to_first_image: int = 0,
         little_endian: bool = True,
         progress_signal: Signal = None, # The progress signal of the task
+        mapper: IncrementalMapper = None,
+        memory_budget: int = None,
 ) -> None:
     """
     Reads a 4D-STEM dataset from a .dm4 file and writes it into an HDF5 dataset.
 
+    The .dm4 file stores the data as (dp_i, dp_j, scan_i, scan_j). The data 
+    block is memory-mapped and transposed out of core, tile by tile, where 
+    every tile is a block of scan rows times a block of pattern rows sized to 
+    the memory budget (see planTransposeTiles). Compared with transposing 
+    whole dp_i slabs, every tile is written to a compact region of the HDF5 
+    dataset instead of touching every scanning position.
+
     arguments:
         file_path: (str) The absolute path of the .dm4 file.
 
@@ -326,6 +760,12 @@ def readFourDSTEMFromDM4(
         little_endian: (bool) default to be True. If false, will read with
             big_endian.
 
+        mapper: (IncrementalMapper) if given, every loaded tile is also 
+            accumulated into it, so that preview images can be shown while 
+            loading.
+
+        memory_budget: (int) bytes that one tile may take. Default is given
+            by the memory budget (see bin.MemoryBudget).
     """
     if progress_signal is None:
         progress_signal = Signal(int)
@@ -333,38 +773,92 @@ def readFourDSTEMFromDM4(
     global qApp 
     hdf_handler = qApp.hdf_handler
     dataset = hdf_handler.file[item_path]
-    dt = getDType(scalar_type, scalar_size, little_endian)
-        
-    with open(file_path, 'rb') as fid:
-        fid.seek(offset_to_first_image)
+    dt = np.dtype(getDType(scalar_type, scalar_size, little_endian))
+
+    source = np.memmap(
+        file_path, 
+        dtype = dt, 
+        mode = 'r', 
+        offset = offset_to_first_image, 
+        shape = (dp_i, dp_j, scan_i, scan_j),
+    )
+    budget = getMemoryBudget()
+    if memory_budget is None:
+        # the smallest tile is a pattern row of a scan row, read and transposed
+        allocation = budget.request(2 * scan_j * dp_j * dt.itemsize)
+        memory_budget = allocation.nbytes
+    else:
+        allocation = budget.reserve(memory_budget)
+    with allocation:
+        block_scan_i, block_dp_i = planTransposeTiles(
+            scan_i, scan_j, dp_i, dp_j, dt.itemsize, memory_budget, 
+            dataset.chunks,
+        )
+        is_float = np.issubdtype(dt, np.floating)
+        total_tiles = (
+            ((scan_i - 1) // block_scan_i + 1) * ((dp_i - 1) // block_dp_i + 1)
+        )
+        tile_index = 0
+        for i_start in range(0, scan_i, block_scan_i):
+            i_end = min(i_start + block_scan_i, scan_i)
+            for d_start in range(0, dp_i, block_dp_i):
+                d_end = min(d_start + block_dp_i, dp_i)
+                tile = np.empty(
+                    (i_end - i_start, scan_j, d_end - d_start, dp_j), 
+                    dtype = dt,
+                )
+                # Transpose one pattern row at a time, so that the source being 
+                # gathered, (dp_j, block_scan_i, scan_j), stays small.
+                for r_ii in range(d_start, d_end):
+                    tile[:, :, r_ii - d_start, :] = (
+                        source[r_ii, :, i_start:i_end, :].transpose(1, 2, 0)
+                    )
+                if is_float:
+                    np.nan_to_num(tile, copy = False)
+                dataset[i_start:i_end, :, d_start:d_end, :] = tile 
+                if mapper is not None:
+                    mapper.accumulate(tile, i_start, 0, d_start, 0)
+
+                tile_index += 1
+                progress_signal.emit(int(tile_index / total_tiles * 100))
+    del source 
+
+    # with open(file_path, 'rb') as fid:
+    #     fid.seek(offset_to_first_image)
         
-        # Set up chunk size for dp_i dimension
-        # ensure the chunk size is smaller than 1 percent of the whole dataset 
-        # if the whole dataset is large
-        dp_i_chunk_size = max(dp_i // 100, 1)
+    #     # Set up chunk size for dp_i dimension
+    #     # ensure the chunk size is smaller than 1 percent of the whole dataset 
+    #     # if the whole dataset is large
+    #     dp_i_chunk_size = max(dp_i // 100, 1)
         
-        for i_start in range(0, dp_i, dp_i_chunk_size):
-            i_end = min(i_start + dp_i_chunk_size, dp_i)
-            chunk_elements = (i_end - i_start) * dp_j * scan_i * scan_j
+    #     for i_start in range(0, dp_i, dp_i_chunk_size):
+    #         i_end = min(i_start + dp_i_chunk_size, dp_i)
+    #         chunk_elements = (i_end - i_start) * dp_j * scan_i * scan_j
             
-            data = np.nan_to_num(np.fromfile(fid, dtype=dt, count=chunk_elements))
-            data = data.reshape((i_end - i_start, dp_j, scan_i, scan_j))
-            data = data.transpose(2, 3, 0, 1)   # shape to (scan_i, scan_j, dp_i, dp_j)
-            dataset[:, :, i_start:i_end, :] = data  # the dataset slice must be 4D
+    #         data = np.nan_to_num(np.fromfile(fid, dtype=dt, count=chunk_elements))
+    #         data = data.reshape((i_end - i_start, dp_j, scan_i, scan_j))
+    #         data = data.transpose(2, 3, 0, 1)   # shape to (scan_i, scan_j, dp_i, dp_j)
+    #         dataset[:, :, i_start:i_end, :] = data  # the dataset slice must be 4D
             
-            progress = int((i_end) / dp_i * 100)
-            progress_signal.emit(progress)
+    #         progress = int((i_end) / dp_i * 100)
+    #         progress_signal.emit(progress)
             
             
 def readDataFromHDF5(
     file_path: str, 
     dataset_path: str, 
     item_path: str, 
-    progress_signal: Signal = None
+    progress_signal: Signal = None,
+    mapper: IncrementalMapper = None,
+    memory_budget: int = None,
 ):
     """
     Read data from an HDF5 file and write it to a dataset in the current HDF5 file.
 
+    The data are copied by lib.HDFCopy.copyDataset, i.e. the raw chunks are 
+    copied directly if the two datasets have the same chunks and filters, 
+    otherwise in chunk-aligned hyperslabs.
+
     arguments:
         file_path: (str) The absolute path of the source HDF5 file.
 
@@ -373,6 +867,13 @@ def readDataFromHDF5(
         item_path: (str) The path of the dataset in the current HDF5 file.
 
         progress_signal: (Signal) A signal to emit progress updates.
+
+        mapper: (IncrementalMapper) If given, the 4D-STEM data are also 
+            accumulated into it, so that preview images can be shown while 
+            loading. Defaults to None.
+
+        memory_budget: (int) bytes of a hyperslab. Default is given by the 
+            memory budget (see bin.MemoryBudget).
     """
     if progress_signal is None:
         progress_signal = Signal(int)
@@ -381,15 +882,29 @@ def readDataFromHDF5(
     hdf_handler = qApp.hdf_handler
     dataset = hdf_handler.file[item_path]
     
-    with h5py.File(file_path, 'r') as src_hdf_file:
+    with h5py.File(
+        file_path, 'r', rdcc_nbytes = getMemoryBudget().hdf_cache,
+    ) as src_hdf_file:
         src_dataset = src_hdf_file[dataset_path]
-        total_elements = src_dataset.size
-        chunk_size = max(total_elements // 100, 1)
-        
-        for i in range(0, total_elements, chunk_size):
-            end = min(i + chunk_size, total_elements)
-            chunk = src_dataset[i:end]
-            dataset[i:end] = chunk
-            
-            progress = int(end / total_elements * 100)
-            progress_signal.emit(progress)
+        copyDataset(
+            src_dataset, 
+            dataset, 
+            progress_signal = progress_signal, 
+            memory_budget = memory_budget, 
+            mapper = mapper,
+        )
+
+    # The flat offsets below slice the first axis only, so that a chunk 
+    # contains total_elements // 100 rows instead of elements.
+    # with h5py.File(file_path, 'r') as src_hdf_file:
+    #     src_dataset = src_hdf_file[dataset_path]
+    #     total_elements = src_dataset.size
+    #     chunk_size = max(total_elements // 100, 1)
+    #     
+    #     for i in range(0, total_elements, chunk_size):
+    #         end = min(i + chunk_size, total_elements)
+    #         chunk = src_dataset[i:end]
+    #         dataset[i:end] = chunk
+    #         
+    #         progress = int(end / total_elements * 100)
+    #         progress_signal.emit(progress)
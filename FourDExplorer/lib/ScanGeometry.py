@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+"""
+*----------------------------- ScanGeometry.py -------------------------------*
+扫描几何：计算各个扫描点上 probe 的位置。
+
+所有位置都以实空间像素为单位，形状为 (scan_i, scan_j, 2)，由广播一次算出，不需要逐点
+循环。扫描方向可以相对于物体旋转一个角度。为了在模拟中从物体上截取 probe 窗口，还提供
+把位置平移到物体坐标系中、以及计算所需物体大小的函数。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Scan geometry: the positions of the probe at every scanning point.
+
+All positions are in real space pixels, in the shape (scan_i, scan_j, 2), and
+are calculated at once by broadcasting instead of looping over the points. The
+scanning direction may be rotated relative to the object. For the simulation,
+which takes windows of the object at the probe positions, there are also
+functions to move the positions into the frame of the object and to get the
+shape of the object needed.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*----------------------------- ScanGeometry.py -------------------------------*
+"""
+
+import numpy as np
+
+
+def generateScanPositions(
+    scan_shape: tuple[int],
+    step: float,
+    scan_angle: float = 0,
+    origin: tuple[float] = (0, 0),
+) -> np.ndarray:
+    """
+    Generate the probe positions of a rectangular scan.
+
+    The position of the scanning point (ii, jj) is
+        origin + R(scan_angle) · (ii * step, jj * step)
+
+    arguments:
+        scan_shape: (tuple) (scan_i, scan_j)
+
+        step: (float) the scan step size, unit: pixel
+
+        scan_angle: (float) the rotation of the scan, unit: rad
+
+        origin: (tuple) the position of the first scanning point, unit: pixel
+
+    returns:
+        (np.ndarray) in the shape (scan_i, scan_j, 2)
+    """
+    scan_i, scan_j = scan_shape
+    ii = np.arange(scan_i)[:, None] * step
+    jj = np.arange(scan_j)[None, :] * step
+    cos, sin = np.cos(scan_angle), np.sin(scan_angle)
+    positions = np.empty((scan_i, scan_j, 2))
+    positions[:, :, 0] = origin[0] + ii * cos - jj * sin
+    positions[:, :, 1] = origin[1] + ii * sin + jj * cos
+    return positions
+
+
+def shiftPositionsToObject(
+    positions: np.ndarray,
+    padding: int = 0,
+) -> np.ndarray:
+    """
+    Move the positions so that the smallest ones are at the padding, i.e.
+    into the frame of an object array with the padding around the scan.
+
+    arguments:
+        positions: (np.ndarray) in the shape (..., 2), unit: pixel
+
+        padding: (int) unit: pixel
+
+    returns:
+        (np.ndarray) in the same shape as positions. The fractional parts are
+            kept.
+    """
+    positions = np.asarray(positions, dtype = 'float64')
+    minimum = np.floor(positions.reshape(-1, 2).min(axis = 0))
+    return positions - minimum + padding
+
+
+def getObjectShape(
+    positions: np.ndarray,
+    window_shape: tuple[int],
+    padding: int = 0,
+) -> tuple[int]:
+    """
+    Get the shape of the object that contains the windows at all positions
+    in the frame of the object, with the padding on the far side.
+
+    arguments:
+        positions: (np.ndarray) in the shape (..., 2), unit: pixel
+
+        window_shape: (tuple) the shape of the probe window.
+
+        padding: (int) unit: pixel
+
+    returns:
+        (tuple) (object_i, object_j)
+    """
+    maximum = np.floor(
+        np.asarray(positions).reshape(-1, 2).max(axis = 0)
+    ).astype(int)
+    return (
+        int(maximum[0]) + window_shape[0] + padding,
+        int(maximum[1]) + window_shape[1] + padding,
+    )
+
+
+def extractWindows(
+    array: np.ndarray,
+    corners: np.ndarray,
+    window_shape: tuple[int],
+) -> np.ndarray:
+    """
+    Extract windows of the array at a batch of integer corners.
+
+    arguments:
+        array: (np.ndarray) in the shape (M, N)
+
+        corners: (np.ndarray) the top-left corners of the windows, in the
+            shape (B, 2).
+
+        window_shape: (tuple) (n_i, n_j)
+
+    returns:
+        (np.ndarray) in the shape (B, n_i, n_j)
+
+    raises:
+        IndexError: if a window is out of the array.
+    """
+    corners = np.asarray(corners, dtype = np.intp)
+    if corners.size and (
+        corners.min() < 0
+        or corners[:, 0].max() + window_shape[0] > array.shape[0]
+        or corners[:, 1].max() + window_shape[1] > array.shape[1]
+    ):
+        raise IndexError('windows of shape {0} at the positions are out of '
+            'the array of shape {1}'.format(window_shape, array.shape))
+    rows = corners[:, 0, None, None] + np.arange(window_shape[0])[:, None]
+    cols = corners[:, 1, None, None] + np.arange(window_shape[1])[None, :]
+    return array[rows, cols]
@@ -23,6 +23,8 @@ import numpy as np
 from bin.TaskManager import Subtask, SubtaskWithProgress, Task
 from bin.HDFManager import HDFHandler
 from bin.Widgets.WidgetMasks import WidgetMaskBase
+from Constants import Precision
+from lib.ComputePrecision import getResultDType
 from lib.FourDSTEMModifying import FilteringDiffractionPattern
 from lib.FourDSTEMModifying import RollingDiffractionPattern
 from lib.FourDSTEMModifying import TranslatingDiffractionPattern
@@ -42,7 +44,8 @@ class TaskBaseFourDSTEMModify(Task):
         output_parent_path: str,
         output_name: str,
         parent: QObject = None,
-        meta: dict = None 
+        meta: dict = None,
+        precision: Precision = Precision.Native,
     ):
         """
         arguments:
@@ -57,11 +60,16 @@ class TaskBaseFourDSTEMModify(Task):
 
             **meta: (key word arguments) other meta data that should be stored
                 in the attrs of reconstructed HDF5 object
+
+            precision: (Precision) the dtype of the modified 4D-STEM dataset. 
+                Precision.Native keeps the dtype of the source dataset. It 
+                is ignored if the source dataset is covered.
         """
         super().__init__(parent)
         self._item_path = item_path 
         self._output_parent_path = output_parent_path
         self._output_name = output_name 
+        self._precision = precision
         self._meta = {}
         if meta:
             self._meta.update(meta) 
@@ -125,6 +133,8 @@ class TaskBaseFourDSTEMModify(Task):
         just before the task is submitted.
         """
         print('output_path: {0}'.format(self.output_path))
+        scan_i, scan_j = self.hdf_handler.file[self.source_path].shape[:2]
+        self.patterns = int(scan_i * scan_j)
         
         if self.output_path != self.source_path:
             data_object = self.hdf_handler.file[self.source_path]
@@ -133,7 +143,8 @@ class TaskBaseFourDSTEMModify(Task):
                 self._output_parent_path,
                 self._output_name,
                 shape = data_object.shape,
-                dtype = data_object.dtype,
+                # dtype = data_object.dtype,
+                dtype = getResultDType(self._precision, data_object.dtype),
             )
 
         for key, value in self._meta.items():
@@ -141,6 +152,7 @@ class TaskBaseFourDSTEMModify(Task):
                 self.hdf_handler.file[self.output_path].attrs[key] = value
             except Exception as e:
                 self.logger.error(f'Failed to set attribute {key} for dataset {self.output_path}: {e}')
+        self.hdf_handler.attributesChanged(self.output_path)
 
     def _showFourDSTEM(self):
         """
@@ -166,6 +178,7 @@ class TaskFourDSTEMAlign(TaskBaseFourDSTEMModify):
         translation_vector: tuple,
         parent: QObject = None,
         meta: dict = None,
+        precision: Precision = Precision.Native,
     ):
         """
         arguments:
@@ -183,6 +196,8 @@ class TaskFourDSTEMAlign(TaskBaseFourDSTEMModify):
 
             **meta: (key word arguments) other meta data that should be stored
                 in the attrs of reconstructed HDF5 object
+
+            precision: (Precision) the dtype of the modified 4D-STEM dataset.
         """
         super().__init__(
             item_path, 
@@ -190,6 +205,7 @@ class TaskFourDSTEMAlign(TaskBaseFourDSTEMModify):
             output_name, 
             parent, 
             meta,
+            precision,
         )
         self._translation_vector = translation_vector
         
@@ -218,8 +234,16 @@ class TaskFourDSTEMAlignMapping(TaskBaseFourDSTEMModify):
         shift_mapping: np.ndarray | h5py.Dataset,
         parent: QObject = None,
         meta: dict = None,
+        precision: Precision = Precision.Native,
     ):
-        super().__init__(item_path, output_parent_path, output_name, parent, meta)
+        super().__init__(
+            item_path, 
+            output_parent_path, 
+            output_name, 
+            parent, 
+            meta,
+            precision,
+        )
         self._shift_mapping = shift_mapping 
         self.name = '4D-STEM Alignment With Shift Mapping'
         
@@ -249,6 +273,7 @@ class TaskFourDSTEMFiltering(TaskBaseFourDSTEMModify):
         window_max: float = None,
         parent: QObject = None,
         meta: dict = None,
+        precision: Precision = Precision.Native,
     ):
         """
         arguments:
@@ -271,13 +296,16 @@ class TaskFourDSTEMFiltering(TaskBaseFourDSTEMModify):
 
             **meta: (key word arguments) other meta data that should be stored
                 in the attrs of reconstructed HDF5 object
+
+            precision: (Precision) the dtype of the modified 4D-STEM dataset.
         """
         super().__init__(
             item_path, 
             output_parent_path, 
             output_name, 
             parent, 
-            meta
+            meta,
+            precision,
         )
 
         self.name = '4D-STEM Background Subtraction'
@@ -307,6 +335,7 @@ class TaskFourDSTEMRotate(TaskBaseFourDSTEMModify):
         rotation_angle: float,
         parent: QObject = None,
         meta: dict = None,
+        precision: Precision = Precision.Native,
     ):
         """
         arguments:
@@ -324,13 +353,16 @@ class TaskFourDSTEMRotate(TaskBaseFourDSTEMModify):
 
             **meta: (key word arguments) other meta data that should be stored
                 in the attrs of reconstructed HDF5 object
+
+            precision: (Precision) the dtype of the modified 4D-STEM dataset.
         """
         super().__init__(
             item_path, 
             output_parent_path, 
             output_name, 
             parent, 
-            meta
+            meta,
+            precision,
         )
         self.name = '4D-STEM Rotate'
         self._rotation_angle = rotation_angle
@@ -357,6 +389,7 @@ class TaskFourDSTEMSubtractRef(TaskBaseFourDSTEMModify):
         background_path: str,
         parent: QObject = None,
         meta: dict = None,
+        precision: Precision = Precision.Native,
     ):
         """
         arguments:
@@ -373,13 +406,16 @@ class TaskFourDSTEMSubtractRef(TaskBaseFourDSTEMModify):
             
             meta: (key word arguments) other meta data that should be stored
                 in the attrs of reconstructed HDF5 object
+
+            precision: (Precision) the dtype of the modified 4D-STEM dataset.
         """
         super().__init__(
             item_path, 
             output_parent_path, 
             output_name, 
             parent, 
-            meta
+            meta,
+            precision,
         )
         self.name = '4D-STEM Background Subtraction'
         self.addSubtaskFuncWithProgress(
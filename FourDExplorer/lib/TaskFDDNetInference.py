@@ -20,15 +20,17 @@ from logging import Logger
 from PySide6.QtCore import QObject
 from PySide6.QtCore import Signal 
 import numpy as np
-from scipy.optimize import curve_fit
+# from scipy.optimize import curve_fit
 
 from bin.TaskManager import Task 
 from bin.HDFManager import HDFHandler
 from lib.FDDNetInference import mapInferenceFDDNet
 from lib.FDDNetInference import mapInferenceFDDNetAngle
 from lib.FDDNetInference import mapInferenceFDDNetEllipse
-from lib.DiffractionAlignment import linearModel
-from lib.DiffractionAlignment import quadraticModel
+# from lib.DiffractionAlignment import linearModel
+# from lib.DiffractionAlignment import quadraticModel
+from lib.PolynomialFit import FitPolynomialMap
+from lib.PolynomialFit import fitPolynomial
 
 class TaskFDDNetInference(Task):
     """
@@ -54,6 +56,7 @@ class TaskFDDNetInference(Task):
         names_dict: dict,
         metas_dict: dict,
         fit_models_dict: dict = None,
+        robust: str = None,
         parent: QObject = None, 
     ):
         """
@@ -79,6 +82,9 @@ class TaskFDDNetInference(Task):
                 - 'Linear': use linear fitting
                 - 'Quadratic': use quadratic fitting
             
+            robust: (str) None, 'Huber' or 'RANSAC', the robust fitting that
+                discards the points where FDDNet fails.
+            
             parent: (QObject) the parent object of this task.
         """
         super().__init__(parent)
@@ -103,6 +109,7 @@ class TaskFDDNetInference(Task):
             if self._calc_dict[key] and key not in fit_models_dict:
                 fit_models_dict[key] = None 
         self._fit_models_dict = fit_models_dict
+        self._robust = robust
         
         self.comment = (
             'FDDNet inference on all diffraction images in the 4D-STEM dataset.\n'
@@ -165,6 +172,7 @@ class TaskFDDNetInference(Task):
                 for key, value in self._metas_dict[mode].items():
                     data_path = self._getDataPath(mode)
                     self.hdf_handler.file[data_path].attrs[key] = value 
+                self.hdf_handler.attributesChanged(self._getDataPath(mode))
                     
     def _getDataPath(self, mode: str) -> str:
         """
@@ -233,43 +241,50 @@ class TaskFDDNetInference(Task):
             'angle': angle,
         }
         
+        # for mode, is_calced in self._calc_dict.items():
+        #     if is_calced:
+        #         data_path = self._getDataPath(mode)
+        #         result = result_dict[mode]
+        #         fit_model_name = self._fit_models_dict.get(mode, None)
+
+        #         if fit_model_name is not None:
+        #             i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
+        #             locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
+
+        #             if mode in ['ci', 'cj', 'a', 'b', 'angle']:
+        #                 values = result.ravel()
+        #                 params = self._fitModel(fit_model_name, locations, values)
+        #                 if params is not None:
+        #                     if fit_model_name == 'Linear':
+        #                         result = linearModel(locations.T, *params).reshape(scan_i, scan_j)
+        #                     elif fit_model_name == 'Quadratic':
+        #                         result = quadraticModel(locations.T, *params).reshape(scan_i, scan_j)
+        #             elif mode == 'center':
+
+
+        #                 ci_values = result_dict['ci'].ravel()
+        #                 cj_values = result_dict['cj'].ravel()
+
+        #                 ci_params = self._fitModel(fit_model_name, locations, ci_values)
+        #                 cj_params = self._fitModel(fit_model_name, locations, cj_values)
+
+        #                 if ci_params is not None and cj_params is not None:
+        #                     if fit_model_name == 'Linear':
+        #                         ci_result = linearModel(locations.T, *ci_params).reshape(scan_i, scan_j)
+        #                         cj_result = linearModel(locations.T, *cj_params).reshape(scan_i, scan_j)
+        #                     elif fit_model_name == 'Quadratic':
+        #                         ci_result = quadraticModel(locations.T, *ci_params).reshape(scan_i, scan_j)
+        #                         cj_result = quadraticModel(locations.T, *cj_params).reshape(scan_i, scan_j)
+
+        #                     result = np.stack([ci_result, cj_result], axis=0)
+
+        #         self.hdf_handler.file[data_path][:] = result
+
+        fitted_dict = self._fitResults(result_dict, scan_i, scan_j)
         for mode, is_calced in self._calc_dict.items():
             if is_calced:
                 data_path = self._getDataPath(mode)
-                result = result_dict[mode]
-                fit_model_name = self._fit_models_dict.get(mode, None)
-                
-                if fit_model_name is not None:
-                    i_grid, j_grid = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing='ij')
-                    locations = np.vstack([i_grid.ravel(), j_grid.ravel()]).T
-                    
-                    if mode in ['ci', 'cj', 'a', 'b', 'angle']:
-                        values = result.ravel()
-                        params = self._fitModel(fit_model_name, locations, values)
-                        if params is not None:
-                            if fit_model_name == 'Linear':
-                                result = linearModel(locations.T, *params).reshape(scan_i, scan_j)
-                            elif fit_model_name == 'Quadratic':
-                                result = quadraticModel(locations.T, *params).reshape(scan_i, scan_j)
-                    elif mode == 'center':
-                        
-                        
-                        ci_values = result_dict['ci'].ravel()
-                        cj_values = result_dict['cj'].ravel()
-                        
-                        ci_params = self._fitModel(fit_model_name, locations, ci_values)
-                        cj_params = self._fitModel(fit_model_name, locations, cj_values)
-                        
-                        if ci_params is not None and cj_params is not None:
-                            if fit_model_name == 'Linear':
-                                ci_result = linearModel(locations.T, *ci_params).reshape(scan_i, scan_j)
-                                cj_result = linearModel(locations.T, *cj_params).reshape(scan_i, scan_j)
-                            elif fit_model_name == 'Quadratic':
-                                ci_result = quadraticModel(locations.T, *ci_params).reshape(scan_i, scan_j)
-                                cj_result = quadraticModel(locations.T, *cj_params).reshape(scan_i, scan_j)
-                            
-                            result = np.stack([ci_result, cj_result], axis=0)
-                
+                result = fitted_dict.get(mode, result_dict[mode])
                 self.hdf_handler.file[data_path][:] = result
         
         
@@ -300,9 +315,67 @@ class TaskFDDNetInference(Task):
         returns:
             (np.ndarray|None) The fitted parameters for the model, or None if the model name is not recognized.
         """
-        if model_name == 'Linear':
-            return curve_fit(linearModel, locations.T, values)[0]
-        elif model_name == 'Quadratic':
-            return curve_fit(quadraticModel, locations.T, values)[0]
+        # if model_name == 'Linear':
+        #     return curve_fit(linearModel, locations.T, values)[0]
+        # elif model_name == 'Quadratic':
+        #     return curve_fit(quadraticModel, locations.T, values)[0]
+        # else:
+        #     return None
+        if model_name in ('Linear', 'Quadratic'):
+            return fitPolynomial(locations, values, model_name, self._robust)
         else:
-            return None
\ No newline at end of file
+            return None
+
+    def _fitResults(
+        self, 
+        result_dict: dict, 
+        scan_i: int, 
+        scan_j: int,
+    ) -> dict:
+        """
+        Fit the results with their models. All of the components that use 
+        the same model (e.g. ci, cj, a, b and angle) are fitted in one solve.
+
+        arguments:
+            result_dict: (dict[str: np.ndarray]) the inference results.
+
+            scan_i: (int)
+
+            scan_j: (int)
+
+        returns:
+            (dict[str: np.ndarray]) the fitted results of the modes that use
+                'Linear' or 'Quadratic' fitting.
+        """
+        components_dict = {}
+        for mode, is_calced in self._calc_dict.items():
+            model_name = self._fit_models_dict.get(mode, None)
+            if not is_calced or model_name not in ('Linear', 'Quadratic'):
+                continue
+            components = components_dict.setdefault(model_name, [])
+            for name in (('ci', 'cj') if mode == 'center' else (mode,)):
+                if name not in components:
+                    components.append(name)
+
+        fitted_components = {}
+        for model_name, components in components_dict.items():
+            mappings = np.stack([result_dict[name] for name in components])
+            fitted = FitPolynomialMap(
+                mappings, model_name, robust = self._robust
+            )
+            for name, mapping in zip(components, fitted):
+                fitted_components[(model_name, name)] = mapping
+
+        fitted_dict = {}
+        for mode, is_calced in self._calc_dict.items():
+            model_name = self._fit_models_dict.get(mode, None)
+            if not is_calced or model_name not in ('Linear', 'Quadratic'):
+                continue
+            if mode == 'center':
+                fitted_dict[mode] = np.stack([
+                    fitted_components[(model_name, 'ci')],
+                    fitted_components[(model_name, 'cj')],
+                ], axis = 0)
+            else:
+                fitted_dict[mode] = fitted_components[(model_name, mode)]
+        return fitted_dict
\ No newline at end of file
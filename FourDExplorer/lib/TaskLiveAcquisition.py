@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+
+"""
+*------------------------- TaskLiveAcquisition.py ----------------------------*
+在电镜扫描的同时接收 4D-STEM 数据的任务。
+
+该任务包含两个并发执行的子任务：
+    - 接收子任务从 Merlin 的 TCP 端口读取帧，放入有界队列中；
+    - 写入子任务从队列中取出帧，拼成扫描行，追加到不断增长的 HDF5 数据集中，同时
+      逐行更新虚拟明场像、虚拟环形暗场像以及质心矢量场。
+队列是有界的，因此写入速度跟不上时，接收子任务会阻塞，由 TCP 向相机施加背压，而不会
+无限制地占用内存。
+
+作者:           胡一鸣
+创建日期:       2026年10月19日
+
+This module includes the task to receive 4D-STEM data while the microscope is
+still scanning.
+
+There are two subtasks executing concurrently in the task:
+    - the receiving subtask reads frames from the TCP port of Merlin, and puts
+      them into a bounded queue;
+    - the writing subtask gets frames from the queue, assembles them into scan
+      rows, appends rows to a growing HDF5 dataset, and updates virtual bright
+      field image, virtual annular dark field image and the CoM vector field
+      row by row.
+The queue is bounded, so if writing cannot keep up, the receiving subtask will
+block and TCP will apply back pressure to the camera instead of taking memory
+without limit.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*------------------------- TaskLiveAcquisition.py ----------------------------*
+"""
+
+from logging import Logger
+import queue
+import threading
+import time
+
+from PySide6.QtCore import QObject
+from PySide6.QtCore import Signal
+import numpy as np
+
+from bin.TaskManager import Task
+from bin.HDFManager import HDFHandler
+from lib.FourDSTEMMapping import CreateCenterOfMassFilters
+from lib.FourDSTEMMapping import IncrementalMapper
+from lib.MerlinStream import MerlinFrameStream
+
+
+class TaskLiveAcquisition(Task):
+    """
+    实时采集 4D-STEM 数据的任务。
+
+    Task to acquire 4D-STEM dataset from the live stream of Merlin.
+
+    The 4D-STEM dataset is created with shape (0, scan_j, dp_i, dp_j) and is
+    resized whenever a scan row is completed, so the rows that have been
+    written are always readable. If the acquisition is stopped, the dataset
+    keeps the rows received so far.
+
+    The live images are created beside the 4D-STEM dataset, and are named
+    after it, e.g. for 'live.4dstem' they are 'live_vBF.img', 'live_vADF.img'
+    and 'live_CoM.vec'.
+
+    signals:
+        live_updated: (int) emits the number of completed scan rows, at most
+            once per update interval, and once more when the task finishes.
+    """
+
+    live_updated = Signal(int)
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        shape: tuple[int],
+        dtype: str,
+        item_parent_path: str,
+        item_name: str,
+        bright_field_radius: float,
+        adf_inner_radius: float,
+        adf_outer_radius: float,
+        little_endian: bool = True,
+        buffer_frames: int = 1024,
+        update_interval: float = 0.5,
+        parent: QObject = None,
+        **meta,
+    ):
+        """
+        arguments:
+            host: (str) the address of the Merlin PC.
+
+            port: (int) the data port of Merlin, usually 6342.
+
+            shape: (tuple) (scan_i, scan_j, dp_i, dp_j) of the acquisition.
+
+            dtype: (str) the dtype of frames, e.g. 'uint16'.
+
+            item_parent_path: (str) the group where the dataset and live
+                images will be created.
+
+            item_name: (str) the name of the new 4D-STEM dataset.
+
+            bright_field_radius: (float) the radius of the virtual bright
+                field detector in pixels, centered in the pattern.
+
+            adf_inner_radius: (float) the inner radius of the virtual annular
+                dark field detector in pixels.
+
+            adf_outer_radius: (float) the outer radius of the virtual annular
+                dark field detector in pixels.
+
+            little_endian: (bool) the byte order of the frames.
+
+            buffer_frames: (int) the maximum number of frames waiting in the
+                queue between receiving and writing.
+
+            update_interval: (float) the minimum seconds between two
+                live_updated signals.
+
+            parent: (QObject)
+
+            **meta: (key word arguments) other meta data that should be stored
+                in the attrs of the 4D-STEM dataset.
+        """
+        super().__init__(parent)
+        if len(shape) != 4:
+            raise ValueError('shape must be (scan_i, scan_j, dp_i, dp_j)')
+        self._host = host
+        self._port = port
+        self._shape = tuple(shape)
+        self._dtype = np.dtype(dtype)
+        self._item_parent_path = item_parent_path
+        self._item_name = item_name
+        self._bright_field_radius = bright_field_radius
+        self._adf_inner_radius = adf_inner_radius
+        self._adf_outer_radius = adf_outer_radius
+        self._little_endian = little_endian
+        self._update_interval = update_interval
+        self._meta = meta
+
+        self._frame_queue = queue.Queue(maxsize = max(buffer_frames, 1))
+        self._stop_event = threading.Event()
+        self._stream = None
+        self._rows_done = 0
+
+        self.name = 'Live Acquisition'
+        self.comment = (
+            'Live 4D-STEM acquisition from Merlin\n'
+            'Server: {0}:{1}\n'
+            'To Dataset Object: {2}\n'.format(host, port, item_name)
+        )
+
+        self.setPrepare(self._createDatasets)
+        self.addSubtaskFunc('Receive Frames', self._workerReceive)
+        self.addSubtaskFuncWithProgress('Write Frames', self._workerWrite)
+        self.setFollow(self._finishAcquisition)
+
+    @property
+    def logger(self) -> Logger:
+        global qApp
+        return qApp.logger
+
+    @property
+    def hdf_handler(self) -> HDFHandler:
+        global qApp
+        return qApp.hdf_handler
+
+    def _joinPath(self, name: str) -> str:
+        if self._item_parent_path == '/':
+            return '/' + name
+        else:
+            return self._item_parent_path + '/' + name
+
+    @property
+    def item_path(self) -> str:
+        """
+        The path of the growing 4D-STEM dataset.
+        """
+        return self._joinPath(self._item_name)
+
+    @property
+    def live_names(self) -> dict:
+        """
+        The names of the live images, with keys 'vBF', 'vADF' and 'CoM'.
+        """
+        base_name = self._item_name.rsplit('.', 1)[0]
+        return {
+            'vBF': base_name + '_vBF.img',
+            'vADF': base_name + '_vADF.img',
+            'CoM': base_name + '_CoM.vec',
+        }
+
+    @property
+    def live_paths(self) -> dict:
+        """
+        The paths of the live images, with keys 'vBF', 'vADF' and 'CoM'.
+        """
+        return {
+            key: self._joinPath(name) for key, name in self.live_names.items()
+        }
+
+    @property
+    def rows_done(self) -> int:
+        """
+        The number of scan rows that have been written.
+        """
+        return self._rows_done
+
+    def stopAcquisition(self):
+        """
+        Ask the subtasks to stop. The rows received so far are kept.
+
+        This method can be called from the main thread at any time.
+        """
+        self._stop_event.set()
+        if self._stream is not None:
+            self._stream.close()
+
+    def _createDatasets(self):
+        """
+        Create the growing 4D-STEM dataset and the live images.
+
+        This function works as the preparing function that will be called
+        just before the task is submitted.
+        """
+        scan_i, scan_j, dp_i, dp_j = self._shape
+        self.hdf_handler.addNewData(
+            self._item_parent_path,
+            self._item_name,
+            (0, scan_j, dp_i, dp_j),
+            self._dtype.newbyteorder('='),
+            maxshape = (scan_i, scan_j, dp_i, dp_j),
+            chunks = (1, 1, dp_i, dp_j),
+        )
+        for key, value in self._meta.items():
+            try:
+                self.hdf_handler.file[self.item_path].attrs[key] = value
+            except Exception as e:
+                self.logger.error(f'Failed to set attribute {key}: {e}')
+        self.hdf_handler.attributesChanged(self.item_path)
+
+        self.hdf_handler.addNewData(
+            self._item_parent_path,
+            self.live_names['vBF'],
+            (scan_i, scan_j),
+            'float64',
+        )
+        self.hdf_handler.addNewData(
+            self._item_parent_path,
+            self.live_names['vADF'],
+            (scan_i, scan_j),
+            'float64',
+        )
+        self.hdf_handler.addNewData(
+            self._item_parent_path,
+            self.live_names['CoM'],
+            (2, scan_i, scan_j),
+            'float64',
+        )
+
+    def _createMapper(self) -> IncrementalMapper:
+        """
+        Create the mapper of the detectors.
+
+        returns:
+            (IncrementalMapper) the filters are the bright field mask, the 
+                annular dark field mask, and the three CoM filters.
+        """
+        scan_i, scan_j, dp_i, dp_j = self._shape
+        com_filters = CreateCenterOfMassFilters(dp_i, dp_j)
+        loc_i, loc_j, _ones = com_filters
+        radius = np.sqrt(loc_i**2 + loc_j**2)
+        filters = [
+            radius <= self._bright_field_radius,
+            (radius >= self._adf_inner_radius) &
+                (radius <= self._adf_outer_radius),
+        ] + com_filters
+        return IncrementalMapper(filters, (scan_i, scan_j))
+
+    def _workerReceive(self):
+        """
+        Receive frames from the server and put them into the bounded queue.
+
+        A None is always put at the end, to inform the writing subtask.
+        """
+        scan_i, scan_j, dp_i, dp_j = self._shape
+        total_frames = scan_i * scan_j
+        try:
+            self._stream = MerlinFrameStream(
+                self._host,
+                self._port,
+                little_endian = self._little_endian,
+            )
+            self._stream.connect()
+            header = self._stream.readAcquisitionHeader()
+            self.logger.info('Live acquisition started, frames in '
+                'acquisition: {0}'.format(
+                    header.get('Frames in Acquisition (Number)', 'unknown')
+                ))
+            received = 0
+            for _sequence, frame in self._stream:
+                if frame.shape != (dp_i, dp_j):
+                    raise ValueError('Frame shape {0} does not match the '
+                        'dataset {1}'.format(frame.shape, (dp_i, dp_j)))
+                if not self._putFrame(frame):
+                    break
+                received += 1
+                if received >= total_frames:
+                    break
+        except OSError as e:
+            if not self._stop_event.is_set():
+                raise
+            self.logger.debug('Connection closed by stopping: {0}'.format(e))
+        finally:
+            if self._stream is not None:
+                self._stream.close()
+            self._putFrame(None, force = True)
+
+    def _putFrame(self, frame: np.ndarray|None, force: bool = False) -> bool:
+        """
+        Put a frame into the queue, blocking while the queue is full.
+
+        arguments:
+            frame: (np.ndarray or None)
+
+            force: (bool) keep trying even if the task is stopped. Used to
+                put the final None.
+
+        returns:
+            (bool) False if the task is stopped before the frame is put.
+        """
+        while True:
+            if self._stop_event.is_set() and not force:
+                return False
+            try:
+                self._frame_queue.put(frame, timeout = 0.1)
+                return True
+            except queue.Full:
+                if force and self._stop_event.is_set():
+                    # The writer has gone, make room for the final None.
+                    try:
+                        self._frame_queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _workerWrite(self, progress_signal: Signal = None):
+        """
+        Get frames from the queue, append complete scan rows to the dataset,
+        and update the live images row by row.
+        """
+        if progress_signal is None:
+            progress_signal = Signal(int)
+        scan_i, scan_j, dp_i, dp_j = self._shape
+        dataset = self.hdf_handler.file[self.item_path]
+        live_paths = self.live_paths
+        image_bf = self.hdf_handler.file[live_paths['vBF']]
+        image_adf = self.hdf_handler.file[live_paths['vADF']]
+        image_com = self.hdf_handler.file[live_paths['CoM']]
+        mapper = self._createMapper()
+
+        row_buffer = np.zeros((scan_j, dp_i, dp_j), dtype = self._dtype)
+        column = 0
+        last_update = time.monotonic()
+        try:
+            while self._rows_done < scan_i:
+                frame = self._frame_queue.get()
+                if frame is not None:
+                    row_buffer[column] = frame
+                    column += 1
+                if column == scan_j or (frame is None and column > 0):
+                    row_buffer[column:] = 0
+                    r_ii = self._rows_done
+                    dataset.resize(r_ii + 1, axis = 0)
+                    dataset[r_ii] = row_buffer
+
+                    mapper.accumulate(row_buffer[None, :, :, :], r_ii)
+                    reduced = mapper.images[:, r_ii, :]
+                    intensity = reduced[4] + 1e-12
+                    image_bf[r_ii, :] = reduced[0]
+                    image_adf[r_ii, :] = reduced[1]
+                    image_com[0, r_ii, :] = reduced[2] / intensity
+                    image_com[1, r_ii, :] = reduced[3] / intensity
+
+                    self._rows_done += 1
+                    column = 0
+                    progress_signal.emit(int(self._rows_done / scan_i * 100))
+                    if time.monotonic() - last_update >= self._update_interval:
+                        self.live_updated.emit(self._rows_done)
+                        last_update = time.monotonic()
+                if frame is None:
+                    break
+        finally:
+            self._stop_event.set()
+            self.live_updated.emit(self._rows_done)
+
+    def _finishAcquisition(self):
+        """
+        This function works as the following function that will be called
+        just after the task is completed.
+        """
+        self.logger.info('Live acquisition finished: {0} of {1} scan rows '
+            'written to {2}'.format(
+                self._rows_done, self._shape[0], self.item_path
+            ))
@@ -16,6 +16,7 @@ date:           Apr 29, 2021
 
 from logging import Logger
 import os
+from typing import Callable
 from typing import Iterable
 from typing import Mapping
 from typing import Tuple  
@@ -36,6 +37,8 @@ from lib.ReadBinary import readFourDSTEMFromNpy
 from lib.ReadBinary import readFourDSTEMFromNpz
 from lib.ReadBinary import readFourDSTEMFromDM4
 from lib.ReadBinary import readDataFromHDF5
+from lib.HDFCopy import getCreateOptions
+from lib.FourDSTEMMapping import IncrementalMapper
 
 class TaskBaseLoadData(Task):
     """
@@ -46,7 +49,19 @@ class TaskBaseLoadData(Task):
     The task to load data from ouside file.
 
     Will create an object in the HDF5 file automatically.
+
+    For 4D-STEM datasets, enablePreview() can be called before the task is
+    submitted. Then a preview image is created beside the dataset and filled
+    incrementally while loading, so that a bad dataset can be found and the
+    task can be aborted early.
+
+    signals:
+        partial_updated: (int) emits the percentage of loaded data, when the
+            preview image is updated.
     """
+
+    partial_updated = Signal(int)
+
     def __init__(self, 
         shape: Tuple,
         file_path: str,
@@ -75,7 +90,10 @@ class TaskBaseLoadData(Task):
         self._item_parent_path = item_parent_path    # The parent group path inside HDF5 file.
         self._item_name = item_name 
         self._meta = meta 
+        self._preview_mask = None 
+        self._preview_mapper = None 
         self.name = 'Load Data'
+        self.setPrepare(self._countPatterns)
         self.comment = (
             'Load data\n'
             'Data File path: {0}\n'
@@ -105,6 +123,13 @@ class TaskBaseLoadData(Task):
         global qApp 
         return qApp.hdf_handler
         
+    def _countPatterns(self):
+        """
+        Count the diffraction patterns to be loaded, for the throughput.
+        """
+        if len(self._shape) == 4:
+            self.patterns = int(self._shape[0] * self._shape[1])
+
     def setShape(self, shape: tuple[int]):
         """
         arguments:
@@ -158,6 +183,88 @@ class TaskBaseLoadData(Task):
         """
         for key in meta:
             self._meta[key] = meta[key]
+
+    @property
+    def preview_path(self) -> str:
+        """
+        The path of the preview image, e.g. 'data_preview.img' for 
+        'data.4dstem'.
+        """
+        preview_name = self._item_name.rsplit('.', 1)[0] + '_preview.img'
+        if self._item_parent_path == '/':
+            return self._item_parent_path + preview_name
+        else:
+            return self._item_parent_path + '/' + preview_name
+
+    def enablePreview(self, mask: np.ndarray = None):
+        """
+        Create a preview image while loading the 4D-STEM dataset.
+
+        Must be called before the task is submitted. Only the loaders that 
+        accept a mapper support preview; for others this does nothing but 
+        creating an empty image.
+
+        arguments:
+            mask: (np.ndarray) the virtual detector of the preview image. If 
+                None, the total intensity of every pattern is shown.
+        """
+        if len(self._shape) != 4:
+            raise ValueError('Preview is only available for 4D-STEM dataset')
+        if mask is None:
+            mask = np.ones(self._shape[2:])
+        self._preview_mask = mask 
+        self.setPrepare(self._createPreview)
+
+    def _createPreview(self):
+        """
+        Create the preview image and its mapper.
+
+        This function works as the preparing function that will be called
+        just before the task is submitted.
+        """
+        scan_i, scan_j, dp_i, dp_j = self._shape
+        preview_parent_path, preview_name = self.preview_path.rsplit('/', 1)
+        self.hdf_handler.addNewData(
+            preview_parent_path or '/',
+            preview_name,
+            (scan_i, scan_j),
+            'float64',
+        )
+        self.hdf_handler.file[self.preview_path].attrs['/General/notes'] = (
+            'Preview of {0}'.format(self.item_path)
+        )
+        self.hdf_handler.attributesChanged(self.preview_path)
+        self._preview_mapper = IncrementalMapper(
+            [self._preview_mask],
+            (scan_i, scan_j),
+            [self.hdf_handler.file[self.preview_path]],
+            self.partial_updated,
+        )
+
+    def _readWithPreview(
+        self, 
+        reader: Callable, 
+        progress_signal: Signal = None, 
+        **kw,
+    ):
+        """
+        Call the reader, giving it the preview mapper if preview is enabled.
+
+        arguments:
+            reader: (Callable) one of the functions in lib.ReadBinary that 
+                accept a mapper.
+
+            progress_signal: (Signal)
+
+            **kw: the other arguments of the reader.
+        """
+        reader(
+            progress_signal = progress_signal, 
+            mapper = self._preview_mapper,
+            **kw,
+        )
+        if self._preview_mapper is not None:
+            self._preview_mapper.finish()
     
 class TaskLoadFourDSTEMFromRaw(TaskBaseLoadData):
     """
@@ -312,6 +419,7 @@ class TaskLoadFourDSTEMFromRaw(TaskBaseLoadData):
 
         for key, value in self._meta.items():
             self.hdf_handler.file[self.item_path].attrs[key] = value 
+        self.hdf_handler.attributesChanged(self.item_path)
 
     def _bindSubtask(self):
         """
@@ -320,7 +428,8 @@ class TaskLoadFourDSTEMFromRaw(TaskBaseLoadData):
         scan_i, scan_j, dp_i, dp_j = self._shape
         self.addSubtaskFuncWithProgress(
             'Copy Data', 
-            readFourDSTEMFromRaw,
+            self._readWithPreview,
+            reader = readFourDSTEMFromRaw,
             raw_path = self._file_path,
             item_path = self.item_path,
             dp_i = dp_i,
@@ -417,7 +526,8 @@ class TaskLoadNumpy(TaskBaseLoadData):
         if self._file_path.endswith('.npz'):
             self.addSubtaskFuncWithProgress(
                 'Load Data from .npz', 
-                readFourDSTEMFromNpz,
+                self._readWithPreview,
+                reader = readFourDSTEMFromNpz,
                 file_path = self._file_path,
                 item_path = self.item_path,
                 npz_data_name = self._npz_data_name,
@@ -425,7 +535,8 @@ class TaskLoadNumpy(TaskBaseLoadData):
         elif self._file_path.endswith('.npy'):
             self.addSubtaskFuncWithProgress(
                 'Load Data from .npy', 
-                readFourDSTEMFromNpy,
+                self._readWithPreview,
+                reader = readFourDSTEMFromNpy,
                 file_path = self._file_path,
                 item_path = self.item_path,
             )
@@ -502,6 +613,7 @@ class TaskLoadTiff(TaskBaseLoadData):
 
         for key, value in self._meta.items():
             self.hdf_handler.file[self.item_path].attrs[key] = value 
+        self.hdf_handler.attributesChanged(self.item_path)
 
     def copyFromTiff(self, file_path: str, item_path: str):
         """
@@ -634,6 +746,7 @@ class TaskLoadFourDSTEMFromDM4(TaskBaseLoadData):
                 self.hdf_handler.file[self.item_path].attrs[key] = value
             except Exception as e:
                 self.logger.error(f'Failed to set attribute {key}: {e}')
+        self.hdf_handler.attributesChanged(self.item_path)
             
     def _bindSubtask(self):
         """
@@ -642,7 +755,8 @@ class TaskLoadFourDSTEMFromDM4(TaskBaseLoadData):
         scan_i, scan_j, dp_i, dp_j = self._shape 
         self.addSubtaskFuncWithProgress(
             'Copy Data',
-            readFourDSTEMFromDM4,
+            self._readWithPreview,
+            reader = readFourDSTEMFromDM4,
             file_path = self._file_path,
             item_path = self.item_path,
             dp_i = dp_i,
@@ -678,6 +792,8 @@ class TaskLoadDataFromHDF5(TaskBaseLoadData):
             dataset = hdf_file[dataset_path]
             self._shape = dataset.shape
             self._dtype = dataset.dtype
+            # the same chunks and filters allow copying the raw chunks
+            self._create_options = getCreateOptions(dataset)
 
         super().__init__(self._shape, file_path, item_parent_path, item_name, parent, **meta)
         self._file_path = file_path
@@ -705,18 +821,31 @@ class TaskLoadDataFromHDF5(TaskBaseLoadData):
         This function works as the preparing function that will be called
         just before the task is submitted.
         """
-        self.hdf_handler.addNewData(
-            self._item_parent_path,
-            self._item_name,
-            self._shape,
-            self._dtype
-        )
+        try:
+            self.hdf_handler.addNewData(
+                self._item_parent_path,
+                self._item_name,
+                self._shape,
+                self._dtype,
+                **self._create_options,
+            )
+        except (ValueError, TypeError) as e:
+            # e.g. the filter of the source is not available
+            self.logger.warning('Cannot create dataset with the storage '
+                'options of the source, use the default ones: {0}'.format(e))
+            self.hdf_handler.addNewData(
+                self._item_parent_path,
+                self._item_name,
+                self._shape,
+                self._dtype
+            )
         
         for key, value in self._meta.items():
             try:
                 self.hdf_handler.file[self.item_path].attrs[key] = value
             except Exception as e:
                 self.logger.error(f'Failed to set attribute {key}: {e}')
+        self.hdf_handler.attributesChanged(self.item_path)
             
     def _bindSubtask(self):
         """
@@ -724,7 +853,8 @@ class TaskLoadDataFromHDF5(TaskBaseLoadData):
         """
         self.addSubtaskFuncWithProgress(
             'Copy Data',
-            readDataFromHDF5,
+            self._readWithPreview,
+            reader = readDataFromHDF5,
             file_path = self._file_path,
             dataset_path = self._dataset_path,
             item_path = self.item_path
@@ -23,7 +23,14 @@ import numpy as np
 from bin.TaskManager import Subtask, SubtaskWithProgress, Task
 from bin.HDFManager import HDFHandler
 from bin.Widgets.WidgetMasks import WidgetMaskBase
+from Constants import Precision
+from lib.ComputePrecision import getMappingDType, getRatioDType
+from lib.DiffractionAlignment import FitShiftMap, MeasureDiskShifts
 from lib.FourDSTEMMapping import CalculateCenterOfMass, CalculateVirtualImage
+from lib.FourDSTEMMapping import CreateCenterOfMassFilters
+from lib.PhaseCorrelation import MeanDiffractionPattern
+from lib.PhaseCorrelation import PhaseCorrelationRegistration
+from lib.PhaseCorrelation import RegisterDiffractionPatterns
 from lib.VectorFieldOperators import Divergence2D, Potential2D, Curl2D
 
 class TaskBaseReconstruct(Task):
@@ -107,7 +114,14 @@ class TaskVirtualImage(TaskBaseReconstruct):
     进行虚拟成像的 Task.
 
     Task to reconstruct virtual image.
+
+    signals:
+        partial_updated: (int) emits the progress in percentage, when the 
+            partially filled image is written.
     """
+
+    partial_updated = Signal(int)
+
     def __init__(
         self, 
         item_path: str, 
@@ -115,8 +129,26 @@ class TaskVirtualImage(TaskBaseReconstruct):
         image_name: str,
         mask: np.ndarray,
         parent: QObject = None, 
+        precision: Precision = Precision.Float64,
         **meta,
     ):
+        """
+        arguments:
+            item_path: (str) the 4D-STEM dataset path
+
+            image_parent_path: (str) the group where the image will be saved
+
+            image_name: (str) the name of the image dataset
+
+            mask: (np.ndarray) the virtual detector
+
+            parent: (QObject)
+
+            precision: (Precision) the precision of mapping, which also 
+                decides the dtype of the image.
+
+            **meta: the metadata of the image
+        """
         super().__init__(
             item_path, 
             image_parent_path, 
@@ -126,6 +158,7 @@ class TaskVirtualImage(TaskBaseReconstruct):
         )
 
         self._mask = mask
+        self._precision = precision
         self.setPrepare(self._createImage)
         self.setFollow(self._showImage)
         self._bindSubtask()
@@ -139,11 +172,18 @@ class TaskVirtualImage(TaskBaseReconstruct):
         """
         data_object = self.hdf_handler.file[self.stem_path]
         scan_i, scan_j, dp_i, dp_j = data_object.shape
+        self.patterns = int(scan_i * scan_j)
+        # self.hdf_handler.addNewData(
+        #     self._image_parent_path,
+        #     self._image_name,
+        #     (scan_i, scan_j),
+        #     'float64',
+        # )
         self.hdf_handler.addNewData(
             self._image_parent_path,
             self._image_name,
             (scan_i, scan_j),
-            'float64',
+            getMappingDType(self._precision, data_object.dtype, [self._mask]),
         )
 
         for key, value in self._meta.items():
@@ -151,6 +191,7 @@ class TaskVirtualImage(TaskBaseReconstruct):
                 self.hdf_handler.file[self.image_path].attrs[key] = value 
             except Exception as e:
                 self.logger.error(f'Failed to set attribute {key}: {e}')
+        self.hdf_handler.attributesChanged(self.image_path)
 
     def _bindSubtask(self):
         """
@@ -162,6 +203,8 @@ class TaskVirtualImage(TaskBaseReconstruct):
             item_path = self.stem_path,
             mask = self._mask,
             result_path = self.image_path,
+            partial_signal = self.partial_updated,
+            precision = self._precision,
         )
 
     def _showImage(self):
@@ -180,7 +223,14 @@ class TaskCenterOfMass(Task):
     进行使用质心法计算差分相位衬度像的任务。
 
     Task to calculate CoM vector fields.
+
+    signals:
+        partial_updated: (int) emits the progress in percentage, when the 
+            results of the partially accumulated CoM are written.
     """
+
+    partial_updated = Signal(int)
+
     def __init__(
         self,
         item_path: str,
@@ -192,6 +242,7 @@ class TaskCenterOfMass(Task):
         is_com_inverted = False,
         is_mean_set_to_zero = True,
         parent: QObject = None,
+        precision: Precision = Precision.Float64,
     ):
         """
         arguments:
@@ -219,6 +270,10 @@ class TaskCenterOfMass(Task):
                 subtracted from the mean vector. 
 
             parent: (QObject)
+
+            precision: (Precision) the precision of mapping. The results are 
+                float32 if the patterns are mapped in float32, otherwise 
+                float64.
         """
         super(TaskCenterOfMass, self).__init__(parent)
         self._item_path = item_path
@@ -229,6 +284,7 @@ class TaskCenterOfMass(Task):
         self._mask = mask 
         self._is_com_inverted = is_com_inverted
         self._is_mean_set_to_zero = is_mean_set_to_zero
+        self._precision = precision
 
         self.name = 'CoM Reconstruction'
         self.comment = (
@@ -260,6 +316,23 @@ class TaskCenterOfMass(Task):
         global qApp 
         return qApp.hdf_handler
 
+    def _getResultDType(self, data_object: h5py.Dataset) -> np.dtype:
+        """
+        The dtype of the CoM results, i.e. the dtype of the ratio of the 
+        moments mapped in the precision.
+
+        arguments:
+            data_object: (h5py.Dataset) the 4D-STEM dataset.
+
+        returns:
+            (np.dtype)
+        """
+        scan_i, scan_j, dp_i, dp_j = data_object.shape
+        filters = CreateCenterOfMassFilters(dp_i, dp_j, self._mask)
+        return getRatioDType(getMappingDType(
+            self._precision, data_object.dtype, filters,
+        ))
+
     def _createImages(self):
         """
         Will create multiple datasets in HDF5 file according to the calc_dict.
@@ -269,6 +342,7 @@ class TaskCenterOfMass(Task):
         """
         data_object = self.hdf_handler.file[self.stem_path]
         scan_i, scan_j, dp_i, dp_j = data_object.shape
+        self.patterns = int(scan_i * scan_j)
         for com_mode, is_calced in self._calc_dict.items():
             if is_calced:
                 if com_mode == 'CoM':
@@ -276,11 +350,17 @@ class TaskCenterOfMass(Task):
                 else:
                     shape = (scan_i, scan_j)
 
+                # self.hdf_handler.addNewData(
+                #     self._image_parent_path,
+                #     self._names_dict[com_mode],
+                #     shape,
+                #     'float64',
+                # )
                 self.hdf_handler.addNewData(
                     self._image_parent_path,
                     self._names_dict[com_mode],
                     shape,
-                    'float64',
+                    self._getResultDType(data_object),
                 )
 
                 for key, value in self._metas_dict[com_mode].items():
@@ -289,6 +369,7 @@ class TaskCenterOfMass(Task):
                         self.hdf_handler.file[data_path].attrs[key] = value
                     except Exception as e:
                         self.logger.error(f"Failed to set attribute {key} for dataset {data_path}: {e}")
+                self.hdf_handler.attributesChanged(self._getDataPath(com_mode))
 
     def _getDataPath(self, com_mode: str) -> str:
         """
@@ -306,6 +387,18 @@ class TaskCenterOfMass(Task):
         else:
             return self._image_parent_path + '/' + self._names_dict[com_mode]
 
+    def getResultPaths(self) -> dict:
+        """
+        Returns the paths of the result datasets of the calculated modes.
+
+        returns:
+            (dict) {com_mode: path}
+        """
+        return {
+            com_mode: self._getDataPath(com_mode)
+            for com_mode, is_calced in self._calc_dict.items() if is_calced
+        }
+
     def _bindSubtask(self):
         """
         Add subtask, which is the practical worker.
@@ -320,16 +413,52 @@ class TaskCenterOfMass(Task):
         Calculate the Center of Mass (CoM) distribution of the 4D-STEM dataset.
         The origin of the diffraction plane is set to the center of the 
         diffraction patterns.
-        """
-        data_object = self.hdf_handler.file[self.stem_path]
-        scan_i, scan_j, dp_i, dp_j = data_object.shape
 
+        The results are written while the CoM is being accumulated, so that 
+        they can be shown before the task is completed.
+        """
         com_i, com_j = CalculateCenterOfMass(
             self.stem_path, 
             self._mask, 
             progress_signal,
+            precision = self._precision,
+            partial_func = self._writePartialResults,
         )
-        
+        self._writeResults(com_i, com_j)
+
+    def _writePartialResults(
+        self, 
+        progress: int, 
+        com_i: np.ndarray, 
+        com_j: np.ndarray,
+    ):
+        """
+        Write the results of the partially accumulated CoM, and emit 
+        partial_updated.
+
+        arguments:
+            progress: (int) the percentage of accumulated data.
+
+            com_i: (np.ndarray) the partial CoM in i-direction.
+
+            com_j: (np.ndarray) the partial CoM in j-direction.
+        """
+        self._writeResults(com_i, com_j)
+        self.partial_updated.emit(progress)
+
+    def _writeResults(self, com_i: np.ndarray, com_j: np.ndarray):
+        """
+        Calculate the results of the modes in calc_dict from the CoM, and 
+        write them into the datasets.
+
+        arguments:
+            com_i: (np.ndarray) the CoM in i-direction.
+
+            com_j: (np.ndarray) the CoM in j-direction.
+        """
+        data_object = self.hdf_handler.file[self.stem_path]
+        scan_i, scan_j, dp_i, dp_j = data_object.shape
+
         if self._is_mean_set_to_zero:
             com_i = com_i - np.mean(com_i)
             com_j = com_j - np.mean(com_j)
@@ -338,21 +467,34 @@ class TaskCenterOfMass(Task):
             com_i = - com_i 
             com_j = - com_j 
 
-        com_vec = np.zeros((2, scan_i, scan_j))
+        # com_vec = np.zeros((2, scan_i, scan_j))
+        com_vec = np.zeros(
+            (2, scan_i, scan_j), 
+            dtype = self._getResultDType(data_object),
+        )
         com_vec[0, :, :] = com_i 
         com_vec[1, :, :] = com_j 
-        result_dict = {
-            'CoM': com_vec,
-            'CoMi': com_i,
-            'CoMj': com_j,
-            'dCoM': Divergence2D(com_i, com_j),
-            'iCoM': Potential2D(com_i, com_j),
+        # result_dict = {
+        #     'CoM': com_vec,
+        #     'CoMi': com_i,
+        #     'CoMj': com_j,
+        #     'dCoM': Divergence2D(com_i, com_j),
+        #     'iCoM': Potential2D(com_i, com_j),
+        # }
+        # the results are written repeatedly while the CoM is accumulated, 
+        # so only the selected modes are calculated
+        result_funcs = {
+            'CoM': lambda: com_vec,
+            'CoMi': lambda: com_i,
+            'CoMj': lambda: com_j,
+            'dCoM': lambda: Divergence2D(com_i, com_j),
+            'iCoM': lambda: Potential2D(com_i, com_j),
         }
 
         for com_mode, is_calced in self._calc_dict.items():
             if is_calced:
                 data_path = self._getDataPath(com_mode)
-                self.hdf_handler.file[data_path][:] = result_dict[com_mode]
+                self.hdf_handler.file[data_path][:] = result_funcs[com_mode]()
                 
     def _showImage(self):
         """
@@ -365,3 +507,253 @@ class TaskCenterOfMass(Task):
         
 
 
+
+class TaskMeasureDiskShift(TaskBaseReconstruct):
+    """
+    测量每个扫描位置上衍射盘的平移，并生成平移矢量分布 (shift mapping) 的任务。
+
+    Task to measure the shifts of the diffraction disks at every scanning 
+    point, and to write the shift mapping.
+
+    The shifts are the masked and thresholded Center of Mass of the patterns
+    relative to their centers, see DiffractionAlignment.MeasureDiskShifts. 
+    They can be fitted with a linear or quadratic model of the scanning 
+    location. The result is a vector field in the shape (2, scan_i, scan_j),
+    which can be used by TaskFourDSTEMAlignMapping.
+    """
+    def __init__(
+        self, 
+        item_path: str, 
+        image_parent_path: str, 
+        image_name: str,
+        mask: np.ndarray = None,
+        threshold: float = 0,
+        fit_model: str = None,
+        workers: int = 1,
+        robust: str = None,
+        parent: QObject = None, 
+        **meta,
+    ):
+        """
+        arguments:
+            item_path: (str) the 4D-STEM dataset path, usually the reference
+                dataset without sample.
+
+            image_parent_path: (str) the group where the shift mapping will 
+                be saved
+
+            image_name: (str) the name of the shift mapping dataset
+
+            mask: (np.ndarray) the region of the patterns that contributes. 
+                If None, all of the pattern contributes.
+
+            threshold: (float) the values below threshold times the maximum
+                of each pattern are ignored, in [0, 1).
+
+            fit_model: (str) None, 'Linear' or 'Quadratic'. The points 
+                without mass are not used in the fitting.
+
+            workers: (int) the number of threads.
+
+            robust: (str) None, 'Huber' or 'RANSAC', the robust fitting 
+                that discards the outliers.
+
+            parent: (QObject)
+
+            **meta: the metadata of the shift mapping
+        """
+        super().__init__(
+            item_path, 
+            image_parent_path, 
+            image_name, 
+            parent, 
+            **meta,
+        )
+        if fit_model not in (None, 'Linear', 'Quadratic'):
+            raise ValueError('fit_model must be None, \'Linear\' or '
+                '\'Quadratic\', not {0}'.format(fit_model))
+        self._mask = mask
+        self._threshold = threshold
+        self._fit_model = fit_model
+        self._workers = workers
+        self._robust = robust
+        self.name = 'Measure Diffraction Disk Shift'
+        self.comment = (
+            'Measure the shift of diffraction disks by Center of Mass.\n'
+            '4D-STEM dataset path: {0}\n'
+            'Fit model: {1}\n'
+            'Shift mapping is saved in: {2}\n'.format(
+                self._item_path, self._fit_model, self._image_name
+            )
+        )
+        self.setPrepare(self._createShiftMapping)
+        self.setFollow(self._showImage)
+        self.addSubtaskFuncWithProgress(
+            'Measuring Disk Shift',
+            self._workerMeasureDiskShift,
+        )
+
+    def _createShiftMapping(self):
+        """
+        Will create a dataset in HDF5 file according to the image_path.
+
+        This function works as the preparing function that will be called
+        just before the task is submitted.
+        """
+        data_object = self.hdf_handler.file[self.stem_path]
+        scan_i, scan_j, dp_i, dp_j = data_object.shape
+        self.patterns = int(scan_i * scan_j)
+        self.hdf_handler.addNewData(
+            self._image_parent_path,
+            self._image_name,
+            (2, scan_i, scan_j),
+            'float64',
+        )
+
+        for key, value in self._meta.items():
+            try:
+                self.hdf_handler.file[self.image_path].attrs[key] = value 
+            except Exception as e:
+                self.logger.error(f'Failed to set attribute {key}: {e}')
+        self.hdf_handler.attributesChanged(self.image_path)
+
+    def _workerMeasureDiskShift(self, progress_signal: Signal = None):
+        """
+        Measure the shifts block by block, fit them and write the mapping.
+
+        arguments:
+            progress_signal: (Signal)
+        """
+        data_object = self.hdf_handler.file[self.stem_path]
+        shifts, mass = MeasureDiskShifts(
+            data_object, 
+            self._mask, 
+            self._threshold, 
+            progress_signal, 
+            self._workers,
+        )
+        shift_map = FitShiftMap(
+            shifts, self._fit_model, mass != 0, self._robust
+        )
+        self.hdf_handler.file[self.image_path][:] = shift_map
+
+    def _showImage(self):
+        """
+        This function works as the following function that will be called
+        just after the task is completed.
+        """
+        self.logger.debug('Task {0} completed.'.format(self.name))
+
+
+class TaskRegisterDiskShift(TaskMeasureDiskShift):
+    """
+    用相位相关测量衍射盘的平移，并生成平移矢量分布的任务。
+
+    Task to measure the shifts of the diffraction disks by phase correlation
+    against a template, and to write the shift mapping.
+
+    Every pattern (or its edges) is registered to the template with sub-pixel
+    precision, see PhaseCorrelation.PhaseCorrelationRegistration. If the 
+    template is not given, the mean pattern of the dataset is used. The 
+    shifts are relative to the centers of the patterns, in the same 
+    convention as TaskMeasureDiskShift, so the result can be used by 
+    TaskFourDSTEMAlignMapping.
+    """
+    def __init__(
+        self, 
+        item_path: str, 
+        image_parent_path: str, 
+        image_name: str,
+        template: np.ndarray = None,
+        upsample_factor: int = 20,
+        edge_filter: bool = False,
+        fit_model: str = None,
+        workers: int = None,
+        robust: str = None,
+        parent: QObject = None, 
+        **meta,
+    ):
+        """
+        arguments:
+            item_path: (str) the 4D-STEM dataset path
+
+            image_parent_path: (str) the group where the shift mapping will 
+                be saved
+
+            image_name: (str) the name of the shift mapping dataset
+
+            template: (np.ndarray) the pattern to register to. If None, the
+                mean pattern of the dataset is used.
+
+            upsample_factor: (int) the shifts are measured to 
+                1/upsample_factor pixel.
+
+            edge_filter: (bool) whether to register the edges of the patterns
+
+            fit_model: (str) None, 'Linear' or 'Quadratic'.
+
+            workers: (int) the number of threads of the FFT.
+
+            robust: (str) None, 'Huber' or 'RANSAC', the robust fitting 
+                that discards the outliers.
+
+            parent: (QObject)
+
+            **meta: the metadata of the shift mapping
+        """
+        super().__init__(
+            item_path, 
+            image_parent_path, 
+            image_name, 
+            fit_model = fit_model,
+            workers = workers,
+            robust = robust,
+            parent = parent, 
+            **meta,
+        )
+        self._template = template
+        self._upsample_factor = upsample_factor
+        self._edge_filter = edge_filter
+        self.name = 'Register Diffraction Disk Shift'
+        self.comment = (
+            'Measure the shift of diffraction disks by phase correlation.\n'
+            '4D-STEM dataset path: {0}\n'
+            'Upsample factor: {1}\n'
+            'Edge filter: {2}\n'
+            'Fit model: {3}\n'
+            'Shift mapping is saved in: {4}\n'.format(
+                self._item_path, 
+                self._upsample_factor, 
+                self._edge_filter,
+                self._fit_model, 
+                self._image_name,
+            )
+        )
+
+    def _workerMeasureDiskShift(self, progress_signal: Signal = None):
+        """
+        Register the patterns block by block, fit the shifts and write the 
+        mapping.
+
+        arguments:
+            progress_signal: (Signal)
+        """
+        data_object = self.hdf_handler.file[self.stem_path]
+        template = self._template
+        if template is None:
+            template = MeanDiffractionPattern(data_object)
+        registration = PhaseCorrelationRegistration(
+            template,
+            upsample_factor = self._upsample_factor,
+            edge_filter = self._edge_filter,
+            workers = self._workers,
+        )
+        shifts = RegisterDiffractionPatterns(
+            data_object, 
+            registration, 
+            progress_signal,
+        )
+        shift_map = FitShiftMap(
+            shifts, self._fit_model, robust = self._robust
+        )
+        self.hdf_handler.file[self.image_path][:] = shift_map
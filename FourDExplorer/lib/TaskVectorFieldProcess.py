@@ -23,14 +23,76 @@ import numpy as np
 
 from bin.TaskManager import Task 
 from bin.HDFManager import HDFHandler
+from Constants import Precision
+from lib.ComputePrecision import getTransformDType
 from lib.TaskReconstruction import TaskBaseReconstruct
-from lib.VectorFieldOperators import Divergence2D, Curl2D, Potential2D
+# from lib.VectorFieldOperators import Divergence2D, Curl2D, Potential2D
+from lib.VectorFieldPipeline import FlipVectorStage
+from lib.VectorFieldPipeline import RotateVectorStage
+from lib.VectorFieldPipeline import SubtractVectorFieldStage
+from lib.VectorFieldPipeline import SubtractVectorOffsetStage
+from lib.VectorFieldPipeline import VectorFieldPipeline
+from lib.VectorFieldPipeline import VectorFieldStage
+
+
+def _getVectorFieldDType(precision: Precision, source_dtype: np.dtype) -> np.dtype:
+    """
+    The dtype of the results of vector field processing.
+
+    arguments:
+        precision: (Precision) Precision.Native keeps float32 vector fields 
+            in float32.
+
+        source_dtype: (np.dtype) the dtype of the source vector field.
+
+    returns:
+        (np.dtype) float64 or float32
+    """
+    precision = Precision(precision)
+    if precision == Precision.Float64:
+        return np.dtype('float64')
+    if precision == Precision.Float32:
+        return np.dtype('float32')
+    return getTransformDType(source_dtype)
+
+def _runPipeline(
+    task: TaskBaseReconstruct, 
+    stages: list[VectorFieldStage], 
+    output: str = None,
+    **kw,
+) -> h5py.Dataset:
+    """
+    Run a VectorFieldPipeline from the source of the task to its result, 
+    calculating in the dtype of the result.
+
+    arguments:
+        task: (TaskBaseVectorToVector or TaskBaseVectorToImage)
+
+        stages: (list[VectorFieldStage])
+
+        output: (str) see VectorFieldPipeline
+
+        **kw: other keyword arguments of VectorFieldPipeline
+
+    returns:
+        (h5py.Dataset) the result.
+    """
+    data_object = task.hdf_handler.file[task.source_path]
+    new_image = task.hdf_handler.file[task.image_path]
+    pipeline = VectorFieldPipeline(
+        stages, output, dtype = getTransformDType(new_image.dtype), **kw
+    )
+    return pipeline.run(data_object, new_image)
+
 
 class TaskBaseVectorToVector(TaskBaseReconstruct):
     """
     从 Vector Field 中产生一个 Vector Field 的任务的基类。
 
     Base task of producing an vector field from a vector field.
+
+    The subclasses accept the keyword argument precision (Precision), which
+    decides the dtype of the result (float64 by default).
     """
     def __init__(
         self,
@@ -38,6 +100,7 @@ class TaskBaseVectorToVector(TaskBaseReconstruct):
         image_parent_path: str,
         image_name: str,
         parent: QObject = None,
+        precision: Precision = Precision.Float64,
         **meta,
     ):
         super().__init__(
@@ -47,6 +110,7 @@ class TaskBaseVectorToVector(TaskBaseReconstruct):
             parent,
             **meta,
         )
+        self._precision = precision
         self.comment = (
             '{0}.\n'
             'Vector Field dataset path: {1}\n'
@@ -81,7 +145,8 @@ class TaskBaseVectorToVector(TaskBaseReconstruct):
             self._image_parent_path,
             self._image_name,
             (2, height, width),
-            'float64',
+            # 'float64',
+            _getVectorFieldDType(self._precision, data_object.dtype),
         )
 
         for key, value in self._meta.items():
@@ -89,6 +154,7 @@ class TaskBaseVectorToVector(TaskBaseReconstruct):
                 self.hdf_handler.file[self.image_path].attrs[key] = value
             except Exception as e:
                 self.logger.error(f"Failed to set attribute {key} for dataset {self.image_path}: {e}")
+        self.hdf_handler.attributesChanged(self.image_path)
 
     def _showVectorField(self):
         """
@@ -159,17 +225,19 @@ class TaskRotateVectorAngle(TaskBaseVectorToVector):
         returns:
             (h5py.Dataset)
         """
-        data_object = self.hdf_handler.file[self.source_path]
-        vec_i = data_object[0, :, :]
-        vec_j = data_object[1, :, :]
-        angle_rad = self._angle * np.pi / 180
-        new_vec_i = vec_i * np.cos(angle_rad) - vec_j * np.sin(angle_rad)
-        new_vec_j = vec_i * np.sin(angle_rad) + vec_j * np.cos(angle_rad)
-
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[0, :, :] = new_vec_i 
-        new_image[1, :, :] = new_vec_j
-        return new_image
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_i = data_object[0, :, :]
+        # vec_j = data_object[1, :, :]
+        # angle_rad = self._angle * np.pi / 180
+        # new_vec_i = vec_i * np.cos(angle_rad) - vec_j * np.sin(angle_rad)
+        # new_vec_j = vec_i * np.sin(angle_rad) + vec_j * np.cos(angle_rad)
+
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[0, :, :] = new_vec_i 
+        # new_image[1, :, :] = new_vec_j
+        # return new_image
+
+        return _runPipeline(self, [RotateVectorStage(self._angle)])
         
 
 class TaskSubtractVectorOffset(TaskBaseVectorToVector):
@@ -230,17 +298,19 @@ class TaskSubtractVectorOffset(TaskBaseVectorToVector):
         returns:
             (h5py.Dataset)
         """
-        data_object = self.hdf_handler.file[self.source_path]
-        vec_i = data_object[0, :, :]
-        vec_j = data_object[1, :, :]
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_i = data_object[0, :, :]
+        # vec_j = data_object[1, :, :]
+
+        # new_vec_i = vec_i - np.mean(vec_i)
+        # new_vec_j = vec_j - np.mean(vec_j)
 
-        new_vec_i = vec_i - np.mean(vec_i)
-        new_vec_j = vec_j - np.mean(vec_j)
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[0, :, :] = new_vec_i 
+        # new_image[1, :, :] = new_vec_j
+        # return new_image
 
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[0, :, :] = new_vec_i 
-        new_image[1, :, :] = new_vec_j
-        return new_image
+        return _runPipeline(self, [SubtractVectorOffsetStage()])
 
 
 class TaskSubtractVectorField(TaskBaseVectorToVector):
@@ -304,20 +374,25 @@ class TaskSubtractVectorField(TaskBaseVectorToVector):
         returns:
             (h5py.Dataset)
         """
-        data_object = self.hdf_handler.file[self.source_path]
-        vec_i = data_object[0, :, :]
-        vec_j = data_object[1, :, :]
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_i = data_object[0, :, :]
+        # vec_j = data_object[1, :, :]
 
-        subtrahend_object = self.hdf_handler.file[self._subtrahend_path]
-        subtraend_vec_i = subtrahend_object[0, :, :]
-        subtraend_vec_j = subtrahend_object[1, :, :]
+        # subtrahend_object = self.hdf_handler.file[self._subtrahend_path]
+        # subtraend_vec_i = subtrahend_object[0, :, :]
+        # subtraend_vec_j = subtrahend_object[1, :, :]
+
+        # new_vec_i = vec_i - subtraend_vec_i
+        # new_vec_j = vec_j - subtraend_vec_j
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[0, :, :] = new_vec_i 
+        # new_image[1, :, :] = new_vec_j
+        # return new_image
 
-        new_vec_i = vec_i - subtraend_vec_i
-        new_vec_j = vec_j - subtraend_vec_j
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[0, :, :] = new_vec_i 
-        new_image[1, :, :] = new_vec_j
-        return new_image
+        subtrahend_object = self.hdf_handler.file[self._subtrahend_path]
+        return _runPipeline(
+            self, [SubtractVectorFieldStage(subtrahend_object)]
+        )
 
 
 
@@ -378,13 +453,15 @@ class TaskFlipVectorField(TaskBaseVectorToVector):
         returns:
             (h5py.Dataset)
         """
-        data_object = self.hdf_handler.file[self.source_path]
-        vec_i = data_object[0, :, :]
-        vec_j = data_object[1, :, :]
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[0, :, :] = vec_j 
-        new_image[1, :, :] = vec_i
-        return new_image 
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_i = data_object[0, :, :]
+        # vec_j = data_object[1, :, :]
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[0, :, :] = vec_j 
+        # new_image[1, :, :] = vec_i
+        # return new_image
+
+        return _runPipeline(self, [FlipVectorStage()])
 
 
 class TaskBaseVectorToImage(TaskBaseReconstruct):
@@ -392,6 +469,9 @@ class TaskBaseVectorToImage(TaskBaseReconstruct):
     从 Vector Field 中产生一个图像的任务的基类。
 
     Base task of producing an image from a vector field.
+
+    The subclasses accept the keyword argument precision (Precision), which
+    decides the dtype of the result (float64 by default).
     """
     def __init__(
         self, 
@@ -399,6 +479,7 @@ class TaskBaseVectorToImage(TaskBaseReconstruct):
         image_parent_path: str, 
         image_name: str, 
         parent: QObject = None, 
+        precision: Precision = Precision.Float64,
         **meta,
     ):
         super().__init__(
@@ -408,6 +489,7 @@ class TaskBaseVectorToImage(TaskBaseReconstruct):
             parent,
             **meta,
         )
+        self._precision = precision
         self.setPrepare(self._createImage)
         self.setFollow(self._showImage)
         self.comment = (
@@ -442,7 +524,8 @@ class TaskBaseVectorToImage(TaskBaseReconstruct):
             self._image_parent_path,
             self._image_name,
             (height, width),
-            'float64',
+            # 'float64',
+            _getVectorFieldDType(self._precision, data_object.dtype),
         )
 
         for key, value in self._meta.items():
@@ -450,6 +533,7 @@ class TaskBaseVectorToImage(TaskBaseReconstruct):
                 self.hdf_handler.file[self.image_path].attrs[key] = value
             except Exception as e:
                 self.logger.error(f'Failed to set attribute {key}: {e}')
+        self.hdf_handler.attributesChanged(self.image_path)
 
     def _showImage(self):
         """
@@ -473,8 +557,25 @@ class TaskPotential(TaskBaseVectorToImage):
         image_parent_path: str, 
         image_name: str, 
         parent: QObject = None, 
+        mirror: bool = False,
         **meta,
     ):
+        """
+        arguments:
+            item_path: (str) the Vector Field dataset path.
+
+            image_parent_path: (str) the parent group's path of the new image.
+
+            image_name: (str) the potential image's name.
+
+            parent: (QObject)
+
+            mirror: (bool) whether to mirror the vector field before the 
+                Fourier transform, which suppresses the artifacts at the edges.
+
+            **meta: (key word arguments) other meta data that should be stored
+                in the attrs of reconstructed HDF5 object
+        """
         super().__init__(
             item_path,
             image_parent_path,
@@ -484,6 +585,7 @@ class TaskPotential(TaskBaseVectorToImage):
         )
 
         self.name = 'Calcuate Potential'
+        self._mirror = mirror
         
         self.addSubtaskFunc(
             'Calculating Potential',
@@ -495,15 +597,17 @@ class TaskPotential(TaskBaseVectorToImage):
         returns:
             (h5py.Dataset)
         """
-        data_object = self.hdf_handler.file[self.source_path]
-        vec_i = data_object[0, :, :]
-        vec_j = data_object[1, :, :]
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_i = data_object[0, :, :]
+        # vec_j = data_object[1, :, :]
+
+        # potential = Potential2D(vec_i, vec_j)
 
-        potential = Potential2D(vec_i, vec_j)
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[:] = potential
+        # return new_image
 
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[:] = potential
-        return new_image
+        return _runPipeline(self, [], 'potential', mirror = self._mirror)
 
 
 
@@ -541,15 +645,17 @@ class TaskDivergence(TaskBaseVectorToImage):
         returns:
             (h5py.Dataset)
         """
-        data_object = self.hdf_handler.file[self.source_path]
-        vec_i = data_object[0, :, :]
-        vec_j = data_object[1, :, :]
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_i = data_object[0, :, :]
+        # vec_j = data_object[1, :, :]
+
+        # divergence = Divergence2D(vec_i, vec_j)
 
-        divergence = Divergence2D(vec_i, vec_j)
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[:] = divergence 
+        # return new_image
 
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[:] = divergence 
-        return new_image
+        return _runPipeline(self, [], 'divergence')
 
 
 class TaskCurl(TaskBaseVectorToImage):
@@ -586,15 +692,17 @@ class TaskCurl(TaskBaseVectorToImage):
         returns:
             (h5py.Dataset)
         """
-        data_object = self.hdf_handler.file[self.source_path]
-        vec_i = data_object[0, :, :]
-        vec_j = data_object[1, :, :]
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_i = data_object[0, :, :]
+        # vec_j = data_object[1, :, :]
+
+        # divergence = Curl2D(vec_i, vec_j)
 
-        divergence = Curl2D(vec_i, vec_j)
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[:] = divergence 
+        # return new_image
 
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[:] = divergence 
-        return new_image
+        return _runPipeline(self, [], 'curl')
 
 
 class TaskSliceI(TaskBaseVectorToImage):
@@ -631,11 +739,13 @@ class TaskSliceI(TaskBaseVectorToImage):
         returns:
             (h5py.Dataset)
         """
-        data_object = self.hdf_handler.file[self.source_path]
-        vec_i = data_object[0, :, :]
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[:] = vec_i 
-        return new_image 
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_i = data_object[0, :, :]
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[:] = vec_i 
+        # return new_image
+
+        return _runPipeline(self, [], 'slice_i')
 
 
 class TaskSliceJ(TaskBaseVectorToImage):
@@ -672,9 +782,116 @@ class TaskSliceJ(TaskBaseVectorToImage):
         returns:
             (h5py.Dataset)
         """
+        # data_object = self.hdf_handler.file[self.source_path]
+        # vec_j = data_object[1, :, :]
+        # new_image = self.hdf_handler.file[self.image_path]
+        # new_image[:] = vec_j 
+        # return new_image
+
+        return _runPipeline(self, [], 'slice_j')
+
+
+class TaskVectorFieldPipeline(TaskBaseVectorToVector):
+    """
+    按顺序计算一串矢量场算符 (例如旋转 → 减去平均矢量 → 计算势) 的任务。整个链条只读取
+    一次矢量场、写入一次结果，不产生中间的数据集。
+
+    Task to calculate a chain of vector field operators in order, e.g. 
+    rotating → subtracting the offset → calculating the potential. The chain
+    reads the vector field once and writes the result once, without any 
+    intermediate datasets.
+    """
+    def __init__(
+        self,
+        item_path: str,
+        image_parent_path: str,
+        image_name: str,
+        stages: list[VectorFieldStage],
+        output: str = None,
+        mirror: bool = False,
+        parent: QObject = None,
+        **meta,
+    ):
+        """
+        arguments:
+            item_path: (str) the Vector Field dataset path.
+
+            image_parent_path: (str) the parent group's path of the result.
+
+            image_name: (str) the result's name.
+
+            stages: (list[VectorFieldStage]) the pointwise operators, like
+                RotateVectorStage and SubtractVectorOffsetStage.
+
+            output: (str) the output operator, see VectorFieldPipeline. If 
+                None, the result is a vector field. Otherwise it is an image.
+
+            mirror: (bool) whether to mirror the vector field when calculating
+                the potential.
+
+            parent: (QObject)
+
+            **meta: (key word arguments) other meta data that should be stored
+                in the attrs of reconstructed HDF5 object
+        """
+        super().__init__(
+            item_path, 
+            image_parent_path, 
+            image_name, 
+            parent, 
+            **meta
+        )
+        self._stages = list(stages)
+        self._output = output 
+        self._mirror = mirror
+        self.name = 'Vector Field Pipeline'
+        self.comment = (
+            'Calculate a chain of vector field operators.\n'
+            'Source vector field dataset path: {0}\n'
+            'Operators: {1}\n'
+            'Output: {2}\n'
+            'Result is saved in: {3}\n'.format(
+                self._item_path, 
+                ', '.join(type(stage).__name__ for stage in self._stages),
+                self._output, 
+                self._image_name,
+            )
+        )
+
+        self.addSubtaskFunc(
+            'Calculating Vector Field Pipeline',
+            self._calculatePipeline,
+        )
+
+    def _createVectorField(self):
+        """
+        Will create a dataset in HDF5 file according to the image_path, in 
+        the shape of the output.
+
+        This function works as the preparing function that will be called
+        just before the task is submitted.
+        """
         data_object = self.hdf_handler.file[self.source_path]
-        vec_j = data_object[1, :, :]
-        new_image = self.hdf_handler.file[self.image_path]
-        new_image[:] = vec_j 
-        return new_image 
+        pipeline = VectorFieldPipeline(output = self._output)
+        self.hdf_handler.addNewData(
+            self._image_parent_path,
+            self._image_name,
+            pipeline.getResultShape(data_object.shape),
+            _getVectorFieldDType(self._precision, data_object.dtype),
+        )
+
+        for key, value in self._meta.items():
+            try:
+                self.hdf_handler.file[self.image_path].attrs[key] = value
+            except Exception as e:
+                self.logger.error(f"Failed to set attribute {key} for dataset {self.image_path}: {e}")
+        self.hdf_handler.attributesChanged(self.image_path)
 
+    def _calculatePipeline(self):
+        """
+        returns:
+            (h5py.Dataset)
+        """
+        return _runPipeline(
+            self, self._stages, self._output, mirror = self._mirror
+        )
@@ -15,8 +15,13 @@ date:           May 20, 2022
 """
 
 
+from functools import lru_cache
+
 import h5py
 import numpy as np
+from scipy import fft as sp_fft
+
+from bin.MemoryBudget import getMemoryBudget
 
 def _fft2(scalar: np.ndarray) -> np.ndarray:
     return np.fft.fftshift(np.fft.fft2(np.fft.fftshift(scalar)))
@@ -24,6 +29,66 @@ def _fft2(scalar: np.ndarray) -> np.ndarray:
 def _ifft2(scalar: np.ndarray) -> np.ndarray:
     return np.fft.ifftshift(np.fft.ifft2(np.fft.ifftshift(scalar)))
 
+@lru_cache(maxsize = 16)
+def getFrequencyGrid(shape: tuple[int], dtype: str = 'float64') -> tuple:
+    """
+    Returns the space frequencies of the real FFT (rfft2) of a scalar with the
+    shape, cached per shape and dtype. The arrays are read-only.
+
+    Like _getCoord, the frequencies are in units of the pixels of the spectrum,
+    i.e. the frequencies of an axis of length n are fftfreq(n) * n. For an
+    even axis, the Nyquist frequency is -n/2 in k^2, while it is 0 in k_i and
+    k_j: an odd multiplier at the Nyquist frequency gives an imaginary result,
+    which the real part of a complex FFT drops and a real FFT cannot hold.
+
+    arguments:
+        shape: (tuple) (height, width) of the scalar.
+
+        dtype: (str) 'float64' or 'float32'
+
+    returns:
+        (tuple) k_i in the shape (height, 1), k_j in the shape (1, width//2+1),
+            and 1/(k_i^2 + k_j^2) with 0 at the origin.
+    """
+    height, width = shape
+    k_i = (np.fft.fftfreq(height) * height).astype(dtype)[:, None]
+    k_j = (np.fft.rfftfreq(width) * width).astype(dtype)[None, :]
+    k_square = k_i**2 + k_j**2
+    k_square[0, 0] = 1
+    inverse = 1 / k_square
+    inverse[0, 0] = 0
+    if height % 2 == 0:
+        k_i[height // 2, 0] = 0
+    if width % 2 == 0:
+        k_j[0, -1] = 0
+    for array in (k_i, k_j, inverse):
+        array.flags.writeable = False
+    return k_i, k_j, inverse
+
+def MirrorVectorField(vec_i: np.ndarray, vec_j: np.ndarray) -> tuple:
+    """
+    Extend the vector field to twice of its size by mirroring, so that the 
+    field is periodic without jumps at the edges. 
+
+    The potential is mirrored as an even function, so the component normal
+    to a mirror changes its sign:
+        vec_i:  [[ v_i,   v_i(:, -j) ],      vec_j: [[ v_j,  -v_j(:, -j) ],
+                 [-v_i(-i, :), -v_i(-i, -j)]]         [ v_j(-i, :), -v_j(-i, -j)]]
+
+    arguments:
+        vec_i: (np.ndarray) the i-component of the vector field
+
+        vec_j: (np.ndarray) the j-component of the vector field
+
+    returns:
+        (tuple) the i- and j-components in the shape (2 * height, 2 * width)
+    """
+    flip_j = vec_i[:, ::-1]
+    mirror_i = np.block([[vec_i, flip_j], [-vec_i[::-1, :], -flip_j[::-1, :]]])
+    flip_j = vec_j[:, ::-1]
+    mirror_j = np.block([[vec_j, -flip_j], [vec_j[::-1, :], -flip_j[::-1, :]]])
+    return mirror_i, mirror_j
+
 def _getCoord(scalar: np.ndarray) -> np.ndarray:
     """
     returns the location vector distribution.
@@ -117,7 +182,12 @@ def Laplacian2D(scalar: np.ndarray) -> np.ndarray:
     scalar_ji, scalar_jj = np.gradient(scalar_j)
     return scalar_ii +  scalar_jj 
 
-def Potential2D(vec_i: np.ndarray, vec_j: np.ndarray) -> np.ndarray:
+def Potential2D(
+    vec_i: np.ndarray, 
+    vec_j: np.ndarray,
+    mirror: bool = False,
+    workers: int = None,
+) -> np.ndarray:
     """
     Returns the potential scalar function of a vector function.
 
@@ -155,22 +225,151 @@ def Potential2D(vec_i: np.ndarray, vec_j: np.ndarray) -> np.ndarray:
         U = - IFT{[k_x FT(v_x) + k_y FT(v_y)] / [2πi (k_x^2 + k_y^2)]}
 
 
+    Since the vector field is real, the transforms are real FFTs (rfft2), 
+    and the frequencies are cached by getFrequencyGrid. The space frequencies
+    are in units of the pixels of the spectrum, as they have always been in 
+    this function. float32 fields are calculated in float32 (complex64).
+
     arguments:
         vec_i: (np.ndarray) the i-component of the vector field
 
         vec_j: (np.ndarray) the j-component of the vector field
 
+        mirror: (bool) whether to mirror the field to twice of its size 
+            before the transform, which suppresses the artifacts of the jumps
+            at the edges of a non-periodic field.
+
+        workers: (int) the number of threads of the FFT, see scipy.fft
+
     returns:
         (np.ndarray) potential distribution matrix.
     """
 
-    f_i = _fft2(vec_i)
-    f_j = _fft2(vec_j)
-    k_i, k_j = _getCoord(vec_i)
-    f_ivec = (k_i * f_i + k_j * f_j ) / (k_i**2 + k_j**2 + 1e-12)
-    potent = np.real(- _ifft2(f_ivec) / (2 * np.pi * complex(0, 1)))
-    return potent 
+    # f_i = _fft2(vec_i)
+    # f_j = _fft2(vec_j)
+    # k_i, k_j = _getCoord(vec_i)
+    # f_ivec = (k_i * f_i + k_j * f_j ) / (k_i**2 + k_j**2 + 1e-12)
+    # potent = np.real(- _ifft2(f_ivec) / (2 * np.pi * complex(0, 1)))
+    # return potent 
+
+    vec_i, vec_j = np.asarray(vec_i), np.asarray(vec_j)
+    dtype = 'float32' if vec_i.dtype == vec_j.dtype == np.float32 \
+        else 'float64'
+    vec_i = vec_i.astype(dtype, copy = False)
+    vec_j = vec_j.astype(dtype, copy = False)
+    height, width = vec_i.shape
+    if mirror:
+        vec_i, vec_j = MirrorVectorField(vec_i, vec_j)
+    shape = vec_i.shape
+    k_i, k_j, inverse = getFrequencyGrid(shape, dtype)
+
+    f_i = sp_fft.rfft2(vec_i, workers = workers)
+    f_i *= k_i
+    f_j = sp_fft.rfft2(vec_j, workers = workers)
+    f_j *= k_j
+    f_i += f_j
+    f_i *= inverse
+    # - (k·F) / (2πi k^2) = (k·F) · i / (2π k^2)
+    f_i *= 1j / (2 * np.pi)
+    potent = sp_fft.irfft2(f_i, s = shape, workers = workers)
+    return potent[:height, :width]
+
+
+def DivergenceCurlMoments(
+    vec: np.ndarray|h5py.Dataset,
+    progress_signal = None,
+) -> tuple[float]:
+    """
+    Returns the sums of the square divergence, the square curl and their 
+    product of a vector field, i.e. Σ D², Σ C² and Σ D·C, where D and C are
+    Divergence2D and Curl2D.
+
+    When the vectors are rotated by θ, i.e.
+        v_i' = v_i cos θ - v_j sin θ
+        v_j' = v_i sin θ + v_j cos θ
+    the gradients are linear, so that
+        D' = D cos θ - C sin θ
+        C' = C cos θ + D sin θ
+    and the square sums of the rotated field are quadratic forms in cos θ and 
+    sin θ of these three moments, see RotatedDivergenceCurl.
+
+    The vector field is read in blocks of rows, with one more row at each 
+    side of the block to calculate the gradients, so that the field does not
+    need to fit in the memory.
 
+    arguments:
+        vec: (np.ndarray or h5py.Dataset) in the shape (2, height, width)
 
+        progress_signal: (Signal) emits the progress in percentage.
 
+    returns:
+        (tuple) Σ D², Σ C², Σ D·C
+    """
+    _, height, width = vec.shape
+    moments = np.zeros(3, dtype = 'float64')
+    # the block read, 4 gradient images, the divergence and the curl
+    row_bytes = 2 * width * 8
+    with getMemoryBudget().request(row_bytes, height, copies = 4) as alloc:
+        rows_per_block = max(alloc.units, 2)
+        for start in range(0, height, rows_per_block):
+            stop = min(start + rows_per_block, height)
+            first, last = max(start - 1, 0), min(stop + 1, height)
+            block = np.asarray(vec[:, first:last, :], dtype = 'float64')
+            inner = slice(start - first, stop - first)
+            divergence = Divergence2D(block[0], block[1])[inner]
+            curl = Curl2D(block[0], block[1])[inner]
+            moments[0] += np.sum(divergence * divergence)
+            moments[1] += np.sum(curl * curl)
+            moments[2] += np.sum(divergence * curl)
+            if progress_signal is not None:
+                progress_signal.emit(int(stop / height * 100))
+    return tuple(moments)
+
+def RotatedDivergenceCurl(
+    moments: tuple[float], 
+    angles: np.ndarray,
+) -> tuple[np.ndarray]:
+    """
+    Returns the sums of the square divergence and the square curl of the 
+    vector field rotated by the angles, from the moments of the field.
+
+        Σ D'² = Σ D² cos²θ + Σ C² sin²θ - 2 Σ D·C sinθ cosθ
+        Σ C'² = Σ C² cos²θ + Σ D² sin²θ + 2 Σ D·C sinθ cosθ
+
+    arguments:
+        moments: (tuple) Σ D², Σ C², Σ D·C from DivergenceCurlMoments
 
+        angles: (np.ndarray) the rotation angles, unit: degree
+
+    returns:
+        (tuple) the square divergence sums and the square curl sums, in the
+            shape of angles.
+    """
+    div_sq, curl_sq, div_curl = moments
+    angle_rad = np.asarray(angles, dtype = 'float64') * np.pi / 180
+    cos, sin = np.cos(angle_rad), np.sin(angle_rad)
+    cross = 2 * div_curl * sin * cos
+    curve_div = div_sq * cos**2 + curl_sq * sin**2 - cross
+    curve_curl = curl_sq * cos**2 + div_sq * sin**2 + cross
+    return curve_div, curve_curl
+
+def MinimumCurlAngle(moments: tuple[float]) -> float:
+    """
+    Returns the rotation angle that minimizes the sum of the square curl.
+
+    Since
+        Σ C'² = (Σ C² + Σ D²)/2 + (Σ C² - Σ D²)/2 cos 2θ + Σ D·C sin 2θ
+    the minimum is where (cos 2θ, sin 2θ) is opposite to
+    ((Σ C² - Σ D²)/2, Σ D·C), which is exact at any angular resolution. The 
+    angles θ and θ + 180° give the same curl (the vectors are inverted), and 
+    the one in [0, 180) is returned.
+
+    arguments:
+        moments: (tuple) Σ D², Σ C², Σ D·C from DivergenceCurlMoments
+
+    returns:
+        (float) unit: degree, in [0, 180)
+    """
+    div_sq, curl_sq, div_curl = moments
+    double_angle = np.arctan2(- div_curl, - (curl_sq - div_sq) / 2)
+    return float(np.degrees(double_angle / 2) % 180)
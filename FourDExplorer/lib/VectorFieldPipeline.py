@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+
+"""
+*------------------------- VectorFieldPipeline.py ----------------------------*
+矢量场算符的组合与分块计算。
+
+VectorFieldPipeline 把一串逐点的矢量场算符 (旋转、减去平均矢量、减去另一个矢量场、
+交换分量) 与一个可选的输出算符 (势、散度、旋度、取分量) 组合起来。整个链条只读取一次
+源矢量场、写入一次结果，而不是每一步都生成一个新的数据集：
+    - 逐点的算符按若干行为一块计算，块的大小由内存预算决定；
+    - 势、散度与旋度需要整个矢量场，此时一次读入整个矢量场；
+    - 减去平均矢量需要先知道平均值。矢量场可以整个读入时，直接在内存中计算；否则先
+      逐块统计一次平均值。
+
+势由 VectorFieldOperators.Potential2D 计算，使用实数 FFT 与缓存的频率网格，可以
+选择镜像延拓以抑制边缘的伪影。计算的精度可以是 float64 或者 float32。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Composition and blockwise calculation of vector field operators.
+
+VectorFieldPipeline composes a chain of pointwise vector field operators
+(rotating, subtracting the mean vector, subtracting another vector field,
+exchanging the components) with an optional output operator (potential,
+divergence, curl, slicing a component). The whole chain reads the source
+vector field once and writes the result once, instead of creating a dataset
+at every step:
+    - The pointwise operators are calculated in blocks of rows, whose size is
+      decided by the memory budget.
+    - The potential, divergence and curl need the whole vector field, which is
+      then read at once.
+    - Subtracting the mean vector needs the mean first. It is calculated in
+      memory if the whole vector field can be read, otherwise in a pass of
+      blocks before.
+
+The potential is calculated by VectorFieldOperators.Potential2D, with real
+FFTs and cached frequency grids, optionally mirrored to suppress the artifacts
+at the edges. The precision can be float64 or float32.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*------------------------- VectorFieldPipeline.py ----------------------------*
+"""
+
+from PySide6.QtCore import Signal
+import h5py
+import numpy as np
+
+from bin.MemoryBudget import getMemoryBudget
+from lib.ComputePrecision import castResult
+from lib.VectorFieldOperators import Curl2D
+from lib.VectorFieldOperators import Divergence2D
+from lib.VectorFieldOperators import Potential2D
+
+
+class VectorFieldStage:
+    """
+    逐点的矢量场算符的基类。
+
+    Base class of the pointwise operators of vector fields. A stage maps a
+    block of rows of the vector field, in the shape (2, rows, width), to a
+    block of the same shape.
+    """
+    def apply(self, block: np.ndarray, rows: slice) -> np.ndarray:
+        """
+        arguments:
+            block: (np.ndarray) in the shape (2, rows, width). It may be
+                modified in place.
+
+            rows: (slice) the rows of the block in the vector field.
+
+        returns:
+            (np.ndarray) in the shape (2, rows, width)
+        """
+        raise NotImplementedError
+
+
+class RotateVectorStage(VectorFieldStage):
+    """
+    旋转每一个矢量的角度。
+
+    Rotate every vector by an angle, unit: degree.
+    """
+    def __init__(self, angle: float):
+        self.angle = angle
+
+    def apply(self, block: np.ndarray, rows: slice) -> np.ndarray:
+        angle_rad = self.angle * np.pi / 180
+        cos, sin = np.cos(angle_rad), np.sin(angle_rad)
+        vec_i, vec_j = block[0].copy(), block[1]
+        block[0] = vec_i * cos - vec_j * sin
+        block[1] = vec_i * sin + vec_j * cos
+        return block
+
+
+class FlipVectorStage(VectorFieldStage):
+    """
+    交换矢量的 i, j 分量。
+
+    Exchange the i, j components of the vectors.
+    """
+    def apply(self, block: np.ndarray, rows: slice) -> np.ndarray:
+        return block[::-1]
+
+
+class SubtractVectorFieldStage(VectorFieldStage):
+    """
+    减去另一个矢量场。
+
+    Subtract another vector field, which is read block by block as well.
+    """
+    def __init__(self, subtrahend: np.ndarray|h5py.Dataset):
+        self.subtrahend = subtrahend
+
+    def apply(self, block: np.ndarray, rows: slice) -> np.ndarray:
+        block -= self.subtrahend[:, rows, :]
+        return block
+
+
+class SubtractVectorOffsetStage(VectorFieldStage):
+    """
+    减去平均矢量。
+
+    Subtract the mean vector of the field that comes into this stage. If the
+    offset is None, the block must be the whole field and its mean is used.
+    Otherwise VectorFieldPipeline has calculated the offset in a pass before.
+    """
+    def __init__(self):
+        self.offset = None
+
+    def apply(self, block: np.ndarray, rows: slice) -> np.ndarray:
+        if self.offset is None:
+            offset = np.mean(block, axis = (1, 2), dtype = 'float64')
+        else:
+            offset = self.offset
+        block -= offset.astype(block.dtype)[:, None, None]
+        return block
+
+
+class VectorFieldPipeline:
+    """
+    矢量场算符的链条，只读取一次矢量场、写入一次结果。
+
+    The chain of vector field operators that reads the vector field once and
+    writes the result once.
+
+    The output can be:
+        None            the vector field, in the shape (2, height, width)
+        'potential'     the potential, see Potential2D
+        'divergence'    the divergence, see Divergence2D
+        'curl'          the curl, see Curl2D
+        'slice_i'       the i-component
+        'slice_j'       the j-component
+    The others are images in the shape (height, width).
+
+    Usage:
+        pipeline = VectorFieldPipeline(
+            [RotateVectorStage(30), SubtractVectorOffsetStage()],
+            output = 'potential',
+            mirror = True,
+        )
+        pipeline.run(file['/CoM'], file['/potential'], progress_signal)
+    """
+
+    outputs = (None, 'potential', 'divergence', 'curl', 'slice_i', 'slice_j')
+    _whole_field_outputs = ('potential', 'divergence', 'curl')
+
+    def __init__(
+        self,
+        stages: list[VectorFieldStage] = None,
+        output: str = None,
+        dtype: str = 'float64',
+        mirror: bool = False,
+        workers: int = None,
+    ):
+        """
+        arguments:
+            stages: (list[VectorFieldStage]) the pointwise operators, applied
+                in order.
+
+            output: (str) the output operator, one of VectorFieldPipeline.outputs
+
+            dtype: (str) 'float64' or 'float32', the dtype of calculation.
+
+            mirror: (bool) whether to mirror the vector field when calculating
+                the potential.
+
+            workers: (int) the number of threads of the FFT.
+        """
+        if output not in self.outputs:
+            raise ValueError('output must be one of {0}, not {1}'.format(
+                self.outputs, output
+            ))
+        dtype = np.dtype(dtype)
+        if dtype not in (np.dtype('float64'), np.dtype('float32')):
+            raise ValueError('dtype must be float64 or float32')
+        self.stages = list(stages or [])
+        self.output = output
+        self.dtype = dtype
+        self.mirror = mirror
+        self.workers = workers
+
+    def getResultShape(self, source_shape: tuple) -> tuple:
+        """
+        arguments:
+            source_shape: (tuple) (2, height, width)
+
+        returns:
+            (tuple) the shape of the result.
+        """
+        if self.output is None:
+            return tuple(source_shape)
+        return tuple(source_shape[1:])
+
+    def _applyStages(
+        self,
+        block: np.ndarray,
+        rows: slice,
+        stages: list = None,
+    ) -> np.ndarray:
+        for stage in (self.stages if stages is None else stages):
+            block = stage.apply(block, rows)
+        return block
+
+    def _applyOutput(self, block: np.ndarray) -> np.ndarray:
+        if self.output is None:
+            return block
+        if self.output == 'slice_i':
+            return block[0]
+        if self.output == 'slice_j':
+            return block[1]
+        if self.output == 'potential':
+            return Potential2D(
+                block[0], block[1], self.mirror, self.workers
+            )
+        if self.output == 'divergence':
+            return Divergence2D(block[0], block[1])
+        return Curl2D(block[0], block[1])
+
+    def _readBlock(
+        self,
+        source: np.ndarray|h5py.Dataset,
+        rows: slice,
+    ) -> np.ndarray:
+        # the stages work in place, so an array source is always copied
+        block = source[:, rows, :]
+        return block.astype(self.dtype, copy = isinstance(source, np.ndarray))
+
+    def _calculateOffsets(
+        self,
+        source: np.ndarray|h5py.Dataset,
+        rows_per_block: int,
+    ):
+        """
+        Calculate the offsets of SubtractVectorOffsetStage in passes of
+        blocks, one pass for each of them.
+        """
+        _, height, width = source.shape
+        for index, stage in enumerate(self.stages):
+            if not isinstance(stage, SubtractVectorOffsetStage):
+                continue
+            total = np.zeros(2, dtype = 'float64')
+            for start in range(0, height, rows_per_block):
+                rows = slice(start, min(start + rows_per_block, height))
+                block = self._applyStages(
+                    self._readBlock(source, rows), rows, self.stages[:index]
+                )
+                total += np.sum(block, axis = (1, 2), dtype = 'float64')
+            stage.offset = total / (height * width)
+
+    def run(
+        self,
+        source: np.ndarray|h5py.Dataset,
+        result: np.ndarray|h5py.Dataset,
+        progress_signal: Signal = None,
+    ) -> np.ndarray|h5py.Dataset:
+        """
+        Run the pipeline.
+
+        arguments:
+            source: (np.ndarray or h5py.Dataset) the vector field, in the
+                shape (2, height, width)
+
+            result: (np.ndarray or h5py.Dataset) in the shape of
+                getResultShape(source.shape)
+
+            progress_signal: (Signal) emits the progress in percentage.
+
+        returns:
+            (np.ndarray or h5py.Dataset) the result.
+        """
+        if len(source.shape) != 3 or source.shape[0] != 2:
+            raise ValueError('the vector field must be in the shape '
+                '(2, height, width), not {0}'.format(source.shape))
+        result_shape = self.getResultShape(source.shape)
+        if tuple(result.shape) != result_shape:
+            raise ValueError('the shape of result must be {0}, not {1}'.format(
+                result_shape, result.shape
+            ))
+        _, height, width = source.shape
+        # the block read, the copy in a stage and the result
+        row_bytes = 2 * width * self.dtype.itemsize
+        with getMemoryBudget().request(row_bytes, height, copies = 3) as alloc:
+            if self.output in self._whole_field_outputs:
+                rows_per_block = height
+            else:
+                rows_per_block = alloc.units
+
+            for stage in self.stages:
+                if isinstance(stage, SubtractVectorOffsetStage):
+                    stage.offset = None
+            if rows_per_block < height:
+                self._calculateOffsets(source, rows_per_block)
+
+            for start in range(0, height, rows_per_block):
+                rows = slice(start, min(start + rows_per_block, height))
+                block = self._applyStages(self._readBlock(source, rows), rows)
+                block = self._applyOutput(block)
+                if self.output is None:
+                    result[:, rows, :] = castResult(block, result.dtype)
+                else:
+                    result[rows, :] = castResult(block, result.dtype)
+                if progress_signal is not None:
+                    progress_signal.emit(int(rows.stop / height * 100))
+        return result
@@ -0,0 +1,629 @@
+# -*- coding: utf-8 -*-
+
+"""
+*----------------------------- BenchmarkSuite.py -----------------------------*
+FourDExplorer 的性能测试集。
+
+在临时的 HDF5 文件中生成合成的 4D-STEM 数据集 (见 SyntheticData.py)，然后测量导入
+(raw, npy, dm4)、约化 (虚拟成像、质心)、修改 (旋转、平移、滤波、扣除背底)、FDDNet
+映射以及 CTF 计算的耗时。每项测试重复若干次，记录最短的墙钟时间以及 TaskMetrics 的各项
+指标。结果以 JSON 格式输出，并附带当前的 git 提交与运行环境，从而可以在不同提交之间
+比较。缺少可选依赖 (如 onnxruntime, scikit-image) 的测试会被跳过并注明原因。
+
+用法 (在 FourDExplorer 文件夹下运行)：
+    python -m test.benchmark.BenchmarkSuite --shape 32 32 128 128 \
+        --dtype float32 --output benchmark.json --compare baseline.json
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Benchmark suite of FourDExplorer.
+
+A synthetic 4D-STEM dataset (see SyntheticData.py) is generated in a temporary
+HDF5 file. Then the time of importing (raw, npy, dm4), reductions (virtual
+image, center of mass), modifications (rotate, translate, filter, subtract
+background), FDDNet mapping and CTF calculation is measured. Every benchmark is
+repeated several times, and the shortest wall time is recorded along with the
+metrics of TaskMetrics. The results are written as JSON, with the current git
+commit and the environment, so that they can be compared between commits.
+Benchmarks whose optional dependencies (like onnxruntime, scikit-image) are
+missing are skipped with the reason.
+
+Usage (run in the FourDExplorer folder):
+    python -m test.benchmark.BenchmarkSuite --shape 32 32 128 128 \
+        --dtype float32 --output benchmark.json --compare baseline.json
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*----------------------------- BenchmarkSuite.py -----------------------------*
+"""
+
+import argparse
+import builtins
+import importlib.util
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import types
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.TaskMetrics import TaskMetrics
+from lib.FourDSTEMMapping import CalculateCenterOfMass
+from lib.FourDSTEMMapping import CalculateVirtualImage
+from lib.FourDSTEMModifying import FilteringDiffractionPattern
+from lib.FourDSTEMModifying import RotatingDiffractionPattern
+from lib.FourDSTEMModifying import SubtractBackground
+from lib.FourDSTEMModifying import TranslatingDiffractionPattern
+from lib.Probe import CTFCalculator
+from lib.Probe import optics_cache
+from lib.ReadBinary import readFourDSTEMFromDM4
+from lib.ReadBinary import readFourDSTEMFromNpy
+from lib.ReadBinary import readFourDSTEMFromRaw
+from test.benchmark.SyntheticData import SyntheticFourDSTEM
+
+
+BENCHMARKS = []         # list of Benchmark, in the order of registration
+
+
+class BenchmarkSkipped(Exception):
+    """
+    Raised in the setup of a benchmark that cannot run in this environment.
+    """
+
+
+class Benchmark:
+    """
+    一项性能测试。
+
+    A benchmark case.
+
+    The setup function receives the BenchmarkContext, prepares the inputs and
+    returns the function to be timed. The timed function returns the number
+    of diffraction patterns processed, or None.
+
+    attributes:
+        name: (str) like 'reduce.virtual_image'
+
+        group: (str) like 'reduce'
+
+        requires: (tuple) names of the optional modules required.
+    """
+    def __init__(self, name: str, setup, requires: tuple = ()):
+        self.name = name
+        self.group = name.split('.', 1)[0]
+        self.setup = setup
+        self.requires = tuple(requires)
+
+    def missingModules(self) -> list:
+        return [
+            module for module in self.requires
+            if importlib.util.find_spec(module) is None
+        ]
+
+
+def benchmark(name: str, requires: tuple = ()):
+    """
+    Register the decorated setup function as a benchmark.
+
+    arguments:
+        name: (str) '<group>.<case>'
+
+        requires: (tuple) names of the optional modules required.
+    """
+    def _register(setup):
+        BENCHMARKS.append(Benchmark(name, setup, requires))
+        return setup
+    return _register
+
+
+class BenchmarkContext:
+    """
+    性能测试的运行环境：临时文件夹、HDF5 文件与合成数据集。
+
+    The environment of benchmarks: the temporary directory, the HDF5 file and
+    the synthetic dataset at '/4D-STEM'.
+
+    A fake qApp is installed, which has only the logger and the hdf_handler,
+    as the functions in lib require. It must be installed after PySide6 is
+    imported, because importing PySide6 resets builtins.qApp.
+    """
+    item_path = '/4D-STEM'
+
+    def __init__(self, synthetic: SyntheticFourDSTEM, directory: str):
+        self.synthetic = synthetic
+        self.directory = directory
+        self.file = h5py.File(os.path.join(directory, 'benchmark.h5'), 'w')
+        synthetic.writeHDF5(self.file, self.item_path)
+        self.progress_signal = types.SimpleNamespace(emit = lambda value: None)
+        self._counter = 0
+        builtins.qApp = types.SimpleNamespace(
+            logger = logging.getLogger('Benchmark'),
+            hdf_handler = types.SimpleNamespace(file = self.file),
+        )
+
+    @property
+    def shape(self) -> tuple:
+        return self.synthetic.shape
+
+    @property
+    def patterns(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def createDataset(self, shape: tuple = None, dtype = None) -> str:
+        """
+        Create a new dataset for results.
+
+        arguments:
+            shape: (tuple) Default is the shape of the 4D-STEM dataset.
+
+            dtype: Default is the dtype of the 4D-STEM dataset.
+
+        returns:
+            (str) the path of the dataset.
+        """
+        self._counter += 1
+        item_path = '/result_{0}'.format(self._counter)
+        self.file.create_dataset(
+            item_path,
+            shape = shape or self.shape,
+            dtype = dtype or self.synthetic.dtype,
+        )
+        return item_path
+
+    def close(self):
+        self.file.close()
+
+
+# ------------------------------- Import -------------------------------------
+
+@benchmark('import.raw')
+def _importRaw(context: BenchmarkContext):
+    raw_path = context.path('synthetic.raw')
+    context.synthetic.writeRaw(raw_path)
+    item_path = context.createDataset()
+    scan_i, scan_j, dp_i, dp_j = context.shape
+    dtype = context.synthetic.dtype
+    scalar_type = {'f': 'float', 'i': 'int', 'u': 'uint'}[dtype.kind]
+    def _run():
+        readFourDSTEMFromRaw(
+            raw_path, item_path, dp_i, dp_j, scan_i, scan_j,
+            scalar_type, dtype.itemsize,
+            progress_signal = context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+@benchmark('import.npy')
+def _importNpy(context: BenchmarkContext):
+    npy_path = context.path('synthetic.npy')
+    context.synthetic.writeNpy(npy_path)
+    item_path = context.createDataset()
+    def _run():
+        readFourDSTEMFromNpy(
+            npy_path, item_path, progress_signal = context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+@benchmark('import.dm4')
+def _importDM4(context: BenchmarkContext):
+    dm4_path = context.path('synthetic.dm4')
+    offset = context.synthetic.writeDM4(dm4_path)
+    item_path = context.createDataset(dtype = '<u2')
+    scan_i, scan_j, dp_i, dp_j = context.shape
+    def _run():
+        readFourDSTEMFromDM4(
+            dm4_path, item_path, dp_i, dp_j, scan_i, scan_j, 'uint', 2,
+            offset, progress_signal = context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+
+# ------------------------------- Reduce -------------------------------------
+
+def _diskMask(context: BenchmarkContext, radius_ratio: float) -> np.ndarray:
+    dp_i, dp_j = context.shape[2:]
+    loc_i, loc_j = np.meshgrid(
+        np.arange(dp_i) - (dp_i - 1) / 2,
+        np.arange(dp_j) - (dp_j - 1) / 2,
+        indexing = 'ij',
+    )
+    radius = radius_ratio * min(dp_i, dp_j) / 2
+    return (loc_i**2 + loc_j**2 <= radius**2).astype('float64')
+
+@benchmark('reduce.virtual_image')
+def _virtualImage(context: BenchmarkContext):
+    mask = _diskMask(context, 0.5)
+    result_path = context.createDataset(context.shape[:2], 'float64')
+    def _run():
+        CalculateVirtualImage(
+            context.item_path, mask, result_path, context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+@benchmark('reduce.center_of_mass')
+def _centerOfMass(context: BenchmarkContext):
+    mask = _diskMask(context, 0.5)
+    def _run():
+        CalculateCenterOfMass(
+            context.item_path, mask, context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+
+# ------------------------------- Modify -------------------------------------
+
+@benchmark('modify.rotate')
+def _rotate(context: BenchmarkContext):
+    result_path = context.createDataset()
+    def _run():
+        RotatingDiffractionPattern(
+            context.item_path, result_path, 17.5, context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+@benchmark('modify.translate', requires = ('skimage',))
+def _translate(context: BenchmarkContext):
+    result_path = context.createDataset()
+    scan_i, scan_j = context.shape[:2]
+    rng = np.random.default_rng(0)
+    shift_mapping = rng.uniform(-2, 2, size = (2, scan_i, scan_j))
+    def _run():
+        TranslatingDiffractionPattern(
+            context.item_path, shift_mapping, result_path,
+            context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+@benchmark('modify.filter')
+def _filter(context: BenchmarkContext):
+    result_path = context.createDataset()
+    def _run():
+        FilteringDiffractionPattern(
+            context.item_path, result_path, 1, 100,
+            context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+@benchmark('modify.background')
+def _background(context: BenchmarkContext):
+    result_path = context.createDataset()
+    background_path = context.createDataset(
+        context.shape[2:], context.synthetic.dtype,
+    )
+    context.file[background_path][()] = np.mean(
+        context.file[context.item_path][0], axis = 0,
+    ).astype(context.synthetic.dtype)
+    def _run():
+        SubtractBackground(
+            context.item_path, background_path, result_path,
+            context.progress_signal,
+        )
+        return context.patterns
+    return _run
+
+
+# ------------------------------- FDDNet -------------------------------------
+
+@benchmark('fddnet.map', requires = ('onnxruntime', 'skimage', 'models'))
+def _fddnet(context: BenchmarkContext):
+    from lib.FDDNetInference import mapInferenceFDDNet
+    def _run():
+        mapInferenceFDDNet(context.item_path, context.progress_signal)
+        return context.patterns
+    return _run
+
+
+# -------------------------------- CTF ---------------------------------------
+
+def _ctfBenchmark(name: str, method: str, *args, warm_cache: bool = False):
+    """
+    Register a CTF benchmark. By default optics_cache is cleared in every 
+    run, so the CTF is calculated from scratch. With warm_cache, the cache is
+    filled in the setup and every run only hits it.
+    """
+    @benchmark(name)
+    def _setup(context: BenchmarkContext):
+        calculator = CTFCalculator(context.synthetic.optical_stem)
+        if warm_cache:
+            getattr(calculator, method)(*args)
+        def _run():
+            if not warm_cache:
+                optics_cache.clear()
+            getattr(calculator, method)(*args)
+            return None
+        return _run
+    return _setup
+
+_ctfBenchmark('ctf.virtual_image', 'calcCTFofVirtualImageFirstOrder',
+    5e-3, 15e-3)
+_ctfBenchmark('ctf.icom', 'calcCTFofICoM')
+_ctfBenchmark('ctf.dcom', 'calcCTFofDCoM')
+_ctfBenchmark('ctf.axial_bf', 'calcCTFofAxialBF')
+_ctfBenchmark('ctf.icom_warm_cache', 'calcCTFofICoM', warm_cache = True)
+
+
+# ------------------------------- Runner -------------------------------------
+
+def getGitCommit() -> str:
+    """
+    The commit of the working tree, or None if it is not a git repository.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd = ROOTPATH,
+            capture_output = True,
+            text = True,
+            check = True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def getEnvironment() -> dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'h5py': h5py.__version__,
+    }
+
+
+def runBenchmark(
+    case: Benchmark,
+    context: BenchmarkContext,
+    repeat: int = 3,
+) -> dict:
+    """
+    Run a benchmark several times.
+
+    arguments:
+        case: (Benchmark)
+
+        context: (BenchmarkContext)
+
+        repeat: (int) how many times the timed function is run.
+
+    returns:
+        (dict) with the keys 'name', 'group', 'status' ('ok', 'skipped' or
+            'failed'). If it is ok, 'best' and 'median' are the wall times in
+            seconds, and 'metrics' is the TaskMetrics of the best run.
+            Otherwise 'reason' tells why.
+    """
+    result = {'name': case.name, 'group': case.group}
+    missing = case.missingModules()
+    if missing:
+        result.update(
+            status = 'skipped',
+            reason = 'missing modules: {0}'.format(', '.join(missing)),
+        )
+        return result
+    try:
+        run = case.setup(context)
+        runs = []
+        for _ in range(max(repeat, 1)):
+            metrics = TaskMetrics()
+            metrics.start()
+            patterns = run()
+            metrics.stop()
+            metrics.patterns = patterns
+            runs.append(metrics)
+    except BenchmarkSkipped as e:
+        result.update(status = 'skipped', reason = str(e))
+        return result
+    except Exception as e:
+        result.update(
+            status = 'failed',
+            reason = '{0}: {1}'.format(type(e).__name__, e),
+            traceback = traceback.format_exc(),
+        )
+        return result
+
+    wall_times = [metrics.wall_time for metrics in runs]
+    best = min(runs, key = lambda metrics: metrics.wall_time)
+    result.update(
+        status = 'ok',
+        best = best.wall_time,
+        median = float(np.median(wall_times)),
+        wall_times = wall_times,
+        metrics = best.toDict(),
+    )
+    return result
+
+
+def runBenchmarks(
+    shape: tuple = (32, 32, 128, 128),
+    dtype: str = 'float32',
+    repeat: int = 3,
+    names: list = None,
+    seed: int = 0,
+) -> dict:
+    """
+    Generate the synthetic dataset and run the benchmarks.
+
+    arguments:
+        shape: (tuple) (scan_i, scan_j, dp_i, dp_j)
+
+        dtype: (str)
+
+        repeat: (int) how many times every benchmark is run.
+
+        names: (list) substrings of the benchmark names to be run. Default is
+            all of them.
+
+        seed: (int) the seed of the synthetic dataset.
+
+    returns:
+        (dict) the report that can be dumped as JSON.
+    """
+    cases = [
+        case for case in BENCHMARKS
+        if not names or any(name in case.name for name in names)
+    ]
+    start = time.perf_counter()
+    synthetic = SyntheticFourDSTEM(shape, dtype, seed = seed)
+    with tempfile.TemporaryDirectory() as directory:
+        context = BenchmarkContext(synthetic, directory)
+        generate_time = time.perf_counter() - start
+        try:
+            results = [runBenchmark(case, context, repeat) for case in cases]
+        finally:
+            context.close()
+    return {
+        'commit': getGitCommit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': getEnvironment(),
+        'dataset': {
+            'shape': list(synthetic.shape),
+            'dtype': synthetic.dtype.name,
+            'megabytes': synthetic.nbytes / 2**20,
+            'seed': seed,
+            'generate_time': generate_time,
+        },
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def formatReport(report: dict) -> str:
+    """
+    Format the report as a table.
+
+    arguments:
+        report: (dict) returned by runBenchmarks.
+
+    returns:
+        (str)
+    """
+    dataset = report['dataset']
+    lines = [
+        'commit {0}, dataset {1} {2} ({3:.1f} MB)'.format(
+            report['commit'], tuple(dataset['shape']), dataset['dtype'],
+            dataset['megabytes'],
+        ),
+        '{0:<28}{1:>12}{2:>12}{3:>14}{4:>14}'.format(
+            'benchmark', 'best [s]', 'median [s]', 'patterns/s',
+            'peak RSS [MB]',
+        ),
+    ]
+    for result in report['results']:
+        if result['status'] != 'ok':
+            lines.append('{0:<28}{1} ({2})'.format(
+                result['name'], result['status'], result['reason'],
+            ))
+            continue
+        metrics = result['metrics']
+        rate = metrics['patterns_per_second']
+        peak = metrics['peak_rss']
+        lines.append('{0:<28}{1:>12.4f}{2:>12.4f}{3:>14}{4:>14}'.format(
+            result['name'],
+            result['best'],
+            result['median'],
+            '-' if rate is None else '{0:.1f}'.format(rate),
+            '-' if peak is None else '{0:.1f}'.format(peak / 2**20),
+        ))
+    return '\n'.join(lines)
+
+
+def compareReports(baseline: dict, report: dict) -> str:
+    """
+    Compare the best wall times with a baseline report.
+
+    arguments:
+        baseline: (dict) the report of an earlier commit.
+
+        report: (dict) the report of the current commit.
+
+    returns:
+        (str) a table of the speedups, larger than 1 means faster.
+    """
+    old_times = {
+        result['name']: result['best'] for result in baseline['results']
+        if result['status'] == 'ok'
+    }
+    lines = [
+        'compared with commit {0}'.format(baseline.get('commit')),
+        '{0:<28}{1:>12}{2:>12}{3:>10}'.format(
+            'benchmark', 'old [s]', 'new [s]', 'speedup',
+        ),
+    ]
+    keys = ('shape', 'dtype', 'seed')
+    old_dataset = baseline.get('dataset', {})
+    new_dataset = report.get('dataset', {})
+    if any(old_dataset.get(key) != new_dataset.get(key) for key in keys):
+        lines.insert(1, 'WARNING: the datasets are different')
+    for result in report['results']:
+        name = result['name']
+        if result['status'] != 'ok' or name not in old_times:
+            continue
+        old, new = old_times[name], result['best']
+        lines.append('{0:<28}{1:>12.4f}{2:>12.4f}{3:>10.2f}'.format(
+            name, old, new, old / new if new > 0 else float('inf'),
+        ))
+    return '\n'.join(lines)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description = 'Benchmarks of '
+        'FourDExplorer on a synthetic 4D-STEM dataset.')
+    parser.add_argument('--shape', type = int, nargs = 4,
+        default = [32, 32, 128, 128], metavar = ('SCAN_I', 'SCAN_J', 'DP_I',
+        'DP_J'), help = 'shape of the synthetic 4D-STEM dataset')
+    parser.add_argument('--dtype', default = 'float32',
+        help = 'scalar type of the synthetic dataset')
+    parser.add_argument('--repeat', type = int, default = 3,
+        help = 'how many times every benchmark is run')
+    parser.add_argument('--seed', type = int, default = 0,
+        help = 'seed of the synthetic dataset')
+    parser.add_argument('--filter', nargs = '*', default = None,
+        help = 'only run benchmarks whose names include these strings')
+    parser.add_argument('--output', default = None,
+        help = 'path of the JSON report')
+    parser.add_argument('--compare', default = None,
+        help = 'path of a JSON report to be compared with')
+    parser.add_argument('--list', action = 'store_true',
+        help = 'list the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for case in BENCHMARKS:
+            print(case.name)
+        return
+
+    report = runBenchmarks(
+        tuple(args.shape), args.dtype, args.repeat, args.filter, args.seed,
+    )
+    print(formatReport(report))
+    if args.compare:
+        with open(args.compare, 'r', encoding = 'utf-8') as file:
+            print(compareReports(json.load(file), report))
+    if args.output:
+        with open(args.output, 'w', encoding = 'utf-8') as file:
+            json.dump(report, file, indent = 4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+"""
+*----------------------------- SyntheticData.py ------------------------------*
+生成用于性能测试的合成 4D-STEM 数据集。
+
+使用 lib/Probe.OpticalSTEM 计算会聚束电子探针，在一个随机的相位物体上逐点扫描，由
+|F[probe · exp(iφ)]|² 得到会聚束衍射图样。相位物体由固定的随机数种子生成，所以同样的
+参数总会生成同样的数据，不同提交之间的性能测试结果才可以相互比较。
+
+数据可以写入 HDF5 文件中的数据集，也可以写成 .raw、.npy 与 .dm4 文件，用于测试导入的
+速度。
+
+作者：          胡一鸣
+创建时间：      2026年10月19日
+
+Generate synthetic 4D-STEM datasets for benchmarks.
+
+The convergent beam probe is calculated by lib/Probe.OpticalSTEM. It scans
+over a random phase object, and the convergent beam diffraction patterns are
+|F[probe · exp(iφ)]|². The phase object is generated with a fixed random seed,
+so the same parameters always give the same data, and the benchmark results
+of different commits can be compared.
+
+The data can be written into a dataset in an HDF5 file, or into .raw, .npy and
+.dm4 files to benchmark the importers.
+
+author:         Hu Yiming
+date:           Oct 19, 2026
+*----------------------------- SyntheticData.py ------------------------------*
+"""
+
+import os
+import sys
+
+import h5py
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+ROOTPATH = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.Probe import OpticalSTEM
+
+
+class SyntheticFourDSTEM:
+    """
+    合成的 4D-STEM 数据集。
+
+    Synthetic 4D-STEM dataset of a convergent beam scanning a phase object.
+
+    Usage:
+        synthetic = SyntheticFourDSTEM((32, 32, 128, 128), dtype = 'float32')
+        with h5py.File('synthetic.h5', 'w') as file:
+            synthetic.writeHDF5(file, '/4D-STEM')
+    """
+    def __init__(
+        self,
+        shape: tuple = (32, 32, 128, 128),
+        dtype: str = 'float32',
+        accelerate_voltage: float = 300e3,
+        alpha: float = 20e-3,
+        scan_step_size: float = 0.3e-10,
+        defocus: float = -50e-10,
+        max_phase: float = 0.5,
+        dose: float = 1e4,
+        noise: bool = True,
+        seed: int = 0,
+    ):
+        """
+        arguments:
+            shape: (tuple) (scan_i, scan_j, dp_i, dp_j)
+
+            dtype: (str) the scalar type of diffraction patterns. Integer
+                types are clipped to their maximum values.
+
+            accelerate_voltage: (float) unit: V
+
+            alpha: (float) the convergent semi-angle, unit: rad
+
+            scan_step_size: (float) unit: m. It is rounded to a whole number
+                of real space pixels of the probe.
+
+            defocus: (float) unit: m
+
+            max_phase: (float) the maximum phase shift of the object, unit:
+                rad
+
+            dose: (float) the number of electrons in every pattern.
+
+            noise: (bool) whether to add the Poisson noise.
+
+            seed: (int) the seed of the random phase object and noise.
+        """
+        if len(shape) != 4:
+            raise ValueError('shape must be (scan_i, scan_j, dp_i, dp_j), '
+                'not {0}'.format(shape))
+        self.shape = tuple(int(n) for n in shape)
+        self.dtype = np.dtype(dtype)
+        self.dose = dose
+        self.noise = noise
+        self.seed = seed
+        scan_i, scan_j, dp_i, dp_j = self.shape
+
+        self.optical_stem = OpticalSTEM(
+            accelerate_voltage = accelerate_voltage,
+            detector_shape = [dp_i, dp_j],
+            scan_shape = [scan_i, scan_j],
+            alpha = alpha,
+            scan_step_size = scan_step_size,
+            bright_field_disk_radius = max(dp_i, dp_j) / 6,
+            detector_pixel_size = 150e-6,
+            defocus = defocus,
+        )
+        self.probe = self.optical_stem.getProbe()
+        self.step = max(int(round(scan_step_size / self.optical_stem.dx)), 1)
+        self.phase_object = self.generatePhaseObject(max_phase)
+
+    def generatePhaseObject(self, max_phase: float) -> np.ndarray:
+        """
+        Generate a smooth random phase object that covers the whole scan.
+
+        arguments:
+            max_phase: (float) unit: rad
+
+        returns:
+            (np.ndarray) the phase, unit: rad
+        """
+        scan_i, scan_j = self.shape[:2]
+        dp_N = self.optical_stem.dp_N
+        object_shape = (
+            (scan_i - 1) * self.step + dp_N,
+            (scan_j - 1) * self.step + dp_N,
+        )
+        rng = np.random.default_rng(self.seed)
+        phase = gaussian_filter(rng.random(object_shape), sigma = 2)
+        phase -= phase.min()
+        peak = phase.max()
+        if peak > 0:
+            phase *= max_phase / peak
+        return phase
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def generateRows(self, ii: int, rows: int = 1) -> np.ndarray:
+        """
+        Generate the diffraction patterns of some scanning rows.
+
+        arguments:
+            ii: (int) the first scanning row.
+
+            rows: (int) the number of scanning rows.
+
+        returns:
+            (np.ndarray) in the shape (rows, scan_j, dp_i, dp_j)
+        """
+        scan_i, scan_j, dp_i, dp_j = self.shape
+        rows = min(rows, scan_i - ii)
+        dp_N = self.optical_stem.dp_N
+        transmission = np.exp(1j * self.phase_object)
+        exit_waves = np.empty((rows, scan_j, dp_N, dp_N), dtype = 'complex128')
+        for ri in range(rows):
+            top = (ii + ri) * self.step
+            for jj in range(scan_j):
+                left = jj * self.step
+                exit_waves[ri, jj] = self.probe * transmission[
+                    top:top+dp_N, left:left+dp_N
+                ]
+        patterns = np.abs(np.fft.fftshift(
+            np.fft.fft2(exit_waves, axes = (-2, -1)), axes = (-2, -1),
+        ))**2
+        top = (dp_N - dp_i) // 2
+        left = (dp_N - dp_j) // 2
+        patterns = patterns[:, :, top:top+dp_i, left:left+dp_j]
+        patterns *= self.dose / patterns.sum(axis = (-2, -1), keepdims = True)
+
+        if self.noise:
+            # one generator per row, so the noise does not depend on blocks
+            for ri in range(rows):
+                rng = np.random.default_rng((self.seed, ii + ri))
+                patterns[ri] = rng.poisson(patterns[ri])
+        if self.dtype.kind in 'ui':
+            info = np.iinfo(self.dtype)
+            patterns = np.clip(np.rint(patterns), info.min, info.max)
+        return patterns.astype(self.dtype)
+
+    def iterBlocks(self, memory_budget: int = 64 * 2**20):
+        """
+        Iterate over the patterns in blocks of scanning rows.
+
+        arguments:
+            memory_budget: (int) bytes of a block of complex exit waves.
+
+        yields:
+            (tuple) (ii, block), where block has the shape
+                (rows, scan_j, dp_i, dp_j).
+        """
+        scan_i, scan_j = self.shape[:2]
+        row_bytes = scan_j * self.optical_stem.dp_N**2 * 16
+        rows = max(memory_budget // max(row_bytes, 1), 1)
+        for ii in range(0, scan_i, rows):
+            yield ii, self.generateRows(ii, rows)
+
+    def generate(self) -> np.ndarray:
+        """
+        Generate the whole 4D-STEM dataset in memory.
+
+        returns:
+            (np.ndarray) in the shape (scan_i, scan_j, dp_i, dp_j)
+        """
+        return np.concatenate([block for _, block in self.iterBlocks()])
+
+    def writeHDF5(
+        self,
+        file: h5py.File,
+        item_path: str,
+        chunks: tuple = None,
+    ) -> h5py.Dataset:
+        """
+        Write the patterns into a new dataset in the HDF5 file.
+
+        arguments:
+            file: (h5py.File)
+
+            item_path: (str) the path of the new dataset.
+
+            chunks: (tuple) the chunk shape of the dataset.
+
+        returns:
+            (h5py.Dataset)
+        """
+        dataset = file.create_dataset(
+            item_path,
+            shape = self.shape,
+            dtype = self.dtype,
+            chunks = chunks,
+        )
+        for ii, block in self.iterBlocks():
+            dataset[ii:ii+block.shape[0]] = block
+        return dataset
+
+    def writeRaw(self, path: str):
+        """
+        Write the patterns into a little-endian raw file without header.
+
+        arguments:
+            path: (str)
+        """
+        with open(path, 'wb') as file:
+            for _, block in self.iterBlocks():
+                file.write(block.astype(self.dtype.newbyteorder('<')).tobytes())
+
+    def writeNpy(self, path: str):
+        """
+        Write the patterns into a .npy file.
+
+        arguments:
+            path: (str)
+        """
+        array = np.lib.format.open_memmap(
+            path, mode = 'w+', dtype = self.dtype, shape = self.shape,
+        )
+        for ii, block in self.iterBlocks():
+            array[ii:ii+block.shape[0]] = block
+        array.flush()
+        del array
+
+    def writeDM4(self, path: str) -> int:
+        """
+        Write the patterns into a minimal .dm4 file of uint16 data.
+
+        arguments:
+            path: (str)
+
+        returns:
+            (int) the offset of the data in the file.
+        """
+        from test.test_ImporterDM4 import writeDM4
+        from lib.ImporterDM4 import ParseDM4
+        writeDM4(path, self.generate())
+        root = ParseDM4(path).parse()
+        image_4d = root.get_tag_by_name('ImageList').get_tag(1)
+        return image_4d.get_tag_by_name('Data').data.offset
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from test.benchmark.BenchmarkSuite import BENCHMARKS
+from test.benchmark.BenchmarkSuite import compareReports
+from test.benchmark.BenchmarkSuite import runBenchmarks
+from test.benchmark.SyntheticData import SyntheticFourDSTEM
+
+
+class TestSyntheticData(unittest.TestCase):
+
+    def test_reproducible(self):
+        first = SyntheticFourDSTEM((3, 4, 24, 20), 'uint16').generate()
+        second = SyntheticFourDSTEM((3, 4, 24, 20), 'uint16').generate()
+        self.assertEqual(first.shape, (3, 4, 24, 20))
+        self.assertEqual(first.dtype, np.uint16)
+        np.testing.assert_array_equal(first, second)
+
+    def test_independent_of_blocks(self):
+        synthetic = SyntheticFourDSTEM((5, 4, 24, 20), 'uint16')
+        patterns = synthetic.generate()
+        blocks = [
+            synthetic.generateRows(ii, 2) for ii in range(0, 5, 2)
+        ]
+        np.testing.assert_array_equal(np.concatenate(blocks), patterns)
+        np.testing.assert_array_equal(
+            synthetic.generateRows(3)[0], patterns[3]
+        )
+
+    def test_dose(self):
+        synthetic = SyntheticFourDSTEM(
+            (2, 3, 32, 32), 'float64', dose = 100, noise = False,
+        )
+        patterns = synthetic.generate()
+        np.testing.assert_allclose(patterns.sum(axis = (-2, -1)), 100)
+        # the bright field disk is in the center
+        self.assertGreater(patterns[0, 0, 16, 16], patterns[0, 0, 0, 0])
+        # the patterns change with the scanning position
+        self.assertFalse(np.allclose(patterns[0, 0], patterns[1, 2]))
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def test_run(self):
+        report = runBenchmarks(
+            (4, 4, 32, 32), 'float32', repeat = 1,
+            names = ['import', 'reduce', 'ctf.icom', 'fddnet'],
+        )
+        json.dumps(report)
+        statuses = {
+            result['name']: result['status'] for result in report['results']
+        }
+        self.assertEqual(statuses['import.raw'], 'ok')
+        self.assertEqual(statuses['import.npy'], 'ok')
+        self.assertEqual(statuses['import.dm4'], 'ok')
+        self.assertEqual(statuses['reduce.virtual_image'], 'ok')
+        self.assertEqual(statuses['reduce.center_of_mass'], 'ok')
+        self.assertEqual(statuses['ctf.icom'], 'ok')
+        self.assertIn(statuses['fddnet.map'], ('ok', 'skipped'))
+        self.assertNotIn('modify.rotate', statuses)
+        for result in report['results']:
+            if result['status'] == 'ok' and result['group'] != 'ctf':
+                self.assertEqual(result['metrics']['patterns'], 16)
+        self.assertIn('ctf.icom', compareReports(report, report))
+
+    def test_names_unique(self):
+        names = [case.name for case in BENCHMARKS]
+        self.assertEqual(len(names), len(set(names)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.CTFSweep import CalculateCTFSweep
+from lib.CTFSweep import CTFSweep
+from lib.Probe import CTFCalculator
+from lib.Probe import OpticalSTEM
+from lib.RadialProfile import RadialAverage
+
+
+def _createOptics(defocus: float = -20e-9, Cs: float = 1e-6):
+    return OpticalSTEM(
+        accelerate_voltage = 300e3,
+        detector_shape = [48, 48],
+        scan_shape = [16, 16],
+        alpha = 20e-3,
+        scan_step_size = 0.5e-10,
+        bright_field_disk_radius = 10,
+        detector_pixel_size = 150e-6,
+        defocus = defocus,
+        Cs = Cs,
+    )
+
+
+class TestCTFSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.defocus = np.linspace(-40e-9, 40e-9, 5)
+        self.beta_max = np.linspace(10e-3, 30e-3, 5)
+
+    def _expected(self, mode: str, defocus: float, beta_max: float):
+        calculator = CTFCalculator(_createOptics(defocus))
+        if mode == 'VirtualImageFirstOrder':
+            return calculator.calcCTFofVirtualImageFirstOrder(5e-3, beta_max)
+        if mode == 'VirtualImageSecondOrder':
+            return calculator.calcCTFofVirtualImageSecondOrder(5e-3, beta_max)
+        if mode == 'ICoM':
+            return calculator.calcCTFofICoM()
+        if mode == 'DCoM':
+            return calculator.calcCTFofDCoM()
+        return calculator.calcCTFofAxialBF()
+
+    def test_matches_calculator(self):
+        for mode in ('VirtualImageFirstOrder', 'VirtualImageSecondOrder',
+            'ICoM', 'DCoM', 'AxialBF'):
+            with self.subTest(mode = mode):
+                sweep = CTFSweep(
+                    _createOptics(),
+                    mode,
+                    {'defocus': self.defocus, 'beta_max': self.beta_max},
+                    beta_min = 5e-3,
+                )
+                ctf_images, distance, profiles = sweep.calculate()
+                for index, (defocus, beta_max) in enumerate(
+                    zip(self.defocus, self.beta_max)
+                ):
+                    expected = self._expected(mode, defocus, beta_max)
+                    scale = np.abs(expected).max()
+                    np.testing.assert_allclose(
+                        ctf_images[index], expected, atol = 1e-9 * scale
+                    )
+                    _, expected_profile = RadialAverage(expected)
+                    np.testing.assert_allclose(
+                        profiles[index], expected_profile, atol = 1e-9 * scale
+                    )
+
+    def test_threads_and_hdf5(self):
+        sweep = CTFSweep(_createOptics(), 'ICoM', {'Cs': [0, 1e-6, 2e-6]})
+        expected, _, expected_profiles = sweep.calculate()
+        with h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        ) as file:
+            images = file.create_dataset('ctf', sweep.image_shape, 'float64')
+            profiles = file.create_dataset(
+                'profiles', sweep.profile_shape, 'float64'
+            )
+            CalculateCTFSweep(sweep, images, profiles, workers = 2)
+            np.testing.assert_allclose(images[:], expected, rtol = 1e-6)
+            np.testing.assert_allclose(
+                profiles[:], expected_profiles, rtol = 1e-6
+            )
+
+    def test_invalid_parameters(self):
+        optics = _createOptics()
+        with self.assertRaises(KeyError):
+            CTFSweep(optics, 'ICoM', {'voltage': [1, 2]})
+        with self.assertRaises(ValueError):
+            CTFSweep(optics, 'ICoM', {'C1': [1, 2], 'C3': [1]})
+        with self.assertRaises(ValueError):
+            CTFSweep(optics, 'TEM', {'C1': [1, 2]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.ComputeCache import ComputeCache
+
+
+class TestComputeCache(unittest.TestCase):
+
+    def test_get(self):
+        cache = ComputeCache()
+        first = cache.get(('ones', 4), lambda: np.ones(4))
+        self.assertIs(cache.get(('ones', 4), lambda: np.zeros(4)), first)
+        self.assertFalse(first.flags.writeable)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        pair = cache.get(('pair',), lambda: (np.ones(2), np.zeros(2)))
+        self.assertFalse(pair[1].flags.writeable)
+
+    def test_least_recently_used(self):
+        cache = ComputeCache(max_bytes = 2 * 8 * 100)
+        first = cache.get(('a',), lambda: np.zeros(100))
+        cache.get(('b',), lambda: np.zeros(100))
+        self.assertIs(cache.get(('a',), lambda: np.zeros(100)), first)
+        cache.get(('c',), lambda: np.zeros(100))
+        # 'b' is dropped, since 'a' was used after it
+        self.assertIs(cache.get(('a',), lambda: np.zeros(100)), first)
+        self.assertEqual(cache.misses, 3)
+        cache.get(('b',), lambda: np.zeros(100))
+        self.assertEqual(cache.misses, 4)
+        cache.clear()
+        self.assertIsNot(cache.get(('a',), lambda: np.zeros(100)), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import builtins
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from Constants import Precision
+from lib.ComputePrecision import castResult
+from lib.ComputePrecision import getMappingDType
+from lib.ComputePrecision import getResultDType
+from lib.ComputePrecision import getTransformDType
+from lib.FourDSTEMMapping import CalculateCenterOfMass
+from lib.FourDSTEMMapping import CalculateVirtualImage
+from lib.FourDSTEMMapping import IncrementalMapper
+from lib.FourDSTEMModifying import FilteringDiffractionPattern
+from lib.FourDSTEMModifying import RotatingDiffractionPattern
+
+
+class TestPrecisionDType(unittest.TestCase):
+
+    def test_mapping_dtype(self):
+        integral = [np.ones((4, 4), dtype = 'bool')]
+        fractional = [np.full((4, 4), 0.5)]
+        self.assertEqual(getMappingDType(Precision.Float64, 'uint8'), 'float64')
+        self.assertEqual(getMappingDType(Precision.Float32, 'float64'),
+            'float32')
+        self.assertEqual(getMappingDType(Precision.Native, 'uint16', integral),
+            'int64')
+        self.assertEqual(
+            getMappingDType(Precision.Native, 'uint16', fractional), 'float32'
+        )
+        self.assertEqual(
+            getMappingDType(Precision.Native, 'int32', fractional), 'float64'
+        )
+        self.assertEqual(getMappingDType(Precision.Native, 'float32',
+            integral), 'float32')
+        self.assertEqual(getMappingDType(Precision.Native, 'float64',
+            integral), 'float64')
+
+    def test_result_dtype(self):
+        self.assertEqual(getResultDType(Precision.Native, 'uint16'), 'uint16')
+        self.assertEqual(getResultDType(Precision.Float32, 'uint16'),
+            'float32')
+        self.assertEqual(getTransformDType('uint16'), 'float32')
+        self.assertEqual(getTransformDType('int32'), 'float64')
+        self.assertEqual(getTransformDType('float32'), 'float32')
+
+    def test_cast_result(self):
+        data = np.array([-3.0, 1.4, 1.6, 300.0])
+        np.testing.assert_array_equal(castResult(data, 'uint8'),
+            [0, 1, 2, 255])
+        self.assertEqual(castResult(data, 'float32').dtype, 'float32')
+        np.testing.assert_array_equal(
+            castResult(np.array([-1, 70000]), 'uint16'), [0, 65535]
+        )
+
+
+_progress = SimpleNamespace(emit = lambda value: None)
+
+
+class TestPrecisionMapping(unittest.TestCase):
+
+    def setUp(self):
+        self.file = h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        )
+        rng = np.random.default_rng(0)
+        self.data = rng.integers(0, 2**16, size = (4, 5, 16, 16)).astype(
+            'uint16'
+        )
+        self.file.create_dataset('/4D-STEM', data = self.data)
+        self._qApp = getattr(builtins, 'qApp', None)
+        builtins.qApp = SimpleNamespace(
+            hdf_handler = SimpleNamespace(file = self.file),
+        )
+
+    def tearDown(self):
+        builtins.qApp = self._qApp
+        self.file.close()
+
+    def test_integer_mapping_is_exact(self):
+        mask = np.zeros((16, 16), dtype = 'bool')
+        mask[4:12, 4:12] = True
+        self.file.create_dataset('/image', shape = (4, 5), dtype = 'int64')
+        CalculateVirtualImage(
+            '/4D-STEM', mask, '/image', _progress, 
+            precision = Precision.Native,
+        )
+        image = self.file['/image'][:]
+        expected = np.sum(self.data[:, :, 4:12, 4:12], axis = (-2, -1),
+            dtype = 'int64')
+        self.assertEqual(image.dtype, 'int64')
+        np.testing.assert_array_equal(image, expected)
+
+    def test_incremental_mapper_dtype(self):
+        filters = [np.ones((16, 16))]
+        mapper = IncrementalMapper(filters, (4, 5), dtype = 'int64')
+        mapper.accumulate(self.data, 0, 0)
+        result = mapper.finish()
+        self.assertEqual(result.dtype, 'int64')
+        np.testing.assert_array_equal(
+            result[0], self.data.sum(axis = (-2, -1), dtype = 'int64')
+        )
+
+    def test_float32_center_of_mass(self):
+        com_64 = CalculateCenterOfMass('/4D-STEM', None, _progress)
+        com_32 = CalculateCenterOfMass(
+            '/4D-STEM', None, _progress, precision = Precision.Float32
+        )
+        for result_64, result_32 in zip(com_64, com_32):
+            self.assertEqual(result_32.dtype, 'float32')
+            np.testing.assert_allclose(result_32, result_64, atol = 1e-3)
+
+    def test_partial_center_of_mass(self):
+        partials = []
+        com_i, com_j = CalculateCenterOfMass(
+            '/4D-STEM', None, _progress, 
+            partial_func = lambda *args: partials.append(args),
+        )
+        self.assertGreater(len(partials), 0)
+        progress, partial_i, partial_j = partials[-1]
+        self.assertEqual(progress, 100)
+        np.testing.assert_array_equal(partial_i, com_i)
+        np.testing.assert_array_equal(partial_j, com_j)
+
+    def test_integer_transforms(self):
+        self.file.create_dataset('/rotated', shape = self.data.shape,
+            dtype = 'uint16')
+        RotatingDiffractionPattern('/4D-STEM', '/rotated', 90, _progress)
+        np.testing.assert_array_equal(
+            self.file['/rotated'][:], np.rot90(self.data, axes = (-2, -1))
+        )
+
+        self.file.create_dataset('/filtered', shape = self.data.shape,
+            dtype = 'uint16')
+        FilteringDiffractionPattern(
+            '/4D-STEM', '/filtered', 100, 60000.5, _progress,
+        )
+        expected = np.where(self.data < 100, 0, self.data)
+        expected = np.minimum(expected, 60000)
+        np.testing.assert_array_equal(self.file['/filtered'][:], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
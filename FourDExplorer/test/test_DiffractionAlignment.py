@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.DiffractionAlignment import FitShiftMap
+from lib.DiffractionAlignment import MeasureDiskShifts
+from lib.DiffractionAlignment import PatternCenterOfMass
+from lib.VectorFieldOperators import CenterOfMass
+
+
+def _createDisks(scan_i = 6, scan_j = 7, dp_N = 32):
+    # Gaussian disks whose centers move linearly with the scanning location
+    ii, jj = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing = 'ij')
+    shifts = np.stack([0.3 * ii - 0.2 * jj + 1, 0.1 * ii + 0.25 * jj - 2])
+    center = (dp_N - 1) / 2
+    grid_i, grid_j = np.meshgrid(
+        np.arange(dp_N) - center, np.arange(dp_N) - center, indexing = 'ij'
+    )
+    patterns = np.exp(- (
+        (grid_i - shifts[0, :, :, None, None])**2
+        + (grid_j - shifts[1, :, :, None, None])**2
+    ) / (2 * 2.5**2))
+    return patterns, shifts
+
+
+class TestMeasureDiskShifts(unittest.TestCase):
+
+    def setUp(self):
+        self.patterns, self.shifts = _createDisks()
+
+    def test_matches_center_of_mass(self):
+        rng = np.random.default_rng(0)
+        patterns = self.patterns + 0.05 * rng.random(self.patterns.shape)
+        shifts, mass = MeasureDiskShifts(patterns)
+        for ii, jj in ((0, 0), (2, 5), (5, 6)):
+            np.testing.assert_allclose(
+                shifts[:, ii, jj], CenterOfMass(patterns[ii, jj])
+            )
+            np.testing.assert_allclose(
+                PatternCenterOfMass(patterns[ii, jj]), shifts[:, ii, jj]
+            )
+        np.testing.assert_allclose(mass, patterns.sum(axis = (-2, -1)))
+
+        # the threshold removes the background that biases the CoM
+        biased = np.abs(shifts - self.shifts).max()
+        shifts, _ = MeasureDiskShifts(patterns, threshold = 0.2)
+        self.assertLess(np.abs(shifts - self.shifts).max(), biased / 5)
+
+    def test_threads_and_hdf5(self):
+        mask = np.zeros((32, 32))
+        mask[4:28, 4:28] = 1
+        expected, _ = MeasureDiskShifts(self.patterns, mask)
+        with h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        ) as file:
+            dataset = file.create_dataset('4D-STEM', data = self.patterns)
+            shifts, _ = MeasureDiskShifts(dataset, mask, workers = 3)
+        np.testing.assert_allclose(shifts, expected)
+
+    def test_fit(self):
+        shifts, mass = MeasureDiskShifts(self.patterns)
+        noisy = shifts.copy()
+        noisy[:, ::2, ::3] += 0.01
+        for model in ('Linear', 'Quadratic'):
+            with self.subTest(model = model):
+                shift_map = FitShiftMap(noisy, model, mass != 0)
+                np.testing.assert_allclose(shift_map, self.shifts, atol = 0.01)
+        self.assertIs(FitShiftMap(shifts), shifts)
+        with self.assertRaises(ValueError):
+            FitShiftMap(shifts, 'Cubic')
+
+    def test_empty_patterns(self):
+        patterns = self.patterns.copy()
+        patterns[1, 1] = 0
+        shifts, mass = MeasureDiskShifts(patterns)
+        self.assertEqual(mass[1, 1], 0)
+        np.testing.assert_array_equal(shifts[:, 1, 1], 0)
+
+        # a single pattern without mass keeps the center, like CenterOfMass
+        empty = np.zeros((32, 33))
+        self.assertEqual(PatternCenterOfMass(empty), CenterOfMass(empty))
+        self.assertEqual(PatternCenterOfMass(empty), (15.5, 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
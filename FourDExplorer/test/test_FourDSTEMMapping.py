@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.FourDSTEMMapping import CreateCenterOfMassFilters
+from lib.FourDSTEMMapping import IncrementalMapper
+
+
+class TestIncrementalMapper(unittest.TestCase):
+
+    def setUp(self):
+        self.data = np.random.randint(
+            0, 256, size = (5, 7, 6, 8)
+        ).astype('uint8')
+        self.filters = [
+            np.random.rand(6, 8),
+        ] + CreateCenterOfMassFilters(6, 8)
+        self.expected = np.einsum(
+            'ijkl,nkl->nij', self.data.astype('float64'), self.filters
+        )
+
+    def test_scan_blocks(self):
+        result = np.zeros((5, 7))
+        mapper = IncrementalMapper(
+            self.filters[:1], (5, 7), [result], update_interval = 0
+        )
+        for ii in range(5):
+            for j_start in range(0, 7, 3):
+                mapper.accumulate(
+                    self.data[ii:ii+1, j_start:j_start+3], ii, j_start
+                )
+        self.assertEqual(mapper.progress, 100)
+        mapper.finish()
+        np.testing.assert_allclose(result, self.expected[0])
+
+    def test_pattern_slabs(self):
+        mapper = IncrementalMapper(self.filters, (5, 7))
+        for i_start in range(0, 6, 4):
+            mapper.accumulate(
+                self.data[:, :, i_start:i_start+4, :], 0, 0, i_start, 0
+            )
+        np.testing.assert_allclose(mapper.finish(), self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.FourDSTEMSimulation import FourDSTEMSimulator
+from lib.FourDSTEMSimulation import SimulateFourDSTEM
+from lib.Probe import OpticalSTEM
+from lib.ScanGeometry import generateScanPositions
+
+
+def _createOptics(scan_step_size: float = 0.4e-10):
+    return OpticalSTEM(
+        accelerate_voltage = 300e3,
+        detector_shape = [32, 32],
+        scan_shape = [5, 6],
+        alpha = 20e-3,
+        scan_step_size = scan_step_size,
+        bright_field_disk_radius = 6,
+        detector_pixel_size = 150e-6,
+        defocus = -10e-9,
+    )
+
+
+class TestScanGeometry(unittest.TestCase):
+
+    def test_probe_positions(self):
+        optics = _createOptics()
+        angle = 0.3
+        step = optics.scan_step_size / optics.dx
+        expected = np.zeros((5, 6, 2))
+        for ii in range(5):
+            for jj in range(6):
+                expected[ii, jj, 0] = (ii+1) * step * np.cos(angle) \
+                    - (jj+1) * step * np.sin(angle)
+                expected[ii, jj, 1] = (ii+1) * step * np.sin(angle) \
+                    + (jj+1) * step * np.cos(angle)
+        np.testing.assert_allclose(
+            optics.generateProbePositions(angle), expected
+        )
+
+    def test_rotation(self):
+        positions = generateScanPositions((2, 3), 2.0, np.pi/2, (1, 1))
+        np.testing.assert_allclose(positions[1, 0], (1, 3), atol = 1e-12)
+        np.testing.assert_allclose(positions[0, 2], (-3, 1), atol = 1e-12)
+
+
+class TestFourDSTEMSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.optics = _createOptics()
+        rng = np.random.default_rng(0)
+        shape = FourDSTEMSimulator.getObjectShape(self.optics, padding = 2)
+        self.phase = rng.random(shape) * 0.5
+
+    def test_vacuum(self):
+        optics = self.optics
+        simulator = FourDSTEMSimulator(optics, np.ones((80, 80), 'complex'))
+        patterns = simulator.simulateRows(0, 5)
+        expected = np.abs(optics.fft2(optics.getProbe(), optics.dx))**2 \
+            * optics.du**2
+        # sub-pixel positions shift the probe without changing the patterns
+        self.assertTrue(np.any(simulator.positions % 1))
+        np.testing.assert_allclose(
+            patterns, np.broadcast_to(expected, patterns.shape), 
+            atol = 1e-9 * expected.max(),
+        )
+        self.assertAlmostEqual(patterns[0, 0].sum(), 1.0, places = 6)
+
+    def test_integer_positions(self):
+        optics = self.optics
+        positions = generateScanPositions((3, 4), 3)
+        simulator = FourDSTEMSimulator(
+            optics, self.phase, positions, padding = 1
+        )
+        patterns = simulator.simulateRows(0, 3)
+        probe = optics.getProbe()
+        dp_N = optics.dp_N
+        for ii in range(3):
+            for jj in range(4):
+                top, left = 1 + 3 * ii, 1 + 3 * jj
+                window = np.exp(1j * self.phase[top:top+dp_N, left:left+dp_N])
+                expected = np.abs(
+                    optics.fft2(probe * window, optics.dx)
+                )**2 * optics.du**2
+                np.testing.assert_allclose(
+                    patterns[ii, jj], expected, atol = 1e-9 * expected.max()
+                )
+
+    def test_stream_to_hdf5(self):
+        simulator = FourDSTEMSimulator(
+            self.optics, self.phase, padding = 2, dose = 1e4, seed = 1,
+        )
+        with h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        ) as file:
+            dataset = file.create_dataset('4D-STEM', simulator.shape, 'uint16')
+            SimulateFourDSTEM(simulator, dataset)
+            data = dataset[:]
+        self.assertEqual(data.shape, (5, 6, 32, 32))
+        np.testing.assert_array_equal(data[2:3], simulator.simulateRows(2, 1))
+        self.assertLess(abs(data.sum(axis = (-2, -1)).mean() - 1e4), 300)
+
+    def test_object_too_small(self):
+        with self.assertRaises(ValueError):
+            FourDSTEMSimulator(self.optics, np.ones((10, 10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
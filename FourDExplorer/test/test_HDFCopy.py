@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.FourDSTEMMapping import IncrementalMapper
+from lib.HDFCopy import canCopyChunksDirectly
+from lib.HDFCopy import copyDataset
+from lib.HDFCopy import getCreateOptions
+from lib.HDFCopy import planHyperslab
+
+
+class _Progress:
+    def __init__(self):
+        self.values = []
+
+    def emit(self, value: int):
+        self.values.append(value)
+
+
+class TestHDFCopy(unittest.TestCase):
+
+    def setUp(self):
+        self.file = h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        )
+        self.data = np.random.randint(
+            0, 2**16, size = (5, 6, 7, 8)
+        ).astype('uint16')
+        self.src = self.file.create_dataset(
+            'src', 
+            data = self.data, 
+            chunks = (1, 3, 7, 8), 
+            compression = 'gzip', 
+            compression_opts = 4, 
+            shuffle = True,
+        )
+
+    def tearDown(self):
+        self.file.close()
+
+    def test_plan_hyperslab(self):
+        # whole trailing axes first, then multiples of the unit
+        self.assertEqual(planHyperslab((5, 6, 7, 8), (1, 3, 7, 8), 2, 2000),
+            (2, 6, 7, 8))
+        self.assertEqual(planHyperslab((5, 6, 7, 8), (1, 3, 7, 8), 2, 8000),
+            (5, 6, 7, 8))
+        self.assertEqual(planHyperslab((5, 6, 7, 8), (1, 3, 7, 8), 2, 10),
+            (1, 3, 7, 8))
+        self.assertEqual(planHyperslab((5, 6, 7, 8), (1, 1, 1, 1), 2, 240),
+            (1, 2, 7, 8))
+
+    def test_direct_chunk_copy(self):
+        dest = self.file.create_dataset(
+            'dest', shape = self.src.shape, dtype = self.src.dtype, 
+            **getCreateOptions(self.src)
+        )
+        self.assertTrue(canCopyChunksDirectly(self.src, dest))
+        progress = _Progress()
+        copyDataset(self.src, dest, progress_signal = progress)
+        np.testing.assert_array_equal(dest[()], self.data)
+        self.assertEqual(progress.values[-1], 100)
+
+    def test_hyperslab_copy(self):
+        dest = self.file.create_dataset(
+            'dest', shape = self.src.shape, dtype = self.src.dtype, 
+            chunks = (2, 2, 7, 8),
+        )
+        self.assertFalse(canCopyChunksDirectly(self.src, dest))
+        mask = np.random.rand(7, 8)
+        mapper = IncrementalMapper([mask], (5, 6))
+        copyDataset(
+            self.src, dest, progress_signal = _Progress(), 
+            memory_budget = 1000, mapper = mapper,
+        )
+        np.testing.assert_array_equal(dest[()], self.data)
+        np.testing.assert_allclose(
+            mapper.finish()[0], 
+            np.einsum('ijkl,kl->ij', self.data.astype('float64'), mask),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
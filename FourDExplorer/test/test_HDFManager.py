@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import builtins
+import logging
+import os
+import sys
+import types
+import unittest
+
+import h5py
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.HDFManager import HDFHandler
+
+
+class TestLazyHDFTree(unittest.TestCase):
+
+    def setUp(self):
+        builtins.qApp = types.SimpleNamespace(
+            logger = logging.getLogger(), 
+            clearMetaManagerDict = lambda: None,
+        )
+        self.file = h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        )
+        for ii in range(3):
+            group = self.file.create_group('group{0}/sub'.format(ii))
+            group.create_dataset('image.img', shape = (4, 4), dtype = 'f4')
+        self.file.create_dataset('line.line', shape = (4,), dtype = 'f4')
+        self.handler = HDFHandler()
+        self.handler.file = self.file
+        self.handler.buildHDFTree()
+
+    def tearDown(self):
+        self.file.close()
+
+    def test_lazy_children(self):
+        root = self.handler.root_node
+        self.assertFalse(root.isLoaded())
+        self.assertEqual(len(root), 4)
+        group = root['group1']
+        self.assertFalse(group.isLoaded())
+        node = self.handler.getNode('/group2/sub/image.img')
+        self.assertIs(node, root['group2']['sub']['image.img'])
+        self.assertFalse(group.isLoaded())
+        self.assertEqual(self.handler.getRank('/line.line'), 3)
+
+    def test_match_nodes(self):
+        paths = sorted(
+            node.path for node in self.handler.matchNodeGenerator('.img')
+        )
+        self.assertEqual(paths, [
+            '/group{0}/sub/image.img'.format(ii) for ii in range(3)
+        ])
+
+    def test_index_after_changes(self):
+        self.handler.renameItem('/group0', 'renamed')
+        with self.assertRaises(KeyError):
+            self.handler.getNode('/group0/sub')
+        node = self.handler.getNode('/renamed/sub/image.img')
+        self.assertEqual(node.path, '/renamed/sub/image.img')
+
+        self.handler.moveItem('/renamed/sub', '/group1/sub')
+        node = self.handler.getNode('/group1/sub/sub/image.img')
+        self.assertIn('image.img', self.file['/group1/sub/sub'])
+
+        self.handler.deleteItem('/group1')
+        with self.assertRaises(KeyError):
+            self.handler.getNode('/group1/sub/sub/image.img')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import builtins
+import os
+import sys
+import tempfile
+import unittest
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.ImportProfiler import ImportProfiler
+
+
+class TestImportProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        package = os.path.join(self.temp_dir.name, 'profiled_pkg')
+        os.mkdir(package)
+        with open(os.path.join(package, '__init__.py'), 'w') as file:
+            file.write('from . import inner\n')
+        with open(os.path.join(package, 'inner.py'), 'w') as file:
+            file.write('import time\ntime.sleep(0.02)\n')
+        sys.path.insert(0, self.temp_dir.name)
+
+    def tearDown(self):
+        sys.path.remove(self.temp_dir.name)
+        for name in ('profiled_pkg', 'profiled_pkg.inner'):
+            sys.modules.pop(name, None)
+        self.temp_dir.cleanup()
+
+    def test_nested_imports(self):
+        original_import = builtins.__import__
+        profiler = ImportProfiler()
+        profiler.start()
+        try:
+            import profiled_pkg
+            import profiled_pkg     # already imported, not recorded again
+        finally:
+            profiler.stop()
+        self.assertIs(builtins.__import__, original_import)
+
+        records = {record.name: record for record in profiler.records}
+        self.assertEqual(
+            [record.name for record in profiler.records].count('profiled_pkg'), 
+            1,
+        )
+        outer = records['profiled_pkg']
+        inner = records['profiled_pkg.inner']
+        self.assertEqual((outer.depth, inner.depth), (0, 1))
+        self.assertGreaterEqual(inner.cumulative, 0.02)
+        self.assertGreaterEqual(outer.cumulative, inner.cumulative)
+        self.assertLess(outer.self_time, inner.cumulative)
+        self.assertEqual(profiler.slowest(1)[0].name, 'profiled_pkg')
+        self.assertIn('profiled_pkg.inner', profiler.report())
+        self.assertIn('profiled_pkg.inner', profiler.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import builtins
+import logging
+import os
+import struct
+import sys
+import tempfile
+import types
+import unittest
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.ImporterDM4 import ParseDM4
+from lib.ReadBinary import readFourDSTEMFromDM4
+
+
+def _entry(kind: int, name: str, payload: bytes) -> bytes:
+    name = name.encode('utf-8')
+    return (
+        bytes([kind]) + struct.pack('>H', len(name)) + name +
+        struct.pack('>Q', len(payload)) + payload
+    )
+
+def _directory(name: str, entries: list) -> bytes:
+    payload = struct.pack('>BBQ', 1, 0, len(entries)) + b''.join(entries)
+    return _entry(20, name, payload)
+
+def _tag(name: str, info: list, data: bytes) -> bytes:
+    payload = (
+        b'%%%%' + struct.pack('>Q', len(info)) +
+        np.asarray(info, dtype = '>i8').tobytes() + data
+    )
+    return _entry(21, name, payload)
+
+def writeDM4(path: str, cube: np.ndarray):
+    """
+    Write a minimal little-endian .dm4 file with a thumbnail and a 4D image.
+    """
+    scan_i, scan_j, dp_i, dp_j = cube.shape
+    # the .dm4 file stores the 4D-STEM data pattern row first
+    data = np.ascontiguousarray(cube.transpose(2, 3, 0, 1)).astype('<u2')
+    thumbnail = np.arange(64, dtype = '<f4')
+    image_thumbnail = _directory('', [
+        _directory('ImageData', [
+            _tag('Data', [20, 6, thumbnail.size], thumbnail.tobytes()),
+            _directory('Dimensions', [
+                _tag('', [5], struct.pack('<I', 8)),
+                _tag('', [5], struct.pack('<I', 8)),
+            ]),
+        ]),
+    ])
+    image_4d = _directory('', [
+        _directory('ImageData', [
+            _tag('Calibrations', [20, 15, 0, 2, 0, 6, 0, 6, 3],
+                np.arange(6, dtype = '<f4').tobytes()),
+            _tag('Data', [20, 4, data.size], data.tobytes()),
+            _directory('Dimensions', [
+                _tag('', [5], struct.pack('<I', n))
+                for n in (scan_i, scan_j, dp_i, dp_j)
+            ]),
+        ]),
+        _tag('Origin', [15, 0, 2, 0, 6, 0, 6], struct.pack('<ff', 1.5, 2.5)),
+        _tag('Name', [18, 4], b'test'),
+    ])
+    root = struct.pack('>BBQ', 1, 0, 1) + _directory(
+        'ImageList', [image_thumbnail, image_4d]
+    )
+    with open(path, 'wb') as file:
+        file.write(struct.pack('>IQI', 4, len(root), 1))
+        file.write(root)
+        file.write(b'\x00' * 8)
+
+
+class TestParseDM4(unittest.TestCase):
+
+    def setUp(self):
+        builtins.qApp = types.SimpleNamespace(logger = logging.getLogger())
+        self.cube = np.random.randint(0, 2**16, size = (3, 4, 5, 6))
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'test.dm4')
+        writeDM4(self.path, self.cube)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_lazy_directories(self):
+        root = ParseDM4(self.path).parse()
+        image_list = root.get_tag(0)
+        self.assertFalse(image_list.is_loaded())
+        image_4d = image_list.get_tag(1)
+        self.assertTrue(image_list.is_loaded())
+        self.assertFalse(image_4d.is_loaded())
+        self.assertEqual(image_4d.get_tag_by_name('Name').get_data(), 'test')
+
+    def test_read_arrays(self):
+        root = ParseDM4(self.path).parse()
+        image_4d = root.get_tag_by_name('ImageList').get_tag(1)
+        dims = image_4d.get_tag_by_name('Dimensions')
+        shape = tuple(dims.get_tag(ii).get_data() for ii in range(4))
+        self.assertEqual(shape, self.cube.shape)
+
+        data = image_4d.get_tag_by_name('Data').get_data()
+        expected = self.cube.transpose(2, 3, 0, 1).ravel()
+        np.testing.assert_array_equal(data, expected)
+
+        calibrations = image_4d.get_tag_by_name('Calibrations').get_data()
+        self.assertEqual(calibrations, [[0, 1], [2, 3], [4, 5]])
+        origin = image_4d.get_tag_by_name('Origin').get_data()
+        self.assertEqual(origin, [1.5, 2.5])
+
+    def test_read_tiled(self):
+        root = ParseDM4(self.path).parse()
+        image_4d = root.get_tag_by_name('ImageList').get_tag(1)
+        offset = image_4d.get_tag_by_name('Data').data.offset
+        progress = types.SimpleNamespace(emit = lambda value: None)
+        with h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        ) as file:
+            builtins.qApp.hdf_handler = types.SimpleNamespace(file = file)
+            # budgets of several scan rows, one scan row, and a pattern row
+            for budget, chunks in ((2**20, None), (480, None), (96, (1, 4, 2, 6))):
+                dataset = file.create_dataset(
+                    'cube{0}'.format(budget), 
+                    shape = self.cube.shape, 
+                    dtype = '<u2', 
+                    chunks = chunks,
+                )
+                readFourDSTEMFromDM4(
+                    self.path, dataset.name, 5, 6, 3, 4, 'uint', 2, offset,
+                    progress_signal = progress, memory_budget = budget,
+                )
+                np.testing.assert_array_equal(dataset[()], self.cube)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import unittest
+
+from PySide6.QtCore import QCoreApplication
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.Log import LogQueueHandler
+from bin.Log import LogStream
+
+
+class TestLogStream(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.stream = LogStream()
+        self.printed = []
+        self.stream.print_signal.connect(self.printed.append)
+
+    def test_batches_from_threads(self):
+        log_queue = queue.SimpleQueue()
+        handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        listener = logging.handlers.QueueListener(log_queue, handler)
+        logger = logging.getLogger('test_Log.batches')
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger.addHandler(LogQueueHandler(log_queue))
+        listener.start()
+
+        def _work(index):
+            for ii in range(10):
+                logger.info('%d-%d', index, ii)
+        threads = [threading.Thread(target = _work, args = (n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        listener.stop()
+
+        self.assertEqual(self.printed, [])      # nothing before delivery
+        self.stream.deliver()
+        self.assertEqual(len(self.printed), 1)
+        lines = self.printed[0].splitlines()
+        self.assertEqual(len(lines), 40)
+        self.assertEqual(lines.count('2-9'), 1)
+        self.stream.deliver()
+        self.assertEqual(len(self.printed), 1)  # empty buffer is not emitted
+
+    def test_rate_limit(self):
+        for ii in range(LogStream.max_lines + 5):
+            self.stream.write('{0}\n'.format(ii))
+        self.stream.deliver()
+        lines = self.printed[0].splitlines()
+        self.assertIn('5 logs omitted', lines[0])
+        self.assertEqual(lines[1], '5')
+        self.assertEqual(len(lines), LogStream.max_lines + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
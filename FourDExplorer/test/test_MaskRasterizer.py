@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+from matplotlib.patches import Circle, Ellipse, Rectangle
+from matplotlib.patches import RegularPolygon, Wedge
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.MaskRasterizer import CircleMask
+from lib.MaskRasterizer import EllipseMask
+from lib.MaskRasterizer import MaskGeometry
+from lib.MaskRasterizer import RectangleMask
+from lib.MaskRasterizer import RegularPolygonMask
+from lib.MaskRasterizer import RingMask
+from lib.MaskRasterizer import SegmentMask
+from lib.MaskRasterizer import WedgeMask
+from lib.MaskRasterizer import rasterizeMask
+from lib.MaskRasterizer import rasterizeSegments
+
+
+SHAPE = (64, 80)
+CENTER = (30.3, 41.7)
+
+
+def _containsPoints(patch) -> np.ndarray:
+    # the old way of the mask widgets, with (x, y) = (j, i)
+    index = np.arange(SHAPE[0] * SHAPE[1])
+    coords = np.stack([index % SHAPE[1], index // SHAPE[1]], axis = 1)
+    patch._transform = None
+    return patch.contains_points(coords).reshape(SHAPE)
+
+
+class TestMaskRasterizer(unittest.TestCase):
+
+    def test_matches_patches(self):
+        x, y = CENTER[1], CENTER[0]
+        width, height, angle = 30, 14, 25
+        rad = np.radians(angle)
+        anchor = (
+            x + height / 2 * np.sin(rad) - width / 2 * np.cos(rad),
+            y - height / 2 * np.cos(rad) - width / 2 * np.sin(rad),
+        )
+        cases = (
+            (CircleMask(CENTER, 17.2), Circle((x, y), 17.2)),
+            (
+                WedgeMask(CENTER, 5.2, 22.1, -30, 100),
+                Wedge((x, y), 22.1, -30, 100, width = 22.1 - 5.2),
+            ),
+            (
+                RectangleMask(CENTER, width, height, angle),
+                Rectangle(anchor, width, height, angle = angle),
+            ),
+            (
+                EllipseMask(CENTER, width, height, angle),
+                Ellipse((x, y), width, height, angle = angle),
+            ),
+            (
+                RegularPolygonMask(CENTER, 20, 5, 17),
+                RegularPolygon(
+                    (x, y), 5, radius = 20, orientation = np.radians(17)
+                ),
+            ),
+        )
+        for geometry, patch in cases:
+            with self.subTest(geometry = type(geometry).__name__):
+                mask = rasterizeMask(geometry, SHAPE)
+                expected = _containsPoints(patch)
+                # only the points on the boundary may differ
+                self.assertLessEqual(np.sum(mask.astype(bool) != expected), 1)
+
+    def test_ring_and_coverage(self):
+        ring = rasterizeMask(RingMask(CENTER, 8.1, 20.3), SHAPE)
+        ii, jj = np.meshgrid(
+            np.arange(SHAPE[0]), np.arange(SHAPE[1]), indexing = 'ij'
+        )
+        radius = np.hypot(ii - CENTER[0], jj - CENTER[1])
+        np.testing.assert_array_equal(ring, (radius >= 8.1) & (radius <= 20.3))
+
+        # the fractional coverage converges to the area
+        circle = CircleMask((31.5, 31.5), 10)
+        binary = rasterizeMask(circle, (64, 64))
+        covered = rasterizeMask(circle, (64, 64), 16)
+        self.assertTrue(np.all((covered >= 0) & (covered <= 1)))
+        self.assertLess(np.sum((covered > 0) & (covered < 1)), 100)
+        self.assertAlmostEqual(covered.sum(), np.pi * 100, delta = 0.5)
+        self.assertGreater(np.abs(binary.sum() - np.pi * 100), 1)
+        with self.assertRaises(ValueError):
+            rasterizeMask(circle, (64, 64), 0)
+
+    def test_segments(self):
+        geometry = SegmentMask(CENTER, 5, 25, 4, 60, 10)
+        segments = rasterizeSegments(geometry, SHAPE, 4)
+        self.assertEqual(segments.shape, (4,) + SHAPE)
+        for ii, wedge in enumerate(geometry.getSegments()):
+            np.testing.assert_array_equal(
+                segments[ii], rasterizeMask(wedge, SHAPE, 4)
+            )
+        # the segments of 60 degree do not overlap, and sum to the union
+        self.assertLessEqual(segments.sum(axis = 0).max(), 1)
+        np.testing.assert_array_equal(
+            rasterizeMask(geometry, SHAPE).astype(bool),
+            rasterizeSegments(geometry, SHAPE).any(axis = 0),
+        )
+
+    def test_cache(self):
+        geometry = EllipseMask(CENTER, 20, 10, 5)
+        mask = rasterizeMask(geometry, SHAPE, 2)
+        same = EllipseMask(CENTER, 20, 10, 5)
+        self.assertIs(rasterizeMask(same, SHAPE, 2), mask)
+        self.assertIsNot(rasterizeMask(geometry, SHAPE, 3), mask)
+        self.assertFalse(mask.flags.writeable)
+        with self.assertRaises(ValueError):
+            RegularPolygonMask(CENTER, 10, 2)
+
+    def test_base_geometry(self):
+        geometry = MaskGeometry(CENTER)
+        with self.assertLogs('4D-Explorer', level = 'WARNING'):
+            mask = rasterizeMask(geometry, SHAPE)
+        self.assertEqual(mask.shape, SHAPE)
+        self.assertFalse(np.any(mask))
+        with self.assertLogs('4D-Explorer', level = 'WARNING'):
+            self.assertIsNot(rasterizeMask(geometry, SHAPE), mask)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.MemoryBudget import MemoryBudget
+
+GB = 2**30
+MB = 2**20
+
+
+class FixedMemoryBudget(MemoryBudget):
+    """
+    A budget on a machine with fixed total and available memory.
+    """
+    def __init__(self, total: int, available: int, **kw):
+        super().__init__(**kw)
+        self.total = total
+        self.available = available
+
+    def getSystemMemory(self) -> tuple:
+        return self.total, self.available
+
+
+class TestMemoryBudget(unittest.TestCase):
+
+    def test_laptop_and_server(self):
+        laptop = FixedMemoryBudget(16*GB, 6*GB, max_block = 64*GB)
+        server = FixedMemoryBudget(512*GB, 500*GB, max_block = 64*GB)
+        # limited by the available memory, not the fraction
+        self.assertEqual(laptop.getFreeBytes(), 5*GB)
+        self.assertEqual(server.getFreeBytes(), 256*GB - 256*MB)
+        with laptop.request(MB) as small, server.request(MB) as large:
+            self.assertEqual(small.nbytes, 5*GB)
+            self.assertEqual(large.nbytes, 64*GB)
+
+    def test_clamp(self):
+        budget = FixedMemoryBudget(16*GB, 16*GB, max_block = 100*MB)
+        with budget.request(MB) as allocation:
+            self.assertEqual(allocation.units, 100)
+        # no free memory, but a block still has the minimum size
+        budget.available = 0
+        with budget.request(1000) as allocation:
+            self.assertEqual(allocation.units, MB // 1000)
+        # a unit larger than the budget is never split
+        with budget.request(10*GB) as allocation:
+            self.assertEqual(allocation.units, 1)
+
+    def test_dtype_and_shape(self):
+        budget = FixedMemoryBudget(16*GB, 16*GB, max_block = 64*MB)
+        with budget.request(256 * 256 * 2) as uint16, \
+            budget.request(256 * 256 * 8) as float64:
+            self.assertEqual(uint16.units, 512)
+            self.assertLess(float64.units, uint16.units)
+        with budget.request(256 * 256 * 2, total_units = 100) as allocation:
+            self.assertEqual(allocation.units, 100)
+        with budget.request(MB, copies = 4, align = 5) as allocation:
+            self.assertEqual(allocation.units, 15)
+            self.assertEqual(allocation.total_bytes, 60*MB)
+
+    def test_concurrent(self):
+        budget = FixedMemoryBudget(16*GB, 16*GB, max_block = 64*GB)
+        first = budget.request(1, total_units = 2*GB)
+        self.assertEqual(first.nbytes, 2*GB)
+        # the rest is shared with the first allocation
+        second = budget.request(1)
+        self.assertEqual(second.nbytes, (6*GB - 256*MB) // 2)
+        self.assertEqual(budget.allocation_count, 2)
+        first.release()
+        first.release()
+        second.release()
+        self.assertEqual(budget.allocated, 0)
+        with budget.reserve(GB):
+            self.assertEqual(budget.getFreeBytes(), 7*GB - 256*MB)
+
+    def test_config(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'config.ini')
+            with open(path, 'w', encoding = 'utf-8') as file:
+                file.write('[Memory]\nfraction = 0.25\nmaxblock = 512\n'
+                    'hdfcache = abc\n')
+            budget = MemoryBudget.fromConfig(path)
+        self.assertEqual(budget.fraction, 0.25)
+        self.assertEqual(budget.max_block, 512*MB)
+        self.assertEqual(budget.hdf_cache, 256*MB)
+        self.assertEqual(budget.min_free, GB)
+
+
+if __name__ == '__main__':
+    unittest.main()
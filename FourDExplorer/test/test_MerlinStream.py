@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.MerlinStream import MerlinFrameStream
+from lib.MerlinStream import MerlinReplayServer
+from lib.MerlinStream import parseMerlinFrameHead
+
+
+def _makeFrameHead(sequence: int, dp_i: int, dp_j: int) -> bytes:
+    head = 'MQ1,{0:06d},00384,01,{1:04d},{2:04d},U16,'.format(
+        sequence, dp_i, dp_j
+    ).encode('ascii')
+    return head.ljust(384, b'\x00')
+
+
+class TestMerlinStream(unittest.TestCase):
+
+    def setUp(self):
+        self.dp_i, self.dp_j = 8, 6
+        self.frames = np.random.randint(
+            0, 2**16, size = (5, self.dp_i, self.dp_j)
+        ).astype('<u2')
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.mib_path = os.path.join(self.temp_dir.name, 'test.mib')
+        with open(self.mib_path, 'wb') as mib_file:
+            for ii, frame in enumerate(self.frames):
+                mib_file.write(_makeFrameHead(ii + 1, self.dp_i, self.dp_j))
+                mib_file.write(frame.tobytes())
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_parse_frame_head(self):
+        info = parseMerlinFrameHead(_makeFrameHead(3, self.dp_i, self.dp_j))
+        self.assertEqual(info['sequence'], 3)
+        self.assertEqual(info['head_size'], 384)
+        self.assertEqual((info['dp_i'], info['dp_j']), (self.dp_i, self.dp_j))
+        self.assertEqual(info['dtype'], np.dtype('<u2'))
+        with self.assertRaises(ValueError):
+            parseMerlinFrameHead(b'HDR,'.ljust(384, b'\x00'))
+
+    def test_replay_round_trip(self):
+        server = MerlinReplayServer(self.mib_path, port = 0)
+        server.start()
+        try:
+            with MerlinFrameStream('127.0.0.1', server.port) as stream:
+                header = stream.readAcquisitionHeader()
+                self.assertEqual(
+                    header['Frames in Acquisition (Number)'], '5'
+                )
+                received = list(stream)
+        finally:
+            server.stop()
+
+        self.assertEqual([seq for seq, _ in received], [1, 2, 3, 4, 5])
+        for (_seq, frame), expected in zip(received, self.frames):
+            np.testing.assert_array_equal(frame, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
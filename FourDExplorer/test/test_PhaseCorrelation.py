@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import h5py
+import numpy as np
+from scipy.special import erfc
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.MemoryBudget import getMemoryBudget
+from lib.PhaseCorrelation import MeanDiffractionPattern
+from lib.PhaseCorrelation import PhaseCorrelationRegistration
+from lib.PhaseCorrelation import RegisterDiffractionPatterns
+from lib.PhaseCorrelation import UpsampledDFT
+
+
+def _createDisks(shifts, dp_N = 48, radius = 10, sigma = 1):
+    # flat disks with smooth edges at the shifts from center, which are exact
+    # translations of each other
+    center = (dp_N - 1) / 2
+    grid_i, grid_j = np.meshgrid(
+        np.arange(dp_N) - center, np.arange(dp_N) - center, indexing = 'ij'
+    )
+    distance = np.hypot(
+        grid_i - shifts[..., 0, None, None],
+        grid_j - shifts[..., 1, None, None],
+    )
+    return 0.5 * erfc((distance - radius) / (np.sqrt(2) * sigma))
+
+
+class TestPhaseCorrelation(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.shifts = rng.uniform(-3, 3, (5, 6, 2))
+        self.patterns = _createDisks(self.shifts)
+        self.template = _createDisks(np.zeros(2))
+
+    def test_upsampled_dft(self):
+        # the upsampled DFT samples the same points as a padded inverse FFT
+        rng = np.random.default_rng(1)
+        spectra = rng.random((2, 8, 6)) + 1j * rng.random((2, 8, 6))
+        factor = 4
+        offsets = np.array([[3., 5.], [-2., 1.]])
+        local = UpsampledDFT(spectra, 5, factor, offsets)
+        for ii in range(2):
+            ki = np.fft.fftfreq(8)[:, None]
+            kj = np.fft.fftfreq(6)[None, :]
+            for mm, nn in ((0, 0), (2, 3), (4, 1)):
+                pos_i = (offsets[ii, 0] + mm) / factor
+                pos_j = (offsets[ii, 1] + nn) / factor
+                expected = np.sum(spectra[ii] * np.exp(
+                    2j * np.pi * (ki * pos_i + kj * pos_j)
+                ))
+                self.assertAlmostEqual(local[ii, mm, nn], expected)
+
+    def test_sub_pixel_shifts(self):
+        # within the upsampled grid of 1/20 pixel
+        for edge_filter in (False, True):
+            with self.subTest(edge_filter = edge_filter):
+                registration = PhaseCorrelationRegistration(
+                    self.template, 20, edge_filter, reference_shift = (0, 0)
+                )
+                shifts = registration.register(self.patterns)
+                self.assertEqual(shifts.shape, (5, 6, 2))
+                np.testing.assert_allclose(shifts, self.shifts, atol = 0.05)
+
+        registration = PhaseCorrelationRegistration(
+            self.template, 100, reference_shift = (0, 0)
+        )
+        shifts = registration.register(self.patterns)
+        np.testing.assert_allclose(shifts, self.shifts, atol = 0.01)
+
+        # the phase correlation is sharper, but biased on smooth disks
+        registration = PhaseCorrelationRegistration(
+            self.template, 20, whitening = 1, reference_shift = (0, 0)
+        )
+        shifts = registration.register(self.patterns)
+        np.testing.assert_allclose(shifts, self.shifts, atol = 0.1)
+
+        # whole pixels only
+        registration = PhaseCorrelationRegistration(
+            self.template, 1, reference_shift = (0, 0)
+        )
+        shifts = registration.register(self.patterns)
+        np.testing.assert_array_equal(shifts, np.round(shifts))
+        np.testing.assert_allclose(shifts, self.shifts, atol = 0.5)
+
+    def test_reference_shift(self):
+        # a template at an offset gives shifts relative to the center
+        template = _createDisks(np.array([1.0, -2.0]))
+        registration = PhaseCorrelationRegistration(template)
+        shifts = registration.register(self.patterns[0, 0])
+        np.testing.assert_allclose(shifts, self.shifts[0, 0], atol = 0.05)
+        with self.assertRaises(ValueError):
+            registration.register(np.zeros((4, 32, 32)))
+        with self.assertRaises(ValueError):
+            PhaseCorrelationRegistration(template, 0)
+        with self.assertRaises(ValueError):
+            PhaseCorrelationRegistration(template, whitening = 2)
+
+    def test_blocks_and_hdf5(self):
+        registration = PhaseCorrelationRegistration(self.template)
+        expected = np.moveaxis(registration.register(self.patterns), -1, 0)
+        budget = getMemoryBudget()
+        min_block, max_block = budget.min_block, budget.max_block
+        budget.min_block, budget.max_block = 1, 2
+        try:
+            with h5py.File(
+                'test.h5', 'w', driver = 'core', backing_store = False
+            ) as file:
+                dataset = file.create_dataset('4D-STEM', data = self.patterns)
+                shift_map = RegisterDiffractionPatterns(dataset, registration)
+                mean = MeanDiffractionPattern(dataset)
+        finally:
+            budget.min_block, budget.max_block = min_block, max_block
+        np.testing.assert_allclose(shift_map, expected)
+        np.testing.assert_allclose(mean, self.patterns.mean(axis = (0, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import numpy as np
+from scipy.optimize import curve_fit
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.DiffractionAlignment import fitQuadraticModel
+from lib.DiffractionAlignment import generateShiftMapWithLinearModel
+from lib.DiffractionAlignment import quadraticModel
+from lib.PolynomialFit import FitPolynomialMap
+from lib.PolynomialFit import evaluatePolynomial
+from lib.PolynomialFit import fitPolynomial
+from lib.PolynomialFit import getPolynomialExponents
+
+
+def _createMappings(scan_i = 12, scan_j = 15):
+    # five smooth components, like ci, cj, a, b and angle of FDDNet
+    ii, jj = np.meshgrid(np.arange(scan_i), np.arange(scan_j), indexing = 'ij')
+    return np.stack([
+        0.3 * ii - 0.2 * jj + 1,
+        0.01 * ii**2 - 0.02 * ii * jj + 0.1 * jj - 2,
+        20 + 0.05 * ii,
+        18 - 0.04 * jj,
+        0.5 + 0.001 * ii * jj,
+    ])
+
+
+class TestPolynomialFit(unittest.TestCase):
+
+    def setUp(self):
+        self.mappings = _createMappings()
+        _, scan_i, scan_j = self.mappings.shape
+        self.locations = np.argwhere(np.ones((scan_i, scan_j), dtype = bool))
+
+    def test_exponents(self):
+        self.assertEqual(getPolynomialExponents(1), ((1, 0), (0, 1), (0, 0)))
+        self.assertEqual(len(getPolynomialExponents(3)), 10)
+        self.assertEqual(
+            getPolynomialExponents('Quadratic'),
+            ((2, 0), (0, 2), (1, 1), (1, 0), (0, 1), (0, 0)),
+        )
+        with self.assertRaises(ValueError):
+            getPolynomialExponents('Cubic')
+
+    def test_matches_curve_fit(self):
+        rng = np.random.default_rng(0)
+        values = self.mappings[1].ravel() + 0.01 * rng.random(180)
+        expected, _ = curve_fit(quadraticModel, self.locations.T, values)
+        params = fitQuadraticModel(self.locations, values)
+        np.testing.assert_allclose(params, expected, rtol = 1e-6, atol = 1e-9)
+
+    def test_multiple_components(self):
+        # all components are fitted at once, with any order
+        fitted = FitPolynomialMap(self.mappings, 2)
+        np.testing.assert_allclose(fitted, self.mappings, atol = 1e-9)
+        fitted = FitPolynomialMap(self.mappings[0], 'Linear')
+        np.testing.assert_allclose(fitted, self.mappings[0], atol = 1e-9)
+
+        values = self.mappings.reshape(5, -1).T
+        params = fitPolynomial(self.locations, values, 4)
+        self.assertEqual(params.shape, (15, 5))
+        np.testing.assert_allclose(
+            evaluatePolynomial(params, 12, 15, 4), self.mappings, atol = 1e-8
+        )
+
+        shift_map = generateShiftMapWithLinearModel(
+            self.locations, values[:, :1].repeat(2, axis = 1), 12, 15
+        )
+        np.testing.assert_allclose(shift_map[1], self.mappings[0], atol = 1e-9)
+
+    def test_robust(self):
+        # some points where the inference fails in all components
+        rng = np.random.default_rng(1)
+        noisy = self.mappings + 0.01 * rng.standard_normal(self.mappings.shape)
+        failed = rng.random(self.mappings.shape[1:]) < 0.15
+        noisy[:, failed] += rng.uniform(5, 20, (5, np.sum(failed)))
+
+        plain = FitPolynomialMap(noisy, 2)
+        self.assertGreater(np.abs(plain - self.mappings).max(), 0.5)
+        for robust in ('Huber', 'RANSAC'):
+            with self.subTest(robust = robust):
+                fitted = FitPolynomialMap(noisy, 2, robust = robust)
+                np.testing.assert_allclose(fitted, self.mappings, atol = 0.05)
+        with self.assertRaises(ValueError):
+            FitPolynomialMap(noisy, 2, robust = 'Median')
+
+    def test_invalid_points(self):
+        mappings = self.mappings.copy()
+        mappings[:, 3, 4] = np.nan
+        valid = np.ones(mappings.shape[1:], dtype = bool)
+        valid[0, :] = False
+        mappings[:, 0, :] = 100
+        fitted = FitPolynomialMap(mappings, 2, valid)
+        np.testing.assert_allclose(fitted, self.mappings, atol = 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,16 @@ import sys
 import os 
 import unittest
 
+import numpy as np
 
 ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
 if not ROOTPATH in sys.path:
     sys.path.append(ROOTPATH)
     
+from lib.Probe import AberrationDict
+from lib.Probe import CTFCalculator
 from lib.Probe import OpticalSTEM
+from lib.Probe import optics_cache
 
 class TestProbe(unittest.TestCase):
 
@@ -129,5 +133,131 @@ class TestProbe(unittest.TestCase):
         # Assert that the calculated detector_pixel_size matches the expected value
         self.assertAlmostEqual(actual_detector_pixel_size, expected_detector_pixel_size, places=2)
 
+
+
+class TestOpticsCache(unittest.TestCase):
+
+    def _createOptics(self, defocus = -20e-9):
+        return OpticalSTEM(
+            accelerate_voltage = 300e3,
+            detector_shape = [64, 64],
+            scan_shape = [16, 16],
+            alpha = 20e-3,
+            scan_step_size = 0.5e-10,
+            bright_field_disk_radius = 12,
+            detector_pixel_size = 150e-6,
+            defocus = defocus,
+        )
+
+    def setUp(self):
+        optics_cache.clear()
+
+    def test_reuse_by_parameters(self):
+        optics = self._createOptics()
+        ui, uj = optics.generateDiffractionMeshgrid()
+        aperture = optics.generateConvergentAperture()
+        chi = optics.generateAberrationFunction()
+        probe = optics.getProbe()
+
+        # a new object with the same parameters hits the cache
+        self.assertIs(self._createOptics().getProbe(), probe)
+
+        # changing defocus keeps the meshgrid and the aperture
+        optics.setDefocus(-30e-9)
+        self.assertIs(optics.generateDiffractionMeshgrid()[0], ui)
+        self.assertIs(optics.generateConvergentAperture(), aperture)
+        self.assertIsNot(optics.generateAberrationFunction(), chi)
+        self.assertIsNot(optics.getProbe(), probe)
+        self.assertFalse(optics.getProbe().flags.writeable)
+
+    def test_cached_results(self):
+        optics = self._createOptics()
+        np.testing.assert_allclose(optics.getProbe(), optics._generateProbe())
+        calculator = CTFCalculator(optics)
+        probe = optics.getProbe()
+        expected = np.real((1/(2*np.pi)) * np.conj(
+            optics.fft2(probe * np.conj(probe), optics.dx)
+        ))
+        np.testing.assert_allclose(
+            calculator.calcCTFofICoM(), 
+            expected, 
+            atol = 1e-12 * np.abs(expected).max(),
+        )
+
+        # changing the detector angles reuses the probe
+        misses = optics_cache.misses
+        calculator.calcCTFofVirtualImageFirstOrder(0, 10e-3)
+        calculator.calcCTFofVirtualImageFirstOrder(5e-3, 15e-3)
+        self.assertEqual(optics_cache.misses, misses)
+
+
+class TestAberrationBasis(unittest.TestCase):
+
+    def setUp(self):
+        optics_cache.clear()
+        self.optics = OpticalSTEM(
+            accelerate_voltage = 300e3,
+            detector_shape = [64, 64],
+            scan_shape = [16, 16],
+            alpha = 20e-3,
+            scan_step_size = 0.5e-10,
+            bright_field_disk_radius = 12,
+            detector_pixel_size = 150e-6,
+        )
+        rng = np.random.default_rng(0)
+        for key, scale in zip(AberrationDict(), 
+            (1e-8, 1e-8, 1e-7, 1e-7, 1e-6, 1e-6, 1e-6, 1e-5, 1e-5, 1e-5, 
+            1e-3, 1e-3)):
+            self.optics.setAberrationCoefficient(
+                key, complex(*(scale * rng.standard_normal(2)))
+            )
+
+    def test_matches_explicit_formula(self):
+        optics = self.optics
+        ad = optics._aberration_dict
+        ui, uj = optics.generateDiffractionMeshgrid()
+        w = optics.wave_length * (ui + 1j * uj)
+        wi = np.conj(w)
+        expected = 2 * np.pi / optics.wave_length * np.real(
+            + 1/2 * w * wi * ad['C1'] 
+            + 1/2 * wi**2 * ad['A1']
+            + w**2 * wi * ad['B2']
+            + 1/3 * wi**3 * ad['A2']
+            + 1/4 * (w*wi)**2 * ad['C3']
+            + w**3 * wi * ad['S3']
+            + 1/4 * wi**4 * ad['A3']
+            + w**3 * wi**2 * ad['B4']
+            + w**4 * wi * ad['D4']
+            + 1/5 * wi**5 * ad['A4']
+            + 1/6 * (w*wi)**3 * ad['C5']
+            + 1/6 * wi**6 * ad['A5']
+        )
+        np.testing.assert_allclose(
+            optics.generateAberrationFunction(), expected, 
+            atol = 1e-9 * np.abs(expected).max(),
+        )
+
+    def test_basis_is_reused(self):
+        optics = self.optics
+        basis = optics.generateAberrationBasis()
+        self.assertEqual(basis.shape, (12, optics.dp_N, optics.dp_N))
+        self.assertFalse(basis.flags.writeable)
+        optics.setDefocus(-50e-9)
+        optics.setCs(2e-6)
+        optics.generateAberrationFunction()
+        self.assertIs(optics.generateAberrationBasis(), basis)
+
+        # a stack of coefficients gives a stack of aberration functions
+        coefficients = np.stack([
+            optics._aberration_dict.getCoefficientVector(), 
+            np.zeros(12, 'complex'),
+        ])
+        chi = AberrationDict.evaluateAberrationFunction(
+            coefficients, basis, optics.wave_length
+        )
+        np.testing.assert_allclose(chi[0], optics.generateAberrationFunction())
+        np.testing.assert_array_equal(chi[1], 0)
+
+
 if __name__ == '__main__':
     unittest.main()
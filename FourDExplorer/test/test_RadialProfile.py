@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.Probe import CTFCalculator
+from lib.RadialProfile import getRadialBins
+from lib.RadialProfile import RadialAverage
+
+
+def _bruteForceAverage(image, center, bin_width = 1.0):
+    profile = {}
+    for ii in range(image.shape[0]):
+        for jj in range(image.shape[1]):
+            radius = np.hypot(ii - center[0], jj - center[1])
+            key = int(np.floor(radius / bin_width + 0.5))
+            profile.setdefault(key, []).append(image[ii, jj])
+    keys = sorted(profile)
+    return (
+        np.array(keys) * bin_width,
+        np.array([np.mean(profile[key]) for key in keys]),
+    )
+
+
+class TestRadialProfile(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.image = rng.random((12, 17))
+
+    def test_matches_brute_force(self):
+        for center, bin_width in (
+            ((6, 8), 1.0),
+            ((3.3, 10.7), 1.0),
+            ((5.5, 8.5), 0.5),
+            ((0, 0), 2.5),
+        ):
+            distance, profile = RadialAverage(
+                self.image, center, bin_width
+            )
+            expected_distance, expected = _bruteForceAverage(
+                self.image, center, bin_width
+            )
+            np.testing.assert_allclose(distance, expected_distance)
+            np.testing.assert_allclose(profile, expected)
+
+    def test_batch(self):
+        images = np.stack([self.image, 2 * self.image, -self.image])
+        images = images.reshape(3, 1, 12, 17)
+        _, profiles = RadialAverage(images, (4.2, 9.1))
+        _, profile = RadialAverage(self.image, (4.2, 9.1))
+        self.assertEqual(profiles.shape, (3, 1, profile.size))
+        np.testing.assert_allclose(profiles[:, 0],
+            [profile, 2 * profile, -profile])
+
+    def test_complex_and_cache(self):
+        bins = getRadialBins((12, 17))
+        self.assertIs(bins, getRadialBins((12, 17), (6, 8)))
+        self.assertFalse(bins.labels.flags.writeable)
+        _, profile = RadialAverage(self.image + 1j * self.image)
+        _, real_profile = RadialAverage(self.image)
+        np.testing.assert_allclose(profile, real_profile * (1 + 1j))
+
+    def test_ctf_calculator_preimage(self):
+        # the target must be used for both of the axes
+        locate, distance = CTFCalculator.generateRadialPreimage(
+            (12, 17), (2, 9), pixel_size = 0.1,
+        )
+        self.assertEqual(sum(len(rows) for rows in locate), 12 * 17)
+        for rows, dist in zip(locate, distance):
+            radius = np.round(np.hypot(rows[:, 0] - 2, rows[:, 1] - 9))
+            np.testing.assert_allclose(radius * 0.1, dist)
+
+        _, from_preimage = CTFCalculator.generateRotationalAverage(
+            self.image, preimage_locate = locate, preimage_distance = distance,
+        )
+        _, direct = CTFCalculator.generateRotationalAverage(
+            self.image, (2, 9),
+        )
+        np.testing.assert_allclose(from_preimage, direct)
+
+
+if __name__ == '__main__':
+    unittest.main()
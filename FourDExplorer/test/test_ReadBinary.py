@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import builtins
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from lib.ReadBinary import NpzMemberStream
+from lib.ReadBinary import openNumpyArray
+from lib.ReadBinary import readFourDSTEMFromNumpy
+
+
+class TestReadNumpy(unittest.TestCase):
+
+    def setUp(self):
+        self.cube = np.random.randint(
+            0, 2**16, size = (5, 4, 6, 7)
+        ).astype('uint16')
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.npy_path = os.path.join(self.temp_dir.name, 'test.npy')
+        self.npz_path = os.path.join(self.temp_dir.name, 'test.npz')
+        self.compressed_path = os.path.join(self.temp_dir.name, 'test_c.npz')
+        np.save(self.npy_path, self.cube)
+        np.savez(self.npz_path, other = np.arange(3), cube = self.cube)
+        np.savez_compressed(self.compressed_path, cube = self.cube)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_open_stored_member(self):
+        array = openNumpyArray(self.npz_path, 'cube')
+        self.assertIsInstance(array, np.memmap)
+        np.testing.assert_array_equal(array, self.cube)
+        del array
+
+    def test_open_compressed_member(self):
+        stream = openNumpyArray(self.compressed_path, 'cube')
+        self.assertIsInstance(stream, NpzMemberStream)
+        stream.close()
+
+    def test_read_blocks(self):
+        progress = types.SimpleNamespace(emit = lambda value: None)
+        with h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        ) as file:
+            builtins.qApp = types.SimpleNamespace(
+                hdf_handler = types.SimpleNamespace(file = file)
+            )
+            # budgets of several scan rows, and of patterns in a scan row
+            for budget in (2**20, 3 * 6 * 7 * 2 * 3):
+                for path, name in (
+                    (self.npy_path, None), 
+                    (self.npz_path, 'cube'), 
+                    (self.compressed_path, 'cube'),
+                ):
+                    dataset = file.create_dataset(
+                        '{0}_{1}'.format(os.path.basename(path), budget), 
+                        shape = self.cube.shape, 
+                        dtype = 'uint16',
+                    )
+                    readFourDSTEMFromNumpy(
+                        path, dataset.name, name, 
+                        progress_signal = progress, memory_budget = budget,
+                    )
+                    np.testing.assert_array_equal(dataset[()], self.cube)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.SearchIndex import HDFSearchIndex
+from bin.SearchIndex import TextIndex
+
+
+class TestTextIndex(unittest.TestCase):
+
+    def test_queries(self):
+        index = TextIndex()
+        for ii, text in enumerate(['alpha', 'alphabet', 'beta', 'al']):
+            index.add(text, ii)
+        index.add('beta', 4)
+        self.assertEqual(index.matchPrefix('alp'), {0, 1})
+        self.assertEqual(index.matchSubstring('pha'), {0, 1})
+        self.assertEqual(index.matchSubstring('l'), {0, 1, 3})
+        self.assertEqual(index.matchSubstring('bet'), {1, 2, 4})
+        index.remove('beta', 2)
+        self.assertEqual(index.matchPrefix('be'), {4})
+        index.remove('beta', 4)
+        self.assertEqual(index.matchSubstring('eta'), set())
+        self.assertEqual(index.matchPrefix('b'), set())
+
+    def test_short_queries(self):
+        index = TextIndex()
+        for ii, text in enumerate(['du_i', 'dv_j', 'title', 'i']):
+            index.add(text, ii)
+        self.assertEqual(index.matchSubstring(''), {0, 1, 2, 3})
+        self.assertEqual(index.matchSubstring('i'), {0, 2, 3})
+        self.assertEqual(index.matchSubstring('_'), {0, 1})
+        self.assertEqual(index.matchSubstring('it'), {2})
+        self.assertEqual(index.matchSubstring('u_i'), {0})
+        self.assertEqual(index.matchSubstring('ij'), set())
+        index.remove('i', 3)
+        index.remove('title', 2)
+        self.assertEqual(index.matchSubstring('i'), {0})
+        self.assertEqual(index.matchSubstring('t'), set())
+        # the ids of the removed strings are reused
+        index.add('tit', 5)
+        self.assertEqual(index.matchSubstring('tit'), {5})
+        self.assertEqual(index.matchSubstring('itl'), set())
+
+
+class TestHDFSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.file = h5py.File(
+            'test.h5', 'w', driver = 'core', backing_store = False
+        )
+        data = self.file.create_dataset(
+            'Recon/ptycho.img', shape = (4, 4), dtype = 'f4'
+        )
+        data.attrs['/Calibration/Space/du_i'] = 0.1
+        data.attrs['/General/notes'] = 'reconstructed by ePIE'
+        data.attrs['large'] = np.zeros(100)
+        self.index = HDFSearchIndex(self.file)
+
+    def tearDown(self):
+        self.file.close()
+
+    def test_names(self):
+        self.assertEqual(self.index.matchNames('ptycho'), ['/Recon/ptycho.img'])
+        self.assertEqual(self.index.matchNames('Re', prefix = True), ['/Recon'])
+
+    def test_attributes(self):
+        self.assertEqual(
+            self.index.matchAttributes('Space'), 
+            [('/Recon/ptycho.img', '/Calibration/Space/du_i')],
+        )
+        self.assertEqual(self.index.matchAttributes('ePIE'), [])
+        self.assertEqual(
+            self.index.matchAttributes('ePIE', values = True), 
+            [('/Recon/ptycho.img', '/General/notes')],
+        )
+
+    def test_long_values(self):
+        data = self.file['Recon/ptycho.img']
+        data.attrs['/General/notes'] = 'x' * 100 + ' reconstructed by ePIE'
+        self.index.updateAttributes('/Recon/ptycho.img')
+        self.assertEqual(
+            self.index.matchAttributes('ePIE', values = True), 
+            [('/Recon/ptycho.img', '/General/notes')],
+        )
+        self.assertEqual(
+            self.index.matchAttributes('xxx', prefix = True, values = True), 
+            [('/Recon/ptycho.img', '/General/notes')],
+        )
+        del data.attrs['/General/notes']
+        self.index.updateAttributes('/Recon/ptycho.img')
+        self.assertEqual(self.index.matchAttributes('ePIE', values = True), [])
+
+    def test_direct_writes(self):
+        self.assertEqual(self.index.matchAttributes('du'), 
+            [('/Recon/ptycho.img', '/Calibration/Space/du_i')])
+        data = self.file['Recon/ptycho.img']
+        data.attrs['/Calibration/Space/dv_j'] = 0.1
+        self.assertEqual(self.index.matchAttributes('dv'), [])
+        self.index.markDirty('/Recon/ptycho.img')
+        self.assertEqual(self.index.matchAttributes('dv'), 
+            [('/Recon/ptycho.img', '/Calibration/Space/dv_j')])
+
+    def test_updates(self):
+        self.file.create_dataset('Recon/dpc.img', shape = (4, 4), dtype = 'f4')
+        self.index.addItem('/Recon/dpc.img')
+        self.index.markDirty('/Recon/dpc.img')
+        self.file['Recon/dpc.img'].attrs['/General/title'] = 'dpc'
+        self.assertEqual(
+            self.index.matchAttributes('title'), 
+            [('/Recon/dpc.img', '/General/title')],
+        )
+
+        self.file.move('Recon', 'Results')
+        self.index.moveItem('/Recon', '/Results')
+        self.assertEqual(self.index.matchNames('.img'), 
+            ['/Results/dpc.img', '/Results/ptycho.img'])
+
+        del self.file['Results/ptycho.img']
+        self.index.removeItem('/Results/ptycho.img')
+        self.assertEqual(self.index.matchAttributes('Space'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import builtins
+import json
+import logging
+import os
+import sys
+import tempfile
+import types
+import unittest
+
+from PySide6.QtCore import QCoreApplication, QEventLoop, QTimer
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.TaskManager import Task, TaskManager
+from bin.TaskMetrics import TaskMetrics
+
+
+def _work(path: str, size: int) -> int:
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    with open(path, 'rb') as f:
+        data = f.read()
+    return sum(ii * ii for ii in range(200000)) + len(data)
+
+
+class TestTaskMetrics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        builtins.qApp = types.SimpleNamespace(logger = logging.getLogger())
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'data.bin')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_measure(self):
+        metrics = TaskMetrics(per_thread = True)
+        self.assertEqual(metrics.summary(), '')
+        metrics.start()
+        _work(self.path, 2**20)
+        metrics.stop()
+        metrics.patterns = 100
+        self.assertGreater(metrics.wall_time, 0)
+        self.assertGreater(metrics.cpu_time, 0)
+        self.assertGreater(metrics.peak_rss, 0)
+        if metrics.bytes_written is not None:
+            self.assertGreaterEqual(metrics.bytes_written, 2**20)
+            self.assertGreaterEqual(metrics.bytes_read, 2**20)
+            self.assertGreater(metrics.megabytes_per_second, 0)
+        self.assertAlmostEqual(
+            metrics.patterns_per_second, 100 / metrics.wall_time
+        )
+        self.assertIn('patterns/s', metrics.summary())
+
+    def test_task_and_export(self):
+        task_manager = TaskManager()
+        task = Task()
+        task.name = 'Metrics'
+        task.patterns = 16
+        task.addSubtaskFunc('work', _work, self.path, 2**16)
+
+        loop = QEventLoop()
+        task.task_completed.connect(loop.quit)
+        QTimer.singleShot(10000, loop.quit)
+        task_manager.addTask(task)
+        loop.exec()
+
+        self.assertIsNotNone(task.metrics.wall_time)
+        self.assertIsNotNone(task[0].metrics.wall_time)
+        self.assertGreaterEqual(task.metrics.wall_time, task[0].metrics.wall_time)
+
+        json_path = os.path.join(self.temp_dir.name, 'metrics.json')
+        task_manager.exportMetrics(json_path)
+        with open(json_path, 'r', encoding = 'utf-8') as f:
+            exported = json.load(f)
+        self.assertEqual(len(exported['tasks']), 1)
+        record = exported['tasks'][0]
+        self.assertEqual(record['name'], 'Metrics')
+        self.assertEqual(record['state'], 'Completed')
+        self.assertEqual(record['patterns'], 16)
+        self.assertEqual(record['subtasks'][0]['name'], 'work')
+        self.assertGreater(record['subtasks'][0]['cpu_time'], 0)
+        task_manager.shutDown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+import h5py
+import numpy as np
+
+ROOTPATH = os.path.split(os.path.dirname(__file__))[0]
+if not ROOTPATH in sys.path:
+    sys.path.append(ROOTPATH)
+from bin.MemoryBudget import getMemoryBudget
+from lib.VectorFieldOperators import Curl2D
+from lib.VectorFieldOperators import Divergence2D
+from lib.VectorFieldOperators import DivergenceCurlMoments
+from lib.VectorFieldOperators import getFrequencyGrid
+from lib.VectorFieldOperators import MinimumCurlAngle
+from lib.VectorFieldOperators import Potential2D
+from lib.VectorFieldOperators import RotatedDivergenceCurl
+from lib.VectorFieldPipeline import FlipVectorStage
+from lib.VectorFieldPipeline import RotateVectorStage
+from lib.VectorFieldPipeline import SubtractVectorFieldStage
+from lib.VectorFieldPipeline import SubtractVectorOffsetStage
+from lib.VectorFieldPipeline import VectorFieldPipeline
+
+
+def _complexPotential(vec_i, vec_j):
+    # the former implementation of Potential2D by complex FFTs
+    fft2 = lambda x: np.fft.fftshift(np.fft.fft2(np.fft.fftshift(x)))
+    ifft2 = lambda x: np.fft.ifftshift(np.fft.ifft2(np.fft.ifftshift(x)))
+    height, width = vec_i.shape
+    k_i, k_j = np.meshgrid(
+        np.linspace(-height/2, height/2 - 1, height),
+        np.linspace(-width/2, width/2 - 1, width),
+        indexing = 'ij',
+    )
+    f_ivec = (k_i * fft2(vec_i) + k_j * fft2(vec_j)) / (k_i**2 + k_j**2 + 1e-12)
+    return np.real(- ifft2(f_ivec) / (2 * np.pi * complex(0, 1)))
+
+
+class TestPotential2D(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vec_i = rng.standard_normal((32, 48))
+        self.vec_j = rng.standard_normal((32, 48))
+
+    def test_matches_complex_fft(self):
+        expected = _complexPotential(self.vec_i, self.vec_j)
+        np.testing.assert_allclose(
+            Potential2D(self.vec_i, self.vec_j), expected, atol = 1e-12
+        )
+        potential = Potential2D(
+            self.vec_i.astype('float32'), self.vec_j.astype('float32')
+        )
+        self.assertEqual(potential.dtype, np.float32)
+        np.testing.assert_allclose(potential, expected, atol = 1e-5)
+
+    def test_frequency_grid_cache(self):
+        grid = getFrequencyGrid((32, 48))
+        self.assertIs(grid, getFrequencyGrid((32, 48)))
+        self.assertEqual(grid[1].shape, (1, 25))
+        self.assertFalse(grid[2].flags.writeable)
+
+    def test_mirror(self):
+        # a non-periodic potential, whose edges jump
+        ii, jj = np.meshgrid(np.arange(40.), np.arange(50.), indexing = 'ij')
+        potential = 0.01 * ii**2 + 0.02 * ii * jj
+        vec_i, vec_j = np.gradient(- potential)
+        correlations = [
+            np.corrcoef(
+                Potential2D(vec_i, vec_j, mirror = mirror).ravel(), 
+                potential.ravel(),
+            )[0, 1] for mirror in (False, True)
+        ]
+        self.assertLess(correlations[0], 0.5)
+        self.assertGreater(correlations[1], 0.99)
+
+
+class TestRotationAngle(unittest.TestCase):
+
+    def setUp(self):
+        # the gradient of a potential, rotated by -37.3 degrees
+        ii, jj = np.meshgrid(np.arange(30.), np.arange(40.), indexing = 'ij')
+        grad_i, grad_j = np.gradient(
+            np.sin(ii / 5) * np.cos(jj / 7) + 0.01 * ii * jj
+        )
+        angle = -37.3 * np.pi / 180
+        rng = np.random.default_rng(2)
+        self.vec = np.stack([
+            grad_i * np.cos(angle) - grad_j * np.sin(angle),
+            grad_i * np.sin(angle) + grad_j * np.cos(angle),
+        ]) + 1e-3 * rng.standard_normal((2, 30, 40))
+
+    def test_matches_rotated_fields(self):
+        angles = np.arange(0, 360, 13.0)
+        curve_div, curve_curl = RotatedDivergenceCurl(
+            DivergenceCurlMoments(self.vec), angles
+        )
+        for angle, div_sq, curl_sq in zip(angles, curve_div, curve_curl):
+            rad = angle * np.pi / 180
+            vec_i = self.vec[0] * np.cos(rad) - self.vec[1] * np.sin(rad)
+            vec_j = self.vec[0] * np.sin(rad) + self.vec[1] * np.cos(rad)
+            self.assertAlmostEqual(
+                div_sq, np.sum(Divergence2D(vec_i, vec_j)**2), places = 10
+            )
+            self.assertAlmostEqual(
+                curl_sq, np.sum(Curl2D(vec_i, vec_j)**2), places = 10
+            )
+
+    def test_minimum_and_blocks(self):
+        moments = DivergenceCurlMoments(self.vec)
+        self.assertAlmostEqual(MinimumCurlAngle(moments), 37.3, delta = 0.1)
+
+        budget = getMemoryBudget()
+        min_block, max_block = budget.min_block, budget.max_block
+        budget.min_block, budget.max_block = 1, 2 * 40 * 8 * 4 * 3
+        try:
+            with h5py.File(
+                'test.h5', 'w', driver = 'core', backing_store = False
+            ) as file:
+                blockwise = DivergenceCurlMoments(
+                    file.create_dataset('field', data = self.vec)
+                )
+        finally:
+            budget.min_block, budget.max_block = min_block, max_block
+        np.testing.assert_allclose(blockwise, moments, rtol = 1e-12)
+
+
+class TestVectorFieldPipeline(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.field = rng.standard_normal((2, 24, 20)) + 3
+        self.other = rng.standard_normal((2, 24, 20))
+
+    def _expected(self):
+        angle = 30 * np.pi / 180
+        vec_i = self.field[0] * np.cos(angle) - self.field[1] * np.sin(angle)
+        vec_j = self.field[0] * np.sin(angle) + self.field[1] * np.cos(angle)
+        vec_i, vec_j = vec_i - self.other[0], vec_j - self.other[1]
+        vec_i, vec_j = vec_i - vec_i.mean(), vec_j - vec_j.mean()
+        return np.stack([vec_j, vec_i])
+
+    def _pipeline(self, output = None):
+        return VectorFieldPipeline([
+            RotateVectorStage(30), 
+            SubtractVectorFieldStage(self.other),
+            SubtractVectorOffsetStage(),
+            FlipVectorStage(),
+        ], output)
+
+    def test_chain(self):
+        source = self.field.copy()
+        result = np.zeros_like(source)
+        self._pipeline().run(source, result)
+        np.testing.assert_allclose(result, self._expected(), atol = 1e-12)
+        np.testing.assert_array_equal(source, self.field)
+
+        curl = np.zeros((24, 20))
+        self._pipeline('curl').run(source, curl)
+        expected = self._expected()
+        np.testing.assert_allclose(
+            curl, Curl2D(expected[0], expected[1]), atol = 1e-12
+        )
+
+    def test_blocks(self):
+        # blocks of a few rows need a pass to calculate the offset
+        budget = getMemoryBudget()
+        min_block, max_block = budget.min_block, budget.max_block
+        budget.min_block, budget.max_block = 1, 2 * 20 * 8 * 3 * 5
+        try:
+            with h5py.File(
+                'test.h5', 'w', driver = 'core', backing_store = False
+            ) as file:
+                source = file.create_dataset('field', data = self.field)
+                result = file.create_dataset('result', (2, 24, 20), 'float32')
+                pipeline = self._pipeline()
+                pipeline.dtype = np.dtype('float32')
+                pipeline.run(source, result)
+                np.testing.assert_allclose(
+                    result[:], self._expected(), atol = 1e-5
+                )
+        finally:
+            budget.min_block, budget.max_block = min_block, max_block
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            VectorFieldPipeline(output = 'gradient')
+        with self.assertRaises(ValueError):
+            VectorFieldPipeline().run(np.zeros((3, 4, 4)), np.zeros((3, 4, 4)))
+
+
+if __name__ == '__main__':
+    unittest.main()
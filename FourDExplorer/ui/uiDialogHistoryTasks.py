@@ -48,6 +48,11 @@ class Ui_Dialog(object):
 
         self.horizontalLayout.addWidget(self.pushButton_clear_all)
 
+        self.pushButton_export = QPushButton(Dialog)
+        self.pushButton_export.setObjectName(u"pushButton_export")
+
+        self.horizontalLayout.addWidget(self.pushButton_export)
+
 
         self.verticalLayout.addLayout(self.horizontalLayout)
 
@@ -80,6 +85,7 @@ class Ui_Dialog(object):
         self.label.setText(QCoreApplication.translate("Dialog", u"History Tasks", None))
         self.pushButton_refresh.setText(QCoreApplication.translate("Dialog", u"Refresh", None))
         self.pushButton_clear_all.setText(QCoreApplication.translate("Dialog", u"Clear All", None))
+        self.pushButton_export.setText(QCoreApplication.translate("Dialog", u"Export Metrics", None))
         self.pushButton_OK.setText(QCoreApplication.translate("Dialog", u"OK", None))
     # retranslateUi
 
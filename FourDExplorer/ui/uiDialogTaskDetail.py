@@ -102,6 +102,16 @@ class Ui_Dialog(object):
 
         self.verticalLayout.addWidget(self.listView_subtask)
 
+        self.label_7 = QLabel(Dialog)
+        self.label_7.setObjectName(u"label_7")
+
+        self.verticalLayout.addWidget(self.label_7)
+
+        self.plainTextEdit_metrics = QPlainTextEdit(Dialog)
+        self.plainTextEdit_metrics.setObjectName(u"plainTextEdit_metrics")
+
+        self.verticalLayout.addWidget(self.plainTextEdit_metrics)
+
         self.horizontalLayout_3 = QHBoxLayout()
         self.horizontalLayout_3.setObjectName(u"horizontalLayout_3")
         self.horizontalSpacer_3 = QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum)
@@ -135,6 +145,7 @@ class Ui_Dialog(object):
         self.label_task_state.setText(QCoreApplication.translate("Dialog", u"Submitted", None))
         self.label_3.setText(QCoreApplication.translate("Dialog", u"Comments:", None))
         self.label_6.setText(QCoreApplication.translate("Dialog", u"Subtasks", None))
+        self.label_7.setText(QCoreApplication.translate("Dialog", u"Performance", None))
         self.pushButton_refresh.setText(QCoreApplication.translate("Dialog", u"Refresh", None))
         self.pushButton_OK.setText(QCoreApplication.translate("Dialog", u"OK", None))
     # retranslateUi